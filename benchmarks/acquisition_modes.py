@@ -0,0 +1,94 @@
+"""
+Benchmark of the acquisition modes: the boxcar kernel of the 'HIRES' mode and the processing of the blocks of the
+simulated device in the 'NORMAL', 'HIRES', 'AVERAGE' and 'EXPONENTIAL_AVERAGE' modes at a device sample rate of
+16 MS/s. The signal is a 1 kHz sine with noise from a seeded generator, so the runs are reproducible.
+
+    python benchmarks/acquisition_modes.py [--record-length 100000] [--repeat 5]
+"""
+import argparse
+import platform
+import statistics
+import time
+
+import numpy as np
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+# the modes and the published sample rates, the device samples at 16 MS/s in all of them
+MODES = (('NORMAL', 16_000_000), ('HIRES', 1_000_000), ('HIRES', 500_000), ('AVERAGE', 16_000_000),
+         ('EXPONENTIAL_AVERAGE', 16_000_000))
+
+
+def median_rate(function, number_of_samples, repeat):
+    """
+    Get the median number of samples per second processed by a function.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return number_of_samples / statistics.median(durations)
+
+
+def benchmark_boxcar(osc, length, repeat):
+    print(f'boxcar average and conversion of {length} samples (MS/s):')
+    adc_counts = np.random.default_rng(0).integers(0, 256, length, dtype=np.uint8)
+    for factor in (2, 16, 64):
+        counts = adc_counts[:length - length % factor]
+        out = np.empty(len(counts) // factor)
+        rates = [median_rate(lambda: osc.c_code.boxcar_convert_to_voltage(counts, factor, 0.04, 0.0, out),
+                             len(counts), repeat) if osc.c_code.c_code_loaded else float('nan')]
+
+        def numpy_boxcar():
+            means = counts.reshape(-1, factor).mean(axis=1)
+            np.subtract(means, 128, out=out)
+            out[:] *= 0.04
+        rates.append(median_rate(numpy_boxcar, len(counts), repeat))
+        print(f'    {factor:2d}x: C {rates[0] / 1e6:8.1f}   NumPy {rates[1] / 1e6:8.1f}')
+
+
+def benchmark_modes(osc, record_length, repeat):
+    print(f'processing of the blocks, {record_length} points per record (MS/s per channel):')
+    rng = np.random.default_rng(0)
+    for mode, sample_rate in MODES:
+        osc.acquisition_mode = mode
+        osc.sample_rate = sample_rate
+        osc.record_length = record_length
+        device_sample_rate = sample_rate * osc._oversampling
+        blocksize = osc._blocksize
+        times = np.arange(20 * blocksize) / device_sample_rate
+        signal = 4 * np.sin(2 * np.pi * 1e3 * times) / 0.04 + 128 + rng.normal(0, 1, len(times))
+        signal = np.clip(np.rint(signal), 0, 255).astype(np.uint8)
+        blocks = signal.reshape(20, blocksize)
+        osc._reset_record()
+        first_record_id = osc.latest_record_id
+
+        def process():
+            for block in blocks:
+                osc._process_block(block, block)
+        rate = median_rate(process, signal.size, repeat)
+        records = (osc.latest_record_id - first_record_id) / repeat
+        print(f'    {mode:20s} {sample_rate / 1e6:5.2f} MS/s ({osc._oversampling:2d}x): {rate / 1e6:8.1f} '
+              f'({records:.1f} records per run)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--record-length', type=int, default=100000, help='the number of points per record')
+    parser.add_argument('--repeat', type=int, default=5, help='the number of measurements per benchmark')
+    args = parser.parse_args()
+    print(f'{platform.processor() or platform.machine()}, Python {platform.python_version()}, '
+          f'NumPy {np.__version__}')
+
+    osc = Oscilloscope(scope=SimulatedScope(realtime=False))
+    osc.trigger_mode = 'REPEAT'
+    osc.channels[0].trigger_level = 0.0
+    osc.number_of_averages = 16
+    benchmark_boxcar(osc, args.record_length * 16, args.repeat)
+    benchmark_modes(osc, args.record_length, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of the streaming filters at the sample rates of 24 MS/s and 48 MS/s. Each filter processes the blocks the
+oscilloscope receives at that rate (one channel). The filters that can be used in the acquisition pipeline are also
+measured with the conversion of the ADC counts (see "Channel.filter"). The load is the fraction of the time of one CPU
+core needed to keep up with the sample rate (above 100 % the filter cannot keep up).
+
+    python benchmarks/filters.py [--repeat 5]
+"""
+import argparse
+import platform
+import statistics
+import time
+
+import numpy as np
+
+from hantekosc.c_code import C_Code
+from hantekosc.filters import BiquadFilter, CICDecimator, DCBlocker, FIRFilter, butterworth_sections, lowpass_taps
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+SAMPLE_RATES = (24_000_000, 48_000_000)
+NUMBER_OF_BLOCKS = 10
+
+
+def filters(sample_rate, c_code):
+    """
+    Get the benchmarked filters by name (without the IIR filters if the C code is not loaded).
+    """
+    taps = lowpass_taps(63, sample_rate / 20, sample_rate)
+    benchmarked_filters = {
+        'FIR 31 taps': FIRFilter(lowpass_taps(31, sample_rate / 20, sample_rate), c_code=c_code),
+        'FIR 63 taps': FIRFilter(taps, c_code=c_code),
+        'FIR 63 taps, /8': FIRFilter(taps, decimation=8, c_code=c_code),
+        'CIC order 3, /8': CICDecimator(8, order=3, c_code=c_code),
+    }
+    if c_code.c_code_loaded:
+        benchmarked_filters.update({
+            'biquad, 4th order': BiquadFilter(butterworth_sections(4, sample_rate / 20, sample_rate), c_code=c_code),
+            'biquad, 8th order': BiquadFilter(butterworth_sections(8, sample_rate / 20, sample_rate), c_code=c_code),
+            'DC blocker': DCBlocker(1e3, sample_rate, c_code=c_code),
+        })
+    return benchmarked_filters
+
+
+def median_duration(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='the number of measurements per benchmark')
+    args = parser.parse_args()
+    print(f'{platform.processor() or platform.machine()}, Python {platform.python_version()}, '
+          f'NumPy {np.__version__}')
+
+    c_code = C_Code()
+    numpy_code = C_Code()
+    # the filters run in NumPy if the C code is not loaded
+    numpy_code.c_code_loaded = False
+    osc = Oscilloscope(scope=SimulatedScope(realtime=False))
+    rng = np.random.default_rng(0)
+    for sample_rate in SAMPLE_RATES:
+        osc.sample_rate = sample_rate
+        block_length = osc._blocksize
+        times = np.arange(NUMBER_OF_BLOCKS * block_length) / sample_rate
+        signal = 128 + 80 * np.sin(2 * np.pi * 1e5 * times) + rng.normal(0, 4, len(times))
+        adc_counts = np.clip(np.rint(signal), 0, 255).astype(np.uint8).reshape(NUMBER_OF_BLOCKS, block_length)
+        values = adc_counts.astype(np.float32) - 128
+        print(f'{sample_rate / 1e6:.0f} MS/s, {block_length} samples per block (throughput in MS/s and load):')
+        print(f'    {"":20s}{"filter":>17s}{"pipeline":>17s}{"NumPy":>17s}')
+        numpy_filters = filters(sample_rate, numpy_code)
+        for name, filter_ in filters(sample_rate, c_code).items():
+            data = adc_counts if isinstance(filter_, CICDecimator) else values
+
+            def process(filter_=filter_):
+                for block in data:
+                    filter_.process(block)
+
+            def pipeline():
+                for block in adc_counts:
+                    osc._filter_block((block, block))
+
+            durations = [median_duration(process, args.repeat), None, None]
+            # decimating filters cannot be used in the acquisition pipeline
+            if filter_.decimation == 1:
+                osc.channels[0].filter = filter_
+                durations[1] = median_duration(pipeline, args.repeat)
+                osc.channels[0].filter = None
+            if name in numpy_filters:
+                durations[2] = median_duration(lambda: process(numpy_filters[name]), args.repeat)
+            cells = ['-' if duration is None else
+                     f'{adc_counts.size / duration / 1e6:.1f} {sample_rate * duration / adc_counts.size:5.0%}'
+                     for duration in durations]
+            print(f'    {name:20s}{"".join(f"{cell:>17s}" for cell in cells)}')
+
+if __name__ == '__main__':
+    main()
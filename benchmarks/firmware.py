@@ -0,0 +1,77 @@
+"""
+Benchmark of the firmware handling: the time to import the Firmware module, to load the control packets of a firmware
+(parsing the hex file or reading the cache) and to flash the simulated device with per-record and coalesced packets.
+
+    python benchmarks/firmware.py [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from hantekosc.py_ht6022 import Firmware
+from hantekosc.simulation import SimulatedScope
+
+
+def import_time(module, repeat):
+    """
+    Get the median cumulative import time of a module in seconds, measured with "python -X importtime" in a new
+    process each time.
+    """
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            fields = [field.strip() for field in line.split('|')]
+            if len(fields) == 3 and fields[2] == module:
+                times.append(int(fields[1]) * 1e-6)
+    return statistics.median(times)
+
+
+def median_time(function, repeat):
+    """
+    Get the median time in seconds a function takes.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20, help='the number of measurements per benchmark')
+    args = parser.parse_args()
+
+    module = 'hantekosc.py_ht6022.Firmware'
+    print(f'import {module}: {import_time(module, args.repeat) * 1e3:8.2f} ms')
+
+    location = Firmware.FIRMWARE_FILES['dso6022be_firmware']
+    with tempfile.TemporaryDirectory() as cache_directory:
+        Firmware.CACHE_DIRECTORY = cache_directory
+        parse = median_time(lambda: Firmware.load_control_packets(location, use_cache=False), args.repeat)
+        Firmware.load_control_packets(location)
+        cached = median_time(lambda: Firmware.load_control_packets(location), args.repeat)
+    print(f'parse DSO6022BE firmware:            {parse * 1e3:8.2f} ms')
+    print(f'load DSO6022BE firmware from cache:  {cached * 1e3:8.2f} ms')
+
+    scope = SimulatedScope()
+    scope.setup()
+    scope.open_handle()
+    # only the control transfers are measured
+    scope.enumeration_time = 0
+    print(f'flash the simulated device ({scope.control_transfer_time * 1e6:.0f} us per control transfer):')
+    for name, coalesce in (('per record', False), ('coalesced', True)):
+        packets = Firmware.fx2_ihex_to_control_packets(location, coalesce=coalesce)
+        duration = median_time(lambda: scope.flash_firmware(packets), args.repeat)
+        print(f'    {name:10s} {len(packets):4d} control transfers: {duration * 1e3:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
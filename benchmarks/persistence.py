@@ -0,0 +1,68 @@
+"""
+Benchmark of the persistence histogram (see "PersistenceHistogram"). Records of a noisy sine are added to a histogram
+of 1000 time bins, in C and with "numpy.bincount". The throughput is given in records/s and in MS/s, the load is the
+fraction of the time of one CPU core needed to accumulate every record at a display rate of 50 records/s.
+
+    python benchmarks/persistence.py [--repeat 5]
+"""
+import argparse
+import platform
+import statistics
+import time
+
+import numpy as np
+
+from hantekosc.c_code import C_Code
+from hantekosc.persistence import PersistenceHistogram
+
+RECORD_LENGTHS = (10_000, 100_000, 1_000_000)
+TIME_BINS = 1000
+NUMBER_OF_RECORDS = 20
+DISPLAY_RATE = 50
+
+
+def median_duration(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='the number of measurements per benchmark')
+    args = parser.parse_args()
+    print(f'{platform.processor() or platform.machine()}, Python {platform.python_version()}, '
+          f'NumPy {np.__version__}')
+
+    c_code = C_Code()
+    implementations = {'NumPy': None}
+    if c_code.c_code_loaded:
+        implementations['C'] = c_code
+    rng = np.random.default_rng(0)
+    print(f'{TIME_BINS} time bins (records/s, MS/s and load at {DISPLAY_RATE} records/s):')
+    print(f'    {"record length":20s}{"".join(f"{name:>30s}" for name in implementations)}')
+    for record_length in RECORD_LENGTHS:
+        times = np.arange(record_length) / record_length
+        records = []
+        for _ in range(NUMBER_OF_RECORDS):
+            signal = 128 + 80 * np.sin(2 * np.pi * 10 * times + rng.uniform(0, 2 * np.pi))
+            signal += rng.normal(0, 4, record_length)
+            records.append(np.clip(np.rint(signal), 0, 255).astype(np.uint8))
+        cells = []
+        for implementation in implementations.values():
+            histogram = PersistenceHistogram(TIME_BINS, 'EXPONENTIAL', decay_records=100, c_code=implementation)
+
+            def accumulate(histogram=histogram):
+                for adc_counts in records:
+                    histogram.add(adc_counts)
+
+            duration = median_duration(accumulate, args.repeat) / NUMBER_OF_RECORDS
+            cells.append(f'{1 / duration:.0f} {record_length / duration / 1e6:.1f} {DISPLAY_RATE * duration:5.1%}')
+        print(f'    {record_length:<20d}{"".join(f"{cell:>30s}" for cell in cells)}')
+
+
+if __name__ == '__main__':
+    main()
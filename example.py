@@ -1,4 +1,5 @@
 import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib.animation import FuncAnimation
 
 from hantekosc import devices
@@ -20,6 +21,7 @@ osc.start()
 
 delay_ = 0
 case_ = 0
+record_id = 0
 
 fig, ax = plt.subplots()
 xdata, ydata = [], []
@@ -37,9 +39,15 @@ def init():
 def update(frame):
     global delay_
     global case_
+    global record_id
 
-    x_data = osc.channels[0].measured_data[0]
-    y_data = osc.channels[0].measured_data[1]
+    # the minimum and maximum of each of 2000 bins (peak detection) are enough to plot the whole record
+    if osc.latest_record_id == record_id:
+        return ln,
+    record_id, x_data, y_min, y_max = osc.channels[0].peak_detect(2000)
+    # draw a vertical line from the minimum to the maximum of each bin
+    x_data = np.repeat(x_data, 2)
+    y_data = np.stack((y_min, y_max), axis=1).ravel()
 
     """
     if delay_ == 20:
@@ -65,15 +73,15 @@ def update(frame):
 
     ln.set_data(x_data, y_data)
 
-    x_min = min(x_data)
-    x_max = max(x_data)
+    x_min = x_data.min()
+    x_max = x_data.max()
     x_scale = max([abs(x_min), abs(x_max)])
-    y_min = min(y_data)
-    y_max = max(y_data)
+    y_min = y_data.min()
+    y_max = y_data.max()
     y_scale = max([abs(y_min), abs(y_max)])
 
-    ln.axes.set_xlim(min(x_data) - x_scale * 0.05, max(x_data) + x_scale * 0.05)
-    ln.axes.set_ylim(min(y_data) - y_scale * 0.1, max(y_data) + y_scale * 0.05)
+    ln.axes.set_xlim(x_min - x_scale * 0.05, x_max + x_scale * 0.05)
+    ln.axes.set_ylim(y_min - y_scale * 0.1, y_max + y_scale * 0.05)
     return ln,
 
 ani = FuncAnimation(fig, update, frames=10, init_func=init, blit=False)
@@ -1,3 +1,27 @@
-from .devices import list_connected_hantek_devices
-from .oscilloscope import Oscilloscope
-from .channel import Channel
\ No newline at end of file
+import importlib
+
+# The public classes and functions are imported on first use, so importing the package (or a light module like
+# "hantekosc.devices") does not load numpy, cffi and the oscilloscope modules.
+_lazy_attributes = {
+    'list_connected_hantek_devices': 'hantekosc.devices',
+    'upload_firmware': 'hantekosc.devices',
+    'Oscilloscope': 'hantekosc.oscilloscope',
+    'Channel': 'hantekosc.channel',
+    'MathChannel': 'hantekosc.math_channel',
+    'AsyncOscilloscope': 'hantekosc.async_oscilloscope',
+    'ScopeGroup': 'hantekosc.scope_group',
+}
+
+__all__ = list(_lazy_attributes)
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
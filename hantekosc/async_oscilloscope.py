@@ -0,0 +1,250 @@
+import asyncio
+import functools
+import select
+from concurrent.futures import ThreadPoolExecutor
+
+from hantekosc.oscilloscope import Oscilloscope
+
+
+class AsyncOscilloscope:
+    """
+    asyncio front-end for an oscilloscope.
+
+    The USB events are handled in the event loop by watching the pollable file descriptors of libusb, so no thread is
+    spinning to retrieve the data. The transfer callbacks never block (a block is dropped if the processing thread
+    falls behind), so the event loop is never stalled by the measurement. The file descriptors are watched until the
+    measurement stops, also when it stops itself in the 'SINGLE' trigger mode. Blocking control operations (starting,
+    stopping and changing settings) are executed one after another in a worker thread of the device and can be
+    awaited.
+    If libusb does not provide pollable file descriptors (e.g. on Windows, or for a simulated device), the USB events
+    are handled in a thread as usual.
+
+    Example:
+
+        async with await AsyncOscilloscope.open() as scope:
+            await scope.configure(sample_rate=1e6, record_length=10000)
+            await scope.start()
+            async for record in scope.records():
+                ...
+
+    Attributes:
+        osc (Oscilloscope): The wrapped oscilloscope.
+    """
+    def __init__(self, osc):
+        """
+        Class constructor.
+
+        Args:
+            osc (Oscilloscope): The oscilloscope to wrap. Must not be running.
+        """
+        self.osc = osc
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._loop = None
+        self._usb_file_descriptors = set()
+        self._timeout_handle = None
+        # the settings of the oscilloscope replaced while the USB events are handled in the event loop
+        self._previous_handle_usb_events = None
+        self._previous_stop_callback = None
+        # increased whenever the USB events are attached, so a detach scheduled by an old measurement is ignored
+        self._session = 0
+
+    @classmethod
+    async def open(cls, *args, **kwargs):
+        """
+        Open an oscilloscope without blocking the event loop. All arguments are passed to the Oscilloscope constructor.
+
+        Returns:
+            AsyncOscilloscope: The wrapped oscilloscope.
+        """
+        loop = asyncio.get_running_loop()
+        osc = await loop.run_in_executor(None, functools.partial(Oscilloscope, *args, **kwargs))
+        return cls(osc)
+
+    async def _run(self, function, *args, **kwargs):
+        """
+        Execute a blocking function in the worker thread of the device.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def start(self):
+        """
+        Start the measurement.
+        """
+        if not self.osc.running:
+            # the last measurement may have stopped itself ('SINGLE' trigger mode)
+            self._detach_usb_events()
+        self._attach_usb_events()
+        await self._run(self.osc.start)
+
+    async def stop(self):
+        """
+        Stop the measurement.
+        """
+        await self._run(self.osc.stop)
+        self._detach_usb_events()
+
+    async def configure(self, **settings):
+        """
+        Change settings of the oscilloscope, e.g. "await scope.configure(sample_rate=1e6, trigger_mode='REPEAT')".
+        The settings are applied in the given order.
+
+        Args:
+            settings: The names of the Oscilloscope properties and their new values.
+        """
+        def apply():
+            for name, value in settings.items():
+                setattr(self.osc, name, value)
+        await self._run(apply)
+
+    async def configure_channel(self, channel, **settings):
+        """
+        Change settings of a channel, e.g. "await scope.configure_channel(0, voltage_range=1)".
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            settings: The names of the Channel properties and their new values.
+        """
+        def apply():
+            for name, value in settings.items():
+                setattr(self.osc.channels[channel], name, value)
+        await self._run(apply)
+
+    async def next_record(self, after_id=None):
+        """
+        Wait for a record newer than the given record id.
+
+        Args:
+            after_id (int): (OPTIONAL) The id of the last known record. Default: the id of the latest record.
+
+        Returns:
+            Record: The latest record, or None if the measurement was stopped.
+        """
+        return await self.osc.next_record(after_id)
+
+    def records(self, maxsize=16, timeout=None):
+        """
+        Get an asynchronous iterator yielding each new record exactly once ("async for record in scope.records()").
+
+        Args:
+            maxsize (int): (OPTIONAL) The maximum number of buffered records.
+            timeout (float): (OPTIONAL) The maximum time to wait for a record in seconds. Default: wait forever.
+
+        Returns:
+            RecordStream: The iterator.
+        """
+        return self.osc.records(maxsize, timeout)
+
+    async def close(self):
+        """
+        Stop the measurement and close the connection to the device.
+        """
+        if self.osc.running:
+            await self._run(self.osc.stop)
+        await self._run(self.osc.scope.close_handle)
+        self._detach_usb_events()
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _attach_usb_events(self):
+        """
+        Watch the file descriptors of libusb in the event loop instead of handling the USB events in a thread.
+        """
+        if self._loop is not None:
+            return
+        context = self.osc.scope.context
+        file_descriptors = None
+        # a simulated device has no USB context
+        if context is not None:
+            try:
+                file_descriptors = context.getPollFDList()
+            except NotImplementedError:
+                # libusb cannot provide pollable file descriptors on this platform
+                pass
+        if file_descriptors is None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._session += 1
+        self._previous_handle_usb_events = self.osc.handle_usb_events
+        self._previous_stop_callback = self.osc.stop_callback
+        self.osc.handle_usb_events = False
+        self.osc.stop_callback = self._measurement_stopped
+        for file_descriptor, events in file_descriptors:
+            self._add_file_descriptor(file_descriptor, events)
+        context.setPollFDNotifiers(self._file_descriptor_added, self._file_descriptor_removed)
+        self._schedule_usb_timeout()
+
+    def _measurement_stopped(self):
+        """
+        Called by the oscilloscope from the thread that stopped the measurement (e.g. the processing thread in the
+        'SINGLE' trigger mode), so the file descriptors are detached on every stop.
+        """
+        loop, previous_stop_callback = self._loop, self._previous_stop_callback
+        if loop is not None:
+            loop.call_soon_threadsafe(self._detach_usb_events, self._session)
+        if previous_stop_callback is not None:
+            previous_stop_callback()
+
+    def _detach_usb_events(self, session=None):
+        """
+        Stop watching the file descriptors of libusb and restore the settings of the oscilloscope.
+
+        Args:
+            session (int): (OPTIONAL) Only detach if the events are still attached for this measurement (the
+                measurement may have been started again before a detach scheduled by a stop is executed).
+        """
+        if self._loop is None or (session is not None and session != self._session):
+            return
+        self.osc.scope.context.setPollFDNotifiers()
+        for file_descriptor in list(self._usb_file_descriptors):
+            self._remove_file_descriptor(file_descriptor)
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+            self._timeout_handle = None
+        self.osc.handle_usb_events = self._previous_handle_usb_events
+        self.osc.stop_callback = self._previous_stop_callback
+        self._loop = None
+
+    def _file_descriptor_added(self, file_descriptor, events, user_data=None):
+        # libusb may call this from any thread
+        self._loop.call_soon_threadsafe(self._add_file_descriptor, file_descriptor, events)
+
+    def _file_descriptor_removed(self, file_descriptor, user_data=None):
+        self._loop.call_soon_threadsafe(self._remove_file_descriptor, file_descriptor)
+
+    def _add_file_descriptor(self, file_descriptor, events):
+        if events & select.POLLIN:
+            self._loop.add_reader(file_descriptor, self._handle_usb_events)
+        if events & select.POLLOUT:
+            self._loop.add_writer(file_descriptor, self._handle_usb_events)
+        self._usb_file_descriptors.add(file_descriptor)
+
+    def _remove_file_descriptor(self, file_descriptor):
+        if self._loop is None:
+            return
+        self._loop.remove_reader(file_descriptor)
+        self._loop.remove_writer(file_descriptor)
+        self._usb_file_descriptors.discard(file_descriptor)
+
+    def _handle_usb_events(self):
+        """
+        Handle the pending USB events without blocking. The transfer callbacks are called from here.
+        """
+        self.osc.scope.context.handleEventsTimeout(0)
+        self._schedule_usb_timeout()
+
+    def _schedule_usb_timeout(self):
+        """
+        libusb may need to handle timeouts that are not signalled via the file descriptors.
+        """
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+            self._timeout_handle = None
+        timeout = self.osc.scope.context.getNextTimeout()
+        if timeout is not None:
+            self._timeout_handle = self._loop.call_later(timeout, self._handle_usb_events)
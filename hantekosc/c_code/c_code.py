@@ -1,72 +1,178 @@
+import hashlib
+import importlib
 import os
 import sys
-import time
 
-import numpy
 import numpy as np
-from cffi import FFI
 
 
 class C_Code:
     """
     This class contains all wrapper functions to call C code.
 
+    The kernels work directly on the memory of the NumPy arrays passed in: Inputs are never converted or copied
+    (uint8, float32 and float64 arrays are supported, including strided views), and results are written into
+    preallocated output arrays. As the C code is called in cffi's API mode, the GIL is released during each call, so
+    the processing thread does not block the thread handling the USB events.
+
     Attributes:
         c_code_loaded (bool): Indicates whether the C code could be imported. If not, this class cannot be used.
         ffibuilder (FFI): A FFI instance.
+        ffi (FFI): The FFI instance of the compiled module.
+        lib: The compiled C library.
     """
 
+    # Maps the supported NumPy data types to the C type and the suffix of the corresponding kernel.
+    _c_types = {
+        np.dtype(np.uint8): ('uint8_t', 'u8'),
+        np.dtype(np.float32): ('float', 'f32'),
+        np.dtype(np.float64): ('double', 'f64'),
+    }
+
     def __init__(self):
         """
         Standard constructor. Here the C code is compiled and imported.
         """
+        # cffi is only needed when the C code is loaded
+        from cffi import FFI
+
         self.c_code_loaded = False
         self.ffibuilder = FFI()
+        self.ffi = None
+        self.lib = None
 
         # Here the headers of all C-functions must be specified
-        self.ffibuilder.cdef("int find_trigger_position(double *data_array, int length, double threshold, int rising_edge);")
-        self.ffibuilder.cdef("double* create_timing_data(double *data_array, int number_of_points, int sample_rate);")
-        self.ffibuilder.cdef("double* create_pretrigger_timing_data(double *data_array, int number_of_points, int sample_rate);")
-        self.ffibuilder.cdef("double* create_voltage_data(double *data_array, int length, double scale_factor, double offset);")
+        for suffix, c_type in (('u8', 'uint8_t'), ('f32', 'float'), ('f64', 'double')):
+            self.ffibuilder.cdef(f"ptrdiff_t find_trigger_position_{suffix}(const {c_type} *data_array, "
+                                 f"ptrdiff_t length, ptrdiff_t stride, double threshold, int rising_edge);")
+            self.ffibuilder.cdef(f"void minmax_decimate_{suffix}(const {c_type} *min_data, const {c_type} *max_data, "
+                                 f"ptrdiff_t stride, ptrdiff_t length, {c_type} *out_min, {c_type} *out_max, "
+                                 f"ptrdiff_t n_bins);")
+        self.ffibuilder.cdef("void reduce_level_u8(const uint8_t *min_data, const uint8_t *max_data, "
+                             "const float *mean_data, ptrdiff_t row_stride, ptrdiff_t n_rows, ptrdiff_t length, "
+                             "ptrdiff_t factor, uint8_t *out_min, uint8_t *out_max, float *out_mean, "
+                             "ptrdiff_t out_row_stride);")
+        self.ffibuilder.cdef("ptrdiff_t find_crossings_u8(const uint8_t *data_array, ptrdiff_t stride, "
+                             "ptrdiff_t length, double level, double half_band, double *out_positions, "
+                             "uint8_t *out_rising, ptrdiff_t max_crossings);")
+        self.ffibuilder.cdef("void accumulate_histogram_u8(const uint8_t *data_array, ptrdiff_t stride, "
+                             "ptrdiff_t length, uint32_t *histogram, ptrdiff_t time_bins);")
+        self.ffibuilder.cdef("void fir_filter_f32(const float *data_array, ptrdiff_t n_outputs, ptrdiff_t step, "
+                             "const float *taps, ptrdiff_t n_taps, float *out);")
+        self.ffibuilder.cdef("void biquad_filter_f32(float *data_array, ptrdiff_t length, const double *coefficients, "
+                             "ptrdiff_t n_sections, double *state);")
+        self.ffibuilder.cdef("ptrdiff_t cic_decimate_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, "
+                             "ptrdiff_t order, ptrdiff_t ratio, uint64_t *state, double gain, float *out);")
+        self.ffibuilder.cdef("void round_to_u8_f32(const float *data_array, ptrdiff_t length, uint8_t *out);")
+        self.ffibuilder.cdef("ptrdiff_t mask_test_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, "
+                             "const uint8_t *limits, ptrdiff_t *first_violation);")
+        for suffix, c_type in (('f32', 'float'), ('f64', 'double')):
+            self.ffibuilder.cdef(f"void fill_timing_data_{suffix}({c_type} *out, ptrdiff_t length, ptrdiff_t stride, "
+                                 f"ptrdiff_t first_index, double sample_rate);")
+            self.ffibuilder.cdef(f"void convert_u8_to_{suffix}(const uint8_t *data_array, ptrdiff_t stride, "
+                                 f"{c_type} *out, ptrdiff_t out_stride, ptrdiff_t length, double scale_factor, "
+                                 f"double offset);")
+            self.ffibuilder.cdef(f"void boxcar_convert_u8_to_{suffix}(const uint8_t *data_array, ptrdiff_t stride, "
+                                 f"{c_type} *out, ptrdiff_t out_stride, ptrdiff_t length, ptrdiff_t factor, "
+                                 f"double scale_factor, double offset);")
+            self.ffibuilder.cdef(f"void convert_channels_u8_to_{suffix}(const uint8_t *ch1_data, ptrdiff_t ch1_stride, "
+                                 f"const uint8_t *ch2_data, ptrdiff_t ch2_stride, {c_type} *ch1_out, "
+                                 f"{c_type} *ch2_out, ptrdiff_t length, double ch1_scale_factor, double ch1_offset, "
+                                 f"double ch2_scale_factor, double ch2_offset);")
 
         c_code_path = os.path.abspath(os.path.dirname(__file__))
         sys.path.insert(0, c_code_path)
-        global find_trigger_position, create_timing_data, create_pretrigger_timing_data, \
-            create_voltage_data
+        # The module name contains a hash of the C sources, so a stale build is never imported after the sources changed
+        module_name = '_triggering_' + self._source_hash(c_code_path)
 
         # if the C code is compiled, import it. Otherwise, compile and import it.
         try:
-            from _triggering.lib import find_trigger_position, create_timing_data, create_pretrigger_timing_data, \
-                create_voltage_data
-            self.c_code_loaded = True
-        except ModuleNotFoundError:
+            module = importlib.import_module(module_name)
+        except ImportError:
             print("building C code")
-            self.ffibuilder.set_source("_triggering",  # name of the output C extension
+            self.ffibuilder.set_source(module_name,  # name of the output C extension
                                        """ #include "triggering.h" """,
-                                       sources=['triggering.c'],  # includes pi.c as additional sources
-                                       libraries=[], )  # on Unix, link with the math library
+                                       sources=['triggering.c'],  # relative to c_code_path
+                                       extra_compile_args=['-O3'] if os.name == 'posix' else [],
+                                       libraries=[], )
             self.ffibuilder.compile(c_code_path, verbose=False)
-            from _triggering.lib import find_trigger_position, create_timing_data, create_pretrigger_timing_data, \
-                create_voltage_data
-            self.c_code_loaded = True
+            module = importlib.import_module(module_name)
+        self.ffi = module.ffi
+        self.lib = module.lib
+        self.c_code_loaded = True
+
+    @staticmethod
+    def _source_hash(c_code_path):
+        source_hash = hashlib.sha1()
+        for file_name in ('triggering.h', 'triggering.c'):
+            with open(os.path.join(c_code_path, file_name), 'rb') as f:
+                source_hash.update(f.read())
+        return source_hash.hexdigest()[:10]
 
-    def _create_c_array(self, data_array, dtype=float):
-        if dtype == float:
-            if not isinstance(data_array, numpy.ndarray):
-                data_array = np.array(data_array)
-            data_array = data_array.astype(float, order='C')
-            c_array = self.ffibuilder.from_buffer('double *', data_array)
-            return c_array
+    def _check_loaded(self):
+        if not self.c_code_loaded:
+            raise ImportError('Could not load C code.')
+
+    @staticmethod
+    def _as_array(data_array):
+        """
+        Get a NumPy array for the given data without copying it, if possible.
+        Bytes-like objects (as returned by the USB transfers) are interpreted as uint8 data.
+        """
+        if isinstance(data_array, np.ndarray):
+            array = data_array
+        elif isinstance(data_array, (bytes, bytearray, memoryview)):
+            array = np.frombuffer(data_array, dtype=np.uint8)
+        else:
+            array = np.asarray(data_array)
+        if array.dtype not in C_Code._c_types:
+            array = array.astype(float)
+        if array.ndim != 1:
+            raise ValueError('Only one-dimensional arrays are supported.')
+        return array
+
+    def _as_adc_counts(self, raw_data):
+        """
+        Get the ADC counts of a channel as uint8 array without copying them, if possible. Integer counts of another
+        data type (e.g. a list) are converted if they are within the range of the ADC.
+        """
+        if isinstance(raw_data, (bytes, bytearray, memoryview)):
+            return self._as_array(raw_data)
+        array = np.asarray(raw_data)
+        if array.dtype != np.uint8:
+            if array.size and array.dtype.kind not in 'iu':
+                raise TypeError(f'The ADC counts must be integers (uint8), not {array.dtype}.')
+            if array.size and (array.min() < 0 or array.max() > 255):
+                raise ValueError('The ADC counts must be between 0 and 255.')
+            array = array.astype(np.uint8)
+        return self._as_array(array)
+
+    def _pointer(self, array):
+        """
+        Get a pointer to the first element of a one-dimensional NumPy array, its stride in elements and the suffix of the
+        kernels for its data type.
+        """
+        c_type, suffix = self._c_types[array.dtype]
+        stride, remainder = divmod(array.strides[0], array.itemsize)
+        if remainder:
+            raise ValueError('The array stride must be a multiple of the item size.')
+        pointer = self.ffi.cast(c_type + ' *', array.__array_interface__['data'][0])
+        return pointer, stride, suffix
 
-    def _create_np_array_from_c_array(self, c_array, length):
-        return np.frombuffer(self.ffibuilder.buffer(c_array, length * 8), dtype=float)
+    def _output_pointer(self, out):
+        if not isinstance(out, np.ndarray) or out.dtype not in (np.float32, np.float64) or out.ndim != 1:
+            raise TypeError('The output must be a one-dimensional float32 or float64 NumPy array.')
+        if not out.flags.writeable:
+            raise ValueError('The output array is read-only.')
+        return self._pointer(out)
 
     def find_trigger_position(self, data_array, threshold, trigger_kind='RISING'):
         """
         Get the array position at which a threshold value is exceeded.
 
         Args:
-            data_array (numpy.array or list): The array containing the measurement data.
+            data_array (numpy.array, bytes or list): The array containing the measurement data (uint8, float32 or
+                float64).
             threshold (float): The threshold value at which the trigger should fire.
             trigger_kind (str): The type of trigger (currently 'RISING' and 'FALLING' are supported).
 
@@ -74,14 +180,368 @@ class C_Code:
             The array position where the threshold is hit or crossed.
 
         """
-        if not self.c_code_loaded:
-            raise ImportError('Could not load C code.')
-        else:
-            c_array = self._create_c_array(data_array)
-            if trigger_kind == 'RISING':
-                return find_trigger_position(c_array, len(data_array), threshold, 1)
-            else:
-                return find_trigger_position(c_array, len(data_array), threshold, 0)
+        self._check_loaded()
+        array = self._as_array(data_array)
+        pointer, stride, suffix = self._pointer(array)
+        kernel = getattr(self.lib, 'find_trigger_position_' + suffix)
+        return kernel(pointer, len(array), stride, threshold, 1 if trigger_kind == 'RISING' else 0)
+
+    def find_crossings(self, data_array, level, half_band):
+        """
+        Get the positions where the ADC counts cross a level upwards and downwards. A crossing is only counted once
+        the signal has left the band of +-half_band around the level on the other side, so noise does not cause
+        additional crossings. The positions are interpolated linearly between two samples.
+
+        Args:
+            data_array (numpy.array or bytes): The ADC counts (uint8).
+            level (float): The level.
+            half_band (float): Half the width of the hysteresis band.
+
+        Returns:
+            tuple: The positions of the rising and of the falling crossings in samples (numpy.array).
+        """
+        self._check_loaded()
+        array = self._as_array(data_array)
+        if array.dtype != np.uint8:
+            raise ValueError('Only uint8 data is supported.')
+        pointer, stride, _ = self._pointer(array)
+        # each crossing needs at least one sample, the buffers are only touched as far as they are filled
+        positions = np.empty(len(array), dtype=np.float64)
+        rising = np.empty(len(array), dtype=np.uint8)
+        positions_pointer, _, _ = self._pointer(positions)
+        rising_pointer, _, _ = self._pointer(rising)
+        n_crossings = self.lib.find_crossings_u8(pointer, stride, len(array), level, half_band, positions_pointer,
+                                                 rising_pointer, len(array))
+        rising = rising[:n_crossings].view(bool)
+        positions = positions[:n_crossings]
+        return positions[rising], positions[~rising]
+
+    def accumulate_histogram(self, data_array, histogram):
+        """
+        Add ADC counts to a two-dimensional (time x ADC count) histogram. The samples are distributed evenly over the
+        time bins (the rows of the histogram).
+
+        Args:
+            data_array (numpy.array or bytes): The ADC counts (uint8).
+            histogram (numpy.array): A C-contiguous uint32 array of the shape (time_bins, 256). It is updated in place.
+        """
+        self._check_loaded()
+        array = self._as_array(data_array)
+        if array.dtype != np.uint8:
+            raise ValueError('Only uint8 data is supported.')
+        if histogram.dtype != np.uint32 or histogram.ndim != 2 or histogram.shape[1] != 256 \
+                or not histogram.flags.c_contiguous or not histogram.flags.writeable:
+            raise ValueError('The histogram must be a writable C-contiguous uint32 array of the shape '
+                             '(time_bins, 256).')
+        if len(array) < len(histogram):
+            raise ValueError('There must be at least one sample per time bin.')
+        pointer, stride, _ = self._pointer(array)
+        histogram_pointer = self.ffi.cast('uint32_t *', histogram.__array_interface__['data'][0])
+        self.lib.accumulate_histogram_u8(pointer, stride, len(array), histogram_pointer, len(histogram))
+
+    def _typed_pointer(self, array, c_type, dtype, writeable=False):
+        """
+        Get a pointer to a C-contiguous one-dimensional array of the given data type (used by the filter kernels).
+        """
+        if not isinstance(array, np.ndarray) or array.dtype != dtype or array.ndim != 1 \
+                or not array.flags.c_contiguous or (writeable and not array.flags.writeable):
+            raise ValueError(f'A {"writable " if writeable else ""}C-contiguous one-dimensional {np.dtype(dtype).name} '
+                             f'array is needed.')
+        # much faster than reading the address from "__array_interface__" (which matters for short arrays)
+        return self.ffi.from_buffer(c_type + '[]', array, require_writable=writeable)
+
+    def fir_filter(self, data_array, reversed_taps, step, out):
+        """
+        Calculate the outputs of a FIR filter: out[j] = sum_k reversed_taps[k] * data_array[j * step + k].
+
+        Args:
+            data_array (numpy.array): The input samples (float32) starting with the last len(reversed_taps) - 1 samples
+                of the previous block.
+            reversed_taps (numpy.array): The filter coefficients in reversed order (float32).
+            step (int): The distance between the input samples of two outputs (the decimation factor).
+            out (numpy.array): The float32 output array. Its length is the number of outputs.
+        """
+        self._check_loaded()
+        if len(out) and (len(out) - 1) * step + len(reversed_taps) > len(data_array):
+            raise ValueError('There are not enough input samples for the outputs.')
+        self.lib.fir_filter_f32(self._typed_pointer(data_array, 'float', np.float32), len(out), step,
+                                self._typed_pointer(reversed_taps, 'float', np.float32), len(reversed_taps),
+                                self._typed_pointer(out, 'float', np.float32, writeable=True))
+
+    def biquad_filter(self, data_array, coefficients, state):
+        """
+        Filter samples in place with a cascade of biquad sections (transposed direct form II).
+
+        Args:
+            data_array (numpy.array): The float32 samples.
+            coefficients (numpy.array): The coefficients b0, b1, b2, a1, a2 of each section (float64, shape
+                (n_sections, 5), C-contiguous).
+            state (numpy.array): The two state variables of each section (float64, shape (n_sections, 2)). They are
+                updated in place.
+        """
+        self._check_loaded()
+        if coefficients.shape[1:] != (5,) or state.shape != (len(coefficients), 2):
+            raise ValueError('The coefficients and the state do not fit.')
+        self.lib.biquad_filter_f32(self._typed_pointer(data_array, 'float', np.float32, writeable=True),
+                                   len(data_array), self._typed_pointer(coefficients.reshape(-1), 'double', np.float64),
+                                   len(coefficients),
+                                   self._typed_pointer(state.reshape(-1), 'double', np.float64, writeable=True))
+
+    def cic_decimate(self, data_array, order, ratio, state, out):
+        """
+        Decimate ADC counts with a CIC filter normalized to a DC gain of one.
+
+        Args:
+            data_array (numpy.array or bytes): The ADC counts (uint8).
+            order (int): The number of integrator and comb stages (1 to 8).
+            ratio (int): The decimation factor.
+            state (numpy.array): The integrators, the comb delays and the phase (uint64, 2 * order + 1 values). It is
+                updated in place.
+            out (numpy.array): The float32 output array (at least len(data_array) // ratio + 1 elements).
+
+        Returns:
+            int: The number of outputs written.
+        """
+        self._check_loaded()
+        array = self._as_array(data_array)
+        if array.dtype != np.uint8:
+            raise ValueError('Only uint8 data is supported.')
+        if not 1 <= order <= 8 or len(state) != 2 * order + 1 or len(out) < len(array) // ratio + 1:
+            raise ValueError('The order, the state or the output array do not fit.')
+        pointer, stride, _ = self._pointer(array)
+        return self.lib.cic_decimate_u8(pointer, stride, len(array), order, ratio,
+                                        self._typed_pointer(state, 'uint64_t', np.uint64, writeable=True),
+                                        float(ratio) ** -order, self._typed_pointer(out, 'float', np.float32,
+                                                                                    writeable=True))
+
+    def round_to_adc_counts(self, data_array, out):
+        """
+        Round values relative to the ADC count 128 (e.g. filtered ADC counts) to ADC counts, clipped to 0 ... 255.
+
+        Args:
+            data_array (numpy.array): The float32 values.
+            out (numpy.array): The uint8 output array (same length).
+        """
+        self._check_loaded()
+        if len(out) != len(data_array):
+            raise ValueError('The output array must have the same length as the input.')
+        self.lib.round_to_u8_f32(self._typed_pointer(data_array, 'float', np.float32), len(data_array),
+                                 self._typed_pointer(out, 'uint8_t', np.uint8, writeable=True))
+
+    def mask_test(self, data_array, limits):
+        """
+        Count the samples outside of a mask.
+
+        Args:
+            data_array (numpy.array or bytes): The ADC counts (uint8).
+            limits (numpy.array): The lowest (first row) and the highest (second row) allowed ADC count of each sample
+                (uint8, shape (2, len(data_array)), C-contiguous).
+
+        Returns:
+            tuple: The number of samples outside of the mask and the index of the first one (-1 if there is none).
+        """
+        self._check_loaded()
+        array = self._as_array(data_array)
+        if array.dtype != np.uint8:
+            raise ValueError('Only uint8 data is supported.')
+        if limits.shape != (2, len(array)):
+            raise ValueError('The mask must have a lower and an upper limit per sample.')
+        pointer, stride, _ = self._pointer(array)
+        first_violation = self.ffi.new('ptrdiff_t *')
+        n_violations = self.lib.mask_test_u8(pointer, stride, len(array),
+                                             self._typed_pointer(limits.reshape(-1), 'uint8_t', np.uint8),
+                                             first_violation)
+        return n_violations, first_violation[0]
+
+    def convert_to_voltage(self, raw_data, scale_factor, offset, out=None, dtype=float):
+        """
+        Convert the ADC counts of one channel into voltages.
+
+        Args:
+            raw_data (numpy.array, bytes or list): The uint8 ADC counts returned from the device (or integers between
+                0 and 255).
+            scale_factor (float): A calculated scale factor.
+            offset (float): A calculated offset.
+            out (numpy.array): (OPTIONAL) A preallocated float32 or float64 array the voltages are written to (at least
+                as long as the ADC counts).
+            dtype: (OPTIONAL) The data type of the output array, if no output array is given.
+
+        Returns:
+            numpy.array: The voltage data for the given raw data.
+        """
+        self._check_loaded()
+        array = self._as_adc_counts(raw_data)
+        if out is None:
+            out = np.empty(len(array), dtype=dtype)
+        elif len(out) < len(array):
+            raise ValueError('The output array is shorter than the ADC counts.')
+        pointer, stride, _ = self._pointer(array)
+        out_pointer, out_stride, suffix = self._output_pointer(out[:len(array)])
+        getattr(self.lib, 'convert_u8_to_' + suffix)(pointer, stride, out_pointer, out_stride, len(array),
+                                                     scale_factor, offset)
+        return out
+
+    def boxcar_convert_to_voltage(self, raw_data, factor, scale_factor, offset, out):
+        """
+        Average blocks of factor ADC counts (boxcar filter) and convert the means into voltages. This is used to
+        oversample a signal and reduce it to a lower sample rate with a higher resolution.
+
+        Args:
+            raw_data (numpy.array or bytes): The uint8 ADC counts (at least factor * len(out) samples).
+            factor (int): The number of samples averaged into one point.
+            scale_factor (float): A calculated scale factor.
+            offset (float): A calculated offset.
+            out (numpy.array): A preallocated float32 or float64 array the voltages are written to.
+
+        Returns:
+            numpy.array: The output array.
+        """
+        self._check_loaded()
+        array = self._as_array(raw_data)
+        if array.dtype != np.uint8:
+            raise ValueError('Only uint8 data is supported.')
+        if len(array) < factor * len(out):
+            raise ValueError('The ADC counts are too short for the output array.')
+        pointer, stride, _ = self._pointer(array)
+        out_pointer, out_stride, suffix = self._output_pointer(out)
+        getattr(self.lib, 'boxcar_convert_u8_to_' + suffix)(pointer, stride, out_pointer, out_stride, len(out), factor,
+                                                            scale_factor, offset)
+        return out
+
+    def convert_channels_to_voltage(self, ch1_raw_data, ch2_raw_data, out, scale_factors, offsets):
+        """
+        Convert the ADC counts of both channels into voltages with a single call.
+
+        Args:
+            ch1_raw_data (numpy.array or bytes): The uint8 ADC counts of the first channel.
+            ch2_raw_data (numpy.array or bytes): The uint8 ADC counts of the second channel.
+            out (numpy.array): A preallocated (2, n) float32 or float64 array (or two contiguous arrays) the voltages
+                are written to.
+            scale_factors (tuple): The scale factors of both channels.
+            offsets (tuple): The offsets of both channels.
+
+        Returns:
+            numpy.array: The output array.
+        """
+        self._check_loaded()
+        ch1_array = self._as_adc_counts(ch1_raw_data)
+        ch2_array = self._as_adc_counts(ch2_raw_data)
+        length = len(ch1_array)
+        if len(ch2_array) != length:
+            raise ValueError('The ADC counts of both channels must have the same length.')
+        if len(out) != 2 or len(out[0]) < length or len(out[1]) < length:
+            raise ValueError('The output must have two rows at least as long as the ADC counts.')
+        if out[0].dtype != out[1].dtype or not (out[0].flags.c_contiguous and out[1].flags.c_contiguous):
+            raise ValueError('The outputs must be contiguous arrays of the same data type.')
+        ch1_pointer, ch1_stride, _ = self._pointer(ch1_array)
+        ch2_pointer, ch2_stride, _ = self._pointer(ch2_array)
+        ch1_out, _, suffix = self._output_pointer(out[0])
+        ch2_out, _, _ = self._output_pointer(out[1])
+        getattr(self.lib, 'convert_channels_u8_to_' + suffix)(ch1_pointer, ch1_stride, ch2_pointer, ch2_stride,
+                                                              ch1_out, ch2_out, length,
+                                                              scale_factors[0], offsets[0],
+                                                              scale_factors[1], offsets[1])
+        return out
+
+    def minmax_decimate(self, min_data, max_data, n_bins, out_min=None, out_max=None):
+        """
+        Get the minimum and the maximum of each bin of the data (peak detection). Bin i covers the samples
+        [i * length / n_bins, (i + 1) * length / n_bins), so any number of bins can be used.
+
+        Args:
+            min_data (numpy.array): The data the minima are taken from (uint8, float32 or float64).
+            max_data (numpy.array): The data the maxima are taken from. For raw data, the same array as min_data.
+            n_bins (int): The number of bins (at most the length of the data).
+            out_min (numpy.array): (OPTIONAL) A preallocated array for the minima.
+            out_max (numpy.array): (OPTIONAL) A preallocated array for the maxima.
+
+        Returns:
+            tuple: The minima and the maxima (arrays of the data type of the input).
+        """
+        self._check_loaded()
+        min_array = self._as_array(min_data)
+        max_array = self._as_array(max_data)
+        if min_array.dtype != max_array.dtype or min_array.strides != max_array.strides \
+                or len(min_array) != len(max_array):
+            raise ValueError('The minima and the maxima must be arrays of the same data type, length and stride.')
+        if not 0 < n_bins <= len(min_array):
+            raise ValueError('The number of bins must be between 1 and the length of the data.')
+        if out_min is None:
+            out_min = np.empty(n_bins, dtype=min_array.dtype)
+        if out_max is None:
+            out_max = np.empty(n_bins, dtype=min_array.dtype)
+        for out in (out_min, out_max):
+            if out.dtype != min_array.dtype or not out.flags.c_contiguous or not out.flags.writeable \
+                    or len(out) < n_bins:
+                raise ValueError('The outputs must be contiguous arrays of the data type of the input.')
+        min_pointer, stride, suffix = self._pointer(min_array)
+        max_pointer, _, _ = self._pointer(max_array)
+        out_min_pointer, _, _ = self._pointer(out_min)
+        out_max_pointer, _, _ = self._pointer(out_max)
+        getattr(self.lib, 'minmax_decimate_' + suffix)(min_pointer, max_pointer, stride, len(min_array),
+                                                       out_min_pointer, out_max_pointer, n_bins)
+        return out_min, out_max
+
+    def reduce_level(self, min_data, max_data, mean_data, factor, out_min, out_max, out_mean):
+        """
+        Calculate entries of the next level of a min/max/mean pyramid (see "WaveformPyramid"): the minimum, the maximum
+        and the mean of each block of factor entries. All channels (rows) are processed with a single call.
+
+        Args:
+            min_data (numpy.array): The uint8 minima of the level (one row per channel). For raw ADC counts, the same
+                array as max_data.
+            max_data (numpy.array): The uint8 maxima of the level.
+            mean_data (numpy.array): The float32 means of the level, None for raw ADC counts.
+            factor (int): The number of entries combined into one entry.
+            out_min (numpy.array): A uint8 array for the minima (at least min_data.shape[1] // factor entries per row).
+            out_max (numpy.array): A uint8 array for the maxima.
+            out_mean (numpy.array): A float32 array for the means.
+        """
+        self._check_loaded()
+        inputs = (min_data, max_data) if mean_data is None else (min_data, max_data, mean_data)
+        outputs = (out_min, out_max, out_mean)
+        # the rows must be contiguous, and the arrays of the input and of the output must have the same row stride
+        for arrays in (inputs, outputs):
+            if any(array.ndim != 2 or array.shape[0] != min_data.shape[0] or array.strides[1] != array.itemsize
+                   or array.strides[0] // array.itemsize != arrays[0].strides[0] // arrays[0].itemsize
+                   for array in arrays):
+                raise ValueError('The levels must be two-dimensional arrays with contiguous rows and the same layout.')
+        if min_data.dtype != np.uint8 or max_data.dtype != np.uint8 or out_min.dtype != np.uint8 \
+                or out_max.dtype != np.uint8 or out_mean.dtype != np.float32 \
+                or (mean_data is not None and mean_data.dtype != np.float32):
+            raise ValueError('The minima and maxima must be uint8 arrays, the means float32 arrays.')
+        n_entries = min_data.shape[1] // factor
+        if any(array.shape[1] != min_data.shape[1] for array in inputs) \
+                or any(array.shape[1] < n_entries for array in outputs):
+            raise ValueError('The arrays do not have matching lengths.')
+        if not n_entries or not len(min_data):
+            return
+        min_pointer, _, _ = self._pointer(min_data[0])
+        max_pointer, _, _ = self._pointer(max_data[0])
+        mean_pointer = self.ffi.NULL if mean_data is None else self._pointer(mean_data[0])[0]
+        out_min_pointer, _, _ = self._pointer(out_min[0])
+        out_max_pointer, _, _ = self._pointer(out_max[0])
+        out_mean_pointer, _, _ = self._pointer(out_mean[0])
+        self.lib.reduce_level_u8(min_pointer, max_pointer, mean_pointer, min_data.strides[0] // min_data.itemsize,
+                                 len(min_data), n_entries * factor, factor, out_min_pointer, out_max_pointer,
+                                 out_mean_pointer, out_min.strides[0] // out_min.itemsize)
+
+    def fill_timing_data(self, out, sample_rate, first_index=0):
+        """
+        Write the time of each sample relative to the trigger point into a preallocated array.
+
+        Args:
+            out (numpy.array): A float32 or float64 array the timing data is written to.
+            sample_rate (float): The sample rate of the oscilloscope.
+            first_index (int): The sample index of the first point. Negative for pre-trigger samples.
+
+        Returns:
+            numpy.array: The output array.
+        """
+        self._check_loaded()
+        pointer, stride, suffix = self._output_pointer(out)
+        getattr(self.lib, 'fill_timing_data_' + suffix)(pointer, len(out), stride, first_index, sample_rate)
+        return out
 
     def create_voltage_data(self, raw_data, scale_factor, offset):
         """
@@ -95,13 +555,7 @@ class C_Code:
         Returns:
             numpy.array: The voltage data for the given raw data.
         """
-        if not self.c_code_loaded:
-            raise ImportError('Could not load C code.')
-        else:
-            c_array = self._create_c_array(raw_data)
-            create_voltage_data(c_array, len(raw_data), scale_factor, offset)
-            np_array = self._create_np_array_from_c_array(c_array, len(raw_data))
-            return np_array
+        return self.convert_to_voltage(raw_data, scale_factor, offset)
 
     def create_timing_data(self, num_points, sample_rate):
         """
@@ -114,14 +568,7 @@ class C_Code:
         Returns:
             numpy.array: The timing data.
         """
-        if not self.c_code_loaded:
-            raise ImportError('Could not load C code.')
-        else:
-            raw_data = np.zeros(num_points)
-            c_array = self._create_c_array(raw_data)
-            create_timing_data(c_array, len(raw_data), sample_rate)
-            np_array = self._create_np_array_from_c_array(c_array, len(raw_data))
-            return np_array
+        return self.fill_timing_data(np.empty(num_points), sample_rate)
 
     def create_pretrigger_timing_data(self, num_points, sample_rate):
         """
@@ -134,11 +581,4 @@ class C_Code:
         Returns:
             numpy.array: The timing data.
         """
-        if not self.c_code_loaded:
-            raise ImportError('Could not load C code.')
-        else:
-            raw_data = np.zeros(num_points)
-            c_array = self._create_c_array(raw_data)
-            create_pretrigger_timing_data(c_array, len(raw_data), sample_rate)
-            np_array = self._create_np_array_from_c_array(c_array, len(raw_data))
-            return np_array
\ No newline at end of file
+        return self.fill_timing_data(np.empty(num_points), sample_rate, -num_points)
@@ -2,56 +2,506 @@
 
 /**
  * @brief Find the first value equal or above/below a specified threshold
- * @param data_array
- * @param length
- * @param threshold
- * @param rising_edge
- * @param number_of_values_before_and_after_threshold
- * @return
+ * @param data_array Pointer to the first sample.
+ * @param length Number of samples to search.
+ * @param stride Distance between two samples in elements.
+ * @param threshold The trigger level (in the unit of the data).
+ * @param rising_edge 1 for a rising edge, 0 for a falling edge.
+ * @return The position of the sample that hits or crosses the threshold, -1 if there is none.
  */
-int find_trigger_position(double *data_array, int length, double threshold, int rising_edge){
-    if(length < 1){
-        return -1;
-    }
-    for(int i=1; i<length; i++){
-        if(rising_edge){
-            if(data_array[i-1] < threshold && data_array[i] >= threshold){
-                return i;
+#define DEFINE_FIND_TRIGGER_POSITION(SUFFIX, TYPE)                                                          \
+ptrdiff_t find_trigger_position_##SUFFIX(const TYPE *data_array, ptrdiff_t length, ptrdiff_t stride,       \
+                                         double threshold, int rising_edge){                               \
+    if(length < 1){                                                                                        \
+        return -1;                                                                                         \
+    }                                                                                                      \
+    if(rising_edge){                                                                                       \
+        for(ptrdiff_t i=1; i<length; i++){                                                                 \
+            if(data_array[(i-1)*stride] < threshold && data_array[i*stride] >= threshold){                 \
+                return i;                                                                                  \
+            }                                                                                              \
+        }                                                                                                  \
+    }                                                                                                      \
+    else{                                                                                                  \
+        for(ptrdiff_t i=1; i<length; i++){                                                                 \
+            if(data_array[(i-1)*stride] > threshold && data_array[i*stride] <= threshold){                 \
+                return i;                                                                                  \
+            }                                                                                              \
+        }                                                                                                  \
+    }                                                                                                      \
+    return -1;                                                                                             \
+}
+
+DEFINE_FIND_TRIGGER_POSITION(u8, uint8_t)
+DEFINE_FIND_TRIGGER_POSITION(f32, float)
+DEFINE_FIND_TRIGGER_POSITION(f64, double)
+
+
+/**
+ * @brief Fill a buffer with the time of each sample relative to the trigger point
+ * @param out The output buffer.
+ * @param length Number of points to write.
+ * @param stride Distance between two points in elements.
+ * @param first_index Sample index of the first point (negative for pre-trigger samples).
+ * @param sample_rate The sample rate in Hz.
+ */
+#define DEFINE_FILL_TIMING_DATA(SUFFIX, TYPE)                                                               \
+void fill_timing_data_##SUFFIX(TYPE *out, ptrdiff_t length, ptrdiff_t stride, ptrdiff_t first_index,       \
+                               double sample_rate){                                                        \
+    for(ptrdiff_t i=0; i<length; i++){                                                                     \
+        out[i*stride] = (TYPE) ((double) (first_index + i) / sample_rate);                                 \
+    }                                                                                                      \
+}
+
+DEFINE_FILL_TIMING_DATA(f32, float)
+DEFINE_FILL_TIMING_DATA(f64, double)
+
+
+/**
+ * @brief Convert ADC counts into voltages: (data - 128 - offset) * scale_factor
+ */
+#define DEFINE_CONVERT(SUFFIX, TYPE)                                                                        \
+void convert_u8_to_##SUFFIX(const uint8_t *data_array, ptrdiff_t stride, TYPE *out, ptrdiff_t out_stride,  \
+                            ptrdiff_t length, double scale_factor, double offset){                         \
+    const TYPE scale = (TYPE) scale_factor;                                                                \
+    const TYPE zero = (TYPE) (128 + offset);                                                               \
+    if(stride == 1 && out_stride == 1){                                                                    \
+        for(ptrdiff_t i=0; i<length; i++){                                                                 \
+            out[i] = ((TYPE) data_array[i] - zero) * scale;                                                \
+        }                                                                                                  \
+    }                                                                                                      \
+    else{                                                                                                  \
+        for(ptrdiff_t i=0; i<length; i++){                                                                 \
+            out[i*out_stride] = ((TYPE) data_array[i*stride] - zero) * scale;                              \
+        }                                                                                                  \
+    }                                                                                                      \
+}                                                                                                          \
+                                                                                                           \
+void convert_channels_u8_to_##SUFFIX(const uint8_t *ch1_data, ptrdiff_t ch1_stride,                        \
+                                     const uint8_t *ch2_data, ptrdiff_t ch2_stride,                        \
+                                     TYPE *ch1_out, TYPE *ch2_out, ptrdiff_t length,                       \
+                                     double ch1_scale_factor, double ch1_offset,                           \
+                                     double ch2_scale_factor, double ch2_offset){                          \
+    const TYPE scale1 = (TYPE) ch1_scale_factor;                                                           \
+    const TYPE zero1 = (TYPE) (128 + ch1_offset);                                                          \
+    const TYPE scale2 = (TYPE) ch2_scale_factor;                                                           \
+    const TYPE zero2 = (TYPE) (128 + ch2_offset);                                                          \
+    for(ptrdiff_t i=0; i<length; i++){                                                                     \
+        ch1_out[i] = ((TYPE) ch1_data[i*ch1_stride] - zero1) * scale1;                                     \
+        ch2_out[i] = ((TYPE) ch2_data[i*ch2_stride] - zero2) * scale2;                                     \
+    }                                                                                                      \
+}
+
+DEFINE_CONVERT(f32, float)
+DEFINE_CONVERT(f64, double)
+
+
+/**
+ * @brief Average blocks of factor ADC counts (boxcar filter) and convert the means into voltages (high resolution mode)
+ * @param data_array Pointer to the ADC counts (length * factor samples).
+ * @param stride Distance between two samples in elements.
+ * @param out The output buffer for the voltages.
+ * @param out_stride Distance between two output points in elements.
+ * @param length Number of output points.
+ * @param factor Number of samples averaged into one output point.
+ * @param scale_factor The scale factor: voltage = (mean - 128 - offset) * scale_factor
+ * @param offset The offset in ADC counts.
+ */
+#define DEFINE_BOXCAR_CONVERT(SUFFIX, TYPE)                                                                 \
+void boxcar_convert_u8_to_##SUFFIX(const uint8_t *data_array, ptrdiff_t stride, TYPE *out,                 \
+                                   ptrdiff_t out_stride, ptrdiff_t length, ptrdiff_t factor,               \
+                                   double scale_factor, double offset){                                    \
+    const double scale = scale_factor / (double) factor;                                                   \
+    const double zero = (128 + offset) * (double) factor;                                                  \
+    for(ptrdiff_t i=0; i<length; i++){                                                                     \
+        const uint8_t *block = data_array + i * factor * stride;                                           \
+        uint32_t sum = 0;                                                                                  \
+        if(stride == 1){                                                                                   \
+            for(ptrdiff_t j=0; j<factor; j++){                                                             \
+                sum += block[j];                                                                           \
+            }                                                                                              \
+        }                                                                                                  \
+        else{                                                                                              \
+            for(ptrdiff_t j=0; j<factor; j++){                                                             \
+                sum += block[j*stride];                                                                    \
+            }                                                                                              \
+        }                                                                                                  \
+        out[i*out_stride] = (TYPE) (((double) sum - zero) * scale);                                        \
+    }                                                                                                      \
+}
+
+DEFINE_BOXCAR_CONVERT(f32, float)
+DEFINE_BOXCAR_CONVERT(f64, double)
+
+
+/**
+ * @brief Get the minimum and the maximum of each bin of a data array (peak detection)
+ * @param min_data Pointer to the first sample of the minima (for raw data the same pointer as max_data).
+ * @param max_data Pointer to the first sample of the maxima.
+ * @param stride Distance between two samples in elements.
+ * @param length Number of samples.
+ * @param out_min The output buffer for the minimum of each bin.
+ * @param out_max The output buffer for the maximum of each bin.
+ * @param n_bins Number of bins (at most length).
+ *               Bin i covers the samples [i * length / n_bins, (i+1) * length / n_bins).
+ */
+#define DEFINE_MINMAX_DECIMATE(SUFFIX, TYPE)                                                                \
+void minmax_decimate_##SUFFIX(const TYPE *min_data, const TYPE *max_data, ptrdiff_t stride,                \
+                              ptrdiff_t length, TYPE *out_min, TYPE *out_max, ptrdiff_t n_bins){           \
+    ptrdiff_t start = 0;                                                                                   \
+    for(ptrdiff_t i=0; i<n_bins; i++){                                                                     \
+        const ptrdiff_t stop = (ptrdiff_t) (((int64_t) (i + 1) * length) / n_bins);                        \
+        TYPE minimum = min_data[start*stride];                                                             \
+        TYPE maximum = max_data[start*stride];                                                             \
+        for(ptrdiff_t j=start+1; j<stop; j++){                                                             \
+            const TYPE low = min_data[j*stride];                                                           \
+            const TYPE high = max_data[j*stride];                                                          \
+            minimum = low < minimum ? low : minimum;                                                       \
+            maximum = high > maximum ? high : maximum;                                                     \
+        }                                                                                                  \
+        out_min[i] = minimum;                                                                              \
+        out_max[i] = maximum;                                                                              \
+        start = stop;                                                                                      \
+    }                                                                                                      \
+}
+
+DEFINE_MINMAX_DECIMATE(u8, uint8_t)
+DEFINE_MINMAX_DECIMATE(f32, float)
+DEFINE_MINMAX_DECIMATE(f64, double)
+
+
+/**
+ * @brief Calculate the entries of the next level of a min/max/mean pyramid from blocks of factor entries
+ * @param min_data Pointer to the minima of the level (for raw data the same pointer as max_data).
+ * @param max_data Pointer to the maxima of the level.
+ * @param mean_data Pointer to the means of the level (NULL for raw data, the mean is then taken of min_data).
+ * @param row_stride Distance between the rows (channels) of the level in elements.
+ * @param n_rows Number of rows.
+ * @param length Number of entries of each row of the level (a multiple of factor).
+ * @param factor Number of entries combined into one entry of the next level.
+ * @param out_min The output buffer for the minima of the next level (length / factor entries per row).
+ * @param out_max The output buffer for the maxima of the next level.
+ * @param out_mean The output buffer for the means of the next level.
+ * @param out_row_stride Distance between the rows of the output buffers in elements.
+ */
+void reduce_level_u8(const uint8_t *min_data, const uint8_t *max_data, const float *mean_data, ptrdiff_t row_stride,
+                     ptrdiff_t n_rows, ptrdiff_t length, ptrdiff_t factor, uint8_t *out_min, uint8_t *out_max,
+                     float *out_mean, ptrdiff_t out_row_stride){
+    const ptrdiff_t n_entries = length / factor;
+    const float scale = 1.0f / (float) factor;
+    for(ptrdiff_t row=0; row<n_rows; row++){
+        const uint8_t *row_min = min_data + row * row_stride;
+        const uint8_t *row_max = max_data + row * row_stride;
+        uint8_t *row_out_min = out_min + row * out_row_stride;
+        uint8_t *row_out_max = out_max + row * out_row_stride;
+        float *row_out_mean = out_mean + row * out_row_stride;
+        if(factor == 4 && !mean_data){
+            // the default factor of the raw data (most of the work), unrolled so it can be vectorized
+            for(ptrdiff_t i=0; i<n_entries; i++){
+                const uint8_t *block = row_min + 4 * i;
+                const uint8_t minimum_01 = block[0] < block[1] ? block[0] : block[1];
+                const uint8_t minimum_23 = block[2] < block[3] ? block[2] : block[3];
+                const uint8_t maximum_01 = block[0] > block[1] ? block[0] : block[1];
+                const uint8_t maximum_23 = block[2] > block[3] ? block[2] : block[3];
+                row_out_min[i] = minimum_01 < minimum_23 ? minimum_01 : minimum_23;
+                row_out_max[i] = maximum_01 > maximum_23 ? maximum_01 : maximum_23;
+                row_out_mean[i] = (float) (block[0] + block[1] + block[2] + block[3]) * 0.25f;
+            }
+            continue;
+        }
+        for(ptrdiff_t i=0; i<n_entries; i++){
+            const uint8_t *minima = row_min + i * factor;
+            const uint8_t *maxima = row_max + i * factor;
+            uint8_t minimum = minima[0];
+            uint8_t maximum = maxima[0];
+            for(ptrdiff_t j=1; j<factor; j++){
+                minimum = minima[j] < minimum ? minima[j] : minimum;
+                maximum = maxima[j] > maximum ? maxima[j] : maximum;
+            }
+            row_out_min[i] = minimum;
+            row_out_max[i] = maximum;
+        }
+        if(mean_data){
+            const float *row_mean = mean_data + row * row_stride;
+            for(ptrdiff_t i=0; i<n_entries; i++){
+                float sum = 0;
+                for(ptrdiff_t j=i*factor; j<(i+1)*factor; j++){
+                    sum += row_mean[j];
+                }
+                row_out_mean[i] = sum * scale;
             }
         }
         else{
-            if(data_array[i-1] > threshold && data_array[i] <= threshold){
-                return i;
+            for(ptrdiff_t i=0; i<n_entries; i++){
+                uint32_t sum = 0;
+                for(ptrdiff_t j=i*factor; j<(i+1)*factor; j++){
+                    sum += row_min[j];
+                }
+                row_out_mean[i] = (float) sum * scale;
             }
         }
+    }
+}
+
+
+/**
+ * @brief Find the positions where a signal crosses a level, with hysteresis
+ * A crossing is only counted once the signal has left the band of +-half_band around the level on the other side.
+ * Its position is interpolated linearly between the samples around the last crossing of the level itself.
+ * @param data_array Pointer to the ADC counts.
+ * @param stride Distance between two samples in elements.
+ * @param length Number of samples.
+ * @param level The level.
+ * @param half_band Half the width of the hysteresis band.
+ * @param out_positions The output buffer for the (fractional) sample positions of the crossings.
+ * @param out_rising The output buffer for the direction of each crossing (1: rising, 0: falling).
+ * @param max_crossings The size of the output buffers.
+ * @return The number of crossings found.
+ */
+ptrdiff_t find_crossings_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, double level,
+                            double half_band, double *out_positions, uint8_t *out_rising, ptrdiff_t max_crossings){
+    // the side of the level and of the band of each ADC count
+    uint8_t above_level[256];
+    int8_t band_state[256];
+    for(int value=0; value<256; value++){
+        above_level[value] = value > level;
+        band_state[value] = value > level + half_band ? 1 : (value < level - half_band ? -1 : 0);
+    }
+    ptrdiff_t n_crossings = 0;
+    ptrdiff_t last_change = -1;
+    int8_t state = length > 0 ? band_state[data_array[0]] : 0;
+    uint8_t above = length > 0 ? above_level[data_array[0]] : 0;
+    for(ptrdiff_t i=1; i<length && n_crossings<max_crossings; i++){
+        const uint8_t value = data_array[i*stride];
+        const uint8_t now_above = above_level[value];
+        last_change = now_above != above ? i - 1 : last_change;
+        above = now_above;
+        const int8_t new_state = band_state[value];
+        if(new_state == 0 || new_state == state){
+            continue;
+        }
+        if(state != 0){
+            const double before = data_array[last_change*stride];
+            const double after = data_array[(last_change+1)*stride];
+            out_positions[n_crossings] = (double) last_change + (level - before) / (after - before);
+            out_rising[n_crossings] = new_state > 0;
+            n_crossings++;
+        }
+        state = new_state;
+    }
+    return n_crossings;
+}
+
+
+/**
+ * @brief Add the ADC counts of a record to a two-dimensional (time x ADC count) histogram (persistence display)
+ * @param data_array Pointer to the ADC counts.
+ * @param stride Distance between two samples in elements.
+ * @param length Number of samples.
+ * @param histogram The histogram with 256 counters per time bin (time_bins * 256 counters, one row per time bin).
+ * @param time_bins Number of time bins. Sample i is counted in time bin i * time_bins / length.
+ */
+void accumulate_histogram_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, uint32_t *histogram,
+                             ptrdiff_t time_bins){
+    if(time_bins == length){
+        for(ptrdiff_t i=0; i<length; i++){
+            histogram[i * 256 + data_array[i*stride]]++;
+        }
+        return;
+    }
+    // time_bin = i * time_bins / length, calculated incrementally without a division per sample
+    uint32_t *row = histogram;
+    ptrdiff_t remainder = 0;
+    for(ptrdiff_t i=0; i<length; i++){
+        row[data_array[i*stride]]++;
+        remainder += time_bins;
+        if(remainder >= length){
+            remainder -= length;
+            row += 256;
+        }
+    }
+}
 
 
+/**
+ * @brief Calculate the outputs of a FIR filter
+ * @param data_array Pointer to the input samples. The first n_taps - 1 samples are the end of the previous block.
+ * @param n_outputs Number of outputs.
+ * @param step Distance between the input samples of two outputs (the decimation factor).
+ * @param taps The filter coefficients in reversed order (taps[n_taps - 1] is applied to the newest sample).
+ * @param n_taps Number of filter coefficients.
+ * @param out The output array.
+ */
+void fir_filter_f32(const float *data_array, ptrdiff_t n_outputs, ptrdiff_t step, const float *taps, ptrdiff_t n_taps,
+                    float *out){
+    if(step == 1){
+        // loop over the taps outside, so the inner loop over the outputs can be vectorized. The outputs are
+        // calculated in chunks that stay in the cache.
+        const ptrdiff_t chunk_size = 4096;
+        for(ptrdiff_t start=0; start<n_outputs; start+=chunk_size){
+            const ptrdiff_t stop = start + chunk_size < n_outputs ? start + chunk_size : n_outputs;
+            for(ptrdiff_t j=start; j<stop; j++){
+                out[j] = 0;
+            }
+            for(ptrdiff_t k=0; k<n_taps; k++){
+                const float tap = taps[k];
+                const float *x = data_array + k;
+                for(ptrdiff_t j=start; j<stop; j++){
+                    out[j] += tap * x[j];
+                }
+            }
+        }
+        return;
+    }
+    // only every step-th output is calculated (decimation)
+    for(ptrdiff_t j=0; j<n_outputs; j++){
+        const float *x = data_array + j * step;
+        float sums[4] = {0, 0, 0, 0};
+        ptrdiff_t k = 0;
+        for(; k+4<=n_taps; k+=4){
+            sums[0] += taps[k] * x[k];
+            sums[1] += taps[k+1] * x[k+1];
+            sums[2] += taps[k+2] * x[k+2];
+            sums[3] += taps[k+3] * x[k+3];
+        }
+        for(; k<n_taps; k++){
+            sums[0] += taps[k] * x[k];
+        }
+        out[j] = (sums[0] + sums[1]) + (sums[2] + sums[3]);
     }
-    return -1;
 }
 
 
-double* create_timing_data(double *data_array, int number_of_points, int sample_rate){
-    for(int i=0; i<number_of_points; i++){
-        data_array[i] = (float) i/sample_rate;
+/**
+ * @brief Filter samples in place with a cascade of biquad sections (transposed direct form II)
+ * @param data_array Pointer to the samples.
+ * @param length Number of samples.
+ * @param coefficients The coefficients b0, b1, b2, a1, a2 of each section (a0 = 1).
+ * @param n_sections Number of sections.
+ * @param state The two state variables of each section. They are updated, so the next block continues the filtering.
+ */
+void biquad_filter_f32(float *data_array, ptrdiff_t length, const double *coefficients, ptrdiff_t n_sections,
+                       double *state){
+    for(ptrdiff_t s=0; s<n_sections; s++){
+        const double b0 = coefficients[5*s], b1 = coefficients[5*s+1], b2 = coefficients[5*s+2];
+        const double a1 = coefficients[5*s+3], a2 = coefficients[5*s+4];
+        double z1 = state[2*s], z2 = state[2*s+1];
+        for(ptrdiff_t i=0; i<length; i++){
+            const double x = data_array[i];
+            const double y = b0 * x + z1;
+            z1 = b1 * x - a1 * y + z2;
+            z2 = b2 * x - a2 * y;
+            data_array[i] = (float) y;
+        }
+        state[2*s] = z1;
+        state[2*s+1] = z2;
     }
-    return data_array;
 }
 
-double* create_pretrigger_timing_data(double *data_array, int number_of_points, int sample_rate){
-    int i=0;
-    for(int j=-number_of_points; j<0; j++){
-        data_array[i] = (float) j/sample_rate;
-        i++;
+
+/**
+ * @brief Decimate ADC counts with a CIC filter (a cascade of integrators and combs)
+ * @param data_array Pointer to the ADC counts.
+ * @param stride Distance between two samples in elements.
+ * @param length Number of samples.
+ * @param order Number of integrator and comb stages (1 to CIC_MAX_ORDER).
+ * @param ratio The decimation factor.
+ * @param state The integrators, the comb delays and the number of samples since the last output (2 * order + 1
+ *        values). The integers wrap around (modular arithmetic), which the combs cancel again.
+ * @param gain The factor applied to the outputs (1 / ratio^order for a DC gain of one).
+ * @param out The output array (at least length / ratio + 1 elements).
+ * @return The number of outputs.
+ */
+ptrdiff_t cic_decimate_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, ptrdiff_t order,
+                          ptrdiff_t ratio, uint64_t *state, double gain, float *out){
+    uint64_t integrators[CIC_MAX_ORDER], delays[CIC_MAX_ORDER];
+    for(ptrdiff_t k=0; k<order; k++){
+        integrators[k] = state[k];
+        delays[k] = state[order + k];
     }
-    return data_array;
+    uint64_t phase = state[2 * order];
+    ptrdiff_t n_outputs = 0;
+    for(ptrdiff_t i=0; i<length; i++){
+        integrators[0] += (uint64_t) ((int64_t) data_array[i*stride] - 128);
+        for(ptrdiff_t k=1; k<order; k++){
+            integrators[k] += integrators[k-1];
+        }
+        if(++phase == (uint64_t) ratio){
+            phase = 0;
+            uint64_t value = integrators[order-1];
+            for(ptrdiff_t k=0; k<order; k++){
+                const uint64_t previous = delays[k];
+                delays[k] = value;
+                value -= previous;
+            }
+            out[n_outputs++] = (float) ((double) (int64_t) value * gain + 128);
+        }
+    }
+    for(ptrdiff_t k=0; k<order; k++){
+        state[k] = integrators[k];
+        state[order + k] = delays[k];
+    }
+    state[2 * order] = phase;
+    return n_outputs;
 }
 
 
-double* create_voltage_data(double *data_array, int length, double scale_factor, double offset){
-    for(int i=0; i<length; i++){
-        data_array[i] = (data_array[i]-128-offset)*scale_factor;
+/**
+ * @brief Round filtered values (relative to the ADC count 128) to ADC counts
+ * @param data_array Pointer to the values.
+ * @param length Number of values.
+ * @param out The ADC counts (clipped to 0 ... 255).
+ */
+void round_to_u8_f32(const float *data_array, ptrdiff_t length, uint8_t *out){
+    for(ptrdiff_t i=0; i<length; i++){
+        float value = data_array[i] + 128.5f;
+        value = value < 0 ? 0 : value;
+        value = value > 255 ? 255 : value;
+        out[i] = (uint8_t) value;
     }
-    return data_array;
 }
 
+
+/**
+ * @brief Count the samples outside of a mask (the lowest and the highest allowed ADC count of each sample)
+ * @param data_array Pointer to the ADC counts.
+ * @param stride Distance between two samples in elements.
+ * @param length Number of samples.
+ * @param limits The lowest allowed ADC count of each sample followed by the highest allowed ADC count of each sample.
+ * @param first_violation The index of the first sample outside of the mask is written here (-1 if there is none).
+ * @return The number of samples outside of the mask.
+ */
+ptrdiff_t mask_test_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, const uint8_t *limits,
+                       ptrdiff_t *first_violation){
+    const uint8_t *lower = limits;
+    const uint8_t *upper = limits + length;
+    // count without branches in chunks, so the loop is vectorized. Only a chunk with violations is searched again.
+    const ptrdiff_t chunk_size = 4096;
+    ptrdiff_t n_violations = 0;
+    *first_violation = -1;
+    for(ptrdiff_t start=0; start<length; start+=chunk_size){
+        const ptrdiff_t stop = start + chunk_size < length ? start + chunk_size : length;
+        uint32_t chunk_violations = 0;
+        if(stride == 1){
+            for(ptrdiff_t i=start; i<stop; i++){
+                chunk_violations += (uint32_t)(data_array[i] < lower[i]) | (uint32_t)(data_array[i] > upper[i]);
+            }
+        }
+        else{
+            for(ptrdiff_t i=start; i<stop; i++){
+                chunk_violations += (uint32_t)(data_array[i*stride] < lower[i]) |
+                                    (uint32_t)(data_array[i*stride] > upper[i]);
+            }
+        }
+        if(chunk_violations && *first_violation < 0){
+            for(ptrdiff_t i=start; i<stop; i++){
+                if(data_array[i*stride] < lower[i] || data_array[i*stride] > upper[i]){
+                    *first_violation = i;
+                    break;
+                }
+            }
+        }
+        n_violations += chunk_violations;
+    }
+    return n_violations;
+}
@@ -1,15 +1,76 @@
 #ifndef TRIGGERING_H
 #define TRIGGERING_H
 
-#include <stdio.h>
-#include <stdlib.h>
+#include <stddef.h>
+#include <stdint.h>
 
-#define BLOCKSIZE = 10;
+/*
+ * All kernels work on caller-provided buffers. Strides are given in elements (not bytes), so strided views of
+ * NumPy arrays (e.g. one channel of an interleaved USB buffer) can be processed without copying them first.
+ */
 
-int find_trigger_position(double *data_array, int length, double threshold, int rising_edge);
+ptrdiff_t find_trigger_position_u8(const uint8_t *data_array, ptrdiff_t length, ptrdiff_t stride,
+                                   double threshold, int rising_edge);
+ptrdiff_t find_trigger_position_f32(const float *data_array, ptrdiff_t length, ptrdiff_t stride,
+                                    double threshold, int rising_edge);
+ptrdiff_t find_trigger_position_f64(const double *data_array, ptrdiff_t length, ptrdiff_t stride,
+                                    double threshold, int rising_edge);
 
-double* create_timing_data(double *data_array, int number_of_points, int sample_rate);
-double* create_pretrigger_timing_data(double *data_array, int number_of_points, int sample_rate);
-double* create_voltage_data(double *data_array, int length, double scale_factor, double offset);
+void fill_timing_data_f32(float *out, ptrdiff_t length, ptrdiff_t stride, ptrdiff_t first_index, double sample_rate);
+void fill_timing_data_f64(double *out, ptrdiff_t length, ptrdiff_t stride, ptrdiff_t first_index, double sample_rate);
+
+void convert_u8_to_f32(const uint8_t *data_array, ptrdiff_t stride, float *out, ptrdiff_t out_stride,
+                       ptrdiff_t length, double scale_factor, double offset);
+void convert_u8_to_f64(const uint8_t *data_array, ptrdiff_t stride, double *out, ptrdiff_t out_stride,
+                       ptrdiff_t length, double scale_factor, double offset);
+
+void boxcar_convert_u8_to_f32(const uint8_t *data_array, ptrdiff_t stride, float *out, ptrdiff_t out_stride,
+                              ptrdiff_t length, ptrdiff_t factor, double scale_factor, double offset);
+void boxcar_convert_u8_to_f64(const uint8_t *data_array, ptrdiff_t stride, double *out, ptrdiff_t out_stride,
+                              ptrdiff_t length, ptrdiff_t factor, double scale_factor, double offset);
+
+void convert_channels_u8_to_f32(const uint8_t *ch1_data, ptrdiff_t ch1_stride,
+                                const uint8_t *ch2_data, ptrdiff_t ch2_stride,
+                                float *ch1_out, float *ch2_out, ptrdiff_t length,
+                                double ch1_scale_factor, double ch1_offset,
+                                double ch2_scale_factor, double ch2_offset);
+void convert_channels_u8_to_f64(const uint8_t *ch1_data, ptrdiff_t ch1_stride,
+                                const uint8_t *ch2_data, ptrdiff_t ch2_stride,
+                                double *ch1_out, double *ch2_out, ptrdiff_t length,
+                                double ch1_scale_factor, double ch1_offset,
+                                double ch2_scale_factor, double ch2_offset);
+
+void minmax_decimate_u8(const uint8_t *min_data, const uint8_t *max_data, ptrdiff_t stride, ptrdiff_t length,
+                        uint8_t *out_min, uint8_t *out_max, ptrdiff_t n_bins);
+void minmax_decimate_f32(const float *min_data, const float *max_data, ptrdiff_t stride, ptrdiff_t length,
+                         float *out_min, float *out_max, ptrdiff_t n_bins);
+void minmax_decimate_f64(const double *min_data, const double *max_data, ptrdiff_t stride, ptrdiff_t length,
+                         double *out_min, double *out_max, ptrdiff_t n_bins);
+
+void reduce_level_u8(const uint8_t *min_data, const uint8_t *max_data, const float *mean_data, ptrdiff_t row_stride,
+                     ptrdiff_t n_rows, ptrdiff_t length, ptrdiff_t factor, uint8_t *out_min, uint8_t *out_max,
+                     float *out_mean, ptrdiff_t out_row_stride);
+
+ptrdiff_t find_crossings_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, double level,
+                            double half_band, double *out_positions, uint8_t *out_rising, ptrdiff_t max_crossings);
+
+void accumulate_histogram_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, uint32_t *histogram,
+                             ptrdiff_t time_bins);
+
+void fir_filter_f32(const float *data_array, ptrdiff_t n_outputs, ptrdiff_t step, const float *taps, ptrdiff_t n_taps,
+                    float *out);
+
+void biquad_filter_f32(float *data_array, ptrdiff_t length, const double *coefficients, ptrdiff_t n_sections,
+                       double *state);
+
+#define CIC_MAX_ORDER 8
+
+ptrdiff_t cic_decimate_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, ptrdiff_t order,
+                          ptrdiff_t ratio, uint64_t *state, double gain, float *out);
+
+void round_to_u8_f32(const float *data_array, ptrdiff_t length, uint8_t *out);
+
+ptrdiff_t mask_test_u8(const uint8_t *data_array, ptrdiff_t stride, ptrdiff_t length, const uint8_t *limits,
+                       ptrdiff_t *first_violation);
 
 #endif // TRIGGERING_H
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+
+import numpy as np
+import usb1
+
+
+# The calibration values of a device are cached in a file named after its serial number, so the EEPROM only needs to
+# be read once. The cache file is silently ignored if it cannot be read or written.
+CACHE_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                               'hantekosc', 'calibration')
+
+# EEPROM layout (relative to CALIBRATION_EEPROM_OFFSET): the factory offsets of both channels are stored as pairs
+# (CH1, CH2) at these positions for the voltage range indices 1, 2, 5 and 10. The extended gain and offset corrections
+# written by the "calibration.py" program of the Hantek6022API follow at the same positions behind 32 and 48 bytes.
+_EEPROM_POSITIONS = np.array([[14, 8, 6, 0], [15, 9, 7, 1]])
+_EEPROM_GAIN_OFFSET = 32
+_EEPROM_OFFSET_OFFSET = 48
+
+# parsed calibration values by serial number (read once per process)
+_calibrations = {}
+_calibrations_lock = threading.Lock()
+
+
+def voltage_to_adc(voltages, scale_factor, offset):
+    """
+    Convert voltages into ADC counts with the conversion values of a channel (see "Calibration.conversion_values").
+    It is the inverse of the conversion of the records: (counts - 128 - offset) * scale_factor. The counts are not
+    rounded or clipped.
+
+    Args:
+        voltages (float or numpy.array): The voltages.
+        scale_factor (float): The scale factor of the channel.
+        offset (float): The offset of the channel.
+
+    Returns:
+        float or numpy.array: The ADC counts.
+    """
+    return np.divide(voltages, scale_factor) + 128 + offset
+
+
+class Calibration:
+    """
+    The gain and offset corrections of both channels of a device for each voltage range.
+
+    The values are stored as arrays with one row per channel and one column per voltage range index (see
+    "VOLTAGE_INDICES"). ADC counts are converted into volts by: (adc_count - 128 - offset) * scale_factor.
+
+    Attributes:
+        gains (numpy.array): The gain correction of each channel and voltage range.
+        offsets (numpy.array): The offset of each channel and voltage range in ADC counts.
+        scale_factors (numpy.array): The factors converting ADC counts into volts (including the gain correction).
+        serial_number (str): The serial number of the device (None if unknown).
+    """
+    VOLTAGE_INDICES = (1, 2, 5, 10)
+
+    def __init__(self, gains, offsets, serial_number=None):
+        """
+        Class constructor.
+
+        Args:
+            gains (numpy.array): The gain correction of each channel (rows) and voltage range (columns).
+            offsets (numpy.array): The offset of each channel and voltage range in ADC counts.
+            serial_number (str): (OPTIONAL) The serial number of the device.
+        """
+        self.gains = np.array(gains, dtype=np.float64).reshape(2, len(self.VOLTAGE_INDICES))
+        self.offsets = np.array(offsets, dtype=np.float64).reshape(2, len(self.VOLTAGE_INDICES))
+        self.scale_factors = 5.12 * self.gains / (np.array(self.VOLTAGE_INDICES) << 7)
+        self.serial_number = serial_number
+        self._columns = {voltage_index: column for column, voltage_index in enumerate(self.VOLTAGE_INDICES)}
+
+    def conversion_values(self, channel, voltage_index):
+        """
+        Get the values used to convert the ADC counts of a channel into volts.
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            voltage_index (int): The voltage range index of the channel.
+
+        Returns:
+            tuple: The scale factor and the offset.
+        """
+        column = self._columns[voltage_index]
+        return float(self.scale_factors[channel, column]), float(self.offsets[channel, column])
+
+    @classmethod
+    def defaults(cls, scope, serial_number=None):
+        """
+        Get the default calibration values of the Hantek6022API (used if the device has no calibration values).
+
+        Args:
+            scope: The device object of the Hantek6022API.
+            serial_number (str): (OPTIONAL) The serial number of the device.
+
+        Returns:
+            Calibration: The default calibration.
+        """
+        gains = [[scope.gain1[index] for index in cls.VOLTAGE_INDICES],
+                 [scope.gain2[index] for index in cls.VOLTAGE_INDICES]]
+        offsets = [[scope.offset1[index] for index in cls.VOLTAGE_INDICES],
+                   [scope.offset2[index] for index in cls.VOLTAGE_INDICES]]
+        return cls(gains, offsets, serial_number)
+
+    @classmethod
+    def from_eeprom(cls, eeprom, default, serial_number=None):
+        """
+        Parse the calibration values stored in EEPROM. Values that have not been written (0x00 or 0xff) are taken
+        from the default calibration.
+
+        Args:
+            eeprom (bytes): The EEPROM content starting at CALIBRATION_EEPROM_OFFSET (CALIBRATION_EEPROM_EXT_SIZE
+                bytes).
+            default (Calibration): The calibration used for missing values.
+            serial_number (str): (OPTIONAL) The serial number of the device.
+
+        Returns:
+            Calibration: The calibration of the device.
+        """
+        eeprom = np.frombuffer(bytes(eeprom), dtype=np.uint8).astype(np.float64)
+
+        def values(position):
+            raw = eeprom[_EEPROM_POSITIONS + position]
+            return raw - 128, (raw != 0) & (raw != 255)
+
+        offsets, valid = values(0)
+        offsets = np.where(valid, offsets, default.offsets)
+        extended_offsets, valid = values(_EEPROM_OFFSET_OFFSET)
+        offsets += np.where(valid, extended_offsets / 250, 0)
+        extended_gains, valid = values(_EEPROM_GAIN_OFFSET)
+        gains = default.gains * np.where(valid, 1 + extended_gains / 500, 1)
+        return cls(gains, offsets, serial_number)
+
+    @classmethod
+    def read(cls, scope, serial_number=None):
+        """
+        Read the calibration values from the EEPROM of a device.
+
+        Args:
+            scope: The device object of the Hantek6022API.
+            serial_number (str): (OPTIONAL) The serial number of the device.
+
+        Returns:
+            Calibration: The calibration of the device.
+        """
+        eeprom = scope.read_eeprom(scope.CALIBRATION_EEPROM_OFFSET, scope.CALIBRATION_EEPROM_EXT_SIZE)
+        return cls.from_eeprom(eeprom, cls.defaults(scope, serial_number), serial_number)
+
+    def to_eeprom(self, eeprom, default):
+        """
+        Encode the calibration values in the EEPROM format (the inverse of "from_eeprom"). The offsets are stored as
+        whole ADC counts plus an extended correction in steps of 1/250 count, the gains as a correction of the default
+        gains in steps of 1/500.
+
+        Args:
+            eeprom (bytes): The current EEPROM content starting at CALIBRATION_EEPROM_OFFSET. Other values are kept.
+            default (Calibration): The calibration the gain corrections are relative to.
+
+        Returns:
+            bytes: The new EEPROM content.
+        """
+        eeprom = np.frombuffer(bytes(eeprom), dtype=np.uint8).copy()
+        whole_offsets = np.round(self.offsets)
+        # 0x00 and 0xff mark values that have not been written
+        eeprom[_EEPROM_POSITIONS] = np.clip(whole_offsets + 128, 1, 254)
+        eeprom[_EEPROM_POSITIONS + _EEPROM_OFFSET_OFFSET] = np.clip(
+            np.round((self.offsets - whole_offsets) * 250) + 128, 1, 254)
+        eeprom[_EEPROM_POSITIONS + _EEPROM_GAIN_OFFSET] = np.clip(
+            np.round((self.gains / default.gains - 1) * 500) + 128, 1, 254)
+        return eeprom.tobytes()
+
+    def write(self, scope):
+        """
+        Write the calibration values into the EEPROM of a device. As the EEPROM format has a limited resolution, the
+        values actually stored are returned (and cached for the device).
+
+        Args:
+            scope: The device object of the Hantek6022API.
+
+        Returns:
+            Calibration: The calibration stored in the EEPROM.
+        """
+        default = self.defaults(scope, self.serial_number)
+        eeprom = scope.read_eeprom(scope.CALIBRATION_EEPROM_OFFSET, scope.CALIBRATION_EEPROM_EXT_SIZE)
+        eeprom = self.to_eeprom(eeprom, default)
+        scope.set_calibration_values(bytearray(eeprom))
+        calibration = self.from_eeprom(eeprom, default, self.serial_number)
+        if self.serial_number is not None:
+            with _calibrations_lock:
+                _calibrations[self.serial_number] = calibration
+                calibration._write_cache()
+        return calibration
+
+    @classmethod
+    def load(cls, scope, use_cache=True):
+        """
+        Get the calibration of a device. The EEPROM is only read if the calibration of the device is neither known
+        from a previous call nor cached on disk. If the EEPROM cannot be read, the default values are used.
+
+        Args:
+            scope: The device object of the Hantek6022API.
+            use_cache (bool): (OPTIONAL) Use the calibration read before. Otherwise, the EEPROM is read again (e.g.
+                after it has been changed by another program).
+
+        Returns:
+            Calibration: The calibration of the device.
+        """
+        try:
+            serial_number = scope.get_serial_number_string()
+        except usb1.USBError:
+            serial_number = None
+        with _calibrations_lock:
+            if use_cache and serial_number is not None:
+                calibration = _calibrations.get(serial_number)
+                if calibration is None:
+                    calibration = cls._read_cache(serial_number)
+                if calibration is not None:
+                    _calibrations[serial_number] = calibration
+                    return calibration
+            try:
+                calibration = cls.read(scope, serial_number)
+            except usb1.USBError:
+                print('The calibration values could not be read, the default values are used.')
+                return cls.defaults(scope, serial_number)
+            if serial_number is not None:
+                _calibrations[serial_number] = calibration
+                calibration._write_cache()
+        return calibration
+
+    @staticmethod
+    def _cache_location(serial_number):
+        return os.path.join(CACHE_DIRECTORY, serial_number + '.json')
+
+    @classmethod
+    def _read_cache(cls, serial_number):
+        try:
+            with open(cls._cache_location(serial_number), 'r') as f:
+                values = json.load(f)
+            return cls(values['gains'], values['offsets'], serial_number)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_cache(self):
+        try:
+            os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+            location = self._cache_location(self.serial_number)
+            # write to a temporary file first, so other processes never read an incomplete file
+            temporary_location = '{}.{}.tmp'.format(location, os.getpid())
+            with open(temporary_location, 'w') as f:
+                json.dump({'gains': self.gains.tolist(), 'offsets': self.offsets.tolist()}, f)
+            os.replace(temporary_location, location)
+        except OSError:
+            pass
@@ -1,6 +1,12 @@
 import threading
+import warnings
+
 import numpy as np
 
+from hantekosc.calibration import voltage_to_adc
+from hantekosc.measurements import MEASUREMENTS, RunningStatistics
+from hantekosc.spectrum import SpectrumAnalyzer
+
 
 class Channel:
     """
@@ -10,7 +16,15 @@ class Channel:
         id (str): The channel id.
         ch_number (int): The channel number. Starts with 0.
         osc: The device that owns the channel.
-
+        measurements_enabled (bool): Calculate the standard measurements of this channel for each record when it is
+            published and keep their statistics (see "measurements" and "statistics"). Default: False
+        spectrum_analyzer (SpectrumAnalyzer): Calculates and averages the spectrum of this channel for each published
+            record (see "spectrum"). Default: None (the spectrum is only calculated when it is requested).
+        persistence (PersistenceHistogram): Accumulates the ADC counts of this channel of each record in a time x
+            voltage histogram (see "persistence_image"). Default: None
+        filter: A filter applied to the data stream of this channel before the records are assembled (see "filter").
+        mask_test (MaskTest): Tests each record of this channel against a mask of voltage limits when it is
+            published and counts the passed and failed records. Default: None
 
     """
     def __init__(self, osc, channel_number):
@@ -24,33 +38,301 @@ class Channel:
         self._trigger_kind = 'RISING'
         self._trigger_level = 1
 
-        self.data_mutex = threading.Lock()
+        # only kept for existing code (see "data_mutex")
+        self._data_mutex = threading.Lock()
 
         self.voltage_index = 1
         self.id = 'CH' + str(channel_number + 1)
         self.ch_number = channel_number
         self.osc = osc
-        self.retrieved_data = np.empty((2, 1), float)
-        self.new_data_ready = False
+        # id of the last record returned to the user
+        self._read_record_id = 0
         self.voltage_range = 5
+        self.measurements_enabled = False
+        self.spectrum_analyzer = None
+        self.persistence = None
+        self.mask_test = None
+        self._filter = None
+        # the statistics of each measurement over the records published since the last reset
+        self._statistics = {name: RunningStatistics() for name in MEASUREMENTS}
 
         # ToDo: Add "enabled" variable to improve performance by calculating data only for enabled channels
         # ToDo: Add "probe gain" and "probe offset" variables
 
+    @property
+    def data_mutex(self):
+        """
+        Deprecated: The records are published as immutable snapshots (see "snapshot"), so the data of a channel does
+        not need to be locked anymore. The lock is only kept for existing code, the oscilloscope does not use it.
+
+        Returns:
+            threading.Lock: A lock of the channel.
+        """
+        warnings.warn('Channel.data_mutex is deprecated and not used anymore, the records are immutable snapshots.',
+                      DeprecationWarning, stacklevel=2)
+        return self._data_mutex
+
+    @property
+    def new_data_ready(self):
+        """
+        Check whether a record has been published that has not been read from this channel yet.
+
+        Returns:
+            bool: True if there is unread data.
+        """
+        return self.osc.latest_record_id > self._read_record_id
+
+    @new_data_ready.setter
+    def new_data_ready(self, new_data_ready):
+        """
+        Mark the last record as read (False) or unread (True).
+
+        Args:
+            new_data_ready (bool): Whether there is unread data.
+        """
+        self._read_record_id = 0 if new_data_ready else self.osc.latest_record_id
+
+    @property
+    def record_id(self):
+        """
+        Get the id of the last published record. Readers can compare it with the id of the record they have to skip
+        unchanged records without touching the data.
+
+        Returns:
+            int: The record id (0 if no record has been published yet).
+        """
+        return self.osc.latest_record_id
+
+    def snapshot(self, copy=False):
+        """
+        Get the last record of this channel without copying it.
+        The returned arrays are read-only and are never modified by the oscilloscope, so they can be kept as long as
+        they are needed. Timing and measurement data always belong to the same record.
+
+        Args:
+            copy (bool): (OPTIONAL) Return writable copies of the arrays instead of read-only views.
+
+        Returns:
+            tuple: The record id, the timing data in seconds and the measurement data (volts, or ADC counts in the
+                'uint8' data mode).
+        """
+        record = self.osc.latest_record
+        if record is None:
+            return 0, np.empty(0), np.empty(0)
+        self._read_record_id = record.record_id
+        timing_data = record.timing_data
+        data = record.data[self.ch_number]
+        if copy:
+            timing_data = np.array(timing_data, copy=True)
+            data = np.array(data, copy=True)
+        return record.record_id, timing_data, data
+
+    def wait_for_data(self, timeout=None):
+        """
+        Block until a record is available that has not been read from this channel yet.
+
+        Args:
+            timeout (float): (OPTIONAL) The maximum time to wait in seconds. Default: wait forever.
+
+        Returns:
+            bool: True if new data is available, False if the timeout expired.
+        """
+        return self.osc.wait_for_record(self._read_record_id, timeout) is not None
+
+    def peak_detect(self, n_points=2000, start=0, stop=None):
+        """
+        Get the envelope of the last record of this channel for a display n_points wide: the minimum and the maximum
+        of each of n_points bins (peak detection). Unlike a plot of every n-th sample, short peaks are never lost.
+        The envelope is calculated from the min/max levels built while the record was assembled, so it only takes time
+        proportional to n_points (see "Oscilloscope.peak_detection").
+
+        Args:
+            n_points (int): (OPTIONAL) The number of bins, e.g. the width of the plot in pixels.
+            start (int): (OPTIONAL) The index of the first sample (to zoom in).
+            stop (int): (OPTIONAL) The index behind the last sample. Default: the record length.
+
+        Returns:
+            tuple: The record id, the time of the first sample of each bin, the minima and the maxima (volts, or ADC
+                counts in the 'uint8' data mode).
+        """
+        record = self.osc.latest_record
+        if record is None:
+            return 0, np.empty(0), np.empty(0), np.empty(0)
+        self._read_record_id = record.record_id
+        return (record.record_id,) + record.envelope(self.ch_number, n_points, start, stop)
+
+    def view(self, t_start=None, t_end=None, n_points=2000):
+        """
+        Get a time window of the last record of this channel reduced to n_points bins, e.g. to zoom into and pan over
+        a long record. The minimum, maximum and mean of each bin are taken from the level of the min/max/mean pyramid
+        of the record that fits the zoom, so it only takes time proportional to n_points.
+
+        Args:
+            t_start (float): (OPTIONAL) The start of the window in seconds (relative to the trigger point in the trigger
+                modes). Default: the start of the record.
+            t_end (float): (OPTIONAL) The end of the window in seconds. Default: the end of the record.
+            n_points (int): (OPTIONAL) The number of bins, e.g. the width of the plot in pixels.
+
+        Returns:
+            tuple: The record id, the time of the first sample of each bin, the minima, the maxima and the means (volts,
+                or ADC counts in the 'uint8' data mode).
+        """
+        record = self.osc.latest_record
+        if record is None:
+            return 0, np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+        self._read_record_id = record.record_id
+        return (record.record_id,) + record.view(self.ch_number, t_start, t_end, n_points)
+
+    def measurements(self):
+        """
+        Get the standard measurements of the last record of this channel (mean, RMS, Vpp, frequency, duty cycle, rise
+        time, ...). If "measurements_enabled" is set, they have been calculated when the record was published.
+
+        Returns:
+            tuple: The record id and a dict with the value of each measurement in volts, seconds or percent (see
+                "hantekosc.measurements.MEASUREMENTS", NaN if a measurement is not defined for the record).
+        """
+        record = self.osc.latest_record
+        if record is None:
+            return 0, dict.fromkeys(MEASUREMENTS, float('nan'))
+        self._read_record_id = record.record_id
+        return record.record_id, record.measure(self.ch_number)
+
+    def statistics(self):
+        """
+        Get the statistics of the measurements over the records published with "measurements_enabled" set since the
+        last reset. They are updated when a record is published, so no waveform needs to be read.
+
+        Returns:
+            dict: A dict for each measurement containing 'count', 'mean', 'min', 'max' and 'stddev'.
+        """
+        with self.osc.record_condition:
+            return {name: statistics.as_dict() for name, statistics in self._statistics.items()}
+
+    def reset_statistics(self):
+        """
+        Reset the statistics of the measurements.
+        """
+        with self.osc.record_condition:
+            for statistics in self._statistics.values():
+                statistics.reset()
+
+    def update_statistics(self, measurements):
+        """
+        Add the measurements of a record to the statistics. Called by the oscilloscope with the record condition held.
+
+        Args:
+            measurements (dict): The measurements of a record.
+        """
+        for name, statistics in self._statistics.items():
+            statistics.update(measurements[name])
+
+    def spectrum(self, scale='LINEAR', window='HANN'):
+        """
+        Get the amplitude spectrum of this channel. If a "spectrum_analyzer" is set, its averaged spectrum is returned
+        (it may belong to an older record than the latest one while the worker is busy). Otherwise, the spectrum of the
+        last record is calculated.
+
+        Args:
+            scale (str): (OPTIONAL) 'LINEAR' for amplitudes in volts (peak), 'DB' for dBV.
+            window (str): (OPTIONAL) The window function used without a spectrum analyzer (see
+                "hantekosc.spectrum.WINDOWS").
+
+        Returns:
+            tuple: The record id, the frequencies in Hz and the amplitudes.
+        """
+        spectrum_analyzer = self.spectrum_analyzer
+        if spectrum_analyzer is None:
+            record = self.osc.latest_record
+            if record is None:
+                return 0, np.empty(0), np.empty(0, dtype=np.float32)
+            spectrum_analyzer = SpectrumAnalyzer(window, use_worker=False)
+            spectrum_analyzer.add(record, self.ch_number)
+        record_id, frequencies, amplitudes, _ = spectrum_analyzer.result(scale)
+        self._read_record_id = max(self._read_record_id, record_id)
+        return record_id, frequencies, amplitudes
+
+    def persistence_image(self, scale='LINEAR'):
+        """
+        Get the persistence image of this channel accumulated by "persistence".
+
+        Args:
+            scale (str): (OPTIONAL) 'LINEAR' or 'LOG'.
+
+        Returns:
+            tuple: The time of each column in seconds, the voltage of each row in volts and the intensities between 0
+                and 1 (one row per voltage, one column per time bin). The arrays are empty if "persistence" is not set.
+        """
+        persistence = self.persistence
+        if persistence is None:
+            return np.empty(0), np.empty(0), np.zeros((256, 0), dtype=np.float32)
+        return persistence.time_axis(), persistence.voltage_axis(), persistence.image(scale)
+
+    def voltage_to_adc(self, voltage):
+        """
+        Convert voltages into the ADC counts of this channel with the current voltage range (not rounded).
+
+        Args:
+            voltage (float or numpy.array): The voltages.
+
+        Returns:
+            float or numpy.array: The ADC counts.
+        """
+        return voltage_to_adc(voltage, *self.osc._get_conversion_values(self.ch_number))
+
+    async def next_record(self):
+        """
+        Wait (without blocking the event loop) for a record that has not been read from this channel yet and return
+        it like "snapshot".
+
+        Returns:
+            tuple: The record id, the timing data in seconds and the measurement data (read-only views), or None if the
+                measurement was stopped.
+        """
+        record = await self.osc.next_record(self._read_record_id)
+        if record is None:
+            return None
+        self._read_record_id = record.record_id
+        return record.record_id, record.timing_data, record.data[self.ch_number]
+
     @property
     def measured_data(self):
         """
         Get the measurement data of the x and y coordinates in seconds and volts.
 
+        This property returns a new array on each call, "snapshot" gives access to the data without copying it.
+        In the 'uint8' data mode, the ADC counts are converted into float32 voltages.
+
         Returns:
             numpy.array: The measurement data of the x and y coordinates in seconds and volts.
         """
-        self.data_mutex.acquire()
-        data = np.array(self.retrieved_data, copy=True)
-        self.new_data_ready = False
-        self.data_mutex.release()
+        record = self.osc.latest_record
+        if record is None:
+            return np.empty((2, 1), float)
+        self._read_record_id = record.record_id
+        data = np.empty((2, record.record_length),
+                        dtype=np.float32 if record.data_type == 'uint8' else record.data.dtype)
+        data[0] = record.timing_data
+        data[1] = record.voltage_data(self.ch_number)
         return data
 
+    @property
+    def adc_data(self):
+        """
+        Get the timing data and the ADC counts of the last record together with the values needed to convert them.
+        The voltages can be calculated by: (adc_counts - 128 - offset) * scale_factor
+        This is only available in the 'uint8' data mode of the oscilloscope. The arrays are read-only views.
+
+        Returns:
+            tuple: The timing data (numpy.array), the ADC counts (numpy.array), the scale factor and the offset.
+        """
+        record = self.osc.latest_record
+        if record is None or record.data_type != 'uint8':
+            raise RuntimeError("ADC counts are only published in the 'uint8' data mode.")
+        self._read_record_id = record.record_id
+        return (record.timing_data, record.data[self.ch_number], record.scale_factors[self.ch_number],
+                record.offsets[self.ch_number])
+
     @property
     def voltage_ranges_available(self):
         """
@@ -81,10 +363,9 @@ class Channel:
         """
         self.osc.settings_mutex.acquire()
 
-        was_running = False
-        if self.osc.running:
-            self.osc.stop()
-            was_running = True
+        was_running = self.osc.running
+        if was_running:
+            self.osc._pause_capture()
 
         # ToDo: raise value modified error?
         match voltage_range:
@@ -108,10 +389,40 @@ class Channel:
         self._voltage_range = 5/index
         self.voltage_index = index
 
-        # device must be started and stopped for some reason (Otherwise an SIGSEGV error is thrown)
+        # the transfers must not run while the range is changed (Otherwise an SIGSEGV error is thrown)
         if was_running:
-            self.osc.start()
+            self.osc._resume_capture()
+
+        self.osc.settings_mutex.release()
+
+    @property
+    def filter(self):
+        """
+        Get the filter applied to the data stream of this channel.
+
+        Returns:
+            The filter (see "hantekosc.filters"), None if the data is not filtered.
+        """
+        return self._filter
+
+    @filter.setter
+    def filter(self, filter_):
+        """
+        Set a filter applied to the data stream of this channel (e.g. a FIRFilter, BiquadFilter, DCBlocker or a
+        FilterChain of them). The blocks are filtered continuously (the state of the filter is kept across the block
+        boundaries) and rounded to ADC counts again, before the trigger is searched and the records are assembled
+        (see "Oscilloscope.filter_before_trigger"). The filter works on the ADC counts relative to 128 and must not
+        decimate the data.
 
+        Args:
+            filter_: The filter, None to disable filtering.
+        """
+        if filter_ is not None and getattr(filter_, 'decimation', 1) != 1:
+            raise ValueError('Decimating filters cannot be used in the acquisition pipeline.')
+        self.osc.settings_mutex.acquire()
+        if filter_ is not None:
+            filter_.reset()
+        self._filter = filter_
         self.osc.settings_mutex.release()
 
     @property
@@ -1,61 +1,134 @@
-import hantekosc.py_ht6022.LibUsbScope
+import threading
 
+import usb1
 
-def list_connected_hantek_devices():
+from hantekosc.py_ht6022 import LibUsbScope
+
+
+# model names by product id
+_models = {LibUsbScope.Oscilloscope.PRODUCT_ID_BE: '6022BE',
+           LibUsbScope.Oscilloscope.PRODUCT_ID_BL: '6022BL',
+           LibUsbScope.Oscilloscope.PRODUCT_ID_21: '6021'}
+
+# The USB context used for the enumeration and the cached device information (keyed by bus number and port numbers).
+# The cache is invalidated by hotplug events (where supported) and whenever the address of a device changes, which
+# happens each time a device is connected or re-enumerates (e.g. after uploading the firmware).
+_context = None
+_device_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _get_context():
+    global _context
+    if _context is None:
+        _context = usb1.USBContext()
+        if usb1.hasCapability(usb1.CAP_HAS_HOTPLUG):
+            _context.hotplugRegisterCallback(_hotplug_callback, flags=usb1.HOTPLUG_NO_FLAGS)
+    return _context
+
+
+def _hotplug_callback(context, device, event):
+    """
+    Remove a device from the cache when it is connected or disconnected.
+    """
+    with _cache_lock:
+        _device_cache.pop((device.getBusNumber(), tuple(device.getPortNumberList())), None)
+    return False
+
+
+def _read_device_info(device):
+    """
+    Read the information about a device from its descriptors. Only the serial number string needs the device to be
+    opened, no interface is claimed and nothing is sent to the device.
+    """
+    firmware_present = (device.getVendorID() == LibUsbScope.Oscilloscope.FIRMWARE_PRESENT_VENDOR_ID
+                        and device.getbcdDevice() == LibUsbScope.Oscilloscope.FIRMWARE_VERSION)
+    serial_number = None
+    if device.getVendorID() == LibUsbScope.Oscilloscope.FIRMWARE_PRESENT_VENDOR_ID:
+        # only the custom firmware reports a serial number
+        try:
+            serial_number = device.getSerialNumber()
+        except usb1.USBError:
+            # the device is not accessible (e.g. missing permissions or used by another process)
+            pass
+    return {'Manufacturer': 'Hantek', 'Model': _models[device.getProductID()], 'Serial Number': serial_number,
+            'Firmware Present': firmware_present, 'Bus': device.getBusNumber(),
+            'Port': tuple(device.getPortNumberList())}
+
+
+def list_connected_hantek_devices(use_cache=True, max_workers=8):
     """
     List all connected oscilloscopes from hantek.
 
+    Only the device descriptors and serial number strings are read, the devices are neither claimed nor is any
+    firmware uploaded. Devices without firmware do not report a serial number (use "upload_firmware" to upload it
+    explicitly). The information of the devices is read in parallel and cached until a device is disconnected or
+    re-enumerates.
+
+    Args:
+        use_cache (bool): (OPTIONAL) Use the information of devices that has been read before.
+        max_workers (int): (OPTIONAL) The maximum number of devices read in parallel.
+
     Returns:
-        list(dict): A list containing a dict containing 'Manufacturer', 'Model' and 'Serial Number' for each device
-    """
-    scope = hantekosc.py_ht6022.LibUsbScope.Oscilloscope()
-    usb_device_list = scope.context.getDeviceList(skip_on_error=True)
-    device_list = []
-
-    for device in usb_device_list:
-        # Hantek 6022BE
-        if (device.getVendorID() == scope.FIRMWARE_PRESENT_VENDOR_ID or device.getVendorID() ==
-                scope.NO_FIRMWARE_VENDOR_ID) and device.getProductID() == scope.PRODUCT_ID_BE:
-            hantek_6022be = hantekosc.py_ht6022.LibUsbScope.Oscilloscope(device.getVendorID(), device.getProductID())
-            hantek_6022be.setup()
-            if not  hantek_6022be.open_handle():
-                sys.exit(-1)
-
-            if (not  hantek_6022be.is_device_firmware_present):
-                print('upload firmware...')
-                hantek_6022be.flash_firmware()
-            resource_info = {'Manufacturer': 'Hantek', 'Model': '6022BE',
-                             'Serial Number': hantek_6022be.get_serial_number_string()}
-            device_list.append(resource_info)
-            device.close()
-        # Hantek 6022BL
-        if (device.getVendorID() == scope.FIRMWARE_PRESENT_VENDOR_ID or device.getVendorID() ==
-                scope.NO_FIRMWARE_VENDOR_ID) and device.getProductID() == scope.PRODUCT_ID_BL:
-            hantek_6022be = hantekosc.PyHT6022.LibUsbScope.Oscilloscope(device.getVendorID(), device.getProductID())
-            hantek_6022be.setup()
-            if not hantek_6022be.open_handle():
-                sys.exit(-1)
-
-            if (not hantek_6022be.is_device_firmware_present):
-                print('upload firmware...')
-                hantek_6022be.flash_firmware()
-            resource_info = {'Manufacturer': 'Hantek', 'Model': '6022BL',
-                             'Serial Number': hantek_6022be.get_serial_number_string()}
-            device_list.append(resource_info)
-            device.close()
-        # Hantek 6021
-        if (device.getVendorID() == scope.FIRMWARE_PRESENT_VENDOR_ID or device.getVendorID() ==
-                scope.NO_FIRMWARE_VENDOR_ID) and device.getProductID() == scope.PRODUCT_ID_21:
-            hantek_6022be = hantekosc.PyHT6022.LibUsbScope.Oscilloscope(device.getVendorID(), device.getProductID())
-            hantek_6022be.setup()
-            if not hantek_6022be.open_handle():
-                sys.exit(-1)
-
-            if (not hantek_6022be.is_device_firmware_present):
-                print('upload firmware...')
-                hantek_6022be.flash_firmware()
-            resource_info = {'Manufacturer': 'Hantek', 'Model': '6021',
-                             'Serial Number': hantek_6022be.get_serial_number_string()}
-            device_list.append(resource_info)
-            device.close()
+        list(dict): A list containing a dict containing 'Manufacturer', 'Model', 'Serial Number' (None if the firmware
+            is not loaded), 'Firmware Present', 'Bus' and 'Port' for each device
+    """
+    context = _get_context()
+    # deliver pending hotplug events
+    context.handleEventsTimeout(tv=0)
+
+    vendor_ids = (LibUsbScope.Oscilloscope.FIRMWARE_PRESENT_VENDOR_ID, LibUsbScope.Oscilloscope.NO_FIRMWARE_VENDOR_ID)
+    devices = [device for device in context.getDeviceList(skip_on_error=True, skip_on_access_error=True)
+               if device.getVendorID() in vendor_ids and device.getProductID() in _models]
+
+    device_list = [None] * len(devices)
+    devices_to_read = []
+    with _cache_lock:
+        for index, device in enumerate(devices):
+            key = (device.getBusNumber(), tuple(device.getPortNumberList()))
+            cached = _device_cache.get(key)
+            if use_cache and cached is not None and cached[0] == device.getDeviceAddress():
+                device_list[index] = dict(cached[1])
+            else:
+                devices_to_read.append(index)
+
+    if devices_to_read:
+        # only imported when needed, as it takes longer to import than most listings take
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(devices_to_read))) as executor:
+            device_infos = executor.map(_read_device_info, [devices[index] for index in devices_to_read])
+            for index, device_info in zip(devices_to_read, device_infos):
+                device_list[index] = device_info
+        with _cache_lock:
+            for index in devices_to_read:
+                device = devices[index]
+                key = (device.getBusNumber(), tuple(device.getPortNumberList()))
+                _device_cache[key] = (device.getDeviceAddress(), dict(device_list[index]))
     return device_list
+
+
+def upload_firmware(max_workers=8):
+    """
+    Upload the firmware to all connected oscilloscopes from hantek that do not have it loaded yet. The devices are
+    flashed in parallel.
+
+    Args:
+        max_workers (int): (OPTIONAL) The maximum number of devices flashed in parallel.
+
+    Returns:
+        list(dict): The connected devices (see "list_connected_hantek_devices").
+    """
+    def flash(port):
+        scope = LibUsbScope.Oscilloscope(context=_get_context())
+        if scope.setup(port=port) and scope.open_handle():
+            scope.flash_firmware()
+            scope.close_handle()
+
+    ports = [(device_info['Bus'], device_info['Port']) for device_info in list_connected_hantek_devices()
+             if not device_info['Firmware Present']]
+    if ports:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(ports))) as executor:
+            # raise the exceptions of the threads
+            list(executor.map(flash, ports))
+    return list_connected_hantek_devices()
@@ -0,0 +1,317 @@
+import math
+import threading
+
+import numpy as np
+
+
+# A C_Code instance shared by the filters created without one (the C code is only loaded on first use)
+_shared_c_code = None
+_shared_c_code_lock = threading.Lock()
+
+
+def _get_c_code(c_code):
+    global _shared_c_code
+    if c_code is not None:
+        return c_code if c_code.c_code_loaded else None
+    with _shared_c_code_lock:
+        if _shared_c_code is None:
+            from hantekosc.c_code import C_Code
+            try:
+                _shared_c_code = C_Code()
+            except Exception:
+                print('The C code could not be loaded, the filters run in NumPy.')
+                _shared_c_code = False
+    return _shared_c_code or None
+
+
+def lowpass_taps(number_of_taps, cutoff, sample_rate):
+    """
+    Design the coefficients of a linear-phase FIR low-pass filter (windowed sinc, Blackman window, DC gain of one).
+
+    Args:
+        number_of_taps (int): The number of coefficients (odd numbers give a delay of whole samples).
+        cutoff (float): The cutoff frequency in Hz.
+        sample_rate (float): The sample rate in Hz.
+
+    Returns:
+        numpy.array: The coefficients (float32).
+    """
+    if not 0 < cutoff < sample_rate / 2:
+        raise ValueError('The cutoff frequency must be between 0 and half the sample rate.')
+    positions = np.arange(number_of_taps) - (number_of_taps - 1) / 2
+    taps = np.sinc(2 * cutoff / sample_rate * positions) * np.blackman(number_of_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def butterworth_sections(order, cutoff, sample_rate, kind='LOWPASS'):
+    """
+    Design a Butterworth filter as a cascade of biquad sections (bilinear transform with pre-warping).
+
+    Args:
+        order (int): The order of the filter.
+        cutoff (float): The -3 dB frequency in Hz.
+        sample_rate (float): The sample rate in Hz.
+        kind (str): (OPTIONAL) 'LOWPASS' or 'HIGHPASS'.
+
+    Returns:
+        numpy.array: The coefficients b0, b1, b2, a1, a2 of each section (shape ((order + 1) // 2, 5)).
+    """
+    if kind not in ('LOWPASS', 'HIGHPASS'):
+        raise ValueError("The kind must be 'LOWPASS' or 'HIGHPASS'.")
+    if not 0 < cutoff < sample_rate / 2:
+        raise ValueError('The cutoff frequency must be between 0 and half the sample rate.')
+    k = 2 * sample_rate
+    omega = k * math.tan(math.pi * cutoff / sample_rate)
+    sections = []
+    for index in range(order // 2):
+        # a pair of conjugate poles: s^2 + b s + c
+        angle = math.pi * (2 * index + order + 1) / (2 * order)
+        b, c = -2 * math.cos(angle) * omega, omega * omega
+        a0, a1, a2 = k * k + b * k + c, 2 * c - 2 * k * k, k * k - b * k + c
+        numerator = (c, 2 * c, c) if kind == 'LOWPASS' else (k * k, -2 * k * k, k * k)
+        sections.append([value / a0 for value in numerator] + [a1 / a0, a2 / a0])
+    if order % 2:
+        # the real pole: s + omega
+        a0, a1 = k + omega, omega - k
+        numerator = (omega, omega, 0) if kind == 'LOWPASS' else (k, -k, 0)
+        sections.append([value / a0 for value in numerator] + [a1 / a0, 0])
+    return np.array(sections, dtype=np.float64)
+
+
+class FIRFilter:
+    """
+    A FIR filter for a continuous stream of blocks. The last samples of each block are kept, so the output is the same
+    as if the stream was filtered at once. With a decimation factor, only every n-th output is calculated (the
+    computation of a polyphase decimator).
+
+    Attributes:
+        taps (numpy.array): The filter coefficients (float32).
+        decimation (int): The decimation factor.
+    """
+    def __init__(self, taps, decimation=1, c_code=None):
+        """
+        Class constructor.
+
+        Args:
+            taps (numpy.array): The filter coefficients (e.g. from "lowpass_taps").
+            decimation (int): (OPTIONAL) The decimation factor.
+            c_code (C_Code): (OPTIONAL) Used to run the filter in C. Default: a shared instance.
+        """
+        if len(taps) < 1 or decimation < 1:
+            raise ValueError('At least one coefficient and a positive decimation factor are needed.')
+        self.taps = np.array(taps, dtype=np.float32)
+        self.decimation = decimation
+        self._reversed_taps = np.ascontiguousarray(self.taps[::-1])
+        self._c_code = _get_c_code(c_code)
+        self._buffer = np.empty(0, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the state of the filter (the input before the next block is assumed to be zero).
+        """
+        self._history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+        # the number of input samples before the next output
+        self._phase = 0
+
+    def process(self, data):
+        """
+        Filter the next block of the stream.
+
+        Args:
+            data (numpy.array): The samples of the block.
+
+        Returns:
+            numpy.array: The filtered (and decimated) samples (float32).
+        """
+        history_length = len(self._history)
+        if len(self._buffer) != history_length + len(data):
+            self._buffer = np.empty(history_length + len(data), dtype=np.float32)
+        self._buffer[:history_length] = self._history
+        self._buffer[history_length:] = data
+        n_outputs = max(0, -(-(len(data) - self._phase) // self.decimation))
+        out = np.empty(n_outputs, dtype=np.float32)
+        if self._c_code is not None:
+            self._c_code.fir_filter(self._buffer[self._phase:], self._reversed_taps, self.decimation, out)
+        else:
+            out[:] = np.convolve(self._buffer[self._phase:], self.taps, 'valid')[::self.decimation][:n_outputs]
+        self._phase = (self._phase - len(data)) % self.decimation
+        self._history = self._buffer[len(data):].copy()
+        return out
+
+
+class BiquadFilter:
+    """
+    An IIR filter as cascade of biquad sections (transposed direct form II, calculated in double precision) for a
+    continuous stream of blocks. The state of each section is kept between the blocks. The filter needs the C code.
+
+    Attributes:
+        sections (numpy.array): The coefficients b0, b1, b2, a1, a2 of each section (e.g. from "butterworth_sections").
+        decimation (int): Always 1.
+    """
+    decimation = 1
+
+    def __init__(self, sections, c_code=None):
+        """
+        Class constructor.
+
+        Args:
+            sections (numpy.array): The coefficients of each section (shape (n_sections, 5), a0 = 1).
+            c_code (C_Code): (OPTIONAL) Used to run the filter. Default: a shared instance.
+        """
+        self.sections = np.ascontiguousarray(np.array(sections, dtype=np.float64).reshape(-1, 5))
+        self._c_code = _get_c_code(c_code)
+        if self._c_code is None:
+            raise ImportError('Could not load C code.')
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the state of the filter.
+        """
+        self._state = np.zeros((len(self.sections), 2), dtype=np.float64)
+
+    def process(self, data):
+        """
+        Filter the next block of the stream.
+
+        Args:
+            data (numpy.array): The samples of the block.
+
+        Returns:
+            numpy.array: The filtered samples (float32).
+        """
+        out = np.array(data, dtype=np.float32)
+        self._c_code.biquad_filter(out, self.sections, self._state)
+        return out
+
+
+class DCBlocker(BiquadFilter):
+    """
+    A first-order high-pass filter removing the DC part of a signal: y[n] = x[n] - x[n-1] + a * y[n-1].
+    """
+    def __init__(self, cutoff, sample_rate, c_code=None):
+        """
+        Class constructor.
+
+        Args:
+            cutoff (float): The cutoff frequency in Hz.
+            sample_rate (float): The sample rate in Hz.
+            c_code (C_Code): (OPTIONAL) Used to run the filter. Default: a shared instance.
+        """
+        pole = math.exp(-2 * math.pi * cutoff / sample_rate)
+        super().__init__([[1, -1, 0, -pole, 0]], c_code)
+
+
+class CICDecimator:
+    """
+    A CIC decimator (a cascade of integrators and combs, the equivalent of "order" moving averages over "ratio"
+    samples) for a continuous stream of ADC counts. It only needs additions, as the integers wrap around (the combs
+    cancel the overflows of the integrators).
+
+    Attributes:
+        ratio (int): The decimation factor.
+        order (int): The number of stages (1 to 8).
+        decimation (int): The decimation factor (the same as "ratio").
+    """
+    def __init__(self, ratio, order=3, c_code=None):
+        """
+        Class constructor.
+
+        Args:
+            ratio (int): The decimation factor.
+            order (int): (OPTIONAL) The number of stages.
+            c_code (C_Code): (OPTIONAL) Used to run the filter in C. Default: a shared instance.
+        """
+        if ratio < 1 or not 1 <= order <= 8:
+            raise ValueError('The ratio must be positive and the order between 1 and 8.')
+        if ratio ** order * 255 >= 2 ** 63:
+            raise ValueError('The ratio and the order are too large.')
+        self.ratio = ratio
+        self.order = order
+        self.decimation = ratio
+        self._c_code = _get_c_code(c_code)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the state of the filter.
+        """
+        # the integrators, the comb delays and the number of samples since the last output
+        self._state = np.zeros(2 * self.order + 1, dtype=np.uint64)
+
+    def process(self, adc_counts):
+        """
+        Filter and decimate the next block of the stream.
+
+        Args:
+            adc_counts (numpy.array): The ADC counts of the block (uint8).
+
+        Returns:
+            numpy.array: The decimated ADC counts (float32, with the fractions gained by averaging).
+        """
+        out = np.empty(len(adc_counts) // self.ratio + 1, dtype=np.float32)
+        if self._c_code is not None:
+            return out[:self._c_code.cic_decimate(adc_counts, self.order, self.ratio, self._state, out)]
+        state = self._state.view(np.int64)
+        values = np.asarray(adc_counts).astype(np.int64) - 128
+        with np.errstate(over='ignore'):
+            for k in range(self.order):
+                values = np.cumsum(values)
+                values += state[k]
+                if len(values):
+                    state[k] = values[-1]
+            phase = int(state[2 * self.order])
+            values = values[self.ratio - 1 - phase::self.ratio]
+            for k in range(self.order):
+                if len(values):
+                    previous = np.concatenate(([state[self.order + k]], values[:-1]))
+                    state[self.order + k] = values[-1]
+                    values = values - previous
+        state[2 * self.order] = (phase + len(adc_counts)) % self.ratio
+        out = out[:len(values)]
+        np.multiply(values, float(self.ratio) ** -self.order, out=out, casting='unsafe')
+        out += 128
+        return out
+
+
+class FilterChain:
+    """
+    Filters applied one after another.
+
+    Attributes:
+        filters (list): The filters.
+        decimation (int): The product of the decimation factors of the filters.
+    """
+    def __init__(self, *filters):
+        """
+        Class constructor.
+
+        Args:
+            filters: The filters (FIRFilter, BiquadFilter, ...). A CICDecimator can only be the first filter.
+        """
+        if any(isinstance(filter_, CICDecimator) for filter_ in filters[1:]):
+            raise ValueError('A CIC decimator can only be the first filter of a chain.')
+        self.filters = list(filters)
+        self.decimation = math.prod(filter_.decimation for filter_ in self.filters)
+
+    def reset(self):
+        """
+        Clear the state of all filters.
+        """
+        for filter_ in self.filters:
+            filter_.reset()
+
+    def process(self, data):
+        """
+        Filter the next block of the stream.
+
+        Args:
+            data (numpy.array): The samples of the block.
+
+        Returns:
+            numpy.array: The filtered samples (float32).
+        """
+        for filter_ in self.filters:
+            data = filter_.process(data)
+        return data
@@ -0,0 +1,223 @@
+import collections
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from hantekosc.calibration import voltage_to_adc
+
+
+class MaskTest:
+    """
+    A pass/fail test of each record of a channel against a mask: a lower and an upper voltage limit for each sample.
+
+    The limits are converted into ADC counts once (and again only when the record length, the time span or the voltage
+    range changes), so the records are compared as raw uint8 counts without converting them into volts. A sample
+    fails if it is outside the limits, a record fails if any of its samples fails. The comparison is done in C (or
+    vectorized with NumPy if the C code is not available) while the record is published.
+
+    Only the failing records are kept (the last "keep_failures" of them) and, if "save_directory" is set, saved to
+    disk as .npz files by a worker thread of the oscilloscope.
+
+    Attributes:
+        lower: The lower limit (see the constructor).
+        upper: The upper limit (see the constructor).
+        keep_failures (int): The number of failing records kept in "failures".
+        save_directory (str): The directory the failing records are saved to (None to not save them).
+        tested (int): The number of records tested since the last reset.
+        passed (int): The number of records that passed.
+        failed (int): The number of records that failed.
+        failures (collections.deque): The last failing records as tuples of the record, the number of samples outside
+            the mask and the time of the first of them in seconds.
+    """
+    def __init__(self, lower=None, upper=None, keep_failures=16, save_directory=None, c_code=None):
+        """
+        Class constructor.
+
+        Args:
+            lower: (OPTIONAL) The lower limit in volts: a number, an array (stretched over the record if its length
+                differs from the record length) or a function returning the limit for an array of sample times in
+                seconds. Default: no lower limit.
+            upper: (OPTIONAL) The upper limit in volts, like "lower". Default: no upper limit.
+            keep_failures (int): (OPTIONAL) The number of failing records kept.
+            save_directory (str): (OPTIONAL) The directory the failing records are saved to.
+            c_code (C_Code): (OPTIONAL) Used to compare the records in C. Default: use NumPy.
+        """
+        if keep_failures < 0:
+            raise ValueError('The number of kept failures must not be negative.')
+        self.lower = lower
+        self.upper = upper
+        self.keep_failures = keep_failures
+        self.save_directory = save_directory
+        self._c_code = c_code if c_code is not None and c_code.c_code_loaded else None
+        self._lock = threading.Lock()
+        # the limits in ADC counts and the record length, time span and conversion values they were calculated for
+        self._limits = None
+        self._key = None
+        self._outside = None
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the counters and the failing records. The limits are converted again for the next record (e.g. after
+        "lower" or "upper" was changed).
+        """
+        with self._lock:
+            self._limits = None
+            self._key = None
+            self.tested = 0
+            self.passed = 0
+            self.failed = 0
+            self.failures = collections.deque(maxlen=self.keep_failures)
+            # the time of the first and the last test and the time spent comparing
+            self._first_test_time = None
+            self._last_test_time = None
+            self._test_duration = 0.0
+
+    def adc_limits(self, timing_data, conversion):
+        """
+        Get the limits of each sample in ADC counts. A sample passes if lower <= counts <= upper. Samples that
+        cannot pass (e.g. an upper limit below the voltage range) get the limits (255, 0).
+
+        Args:
+            timing_data (numpy.array): The time of each sample of the record in seconds.
+            conversion (tuple): The scale factor and the offset used to convert ADC counts into volts.
+
+        Returns:
+            numpy.array: The lower (first row) and the upper limits (second row) as read-only uint8 array.
+        """
+        length = len(timing_data)
+        key = (length, float(timing_data[0]), float(timing_data[-1]), tuple(conversion)) if length else (0,)
+        with self._lock:
+            if key == self._key:
+                return self._limits
+        lower = voltage_to_adc(self._evaluate(self.lower, timing_data, -math.inf), *conversion)
+        upper = voltage_to_adc(self._evaluate(self.upper, timing_data, math.inf), *conversion)
+        if conversion[0] < 0:
+            lower, upper = upper, lower
+        # a small tolerance, so that a limit on a voltage level of the ADC does not fail because of rounding errors
+        lower = np.ceil(lower - 1e-6)
+        upper = np.floor(upper + 1e-6)
+        impossible = (lower > upper) | (lower > 255) | (upper < 0) | np.isnan(lower) | np.isnan(upper)
+        limits = np.empty((2, length), dtype=np.uint8)
+        limits[0] = np.where(impossible, 255, np.clip(lower, 0, 255))
+        limits[1] = np.where(impossible, 0, np.clip(upper, 0, 255))
+        limits.flags.writeable = False
+        with self._lock:
+            self._limits = limits
+            self._key = key
+        return limits
+
+    @staticmethod
+    def _evaluate(limit, timing_data, default):
+        """
+        Get the voltage limit of each sample.
+        """
+        length = len(timing_data)
+        if limit is None:
+            return np.full(length, default)
+        if callable(limit):
+            return np.broadcast_to(np.asarray(limit(timing_data), dtype=np.float64), (length,))
+        limit = np.asarray(limit, dtype=np.float64)
+        if limit.ndim == 0 or len(limit) == length:
+            return np.broadcast_to(limit, (length,))
+        # stretch the limit over the record
+        return np.interp(np.linspace(0, len(limit) - 1, length), np.arange(len(limit)), limit)
+
+    def test(self, adc_counts, timing_data, conversion):
+        """
+        Compare the ADC counts of a record of a channel with the mask (without counting the result).
+
+        Args:
+            adc_counts (numpy.array): The ADC counts (uint8).
+            timing_data (numpy.array): The time of each sample in seconds.
+            conversion (tuple): The scale factor and the offset used to convert ADC counts into volts.
+
+        Returns:
+            tuple: The number of samples outside the mask and the index of the first of them (-1 if there is none).
+        """
+        limits = self.adc_limits(timing_data, conversion)
+        if self._c_code is not None:
+            return self._c_code.mask_test(adc_counts, limits)
+        lower, upper = limits
+        if self._outside is None or self._outside.shape[1] != len(adc_counts):
+            self._outside = np.empty((2, len(adc_counts)), dtype=bool)
+        below, above = self._outside
+        np.less(adc_counts, lower, out=below)
+        np.greater(adc_counts, upper, out=above)
+        np.logical_or(below, above, out=below)
+        n_violations = int(np.count_nonzero(below))
+        return n_violations, int(np.argmax(below)) if n_violations else -1
+
+    def add_record(self, record, channel, adc_counts=None, executor=None):
+        """
+        Test a channel of a published record and count the result. Called by the oscilloscope for each published
+        record.
+
+        Args:
+            record (Record): The record.
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            adc_counts (numpy.array): (OPTIONAL) The ADC counts of the channel. Default: the ADC counts of the record
+                (see "Record.adc_counts").
+            executor (concurrent.futures.Executor): (OPTIONAL) The executor saving failing records. Default: save
+                them in the calling thread.
+
+        Returns:
+            bool: True if the record passed.
+        """
+        if not record.record_length:
+            return True
+        if adc_counts is None:
+            adc_counts = record.adc_counts(channel)
+        start = time.perf_counter()
+        n_violations, first_violation = self.test(adc_counts, record.timing_data,
+                                                  (record.scale_factors[channel], record.offsets[channel]))
+        stop = time.perf_counter()
+        with self._lock:
+            if self._first_test_time is None:
+                self._first_test_time = start
+            self._last_test_time = stop
+            self._test_duration += stop - start
+            self.tested += 1
+            if not n_violations:
+                self.passed += 1
+                return True
+            self.failed += 1
+            self.failures.append((record, n_violations, float(record.timing_data[first_violation])))
+        if self.save_directory is not None:
+            if executor is None:
+                self._save(record, channel, n_violations, first_violation)
+            else:
+                executor.submit(self._save, record, channel, n_violations, first_violation)
+        return False
+
+    def _save(self, record, channel, n_violations, first_violation):
+        """
+        Save a failing record (all channels) as 'mask_failure_<record id>.npz' into the save directory.
+        """
+        os.makedirs(self.save_directory, exist_ok=True)
+        path = os.path.join(self.save_directory, f'mask_failure_{record.record_id:08d}.npz')
+        np.savez(path, timing_data=record.timing_data, data=record.data, data_type=record.data_type,
+                 scale_factors=record.scale_factors, offsets=record.offsets, sample_rate=record.sample_rate,
+                 channel=channel, number_of_violations=n_violations, first_violation=first_violation)
+
+    def statistics(self):
+        """
+        Get the counters of the test.
+
+        Returns:
+            dict: The number of tested, passed and failed records, the failure rate, the tested records per second
+                (between the first and the last test) and the mean time in seconds spent comparing a record.
+        """
+        with self._lock:
+            elapsed = self._last_test_time - self._first_test_time if self.tested else 0.0
+            return {
+                'tested': self.tested,
+                'passed': self.passed,
+                'failed': self.failed,
+                'failure_rate': self.failed / self.tested if self.tested else 0.0,
+                'records_per_second': (self.tested - 1) / elapsed if self.tested > 1 and elapsed > 0 else 0.0,
+                'test_time': self._test_duration / self.tested if self.tested else 0.0,
+            }
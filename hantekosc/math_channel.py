@@ -0,0 +1,221 @@
+import ast
+import operator
+
+import numpy as np
+
+
+# The operators and functions that can be used in the expression of a math channel
+_BINARY_OPERATORS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide,
+                     ast.Pow: np.power}
+_CONSTANT_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+                       ast.Pow: operator.pow}
+FUNCTIONS = {'abs': np.absolute, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log10': np.log10, 'sin': np.sin,
+             'cos': np.cos}
+# The number of samples evaluated at once, so the intermediate results stay in the cache
+CHUNK_SIZE = 65536
+
+
+class MathChannel:
+    """
+    A virtual channel calculated from the physical channels for each record, e.g. 'CH1 - CH2' for a differential
+    measurement or 'CH1 * CH2' for the power. The expression may contain the channels ('CH1', 'CH2'), numbers, the
+    operators +, -, *, / and ** and the functions in "FUNCTIONS".
+
+    The expression is compiled once into a short list of NumPy operations that write into the output buffer (and a
+    preallocated buffer per nesting level), so no temporary arrays are allocated per record. All operations are
+    applied to a chunk of "CHUNK_SIZE" samples before the next chunk, so each sample is read from and written to
+    memory only once (like numexpr) instead of once per operation. The oscilloscope evaluates each math channel once
+    per record when it is published, so the data shares the record id and the time axis of the physical channels and
+    is never calculated again by the readers.
+
+    Attributes:
+        id (str): The name of the math channel (e.g. 'MATH1').
+        expression (str): The expression.
+        osc: The device that owns the channel.
+    """
+    def __init__(self, osc, name, expression, channel_names=('CH1', 'CH2')):
+        """
+        Class constructor. The expression is checked and compiled.
+
+        Args:
+            osc: The device that owns the channel.
+            name (str): The name of the math channel.
+            expression (str): The expression.
+            channel_names (tuple): (OPTIONAL) The names of the physical channels that can be used.
+        """
+        self.id = name
+        self.expression = expression
+        self.osc = osc
+        self._channel_names = tuple(channel_names)
+        # the operations: (function, first operand, second operand or None, destination register). An operand is
+        # ('channel', index), ('constant', value) or ('register', number); register 0 is the output buffer.
+        self._operations = []
+        self._number_of_registers = 1
+        try:
+            tree = ast.parse(expression, mode='eval')
+        except SyntaxError as error:
+            raise ValueError(f'Invalid expression {expression!r}: {error.msg}') from None
+        self._result = self._compile(tree.body, 0)
+        self._temporaries = []
+        # id of the last record returned to the user
+        self._read_record_id = 0
+
+    def _compile(self, node, register):
+        """
+        Compile a node of the expression into operations writing into the given register (or registers above it for
+        the intermediate results). Constant subexpressions are folded.
+
+        Returns:
+            tuple: The operand holding the result of the node.
+        """
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            return 'constant', float(node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in self._channel_names:
+                raise ValueError(f'Unknown channel {node.id!r} in {self.expression!r}, available channels: '
+                                 f'{self._channel_names}')
+            return 'channel', self._channel_names.index(node.id)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile(node.operand, register)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            if operand[0] == 'constant':
+                return 'constant', -operand[1]
+            return self._emit(np.negative, operand, None, register)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            left = self._compile(node.left, register)
+            right = self._compile(node.right, register + 1)
+            if left[0] == 'constant' and right[0] == 'constant':
+                return self._fold(_CONSTANT_OPERATORS[type(node.op)], left[1], right[1])
+            if isinstance(node.op, ast.Pow) and right == ('constant', 2.0):
+                return self._emit(np.square, left, None, register)
+            return self._emit(_BINARY_OPERATORS[type(node.op)], left, right, register)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+                and len(node.args) == 1 and not node.keywords:
+            operand = self._compile(node.args[0], register)
+            if operand[0] == 'constant':
+                return self._fold(FUNCTIONS[node.func.id], operand[1])
+            return self._emit(FUNCTIONS[node.func.id], operand, None, register)
+        raise ValueError(f'Unsupported element {ast.dump(node)} in {self.expression!r}')
+
+    def _fold(self, function, *arguments):
+        """
+        Calculate a constant subexpression.
+
+        Returns:
+            tuple: The constant operand.
+        """
+        try:
+            with np.errstate(all='raise'):
+                return 'constant', float(function(*arguments))
+        except (ArithmeticError, TypeError) as error:
+            # e.g. a division by zero, an overflow or a complex result
+            raise ValueError(f'Invalid constant in {self.expression!r}: {error}') from None
+
+    def _emit(self, function, first, second, register):
+        self._operations.append((function, first, second, register))
+        self._number_of_registers = max(self._number_of_registers, register + 1)
+        return 'register', register
+
+    def evaluate(self, channel_data, out):
+        """
+        Calculate the math channel for a record.
+
+        Args:
+            channel_data (numpy.array): The voltages of the physical channels (one row per channel).
+            out (numpy.array): The buffer the result is written to (float32 or float64).
+        """
+        if self._result != ('register', 0):
+            # the expression is a single channel or a constant
+            kind, argument = self._result
+            out[:] = channel_data[argument] if kind == 'channel' else argument
+            return
+        chunk_size = min(CHUNK_SIZE, len(out))
+        if len(self._temporaries) != self._number_of_registers - 1 or any(
+                len(temporary) != chunk_size or temporary.dtype != out.dtype for temporary in self._temporaries):
+            self._temporaries = [np.empty(chunk_size, dtype=out.dtype) for _ in range(self._number_of_registers - 1)]
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for start in range(0, len(out), chunk_size):
+                stop = min(start + chunk_size, len(out))
+                registers = [out[start:stop]] + [temporary[:stop - start] for temporary in self._temporaries]
+                chunk = channel_data[:, start:stop]
+                for function, first, second, register in self._operations:
+                    first = chunk[first[1]] if first[0] == 'channel' else \
+                        registers[first[1]] if first[0] == 'register' else first[1]
+                    if second is None:
+                        function(first, out=registers[register])
+                        continue
+                    second = chunk[second[1]] if second[0] == 'channel' else \
+                        registers[second[1]] if second[0] == 'register' else second[1]
+                    function(first, second, out=registers[register])
+
+    @property
+    def new_data_ready(self):
+        """
+        Check whether a record has been published that has not been read from this channel yet.
+
+        Returns:
+            bool: True if there is unread data.
+        """
+        return self.osc.latest_record_id > self._read_record_id
+
+    @property
+    def record_id(self):
+        """
+        Get the id of the last published record.
+
+        Returns:
+            int: The record id (0 if no record has been published yet).
+        """
+        return self.osc.latest_record_id
+
+    def snapshot(self, copy=False):
+        """
+        Get the last record of this math channel without copying it (like "Channel.snapshot").
+
+        Args:
+            copy (bool): (OPTIONAL) Return writable copies of the arrays instead of read-only views.
+
+        Returns:
+            tuple: The record id, the timing data in seconds and the calculated data. The data is empty if the record
+                was published before the math channel was added.
+        """
+        record = self.osc.latest_record
+        if record is None:
+            return 0, np.empty(0), np.empty(0)
+        self._read_record_id = record.record_id
+        timing_data = record.timing_data
+        data = record.math_data.get(self.id, np.empty(0))
+        if copy:
+            timing_data = np.array(timing_data, copy=True)
+            data = np.array(data, copy=True)
+        return record.record_id, timing_data, data
+
+    def wait_for_data(self, timeout=None):
+        """
+        Block until a record is available that has not been read from this channel yet.
+
+        Args:
+            timeout (float): (OPTIONAL) The maximum time to wait in seconds. Default: wait forever.
+
+        Returns:
+            bool: True if new data is available, False if the timeout expired.
+        """
+        return self.osc.wait_for_record(self._read_record_id, timeout) is not None
+
+    async def next_record(self):
+        """
+        Wait (without blocking the event loop) for a record that has not been read from this channel yet and return
+        it like "snapshot".
+
+        Returns:
+            tuple: The record id, the timing data in seconds and the calculated data (read-only views), or None if the
+                measurement was stopped.
+        """
+        record = await self.osc.next_record(self._read_record_id)
+        if record is None:
+            return None
+        self._read_record_id = record.record_id
+        return record.record_id, record.timing_data, record.math_data.get(self.id, np.empty(0))
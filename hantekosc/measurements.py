@@ -0,0 +1,209 @@
+import math
+
+import numpy as np
+
+
+# The measurements calculated for each record. The voltages are in volts, the times in seconds, the duty cycle and
+# the overshoot in percent. A measurement that is not defined for a record (e.g. the frequency of a constant signal) is
+# NaN.
+MEASUREMENTS = ('mean', 'rms', 'min', 'max', 'vpp', 'top', 'base', 'amplitude', 'frequency', 'period', 'duty_cycle',
+                'rise_time', 'fall_time', 'overshoot')
+
+
+def measure(adc_counts, sample_rate, scale_factor, offset, c_code=None):
+    """
+    Calculate the standard measurements of a record of a channel (see "MEASUREMENTS").
+
+    The amplitude measurements are calculated from the histogram of the ADC counts, so the record is only scanned once
+    for them: top and base are the most frequent values in the upper and the lower half of the range (the max and the
+    min for signals without flat levels). The timing measurements use the crossings of the 50 % level with a hysteresis
+    of 10 % of the amplitude, the rise and fall times the 10 % and 90 % levels (linearly interpolated between samples).
+
+    Args:
+        adc_counts (numpy.array): The ADC counts of the channel (uint8).
+        sample_rate (float): The sample rate in Hz.
+        scale_factor (float): The scale factor used to convert ADC counts into volts.
+        offset (float): The offset used to convert ADC counts into volts.
+        c_code (C_Code): (OPTIONAL) Used to find the crossings in C. Default: use NumPy.
+
+    Returns:
+        dict: The value of each measurement.
+    """
+    results = dict.fromkeys(MEASUREMENTS, math.nan)
+    if not len(adc_counts):
+        return results
+
+    def to_volts(adc_count):
+        return (adc_count - 128 - offset) * scale_factor
+
+    histogram = np.bincount(adc_counts, minlength=256)
+    counts = np.flatnonzero(histogram)
+    minimum, maximum = int(counts[0]), int(counts[-1])
+    values = np.arange(256, dtype=np.float64) - 128 - offset
+    mean = np.dot(histogram, values) / len(adc_counts)
+    mean_square = np.dot(histogram, values * values) / len(adc_counts)
+    middle = (minimum + maximum) // 2
+    base = minimum + int(np.argmax(histogram[minimum:middle + 1]))
+    top = middle + 1 + int(np.argmax(histogram[middle + 1:maximum + 1])) if maximum > middle else maximum
+    # with a negative scale factor, the largest ADC count is the lowest voltage
+    lowest, highest = sorted((to_volts(minimum), to_volts(maximum)))
+    results.update(mean=mean * scale_factor, rms=math.sqrt(mean_square) * abs(scale_factor), min=lowest, max=highest,
+                   vpp=(maximum - minimum) * abs(scale_factor), top=to_volts(top), base=to_volts(base),
+                   amplitude=(top - base) * abs(scale_factor))
+    if top - base < 2:
+        # no edges that can be distinguished from noise
+        return {name: float(value) for name, value in results.items()}
+    results['overshoot'] = 100 * (maximum - top) / (top - base)
+
+    amplitude = top - base
+    rising, falling = _crossings(adc_counts, base + 0.5 * amplitude, 0.1 * amplitude, c_code)
+    if len(rising) >= 2:
+        period = (rising[-1] - rising[0]) / (len(rising) - 1) / sample_rate
+    elif len(falling) >= 2:
+        period = (falling[-1] - falling[0]) / (len(falling) - 1) / sample_rate
+    else:
+        period = math.nan
+    results.update(period=period, frequency=1 / period)
+    if len(rising) >= 2 and len(falling):
+        # the high time of each complete period
+        first_falling = np.searchsorted(falling, rising[:-1])
+        valid = first_falling < len(falling)
+        high_times = falling[first_falling[valid]] - rising[:-1][valid]
+        high_times = high_times[high_times < np.diff(rising)[valid]]
+        if len(high_times):
+            results['duty_cycle'] = 100 * np.mean(high_times) / (period * sample_rate)
+
+    low_level, high_level = base + 0.1 * amplitude, base + 0.9 * amplitude
+    low_rising, low_falling = _crossings(adc_counts, low_level, 0, c_code)
+    high_rising, high_falling = _crossings(adc_counts, high_level, 0, c_code)
+    results['rise_time'] = _transition_time(rising, falling, low_rising, high_rising, sample_rate)
+    results['fall_time'] = _transition_time(falling, rising, high_falling, low_falling, sample_rate)
+    return {name: float(value) for name, value in results.items()}
+
+
+def _crossings(adc_counts, level, hysteresis, c_code=None):
+    """
+    Get the (interpolated) positions where the signal crosses a level upwards and downwards. A crossing is only
+    counted once the signal has left the band of +-hysteresis around the level on both sides, so noise does not cause
+    additional crossings.
+    """
+    half_band = max(hysteresis / 2, 0.5)
+    if c_code is not None and c_code.c_code_loaded:
+        return c_code.find_crossings(adc_counts, level, half_band)
+    # +1 above the band, -1 below the band, 0 inside
+    state = (adc_counts > level + half_band).view(np.int8) - (adc_counts < level - half_band).view(np.int8)
+    outside = np.flatnonzero(state)
+    if len(outside) < 2:
+        return np.empty(0), np.empty(0)
+    states = state[outside]
+    changes = np.flatnonzero(states[1:] != states[:-1])
+    if not len(changes):
+        return np.empty(0), np.empty(0)
+    # the first sample outside the band on the other side of the level
+    after = outside[changes + 1]
+    rising = states[changes + 1] > 0
+    # the signal crosses the level (without hysteresis) for the last time before it leaves the band
+    above = adc_counts > level
+    level_changes = np.flatnonzero(above[1:] != above[:-1])
+    last_changes = level_changes[np.searchsorted(level_changes, after) - 1]
+    # linear interpolation between the samples on both sides of the level
+    values = adc_counts[last_changes].astype(np.float64)
+    next_values = adc_counts[last_changes + 1].astype(np.float64)
+    positions = last_changes + (level - values) / (next_values - values)
+    return positions[rising], positions[~rising]
+
+
+def _transition_time(edges, opposite_edges, start_crossings, end_crossings, sample_rate):
+    """
+    Get the mean time the signal needs to pass from one level (e.g. 10 %) to another (e.g. 90 %) for each edge (a
+    crossing of the 50 % level). Only crossings between the neighbouring crossings of the opposite direction belong to
+    an edge.
+    """
+    if not len(edges) or not len(start_crossings) or not len(end_crossings):
+        return math.nan
+    # the last start crossing before and the first end crossing after each edge
+    starts = np.searchsorted(start_crossings, edges) - 1
+    ends = np.searchsorted(end_crossings, edges)
+    valid = (starts >= 0) & (ends < len(end_crossings))
+    edges, starts, ends = edges[valid], start_crossings[starts[valid]], end_crossings[ends[valid]]
+    if len(opposite_edges):
+        # the crossings have to lie between the opposite edges around the edge
+        previous = np.searchsorted(opposite_edges, edges) - 1
+        previous_edges = np.where(previous >= 0, opposite_edges[np.maximum(previous, 0)], -np.inf)
+        next_index = previous + 1
+        next_edges = np.where(next_index < len(opposite_edges),
+                              opposite_edges[np.minimum(next_index, len(opposite_edges) - 1)], np.inf)
+        valid = (starts > previous_edges) & (ends < next_edges)
+        starts, ends = starts[valid], ends[valid]
+    if not len(starts):
+        return math.nan
+    return float(np.mean(ends - starts)) / sample_rate
+
+
+class RunningStatistics:
+    """
+    Statistics of a measurement over all records since the last reset (like the statistics of a bench oscilloscope).
+    Only the number of values, the mean, the sum of squared deviations (Welford's method), the minimum and the maximum
+    are kept, so the memory needed does not grow with the number of records. NaN values are not counted.
+
+    Attributes:
+        count (int): The number of values.
+        mean (float): The mean of the values.
+        min (float): The smallest value.
+        max (float): The largest value.
+    """
+    def __init__(self):
+        """
+        Class constructor.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Remove all values.
+        """
+        self.count = 0
+        self.mean = math.nan
+        self.min = math.nan
+        self.max = math.nan
+        self._squared_deviations = 0.0
+
+    def update(self, value):
+        """
+        Add a value.
+
+        Args:
+            value (float): The value of the measurement of a record.
+        """
+        if math.isnan(value):
+            return
+        self.count += 1
+        if self.count == 1:
+            self.mean = self.min = self.max = value
+            return
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._squared_deviations += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def stddev(self):
+        """
+        Get the standard deviation of the values.
+
+        Returns:
+            float: The sample standard deviation (NaN for fewer than two values).
+        """
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(self._squared_deviations / (self.count - 1))
+
+    def as_dict(self):
+        """
+        Get the statistics as dict.
+
+        Returns:
+            dict: 'count', 'mean', 'min', 'max' and 'stddev'.
+        """
+        return {'count': self.count, 'mean': self.mean, 'min': self.min, 'max': self.max, 'stddev': self.stddev}
@@ -1,14 +1,21 @@
 import threading
 import time
 import numpy as np
+import usb1
 from hantekosc.py_ht6022 import LibUsbScope
 
 from threading import Thread
-from queue import Queue
+from queue import Queue, Empty, Full
 
 from hantekosc.c_code import C_Code
 
+from hantekosc.calibration import Calibration
 from hantekosc.channel import Channel
+from hantekosc.math_channel import MathChannel
+from hantekosc.measurements import measure
+from hantekosc.pyramid import WaveformPyramid
+from hantekosc.record import Record, BufferPool, RecordStream
+from hantekosc.roll import RollBuffer, RollUpdate
 
 
 class Oscilloscope:
@@ -19,34 +26,90 @@ class Oscilloscope:
         c_code (C_Code): This object is used to call functions programmed in C language.
         scope (Oscilloscope): A oscilloscope object from Hantek6022API (https://github.com/Ho-Ro/Hantek6022API).
         running (bool): Indicates whether the device is currently running.
+        connected (bool): Indicates whether the device is connected. It is set to False when the device is unplugged.
+        auto_reconnect (bool): Restore the session automatically when the device is reconnected (default: True).
+        connection_callback: (OPTIONAL) A function called with the new connection state (bool) whenever the device is
+            disconnected or has been reconnected. It is called from the thread handling the USB events.
+        stop_callback: (OPTIONAL) A function called without arguments after the measurement has been stopped, also
+            when it stops itself in the 'SINGLE' trigger mode (then it is called from the processing thread).
+        last_recovery_time (float): The time in seconds it took to restore the session after the device was reconnected
+            the last time (None if it has not been reconnected yet).
+        handle_usb_events (bool): Indicates whether the USB events are handled in a separate thread started with the
+            measurement. Disable it if the events are handled elsewhere (e.g. in an asyncio event loop).
+        calibration (Calibration): The gain and offset corrections of the device used to convert ADC counts into
+            volts. They are read from the EEPROM once per device and cached on disk (see "load_calibration").
         channels (list): A list containing objects for each channel of the device.
+        math_channels (list): The virtual channels calculated from the physical channels for each record (see
+            "add_math_channel").
+        latest_roll_update (RollUpdate): The last update of the roll display in the 'ROLL' trigger mode (None if there
+            has not been an update yet).
+        latest_record (Record): The last published record of all channels (None if no record has been published yet).
+        processed_samples (int): The number of samples per channel processed since the measurement was started.
+        dropped_blocks (int): The number of data blocks dropped because the queue of the processing thread was full.
+        peak_detection (bool): Build the min/max/mean levels of each record while it is assembled, so envelopes for
+            any display width and zoom can be calculated quickly (see "Channel.peak_detect" and "Channel.view").
+            Default: True
+        filter_before_trigger (bool): Search the trigger in the filtered data of the channels that have a filter
+            (see "Channel.filter"). Otherwise, the trigger is searched in the unfiltered data. Default: True
+        record_condition (threading.Condition): Notified whenever a record is published or the measurement stops.
+        stop_count (int): The number of times the measurement has been stopped. Record streams end when it changes.
         settings_mutex (threading.lock): A mutex ensuring that only one setting can be made at a time.
     """
+    # The highest sample rate used for oversampling in the 'HIRES' acquisition mode (the highest rate that is
+    # transferred reliably with two channels) and the maximum number of samples averaged into one point.
+    MAX_HIRES_SAMPLE_RATE = 16e6
+    MAX_OVERSAMPLING = 64
 
-    def __init__(self, serial_number=None):
+    def __init__(self, serial_number=None, data_type='float32', context=None, scope=None):
         """
         Class constructor. Open the connection to the instrument using the Hantek6022API
         (https://github.com/Ho-Ro/Hantek6022API).
+
+        Args:
+            serial_number (str): (OPTIONAL) The serial number of the device. Default: use the first device found.
+            data_type (str): The data type of the published measurement data ('float32', 'float64' or 'uint8').
+            context (usb1.USBContext): (OPTIONAL) A USB context shared with other oscilloscopes.
+            scope: (OPTIONAL) The device object of the Hantek6022API to use, e.g. a simulated device
+                (see hantekosc.simulation.SimulatedScope). Default: a USB device.
         """
-        # ToDo: initialize device with serial number
         self.running = False
+        self.handle_usb_events = True
+        self.processed_samples = 0
+        self.peak_detection = True
+        self.filter_before_trigger = True
 
         self.c_code = C_Code()
 
-        self.scope = LibUsbScope.Oscilloscope()
+        self.scope = scope if scope is not None else LibUsbScope.Oscilloscope(context=context)
         # connect to device
-        if not self.scope.setup() or not self.scope.open_handle():
+        if not self._setup_device(serial_number) or not self.scope.open_handle():
+            if serial_number is not None:
+                raise RuntimeError(f"Could not find the hantek device with the serial number '{serial_number}'")
             raise RuntimeError("Could not find any hantek devices")
 
         # upload correct firmware into device's RAM
         if not self.scope.is_device_firmware_present:
             self.scope.flash_firmware() #firmware=PyHT6022.Firmware.mod_firmware_01)
         self.scope.set_num_channels(2)
+        self.calibration = Calibration.load(self.scope)
+
+        # the port of the device is used to recognize it when it is reconnected
+        self._port = self.scope.get_port()
+        self.connected = True
+        self.auto_reconnect = True
+        self.connection_callback = None
+        self.stop_callback = None
+        self.last_recovery_time = None
+        self._recovering = False
+        self._recovery_thread = None
+        self.scope.register_hotplug_callback(self._hotplug_callback)
 
         self._blockslope = 0.00000207
 
         # event to stop async data reading thread
         self._shutdown_event = None
+        self._process_data_thread = None
+        self._retriever_thread = None
         # calculated when setting presample ratio
         self._number_of_presample_points = 0
         # Size of a block read from the device via USB (calculated when setting sample rate)
@@ -54,12 +117,61 @@ class Oscilloscope:
         self._record_length = 0
         self._sample_rate = 0
         self._sample_id = 0
+        # the id of the sample rate selected by the user (the device samples faster in the 'HIRES' mode)
+        self._requested_sample_id = 0
         self._pre_sample_ratio = 0
         self._trigger_mode = ''
         self._selected_channel = 0
+        self._data_type = ''
+        self._acquisition_mode = 'NORMAL'
+        self._number_of_averages = 16
+        # the number of samples captured per published point in the 'HIRES' acquisition mode
+        self._oversampling = 1
+        # the records averaged in the 'AVERAGE' mode, their sum and the accumulator of the 'EXPONENTIAL_AVERAGE' mode
+        # (allocated when they are needed)
+        self._average_history = None
+        self._average_sum = None
+        self._average_accumulator = None
+        self._average_count = 0
+        self._average_index = 0
 
         self._raw_data = Queue(maxsize=50)
-        self._previous_voltage_data = [np.zeros(self._record_length), np.zeros(self._record_length)]
+        self.dropped_blocks = 0
+        # increased whenever a setting of the device changes, so blocks captured with the old settings are discarded
+        self._capture_generation = 0
+        # buffers used to assemble a record from the raw data blocks (allocated when setting the record length)
+        self._record = None
+        self._presample_history = None
+        # position in the record buffer up to which it is filled (None: waiting for the trigger event)
+        self._record_position = None
+        # the min/max/mean levels of the record being assembled (built while the blocks arrive)
+        self._pyramid = None
+        # the threads calculating the spectra and saving the failed records of the mask tests of the channels
+        self._worker_executor = None
+        # the sample rate, record length, index of the first point and data type the timing data was created for
+        self._published_timing_key = None
+        self._timing_data = None
+        # buffers for the record being assembled and the published records (triple buffer, a buffer is reused once no
+        # reader references it anymore)
+        self._record_buffers = BufferPool(number_of_buffers=4)
+        # buffers for the data of the math channels and the voltages they are calculated from in the 'uint8' data mode
+        self._math_buffers = BufferPool(number_of_buffers=4)
+        self._math_inputs = None
+        # buffers for the ADC counts of the filtered channels (reused for each block)
+        self._filter_buffers = None
+        self._record_id = 0
+        self.latest_record = None
+        self.record_condition = threading.Condition()
+        self.stop_count = 0
+        # record streams and asyncio futures waiting for the next record
+        self._record_streams = []
+        self._async_waiters = []
+        # the display buffer of the 'ROLL' trigger mode, its updates and the streams and futures waiting for them
+        self._roll_buffer = None
+        self._roll_update_id = 0
+        self.latest_roll_update = None
+        self._roll_streams = []
+        self._roll_waiters = []
 
         self.settings_mutex = threading.Lock()
 
@@ -69,7 +181,9 @@ class Oscilloscope:
         self.pre_sample_ratio = 0.5
         self.trigger_mode = 'REPEAT'  # SINGLE, AUTO, REPEAT
         self.selected_channel = 0
+        self.data_type = data_type
         self.channels = [Channel(self, 0), Channel(self, 1)]
+        self.math_channels = []
 
     def __del__(self):
         """
@@ -79,18 +193,51 @@ class Oscilloscope:
             self.stop()
             self.scope.close_handle()
 
-    def retrieve_callback(self, ch1_data, ch2_data):
+    def _setup_device(self, serial_number):
+        """
+        Find the device with the given serial number.
+        Devices without firmware do not report a serial number, so if the device is not found, the firmware is uploaded
+        to these devices one after another until the device is found.
+
+        Args:
+            serial_number (str): The serial number of the device. None: use the first device found.
+
+        Returns:
+            bool: True if the device was found.
+        """
+        if self.scope.setup(serial_number=serial_number):
+            return True
+        if serial_number is None:
+            return False
+        for port in self.scope.list_device_ports(firmware_present=False):
+            if not self.scope.setup(port=port) or not self.scope.open_handle():
+                continue
+            self.scope.flash_firmware()
+            if self.scope.get_serial_number_string() == serial_number:
+                return True
+            self.scope.close_handle()
+        return False
+
+    def retrieve_callback(self, ch1_data, ch2_data, capture_generation):
         """
         This callback is called whenever new measurement data is available.
         The data is then putted into a queue to be processed in another thread.
 
         Args:
-            ch1_data (list): Measurement data of the first channel.
-            ch2_data (list): Measurement data of the second channel.
+            ch1_data (bytes): Measurement data (ADC counts) of the first channel.
+            ch2_data (bytes): Measurement data (ADC counts) of the second channel.
+            capture_generation (int): The capture generation the transfer was submitted in (its tag). A callback may
+                still run after the transfers have been cancelled, so blocks of older generations are discarded.
         """
-        # append data to queue
+        # append data to queue (nobody takes it out anymore once the measurement is stopped)
+        if not self.running or capture_generation != self._capture_generation:
+            return
         if len(ch1_data) == self._blocksize and len(ch2_data) == self._blocksize:
-            self._raw_data.put((ch1_data, ch2_data))
+            # the thread handling the USB events must never block, so the block is dropped if the queue is full
+            try:
+                self._raw_data.put_nowait((capture_generation, ch1_data, ch2_data))
+            except Full:
+                self.dropped_blocks += 1
 
     def retrieve(self):
         """
@@ -103,237 +250,1023 @@ class Oscilloscope:
         """
         Start the measurement.
         """
-        self._previous_voltage_data = [np.zeros(self._record_length), np.zeros(self._record_length)]
+        self._arm()
+        self.scope.start_capture()
+
+    def _arm(self):
+        """
+        Prepare everything for the measurement (threads and transfers), so only the capture needs to be started on the
+        device. This allows starting several devices with a minimal time offset (see ScopeGroup).
+        """
+        self._reset_record()
+        self._reset_filters()
+        self.processed_samples = 0
+        self.dropped_blocks = 0
+        # the blocks of the transfers of the last measurement are discarded
+        self._capture_generation += 1
+        self._clear_raw_data()
         self.running = True
 
-        process_data_thread = Thread(target=self._process_data)
-        process_data_thread.start()
+        self._process_data_thread = Thread(target=self._process_data)
+        self._process_data_thread.start()
 
-        self.scope.start_capture()
-        self._shutdown_event = self.scope.read_async(self.retrieve_callback, 2 * self._blocksize,
-                                                     outstanding_transfers=10)
+        if self._shutdown_event is None:
+            self._shutdown_event = self.scope.read_async(self.retrieve_callback, 2 * self._blocksize,
+                                                         outstanding_transfers=10, raw=True,
+                                                         tag=self._capture_generation)
+        else:
+            # reuse the transfers of the last measurement
+            self._shutdown_event = self.scope.resubmit_async(2 * self._blocksize, tag=self._capture_generation)
 
-        retriever_thread = Thread(target=self.retrieve)
-        retriever_thread.start()
+        if self.handle_usb_events:
+            self._retriever_thread = Thread(target=self.retrieve)
+            self._retriever_thread.start()
 
-    def stop(self):
+    def stop(self, timeout=1):
         """
         Stop the measurement.
+        All outstanding transfers are cancelled and the threads are joined, so no data is received and no record is
+        published after this function returns.
+
+        Args:
+            timeout (float): (OPTIONAL) The maximum time in seconds to wait for the transfers and for each thread.
+
+        Returns:
+            float: The time in seconds it took to stop the measurement.
         """
+        start_time = time.perf_counter()
         self.running = False
-        self._shutdown_event.set()
-        time.sleep(1)
-        self._raw_data.queue.clear()
+        if not self.scope.cancel_async(timeout):
+            print('Could not cancel all outstanding transfers.')
+        if self.connected:
+            self.scope.stop_capture()
+
+        # wake up the threads waiting for data blocks or USB events
+        try:
+            self._raw_data.put_nowait(None)
+        except Full:
+            # the processing thread is not waiting for data
+            pass
+        if self._retriever_thread is not None:
+            self.scope.interrupt_poll()
+        with self.record_condition:
+            self.stop_count += 1
+            for loop, future in self._async_waiters + self._roll_waiters:
+                loop.call_soon_threadsafe(self._resolve_future, future, None)
+            self._async_waiters.clear()
+            self._roll_waiters.clear()
+            self.record_condition.notify_all()
+
+        for thread in (self._process_data_thread, self._retriever_thread):
+            # in the 'SINGLE' trigger mode, the measurement is stopped by the processing thread itself
+            if thread is None or thread is threading.current_thread():
+                continue
+            thread.join(timeout)
+            if thread.is_alive():
+                print(f'Thread {thread.name} did not stop within {timeout} s.')
+        self._retriever_thread = None
+        self._clear_raw_data()
+        if self._worker_executor is not None:
+            # finish the spectra and the saving of the last records
+            self._worker_executor.shutdown(wait=True)
+            self._worker_executor = None
+        if self.stop_callback is not None:
+            self.stop_callback()
+        return time.perf_counter() - start_time
+
+    def _pause_capture(self):
+        """
+        Quiesce the data acquisition before a setting of the device is changed while it is running.
+        All outstanding transfers are cancelled and given back by libusb before this function returns, the threads keep
+        running. Must be called with the settings mutex held.
+        """
+        if not self.scope.cancel_async():
+            print('Could not cancel all outstanding transfers.')
+        self.scope.stop_capture()
+
+    def _resume_capture(self):
+        """
+        Resume the data acquisition after a setting of the device has been changed.
+        Only the data captured with the old settings is discarded (the queued blocks and the record currently
+        assembled), the transfers are reused with the current block size. Must be called with the settings mutex held.
+        """
+        self._capture_generation += 1
+        self._clear_raw_data()
+        self._reset_record()
+        self._reset_filters()
+        self.scope.resubmit_async(2 * self._blocksize, tag=self._capture_generation)
+        self.scope.start_capture()
+
+    def _hotplug_callback(self, arrived, port):
+        """
+        This callback is called whenever a scope is connected or disconnected (while the USB events are handled).
+        As no libusb function may be called here, the session is restored in a separate thread.
+
+        Args:
+            arrived (bool): True if a device has been connected, False if it has been disconnected.
+            port (tuple): The port of the device as (bus number, port numbers).
+        """
+        # the device re-enumerates while the firmware is uploaded during the recovery
+        if port != self._port or self._recovering:
+            return
+        if not arrived:
+            if self.connected:
+                self.connected = False
+                print('The device has been disconnected.')
+                if self.connection_callback is not None:
+                    self.connection_callback(False)
+        elif not self.connected and self.auto_reconnect:
+            self._recovering = True
+            # a daemon thread, so that a recovery waiting for the device does not keep the process alive
+            self._recovery_thread = Thread(target=self._recover, daemon=True)
+            self._recovery_thread.start()
+
+    def _recover(self, timeout=5):
+        """
+        Restore the session after the device has been reconnected: Upload the firmware, restore the settings of the
+        device and resume the measurement if it is running. The processing and the USB event threads keep running.
+
+        Args:
+            timeout (float): (OPTIONAL) The maximum time in seconds to wait until the device can be opened.
+        """
+        start_time = time.perf_counter()
+        self.settings_mutex.acquire()
+        try:
+            # the transfers and the handle belong to the device that has been disconnected
+            self.scope.close_handle(release_interface=False)
+            self._shutdown_event = None
+            self.scope.device = None
+            # the device might not be accessible right after it has been connected (e.g. until udev changed the
+            # permissions)
+            deadline = start_time + timeout
+            while not (self.scope.setup(port=self._port) and self._open_handle()):
+                if time.perf_counter() > deadline:
+                    print('Could not reconnect to the device.')
+                    return
+                time.sleep(0.05)
+            if not self.scope.is_device_firmware_present:
+                self.scope.flash_firmware()
+            self.scope.set_num_channels(2)
+            self._restore_device_settings()
+
+            if self.running:
+                # discard the data received before the device was disconnected
+                self._capture_generation += 1
+                self._clear_raw_data()
+                self._reset_record()
+                self._shutdown_event = self.scope.read_async(self.retrieve_callback, 2 * self._blocksize,
+                                                             outstanding_transfers=10, raw=True,
+                                                             tag=self._capture_generation)
+                self.scope.start_capture()
+            self.connected = True
+            self.last_recovery_time = time.perf_counter() - start_time
+        finally:
+            self._recovering = False
+            self.settings_mutex.release()
+        print(f'The device has been reconnected (recovered in {self.last_recovery_time:.3f} s).')
+        if self.connection_callback is not None:
+            self.connection_callback(True)
+
+    def _open_handle(self):
+        try:
+            return self.scope.open_handle()
+        except usb1.USBError:
+            return False
+
+    def _restore_device_settings(self):
+        """
+        Send the current settings to the device again (e.g. after it has been reconnected).
+        The calibration values are kept on the host and do not need to be restored.
+        """
+        self.scope.set_sample_rate(self._sample_id)
+        self.scope.set_ch1_voltage_range(self.channels[0].voltage_index)
+        self.scope.set_ch2_voltage_range(self.channels[1].voltage_index)
+        self.scope.set_ch1_ch2_ac_dc(self.scope.ac_dc_status)
 
     def _process_data(self):
         """
         Here the measurement data are processed in a separate thread.
-        An array with the time units and an array with the measurement data starting from the trigger point are created.
-        In addition, an array is created in which the measurement data is stored that is temporally located before the
-        trigger.
+        The data blocks are taken from the queue one at a time. Until the trigger fires, the last samples are kept as
+        pre-trigger data. Afterwards, the blocks are copied into the record buffer until the record is complete.
+        Records are assembled as raw ADC counts and converted into volts only once, when they are published.
         This function is time critical. If the function takes too long, the queue fills up and measurement data is lost.
         """
         while self.running:
-            # Although this function is time-critical, a short time can be waited to avoid overloading the processor.
-            # This time might depend on the hardware of the user device.
-            time.sleep(0.01)
+            block = self._raw_data.get()
+            # "None" is put into the queue to stop the thread
+            if block is None:
+                break
+            capture_generation, ch1_data, ch2_data = block
             self.settings_mutex.acquire()
             loop_is_to_slow = False
-            if self.running:
-                voltage_data = self._get_voltage_data_block()
-                if self.trigger_mode == 'SINGLE' or self.trigger_mode == 'REPEAT':
-                    trigger_position = self._find_trigger_position(voltage_data)
-                    end_position = self.record_length - self._number_of_presample_points
-                    # system triggered
-                    if trigger_position >= 0:
-                        # add points before trigger event to _previous_raw_data array
-                        for i in range(self.number_of_channels):
-                            prev_data = self._previous_voltage_data[i]
-                            prev_data = np.hstack((prev_data, voltage_data[i][:trigger_position]))
-                            self._previous_voltage_data[i] = prev_data[len(prev_data) - self.record_length:]
-                            voltage_data[i] = voltage_data[i][trigger_position:]
-                        # More data is needed than available in one block --> More blocks must be loaded
-                        if trigger_position + end_position > self._blocksize:
-                            # Points that do not fit into the first block
-                            remaining_points = ((self.record_length - self._number_of_presample_points) -
-                                                (self._blocksize - trigger_position))
-                            # Number of blocks that still need to be loaded
-                            number_of_blocks = int(np.ceil(remaining_points / self._blocksize))
-                            # get needed blocks
-                            for i in range(number_of_blocks):
-                                voltage_data_block = self._get_voltage_data_block()
-                                for j in range(self.number_of_channels):
-                                    voltage_data[j] = np.hstack((voltage_data[j], voltage_data_block[j]))
-
-                    # Calculate the array with the timing points
-                    presample_timing_data = self._create_presample_timing_data(self._number_of_presample_points)
-                    timing_data_ = self._create_timing_data(self.record_length - self._number_of_presample_points)
-                    timing_data = np.hstack((presample_timing_data, timing_data_))
-
-                    # Merge the array containing the measurement data from pre-trigger data
-                    # and the data starting from the trigger event
-                    for i in range(self.number_of_channels):
-                        previous_data_start_pos = len(self._previous_voltage_data[i]) - self._number_of_presample_points
-                        voltage_data[i] = np.hstack(
-                            (self._previous_voltage_data[i][previous_data_start_pos:], voltage_data[i]))
-                        if trigger_position >= 0:
-                            self.channels[i].retrieved_data = np.vstack(
-                                (timing_data, voltage_data[i][:self.record_length]))
-                        self._previous_voltage_data[i] = voltage_data[i]
-                        self._previous_voltage_data[i] = self._previous_voltage_data[i][
-                                                         len(self._previous_voltage_data[i]) - self.record_length:]
-                        self.channels[i].new_data_ready = True
-                    # If the trigger mode is "SINGLE", stop after a trigger event
-                    if self.trigger_mode == 'SINGLE' and trigger_position >= 0:
-                        self.stop()
-                # No trigger, just get data blocks
-                else:
-                    timing_data = self._create_timing_data(self.record_length)
-                    # More data is needed than available in one block --> More blocks must be loaded
-                    if self.record_length > self._blocksize:
-                        number_of_blocks = int(np.ceil((self.record_length - self._blocksize) / self._blocksize))
-                        for i in range(number_of_blocks):
-                            voltage_data_block = self._get_voltage_data_block()
-                            for j in range(self.number_of_channels):
-                                voltage_data[j] = np.hstack((voltage_data[j], voltage_data_block[j]))
-
-                    for i in range(self.number_of_channels):
-                        self.channels[i].data_mutex.acquire()
-                        self.channels[i].retrieved_data = np.vstack((timing_data, voltage_data[i][:self.record_length]))
-                        self.channels[i].new_data_ready = True
-                        self.channels[i].data_mutex.release()
+            # blocks captured before the last change of the device settings are discarded
+            if self.running and capture_generation == self._capture_generation:
+                self.processed_samples += len(ch1_data)
+                self._process_block(np.frombuffer(ch1_data, dtype=np.uint8), np.frombuffer(ch2_data, dtype=np.uint8))
 
                 # clear queue if the program is too slow
                 if self._raw_data.qsize() > 48:
                     print('Data processing is too slow.')
-                    for i in range(48):
-                        self._raw_data.get()
+                    self._clear_raw_data()
                     loop_is_to_slow = True
 
             self.settings_mutex.release()
             if loop_is_to_slow:
                 self.pre_sample_ratio = 0
 
-    def _find_trigger_position(self, voltage_data):
+    def _clear_raw_data(self):
         """
-        Get the array position at which the trigger level value is exceeded.
+        Discard the queued data blocks. The queue is drained with "get_nowait", so a thread waiting to put a block is
+        woken up (clearing the underlying deque would not notify it).
+        """
+        try:
+            while True:
+                self._raw_data.get_nowait()
+        except Empty:
+            pass
+
+    def _process_block(self, *block):
+        """
+        Add a data block to the record that is currently assembled.
+
+        Args:
+            block (numpy.array): The ADC counts of the block for each channel.
+        """
+        start_position = 0
+        trigger_data = block[self.selected_channel]
+        if any(channel.filter is not None for channel in self.channels[:self.number_of_channels]):
+            block = self._filter_block(block)
+            if self.filter_before_trigger:
+                trigger_data = block[self.selected_channel]
+        if self.trigger_mode == 'SINGLE' or self.trigger_mode == 'REPEAT':
+            if self._record_position is None:
+                trigger_position = self._find_trigger_position(trigger_data)
+                # system triggered
+                if trigger_position >= 0:
+                    self._copy_presamples(block, trigger_position)
+                    self._record_position = self._number_of_presample_points
+                    start_position = trigger_position
+            if self._record_position is not None:
+                self._append_to_record(block, start_position)
+            self._update_presample_history(block)
+        elif self.trigger_mode == 'ROLL':
+            self._publish_roll_update(block)
+        # No trigger, just get data blocks
+        else:
+            if self._record_position is None:
+                self._record_position = 0
+            self._append_to_record(block, start_position)
+
+    def _publish_roll_update(self, block):
+        """
+        Append a data block to the roll display and publish the new samples (converted into the selected data type)
+        as update. The work is proportional to the block size, not to the record length.
 
         Args:
-            voltage_data (list): The array containing the measurement data for both channels.
+            block (tuple): The ADC counts of the block for each channel.
+        """
+        start_index = self._roll_buffer.total_samples
+        self._roll_buffer.append(block)
+        channels = self.channels[:self.number_of_channels]
+        scale_factors, offsets = zip(*(self._get_conversion_values(channel.ch_number) for channel in channels))
+        if self.data_type == 'uint8':
+            data = np.array([block[channel.ch_number] for channel in channels])
+        else:
+            data = np.empty((len(channels), len(block[0])), dtype=self.data_type)
+            self._convert_channels_to_voltage(block, data, scale_factors, offsets)
+        self._roll_update_id += 1
+        update = RollUpdate(self._roll_update_id, start_index, data, self.data_type, scale_factors, offsets,
+                            self.sample_rate)
+        with self.record_condition:
+            self.latest_roll_update = update
+            for roll_stream in self._roll_streams:
+                roll_stream.put(update)
+            for loop, future in self._roll_waiters:
+                loop.call_soon_threadsafe(self._resolve_future, future, update)
+            self._roll_waiters.clear()
+            self.record_condition.notify_all()
+
+    def roll_data(self):
+        """
+        Get the whole roll display in chronological order (the last "record_length" samples of the 'ROLL' trigger
+        mode), e.g. to redraw it after a pause. Use "roll_updates" to follow the display incrementally.
+
         Returns:
-            The array position of the selected channel where the trigger level value is hit or crossed.
+            tuple: The id of the last update, the time of each sample in seconds (relative to the start of the
+                measurement) and the data of each channel (volts, or ADC counts in the 'uint8' data mode).
         """
+        roll_buffer = self._roll_buffer
+        if roll_buffer is None:
+            return 0, np.empty(0), np.empty((self.number_of_channels, 0))
+        update_id = self.latest_roll_update_id
+        first_index, adc_counts = roll_buffer.snapshot()
+        adc_counts = adc_counts[:self.number_of_channels]
+        timing_data = (first_index + np.arange(adc_counts.shape[1])) / self.sample_rate
+        if self.data_type == 'uint8':
+            return update_id, timing_data, adc_counts
+        channels = self.channels[:self.number_of_channels]
+        scale_factors, offsets = zip(*(self._get_conversion_values(channel.ch_number) for channel in channels))
+        data = np.empty(adc_counts.shape, dtype=self.data_type)
+        self._convert_channels_to_voltage(adc_counts, data, scale_factors, offsets)
+        return update_id, timing_data, data
+
+    def _convert_channels_to_voltage(self, adc_counts, out, scale_factors, offsets):
+        """
+        Convert the ADC counts of the enabled channels into voltages. Pairs of channels are converted with a single
+        call of the C code.
 
-        # find rising or falling edge
-        # https://stackoverflow.com/questions/50365310/python-rising-falling-edge-oscilloscope-like-trigger
-        selected_channel = self.channels[self.selected_channel]
+        Args:
+            adc_counts: The uint8 ADC counts of each channel.
+            out (numpy.array): The float32 or float64 array the voltages are written to (one row per channel).
+            scale_factors (tuple): The scale factor of each channel.
+            offsets (tuple): The offset of each channel.
+        """
+        if not self.c_code.c_code_loaded:
+            for i in range(len(out)):
+                np.subtract(adc_counts[i], 128 + offsets[i], out=out[i], dtype=out.dtype)
+                out[i] *= scale_factors[i]
+            return
+        for i in range(0, len(out) - 1, 2):
+            self.c_code.convert_channels_to_voltage(adc_counts[i], adc_counts[i + 1], out[i:i + 2],
+                                                    scale_factors[i:i + 2], offsets[i:i + 2])
+        if len(out) % 2:
+            last = len(out) - 1
+            self.c_code.convert_to_voltage(adc_counts[last], scale_factors[last], offsets[last], out=out[last])
+
+    def roll_updates(self, maxsize=64, timeout=None):
+        """
+        Get an iterator yielding each update of the roll display ('ROLL' trigger mode) exactly once, like "records".
 
-        if self.c_code.c_code_loaded:
-            trigger_pos = self.c_code.find_trigger_position(voltage_data[self.selected_channel],
-                                                            selected_channel.trigger_level,
-                                                            selected_channel.trigger_kind)
-            return trigger_pos
+        Args:
+            maxsize (int): (OPTIONAL) The maximum number of buffered updates.
+            timeout (float): (OPTIONAL) The maximum time to wait for an update in seconds. Default: wait forever.
+
+        Returns:
+            RecordStream: The iterator yielding RollUpdate objects.
+        """
+        roll_stream = RecordStream(self, maxsize, timeout, roll_updates=True)
+        with self.record_condition:
+            self._roll_streams.append(roll_stream)
+        return roll_stream
+
+    @property
+    def latest_roll_update_id(self):
+        """
+        Get the id of the last update of the roll display.
+
+        Returns:
+            int: The update id (0 if there has not been an update yet).
+        """
+        update = self.latest_roll_update
+        return update.update_id if update is not None else 0
+
+    async def next_roll_update(self, after_id=None):
+        """
+        Wait (without blocking the event loop) until an update of the roll display newer than the given id has been
+        published.
+
+        Args:
+            after_id (int): (OPTIONAL) The id of the last known update. Default: the id of the latest update.
+
+        Returns:
+            RollUpdate: The latest update, or None if the measurement was stopped.
+        """
+        with self.record_condition:
+            update = self.latest_roll_update
+            if after_id is not None and update is not None and update.update_id > after_id:
+                return update
+            future = self._add_waiter(roll_updates=True)
+        return await future
+
+    def _reset_filters(self):
+        """
+        Clear the state of the filters of the channels when the data stream starts again.
+        """
+        for channel in self.channels:
+            if channel.filter is not None:
+                channel.filter.reset()
+
+    def _filter_block(self, block):
+        """
+        Apply the filters of the channels to a data block. The ADC counts are filtered relative to 128 and rounded to
+        ADC counts again.
+
+        Args:
+            block (tuple): The ADC counts of the block for each channel.
+
+        Returns:
+            tuple: The filtered ADC counts for each channel (the unfiltered counts of channels without filter). The
+                arrays are overwritten by the next block.
+        """
+        block_length = len(block[0])
+        if self._filter_buffers is None or self._filter_buffers.shape[1] < block_length:
+            self._filter_buffers = np.empty((self.number_of_channels, block_length), dtype=np.uint8)
+        filtered_block = []
+        for i, data in enumerate(block):
+            filter_ = self.channels[i].filter
+            if filter_ is None:
+                filtered_block.append(data)
+                continue
+            out = self._filter_buffers[i, :block_length]
+            if self.c_code.c_code_loaded:
+                values = filter_.process(self.c_code.convert_to_voltage(data, 1, 0, dtype=np.float32))
+                self.c_code.round_to_adc_counts(values, out)
+            else:
+                values = filter_.process(np.subtract(data, 128, dtype=np.float32))
+                np.clip(np.rint(values), -128, 127, out=values)
+                np.add(values, 128, out=out, casting='unsafe')
+            filtered_block.append(out)
+        return tuple(filtered_block)
+
+    def _copy_presamples(self, block, trigger_position):
+        """
+        Copy the samples located before the trigger event to the beginning of the record.
+
+        Args:
+            block (tuple): The ADC counts of the current block for each channel.
+            trigger_position (int): The position of the trigger event in the block.
+        """
+        number_of_presamples = self._number_of_presample_points
+        if number_of_presamples == 0:
+            return
+        for i in range(self.number_of_channels):
+            if trigger_position >= number_of_presamples:
+                self._record[i, :number_of_presamples] = block[i][trigger_position - number_of_presamples:
+                                                                 trigger_position]
+            else:
+                # the pre-trigger data starts in one of the previous blocks
+                self._record[i, :number_of_presamples - trigger_position] = self._presample_history[i,
+                                                                                                   trigger_position:]
+                self._record[i, number_of_presamples - trigger_position:number_of_presamples] = \
+                    block[i][:trigger_position]
+
+    def _update_presample_history(self, block):
+        """
+        Keep the last samples of the data stream, as they might be needed as pre-trigger data of the next record.
+
+        Args:
+            block (tuple): The ADC counts of the current block for each channel.
+        """
+        history_length = self._presample_history.shape[1]
+        if history_length == 0:
+            return
+        block_length = len(block[0])
+        for i in range(self.number_of_channels):
+            if block_length >= history_length:
+                self._presample_history[i] = block[i][block_length - history_length:]
+            else:
+                self._presample_history[i, :history_length - block_length] = self._presample_history[i,
+                                                                                                      block_length:]
+                self._presample_history[i, history_length - block_length:] = block[i]
+
+    def _append_to_record(self, block, start_position):
+        """
+        Copy data of a block into the record buffer and publish the record as soon as it is complete.
+        The samples of the block that are not needed anymore are discarded.
+
+        Args:
+            block (tuple): The ADC counts of the current block for each channel.
+            start_position (int): The position of the first sample in the block that belongs to the record.
+        """
+        record_length = self._record.shape[1]
+        # in the other acquisition modes the published data is not the assembled ADC counts
+        if self._pyramid is None and self.peak_detection and self._acquisition_mode == 'NORMAL':
+            self._pyramid = WaveformPyramid(record_length, self.number_of_channels, c_code=self.c_code)
+        number_of_points = min(record_length - self._record_position, len(block[0]) - start_position)
+        for i in range(self.number_of_channels):
+            self._record[i, self._record_position:self._record_position + number_of_points] = \
+                block[i][start_position:start_position + number_of_points]
+        self._record_position += number_of_points
+        if self._pyramid is not None:
+            self._pyramid.update(self._record, self._record_position)
+
+        if self._record_position == record_length:
+            self._record_position = None
+            self._publish_record()
+            # If the trigger mode is "SINGLE", stop after a trigger event
+            if self.trigger_mode == 'SINGLE':
+                self.stop()
+
+    def _publish_record(self):
+        """
+        Convert the completed record into the selected data type and publish it as an immutable snapshot.
+        Both channels are converted with a single call into a buffer that is not referenced by any reader. If the data
+        type is 'uint8', the ADC counts are published together with the values needed to convert them into volts.
+        """
+        # in the trigger modes the time is relative to the trigger point
+        if self.trigger_mode == 'SINGLE' or self.trigger_mode == 'REPEAT':
+            first_index = -(self._number_of_presample_points // self._oversampling)
         else:
-            # find rising or falling edge
-            # https://stackoverflow.com/questions/50365310/python-rising-falling-edge-oscilloscope-like-trigger
-            thresholded_array = np.where(voltage_data[self.selected_channel] > selected_channel.trigger_level, 1, -1)
-            convolution_array = [1, -1]
-            convolution = np.convolve(thresholded_array, convolution_array, mode='same')
-            if self.channels[self.selected_channel].trigger_kind == 'RISING':
-                argmax = np.argmax(convolution)
-                if convolution[argmax] == len(convolution_array):
-                    trigger_pos = argmax
+            first_index = 0
+        timing_key = (self.sample_rate, self.record_length, first_index, self.data_type)
+        if timing_key != self._published_timing_key:
+            # Calculate the array with the timing points
+            self._timing_data = self._create_timing_data(self.record_length, first_index)
+            self._published_timing_key = timing_key
+
+        scale_factors, offsets = zip(*(self._get_conversion_values(i) for i in range(self.number_of_channels)))
+        if self._acquisition_mode != 'NORMAL':
+            data = self._record_buffers.acquire((self._record.shape[0], self.record_length), self.data_type)
+            self._acquire_averaged_data(data, scale_factors, offsets)
+        elif self.data_type == 'uint8':
+            # publish the record buffer itself and assemble the next record in another buffer
+            data = self._record
+            self._record = self._record_buffers.acquire(data.shape, np.uint8)
+        else:
+            data = self._record_buffers.acquire(self._record.shape, self.data_type)
+            self._convert_channels_to_voltage(self._record, data, scale_factors, offsets)
+
+        # the last entries of the min/max/mean levels are added before the record buffer is reused
+        pyramid = self._pyramid
+        self._pyramid = None
+        if pyramid is not None:
+            pyramid.finish(data, self._record if self.data_type != 'uint8' else data)
+
+        # the measurements of the enabled channels are calculated once from the ADC counts
+        adc_counts = self._record if self.data_type != 'uint8' else data
+        measurements = [measure(adc_counts[i], self.sample_rate, scale_factors[i], offsets[i], self.c_code)
+                        if self.channels[i].measurements_enabled and self._acquisition_mode == 'NORMAL' else None
+                        for i in range(self.number_of_channels)]
+
+        # the persistence histograms count the ADC counts of the record (all samples in the 'HIRES' mode)
+        for i in range(self.number_of_channels):
+            if self.channels[i].persistence is not None and len(self._timing_data):
+                self.channels[i].persistence.add(adc_counts[i], (float(self._timing_data[0]),
+                                                                 float(self._timing_data[-1])),
+                                                 (scale_factors[i], offsets[i]))
+
+        math_data = self._calculate_math_channels(data, scale_factors, offsets)
+
+        self._record_id += 1
+        record = Record(self._record_id, self._timing_data, data, self.data_type, scale_factors, offsets,
+                        self.sample_rate, pyramid, measurements, math_data)
+        # in the other acquisition modes the measurements are calculated from the published data
+        measurements = [record.measure(i) if self.channels[i].measurements_enabled else None
+                        for i in range(self.number_of_channels)]
+        with self.record_condition:
+            for channel, channel_measurements in zip(self.channels, measurements):
+                if channel_measurements is not None:
+                    channel.update_statistics(channel_measurements)
+            self.latest_record = record
+            for record_stream in self._record_streams:
+                record_stream.put(record)
+            for loop, future in self._async_waiters:
+                loop.call_soon_threadsafe(self._resolve_future, future, record)
+            self._async_waiters.clear()
+            self.record_condition.notify_all()
+
+        for channel in self.channels[:self.number_of_channels]:
+            if channel.spectrum_analyzer is not None:
+                channel.spectrum_analyzer.submit(record, channel.ch_number, self._get_worker_executor())
+            # the raw ADC counts are tested, in the other acquisition modes the published data
+            if channel.mask_test is not None:
+                channel.mask_test.add_record(record, channel.ch_number, adc_counts[channel.ch_number]
+                                             if self._acquisition_mode == 'NORMAL' else None,
+                                             self._get_worker_executor())
+
+    def _calculate_math_channels(self, data, scale_factors, offsets):
+        """
+        Calculate the math channels of the completed record. The data of all math channels is written into one buffer
+        that is not referenced by any reader (float32 in the 'uint8' data mode).
+
+        Args:
+            data (numpy.array): The published data of the record.
+            scale_factors (tuple): The scale factor of each channel.
+            offsets (tuple): The offset of each channel.
+
+        Returns:
+            dict: The data of each math channel by its name (None if there are no math channels).
+        """
+        math_channels = self.math_channels
+        if not math_channels:
+            return None
+        if self.data_type == 'uint8':
+            # the math channels are calculated from the voltages
+            if self._math_inputs is None or self._math_inputs.shape != data.shape:
+                self._math_inputs = np.empty(data.shape, dtype=np.float32)
+            channel_data = self._math_inputs
+            self._convert_channels_to_voltage(data, channel_data, scale_factors, offsets)
+        else:
+            channel_data = data
+        math_data = self._math_buffers.acquire((len(math_channels), data.shape[1]), channel_data.dtype)
+        for math_channel, out in zip(math_channels, math_data):
+            math_channel.evaluate(channel_data, out)
+        return {math_channel.id: out for math_channel, out in zip(math_channels, math_data)}
+
+    def add_math_channel(self, expression, name=None):
+        """
+        Add a virtual channel calculated from the physical channels for each record, e.g. 'CH1 - CH2' or 'CH1 * CH2'
+        (see "hantekosc.math_channel.MathChannel"). Its data is published in "Record.math_data" together with the
+        physical channels.
+
+        Args:
+            expression (str): The expression.
+            name (str): (OPTIONAL) The name of the math channel. Default: 'MATH1', 'MATH2', ...
+
+        Returns:
+            MathChannel: The math channel.
+        """
+        names = [math_channel.id for math_channel in self.math_channels]
+        if name is None:
+            number = 1
+            while f'MATH{number}' in names:
+                number += 1
+            name = f'MATH{number}'
+        elif name in names or name in (channel.id for channel in self.channels):
+            raise ValueError(f'There already is a channel named {name!r}.')
+        math_channel = MathChannel(self, name, expression, [channel.id for channel in self.channels])
+        # the list is replaced, so the processing thread never sees a partially updated list
+        self.math_channels = self.math_channels + [math_channel]
+        return math_channel
+
+    def remove_math_channel(self, math_channel):
+        """
+        Remove a math channel. It is not calculated for the following records anymore.
+
+        Args:
+            math_channel (MathChannel): The math channel.
+        """
+        self.math_channels = [channel for channel in self.math_channels if channel is not math_channel]
+
+    def _acquire_averaged_data(self, data, scale_factors, offsets):
+        """
+        Calculate the published data of the completed record in the 'HIRES', 'AVERAGE' and 'EXPONENTIAL_AVERAGE'
+        acquisition modes. The records are averaged in place in preallocated buffers: the 'AVERAGE' mode keeps the sum
+        of the last records (exact integer sums of ADC counts), the 'EXPONENTIAL_AVERAGE' mode an accumulator of the
+        mean ADC counts.
+
+        Args:
+            data (numpy.array): The buffer the voltages are written to.
+            scale_factors (tuple): The scale factor of each channel.
+            offsets (tuple): The offset of each channel.
+        """
+        if self._acquisition_mode == 'HIRES':
+            for i in range(self.number_of_channels):
+                if self.c_code.c_code_loaded:
+                    self.c_code.boxcar_convert_to_voltage(self._record[i], self._oversampling, scale_factors[i],
+                                                          offsets[i], data[i])
                 else:
-                    trigger_pos = -1
+                    means = self._record[i].reshape(-1, self._oversampling).mean(axis=1, dtype=data.dtype)
+                    np.subtract(means, 128 + offsets[i], out=data[i])
+                    data[i] *= scale_factors[i]
+            return
+
+        shape = self._record.shape
+        if self._acquisition_mode == 'AVERAGE':
+            if self._average_sum is None or self._average_sum.shape != shape \
+                    or len(self._average_history) != self._number_of_averages:
+                self._average_history = np.empty((self._number_of_averages,) + shape, dtype=np.uint8)
+                self._average_sum = np.zeros(shape, dtype=np.int32)
+            if self._average_count == 0:
+                self._average_sum[:] = 0
+            if self._average_count == self._number_of_averages:
+                # the oldest record leaves the average
+                self._average_sum -= self._average_history[self._average_index]
             else:
-                argmin = np.argmin(convolution)
-                if convolution[argmin] == -1 * len(convolution_array):
-                    trigger_pos = argmin
-                else:
-                    trigger_pos = -1
-            return trigger_pos
+                self._average_count += 1
+            self._average_history[self._average_index] = self._record
+            self._average_sum += self._record
+            self._average_index = (self._average_index + 1) % self._number_of_averages
+            for i in range(self.number_of_channels):
+                np.multiply(self._average_sum[i], scale_factors[i] / self._average_count, out=data[i])
+                data[i] -= (128 + offsets[i]) * scale_factors[i]
+            return
+
+        if self._average_accumulator is None or self._average_accumulator.shape != shape:
+            self._average_accumulator = np.empty(shape, dtype=np.float32)
+        if self._average_count == 0:
+            self._average_accumulator[:] = self._record
+        # the weight of a new record is 1 / N, the first N records are averaged with equal weights
+        self._average_count = min(self._average_count + 1, self._number_of_averages)
+        for i in range(self.number_of_channels):
+            accumulator = self._average_accumulator[i]
+            np.subtract(self._record[i], accumulator, out=data[i])
+            data[i] *= 1 / self._average_count
+            accumulator += data[i]
+            np.subtract(accumulator, 128 + offsets[i], out=data[i])
+            data[i] *= scale_factors[i]
+
+    def _get_worker_executor(self):
+        """
+        Get the worker threads calculating the spectra and saving the records that failed a mask test (created when
+        they are needed for the first time).
+        """
+        if self._worker_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._worker_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='worker')
+        return self._worker_executor
+
+    @staticmethod
+    def _resolve_future(future, record):
+        if not future.done():
+            future.set_result(record)
 
-    def _get_voltage_data_block(self):
+    def wait_for_record(self, after_id=None, timeout=None):
         """
-        Here a data block is fetched from the queue and the measurement data is converted into volts.
+        Block until a record newer than the given record id has been published.
+
+        Args:
+            after_id (int): (OPTIONAL) The id of the last known record. Default: the id of the latest record.
+            timeout (float): (OPTIONAL) The maximum time to wait in seconds. Default: wait forever.
 
         Returns:
-            list: The measurement data in volts.
+            Record: The latest record, or None if the timeout expired.
         """
-        raw_data = self._raw_data.get()
-        voltage_data = []
-        for i in range(self.number_of_channels):
-            voltage_data.append(np.array(self._create_voltage_data(raw_data[i], self.channels[i].voltage_index,
-                                self.selected_channel)))
-        return voltage_data
+        with self.record_condition:
+            if after_id is None:
+                after_id = self.latest_record_id
+            if self.record_condition.wait_for(lambda: self.latest_record_id > after_id, timeout):
+                return self.latest_record
+            return None
+
+    async def next_record(self, after_id=None):
+        """
+        Wait (without blocking the event loop) until a record newer than the given record id has been published.
+
+        Args:
+            after_id (int): (OPTIONAL) The id of the last known record. Default: the id of the latest record.
 
-    def _create_voltage_data(self, raw_data, voltage_range=1, channel=0, probe=1, offset=0):
+        Returns:
+            Record: The latest record, or None if the measurement was stopped.
+        """
+        with self.record_condition:
+            record = self.latest_record
+            if after_id is not None and record is not None and record.record_id > after_id:
+                return record
+            future = self._add_waiter()
+        return await future
+
+    def _add_waiter(self, roll_updates=False):
         """
-        Convenience function for converting data read from the scope to nicely scaled voltages.
-        Apply the calibration values that are stored in EEPROM (call "get_calibration_values()" before)
+        Register a future of the running event loop that is resolved with the next record (or update of the roll
+        display), or with None when the measurement is stopped. Must be called with the record condition held, so
+        no record and no stop is missed between a check and the registration.
 
         Args:
-            raw_data (list): The list of points returned from the read_data functions.
-            voltage_range (int): The voltage range current set for the channel.
-            channel (int): The voltage range current set for the channel. 0 = CH1, 1 = CH2.
-            probe (int): An additonal multiplictive factor for changing the probe gain.
-            offset (float): An additional additive value to compensate the ADC offset
+            roll_updates (bool): (OPTIONAL) Wait for the next update of the roll display instead of a record.
 
         Returns:
-            numpy.array: A list of correctly scaled voltages for the data.
+            asyncio.Future: The future.
         """
-        if channel == 0:
-                mul = probe * self.scope.gain1[voltage_range]
-                off = offset + self.scope.offset1[voltage_range]
-        else:
-                mul = probe * self.scope.gain2[voltage_range]
-                off = offset + self.scope.offset2[voltage_range]
+        # asyncio is only imported when it is used
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        (self._roll_waiters if roll_updates else self._async_waiters).append((loop, future))
+        return future
+
+    def records(self, maxsize=16, timeout=None):
+        """
+        Get an iterator yielding each new record exactly once:
 
-        scale_factor = (5.12 * mul) / (voltage_range << 7)
+            for record in osc.records():
+                ...
 
-        if self.c_code.c_code_loaded:
-            return self.c_code.create_voltage_data(raw_data, scale_factor, off)
-        else:
-            data = np.array(raw_data, dtype=float)
-            data = (data - 128 - off) * scale_factor
-            return data
+        The records are buffered in a bounded queue. If the consumer is too slow, the oldest records are dropped. The
+        iteration ends when the measurement is stopped (or no record arrives within the timeout).
+
+        Args:
+            maxsize (int): (OPTIONAL) The maximum number of buffered records.
+            timeout (float): (OPTIONAL) The maximum time to wait for a record in seconds. Default: wait forever.
+
+        Returns:
+            RecordStream: The iterator.
+        """
+        record_stream = RecordStream(self, maxsize, timeout)
+        with self.record_condition:
+            self._record_streams.append(record_stream)
+        return record_stream
 
-    def _create_timing_data(self, num_points):
+    def unsubscribe(self, record_stream):
         """
-        Convenience method for creating a list of times from the read data.
+        Stop sending records to a record stream.
 
         Args:
-            num_points (int): The number of measured points.
+            record_stream (RecordStream): The record stream.
+        """
+        with self.record_condition:
+            if record_stream in self._record_streams:
+                self._record_streams.remove(record_stream)
+            if record_stream in self._roll_streams:
+                self._roll_streams.remove(record_stream)
+            self.record_condition.notify_all()
+
+    def _reset_record(self):
+        """
+        (Re)allocate the buffers used to assemble the records and discard the record currently assembled.
+        Must be called whenever the record length, the pre sample ratio or the acquisition mode changes.
+        """
+        self._number_of_presample_points = int(self._record_length * self._pre_sample_ratio) * self._oversampling
+        # in the 'HIRES' mode the record is assembled at the oversampled rate
+        self._record = self._record_buffers.acquire((2, self._record_length * self._oversampling), np.uint8)
+        # ADC count of 128 <-> 0 V
+        self._presample_history = np.full((2, self._number_of_presample_points), 128, dtype=np.uint8)
+        self._record_position = None
+        self._pyramid = None
+        # the roll display starts empty
+        self._roll_buffer = None
+        if self._trigger_mode == 'ROLL':
+            self._roll_buffer = RollBuffer(self._record_length, len(self.channels))
+        # the records averaged so far belong to the old settings
+        self._average_count = 0
+        self._average_index = 0
+
+    def _get_conversion_values(self, channel):
+        """
+        Get the values used to convert the ADC counts of a channel into volts: (adc_count - 128 - offset) * scale_factor.
+        The calibration values of the device are applied (see "load_calibration").
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+
+        Returns:
+            tuple: The scale factor and the offset.
+        """
+        return self.calibration.conversion_values(channel, self.channels[channel].voltage_index)
+
+    def load_calibration(self, use_cache=True):
+        """
+        Load the calibration values of the device. This is done when the device is opened, so it is only needed if
+        the calibration values in the EEPROM have been changed by another program.
+
+        Args:
+            use_cache (bool): (OPTIONAL) Use the calibration values read before (in this process or cached on disk).
+                Set it to False to read the EEPROM again.
 
         Returns:
-            numpy.array: The timing data.
+            Calibration: The calibration of the device.
+        """
+        self.settings_mutex.acquire()
+        try:
+            self.calibration = Calibration.load(self.scope, use_cache)
+        finally:
+            self.settings_mutex.release()
+        return self.calibration
+
+    def calibrate(self, signal='GROUND', number_of_samples=200000, calibration_amplitude=2.0, write_eeprom=True,
+                  timeout=5):
         """
+        Calibrate both channels in all voltage ranges. The measurement must be stopped. The settings of the oscilloscope
+        are restored afterwards.
+
+        With the signal 'GROUND', both inputs have to be grounded and the offsets are calibrated. With the signal
+        'CALIBRATION_OUTPUT', both inputs have to be connected to the calibration output (DC coupling) and the gains
+        are calibrated from the amplitude of its square wave. The gains of voltage ranges in which the square wave is
+        clipped are kept. Calibrate the offsets first.
+
+        Args:
+            signal (str): (OPTIONAL) The signal connected to the inputs ('GROUND' or 'CALIBRATION_OUTPUT').
+            number_of_samples (int): (OPTIONAL) The number of samples averaged per voltage range.
+            calibration_amplitude (float): (OPTIONAL) The amplitude of the calibration output in volts.
+            write_eeprom (bool): (OPTIONAL) Store the calibration values in the EEPROM of the device.
+            timeout (float): (OPTIONAL) The maximum time in seconds to wait for a record.
+
+        Returns:
+            Calibration: The new calibration of the device.
+        """
+        if signal not in ('GROUND', 'CALIBRATION_OUTPUT'):
+            raise ValueError(f"Unsupported signal '{signal}'. Use 'GROUND' or 'CALIBRATION_OUTPUT'.")
+        if self.running:
+            raise RuntimeError('The measurement has to be stopped before the device is calibrated.')
+        settings = (self.sample_rate, self.record_length, self.trigger_mode, self.data_type, self.acquisition_mode,
+                    [channel.voltage_range for channel in self.channels])
+        # 20 periods of the calibration output per record
+        self.acquisition_mode = 'NORMAL'
+        self.sample_rate = 1e6
+        self.record_length = 20000
+        self.trigger_mode = 'NONE'
+        self.data_type = 'uint8'
+        if signal == 'CALIBRATION_OUTPUT':
+            self.scope.set_calibration_frequency(1000)
+
+        gains = self.calibration.gains.copy()
+        offsets = self.calibration.offsets.copy()
+        skipped_ranges = []
+        try:
+            self.start()
+            for column, voltage_index in enumerate(Calibration.VOLTAGE_INDICES):
+                for channel in self.channels:
+                    channel.voltage_range = 5 / voltage_index
+                adc_counts = self._capture_adc_counts(number_of_samples, timeout)
+                clipped = np.any((adc_counts == 0) | (adc_counts == 255), axis=1)
+                if signal == 'GROUND':
+                    if np.any(clipped):
+                        raise RuntimeError(f'The signal is clipped in the range +/- {5 / voltage_index} V. '
+                                           f'Are the inputs grounded?')
+                    offsets[:, column] = adc_counts.mean(axis=1) - 128
+                    continue
+                # split the square wave at the middle between its minimum and maximum and average both levels
+                threshold = (adc_counts.min(axis=1).astype(np.float64) + adc_counts.max(axis=1)) / 2
+                high = adc_counts > threshold[:, np.newaxis]
+                high_level = np.sum(adc_counts, axis=1, where=high) / np.count_nonzero(high, axis=1)
+                low_level = np.sum(adc_counts, axis=1, where=~high) / np.count_nonzero(~high, axis=1)
+                amplitude = high_level - low_level
+                if np.any(~clipped & ~(amplitude > 10)):
+                    raise RuntimeError('No calibration signal found. Are the inputs connected to the calibration '
+                                       'output?')
+                gains[~clipped, column] = calibration_amplitude * (voltage_index << 7) / (5.12 * amplitude[~clipped])
+                if np.any(clipped):
+                    skipped_ranges.append(5 / voltage_index)
+        finally:
+            self.stop()
+            sample_rate, record_length, trigger_mode, data_type, acquisition_mode, voltage_ranges = settings
+            self.sample_rate = sample_rate
+            self.record_length = record_length
+            self.trigger_mode = trigger_mode
+            self.data_type = data_type
+            self.acquisition_mode = acquisition_mode
+            for channel, voltage_range in zip(self.channels, voltage_ranges):
+                channel.voltage_range = voltage_range
+        if skipped_ranges:
+            print(f'The calibration signal is clipped in the ranges {skipped_ranges} V, their gains are kept.')
+
+        calibration = Calibration(gains, offsets, self.calibration.serial_number)
+        if write_eeprom:
+            calibration = calibration.write(self.scope)
+        self.settings_mutex.acquire()
+        self.calibration = calibration
+        self.settings_mutex.release()
+        return calibration
+
+    def _capture_adc_counts(self, number_of_samples, timeout):
+        """
+        Collect the ADC counts of the records published from now on (in the 'uint8' data mode). The first record is
+        skipped, so the input has settled after a change of the voltage range.
+
+        Args:
+            number_of_samples (int): The minimum number of samples per channel.
+            timeout (float): The maximum time in seconds to wait for a record.
+
+        Returns:
+            numpy.array: The ADC counts (one row per channel).
+        """
+        record = self.wait_for_record(timeout=timeout)
+        records = []
+        while record is not None and sum(data.shape[1] for data in records) < number_of_samples:
+            record = self.wait_for_record(record.record_id, timeout)
+            if record is not None:
+                records.append(record.data)
+        if record is None:
+            raise RuntimeError(f'No data received within {timeout} s.')
+        return np.concatenate(records, axis=1)
+
+    def _find_trigger_position(self, raw_data):
+        """
+        Get the array position at which the trigger level value is exceeded.
+        The search is done on the raw ADC counts, the trigger level is converted into an ADC count beforehand.
+
+        Args:
+            raw_data (numpy.array): The ADC counts of the selected channel.
+        Returns:
+            The array position of the selected channel where the trigger level value is hit or crossed.
+        """
+        selected_channel = self.channels[self.selected_channel]
+        threshold = selected_channel.voltage_to_adc(selected_channel.trigger_level)
+        # When oversampling, the edges are searched at the published sample rate: a slow edge rises by only a fraction
+        # of an ADC count per oversampled sample, so noise would trigger on both edges. The trigger point is then also
+        # the start of a block of averaged samples.
+        raw_data = raw_data[::self._oversampling]
+
         if self.c_code.c_code_loaded:
-            timing_data = self.c_code.create_timing_data(num_points, self.sample_rate)
-            return timing_data
+            trigger_position = self.c_code.find_trigger_position(raw_data, threshold, selected_channel.trigger_kind)
         else:
-            timing_data, _ = self.scope.convert_sampling_rate_to_measurement_times(num_points, self._sample_id)
-            return np.array(timing_data)
+            # find rising or falling edge
+            if selected_channel.trigger_kind == 'RISING':
+                crossings = np.flatnonzero((raw_data[:-1] < threshold) & (raw_data[1:] >= threshold))
+            else:
+                crossings = np.flatnonzero((raw_data[:-1] > threshold) & (raw_data[1:] <= threshold))
+            trigger_position = int(crossings[0]) + 1 if len(crossings) else -1
+        return trigger_position * self._oversampling if trigger_position >= 0 else -1
 
-    def _create_presample_timing_data(self, num_points):
+    def _create_timing_data(self, num_points, first_index=0):
         """
-        Convenience method for creating a list of pre-trigger times from the read data.
+        Convenience method for creating a list of times relative to the trigger point.
 
         Args:
             num_points (int): The number of measured points.
+            first_index (int): The sample index of the first point. Negative for pre-trigger points.
 
         Returns:
-            numpy.array: The timing data.
+            numpy.array: The read-only timing data (float64 if this is the selected data type, float32 otherwise).
         """
-        if num_points > 0:
-            if self.c_code.c_code_loaded:
-                return self.c_code.create_pretrigger_timing_data(num_points, self.sample_rate)
-            else:
-                timing_data = np.arange(-num_points, 0)
-                timing_data = (timing_data / self.sample_rate)
-                return timing_data
+        dtype = np.float64 if self.data_type == 'float64' else np.float32
+        if self.c_code.c_code_loaded:
+            timing_data = self.c_code.fill_timing_data(np.empty(num_points, dtype=dtype), self.sample_rate, first_index)
         else:
-            return np.array([])
+            timing_data = (np.arange(first_index, first_index + num_points) / self.sample_rate).astype(dtype)
+        timing_data.flags.writeable = False
+        return timing_data
+
+    @property
+    def latest_record_id(self):
+        """
+        Get the id of the last published record. Can be used to cheaply check whether a new record is available.
+
+        Returns:
+            int: The record id (0 if no record has been published yet).
+        """
+        record = self.latest_record
+        return record.record_id if record is not None else 0
 
     @property
     def max_sample_rate(self):
@@ -364,10 +1297,9 @@ class Oscilloscope:
             sample_rate(int): The sample rate in Hz.
         """
         self.settings_mutex.acquire()
-        was_running = False
-        if self.running:
-            self.stop()
-            was_running = True
+        was_running = self.running
+        if was_running:
+            self._pause_capture()
         # ToDo: rase value modified error?
         match sample_rate:
             case num if num in range(0, 30000):
@@ -419,19 +1351,42 @@ class Oscilloscope:
             case _:
                 # ToDo: raise error?
                 sample_id = 0
-        self.scope.set_sample_rate(sample_id)
         if sample_id >= 100:
             self._sample_rate = int((sample_id - 100) * 10e3)
         else:
             self._sample_rate = int(sample_id * 1000000)
-        self._sample_id = sample_id
-
-        self._blocksize = int(self._blockslope * self.sample_rate + 1) * (6 * 1024)  # (should be divisible by 6*1024)
+        self._requested_sample_id = sample_id
+        self._set_device_sample_rate(sample_id)
 
         if was_running:
-            self.start()
+            self._resume_capture()
         self.settings_mutex.release()
 
+    def _set_device_sample_rate(self, sample_id):
+        """
+        Set the sample rate of the device. In the 'HIRES' acquisition mode, the device samples at the highest
+        multiple of the sample rate that is available (up to MAX_HIRES_SAMPLE_RATE), and the samples are averaged
+        down to the sample rate when a record is published. Must be called with the settings mutex held.
+
+        Args:
+            sample_id (int): The id of the sample rate (see "LibUsbScope.Oscilloscope.SAMPLE_RATES").
+        """
+        oversampling = 1
+        device_sample_rate = self._sample_rate
+        if self._acquisition_mode == 'HIRES' and self._sample_rate > 0:
+            for rate_id, (_, rate) in self.scope.SAMPLE_RATES.items():
+                factor = round(rate / self._sample_rate)
+                if rate <= self.MAX_HIRES_SAMPLE_RATE and factor * self._sample_rate == rate \
+                        and oversampling < factor <= self.MAX_OVERSAMPLING:
+                    sample_id, oversampling, device_sample_rate = rate_id, factor, rate
+        self.scope.set_sample_rate(sample_id)
+        self._sample_id = sample_id
+
+        self._blocksize = int(self._blockslope * device_sample_rate + 1) * (6 * 1024)  # (should be divisible by 6*1024)
+        if oversampling != self._oversampling:
+            self._oversampling = oversampling
+            self._reset_record()
+
     @property
     def number_of_channels(self):
         """
@@ -470,7 +1425,7 @@ class Oscilloscope:
         """
         self.settings_mutex.acquire()
         self._pre_sample_ratio = ratio
-        self._number_of_presample_points = int(self.record_length * self._pre_sample_ratio)
+        self._reset_record()
         self.settings_mutex.release()
 
     @property
@@ -504,8 +1459,7 @@ class Oscilloscope:
         """
         self.settings_mutex.acquire()
         self._record_length = record_length
-        self._number_of_presample_points = int(record_length * self._pre_sample_ratio)
-        self._previous_voltage_data = [np.zeros(record_length), np.zeros(record_length)]
+        self._reset_record()
         self.settings_mutex.release()
 
     @property
@@ -516,12 +1470,12 @@ class Oscilloscope:
         Returns:
             list: The available trigger modes as list.
         """
-        return ['SINGLE', 'REPEAT', 'NONE']
+        return ['SINGLE', 'REPEAT', 'NONE', 'ROLL']
 
     @property
     def trigger_mode(self):
         """
-        Get the current trigger mode ('SINGLE', 'REPEAT' or 'NONE')
+        Get the current trigger mode ('SINGLE', 'REPEAT', 'NONE' or 'ROLL')
 
         Returns:
             str: The current trigger mode.
@@ -531,14 +1485,20 @@ class Oscilloscope:
     @trigger_mode.setter
     def trigger_mode(self, trigger_mode):
         """
-        Set the current trigger mode ('SINGLE', 'REPEAT' or 'NONE')
+        Set the current trigger mode ('SINGLE', 'REPEAT', 'NONE' or 'ROLL').
+        In the 'ROLL' mode no records are published. Instead, each data block is appended to a roll display of
+        "record_length" samples and published as update (see "roll_updates" and "roll_data"), so slow signals are
+        shown continuously instead of once per record.
 
         Args:
             trigger_mode (str): The current trigger mode.
 
         """
+        if trigger_mode == 'ROLL' and self._acquisition_mode != 'NORMAL':
+            raise ValueError("The 'ROLL' trigger mode is only available in the 'NORMAL' acquisition mode.")
         self.settings_mutex.acquire()
         self._trigger_mode = trigger_mode
+        self._reset_record()
         self.settings_mutex.release()
 
     @property
@@ -563,3 +1523,125 @@ class Oscilloscope:
         self.settings_mutex.acquire()
         self._selected_channel = selected_channel
         self.settings_mutex.release()
+
+    @property
+    def data_types_available(self):
+        """
+        Get available data types of the measurement data.
+
+        Returns:
+            list: The available data types as list.
+        """
+        return ['float32', 'float64', 'uint8']
+
+    @property
+    def data_type(self):
+        """
+        Get the data type of the measurement data ('float32', 'float64' or 'uint8').
+
+        With 'float32' (default) and 'float64' the voltages are published in the given precision. With 'uint8' the
+        records are not converted at all, instead the ADC counts are published together with the scale factor and
+        offset of each channel (see "Channel.adc_data").
+
+        Returns:
+            str: The data type.
+        """
+        return self._data_type
+
+    @data_type.setter
+    def data_type(self, data_type):
+        """
+        Set the data type of the measurement data ('float32', 'float64' or 'uint8').
+
+        Args:
+            data_type (str): The data type.
+        """
+        if data_type not in self.data_types_available:
+            raise ValueError(f"Unsupported data type '{data_type}'. Use one of {self.data_types_available}.")
+        if data_type == 'uint8' and self._acquisition_mode != 'NORMAL':
+            raise ValueError(f"The data type 'uint8' is not available in the acquisition mode "
+                             f"'{self._acquisition_mode}'.")
+        self.settings_mutex.acquire()
+        self._data_type = data_type
+        self.settings_mutex.release()
+
+    @property
+    def acquisition_modes_available(self):
+        """
+        Get available acquisition modes.
+
+        Returns:
+            list: The available acquisition modes as list.
+        """
+        return ['NORMAL', 'HIRES', 'AVERAGE', 'EXPONENTIAL_AVERAGE']
+
+    @property
+    def acquisition_mode(self):
+        """
+        Get the acquisition mode ('NORMAL', 'HIRES', 'AVERAGE' or 'EXPONENTIAL_AVERAGE').
+
+        'NORMAL' (default) publishes the samples as captured. 'HIRES' oversamples the signal at a higher sample rate
+        of the device and averages blocks of samples down to the sample rate (boxcar filter), which increases the
+        resolution for slow signals by up to 3 bits. 'AVERAGE' publishes the mean of the last "number_of_averages"
+        records, 'EXPONENTIAL_AVERAGE' an exponential average weighting each new record by 1 / number_of_averages.
+        Averaging records reduces the noise of repetitive signals, so the trigger should be used. The data type 'uint8'
+        is only available in the 'NORMAL' mode.
+
+        Returns:
+            str: The acquisition mode.
+        """
+        return self._acquisition_mode
+
+    @acquisition_mode.setter
+    def acquisition_mode(self, acquisition_mode):
+        """
+        Set the acquisition mode ('NORMAL', 'HIRES', 'AVERAGE' or 'EXPONENTIAL_AVERAGE').
+
+        Args:
+            acquisition_mode (str): The acquisition mode.
+        """
+        if acquisition_mode not in self.acquisition_modes_available:
+            raise ValueError(f"Unsupported acquisition mode '{acquisition_mode}'. "
+                             f"Use one of {self.acquisition_modes_available}.")
+        if acquisition_mode != 'NORMAL' and self.data_type == 'uint8':
+            raise ValueError(f"The acquisition mode '{acquisition_mode}' is not available with the data type 'uint8'.")
+        if acquisition_mode != 'NORMAL' and self.trigger_mode == 'ROLL':
+            raise ValueError(f"The acquisition mode '{acquisition_mode}' is not available in the 'ROLL' trigger mode.")
+        self.settings_mutex.acquire()
+        was_running = self.running
+        if was_running:
+            self._pause_capture()
+        self._acquisition_mode = acquisition_mode
+        # the sample rate of the device depends on the oversampling of the 'HIRES' mode
+        self._set_device_sample_rate(self._requested_sample_id)
+        self._reset_record()
+        if was_running:
+            self._resume_capture()
+        self.settings_mutex.release()
+
+    @property
+    def number_of_averages(self):
+        """
+        Get the number of records averaged in the 'AVERAGE' and 'EXPONENTIAL_AVERAGE' acquisition modes.
+
+        Returns:
+            int: The number of averages.
+        """
+        return self._number_of_averages
+
+    @number_of_averages.setter
+    def number_of_averages(self, number_of_averages):
+        """
+        Set the number of records averaged in the 'AVERAGE' and 'EXPONENTIAL_AVERAGE' acquisition modes. The average
+        is restarted.
+
+        Args:
+            number_of_averages (int): The number of averages.
+        """
+        if number_of_averages < 1:
+            raise ValueError('At least one record has to be averaged.')
+        self.settings_mutex.acquire()
+        self._number_of_averages = int(number_of_averages)
+        self._average_count = 0
+        self._average_index = 0
+        self.settings_mutex.release()
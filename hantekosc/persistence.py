@@ -0,0 +1,179 @@
+import threading
+
+import numpy as np
+
+
+DECAY_MODES = ('INFINITE', 'EXPONENTIAL', 'RESET')
+
+
+class PersistenceHistogram:
+    """
+    A two-dimensional (time x voltage) histogram of the records of a channel, accumulated over many records (like the
+    persistence display of a bench oscilloscope). It is used for eye diagrams and to find rare glitches and jitter.
+
+    The histogram counts the ADC counts directly, so each of the 256 possible values of the 8-bit ADC is a voltage bin
+    and the records are never converted into volts. The samples of a record are distributed evenly over the time bins.
+    The counters are preallocated (uint32, one row of 256 counters per time bin) and updated in place in C (or with
+    "numpy.bincount" if the C code is not available).
+
+    The decay mode defines how old records fade: 'INFINITE' keeps all records, 'EXPONENTIAL' halves all counters
+    after every "decay_records" records (a half-life of "decay_records" records), 'RESET' clears the histogram after
+    every "decay_records" records. The histogram is cleared automatically when the time span or the voltage range of
+    the records changes.
+
+    Attributes:
+        time_bins (int): The number of time bins (limited to the record length).
+        decay (str): The decay mode (see "DECAY_MODES").
+        decay_records (int): The number of records after which the counters are halved or cleared.
+        number_of_records (int): The number of records accumulated since the last reset.
+    """
+    def __init__(self, time_bins=1000, decay='INFINITE', decay_records=100, c_code=None):
+        """
+        Class constructor.
+
+        Args:
+            time_bins (int): (OPTIONAL) The number of time bins.
+            decay (str): (OPTIONAL) The decay mode.
+            decay_records (int): (OPTIONAL) The number of records after which the counters are halved or cleared.
+            c_code (C_Code): (OPTIONAL) Used to accumulate the records in C. Default: use NumPy.
+        """
+        if decay not in DECAY_MODES:
+            raise ValueError(f'Unknown decay mode {decay!r}, available modes: {DECAY_MODES}')
+        if time_bins < 1 or decay_records < 1:
+            raise ValueError('The number of time bins and the number of decay records must be positive.')
+        self.time_bins = time_bins
+        self.decay = decay
+        self.decay_records = decay_records
+        self.number_of_records = 0
+        self._c_code = c_code if c_code is not None and c_code.c_code_loaded else None
+        self._lock = threading.Lock()
+        self._histogram = None
+        # the time span and the conversion values of the accumulated records
+        self._key = None
+        self._records_since_decay = 0
+
+    def add(self, adc_counts, time_range=(0.0, 1.0), conversion=(1.0, 0.0)):
+        """
+        Add the ADC counts of a record of a channel.
+
+        Args:
+            adc_counts (numpy.array): The ADC counts (uint8).
+            time_range (tuple): (OPTIONAL) The time of the first and the last sample in seconds.
+            conversion (tuple): (OPTIONAL) The scale factor and the offset used to convert ADC counts into volts.
+        """
+        length = len(adc_counts)
+        if not length:
+            return
+        time_bins = min(self.time_bins, length)
+        key = (time_bins, length, tuple(time_range), tuple(conversion))
+        with self._lock:
+            if key != self._key or self._histogram is None:
+                self._histogram = np.zeros((time_bins, 256), dtype=np.uint32)
+                self._key = key
+                self.number_of_records = 0
+                self._records_since_decay = 0
+            elif self.decay != 'INFINITE' and self._records_since_decay >= self.decay_records:
+                if self.decay == 'EXPONENTIAL':
+                    np.right_shift(self._histogram, 1, out=self._histogram)
+                else:
+                    self._histogram.fill(0)
+                    self.number_of_records = 0
+                self._records_since_decay = 0
+            if self._c_code is not None:
+                self._c_code.accumulate_histogram(adc_counts, self._histogram)
+            else:
+                indices = np.arange(length, dtype=np.int64) * time_bins // length * 256
+                indices += adc_counts
+                self._histogram += np.bincount(indices, minlength=self._histogram.size).reshape(
+                    self._histogram.shape).astype(np.uint32)
+            self.number_of_records += 1
+            self._records_since_decay += 1
+
+    def add_record(self, record, channel):
+        """
+        Add a channel of a published record. Records in the 'uint8' data mode are counted directly, the voltages of
+        the other data modes are converted back into ADC counts.
+
+        Args:
+            record (Record): The record.
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+        """
+        if not record.record_length:
+            return
+        self.add(record.adc_counts(channel), (float(record.timing_data[0]), float(record.timing_data[-1])),
+                 (record.scale_factors[channel], record.offsets[channel]))
+
+    def reset(self):
+        """
+        Clear the histogram.
+        """
+        with self._lock:
+            self._histogram = None
+            self._key = None
+            self.number_of_records = 0
+            self._records_since_decay = 0
+
+    def counts(self):
+        """
+        Get a copy of the counters.
+
+        Returns:
+            numpy.array: The number of hits of each time bin (rows) and ADC count (columns) as uint32 (empty if no
+                record has been added yet).
+        """
+        with self._lock:
+            if self._histogram is None:
+                return np.zeros((0, 256), dtype=np.uint32)
+            return self._histogram.copy()
+
+    def image(self, scale='LINEAR'):
+        """
+        Get the histogram as image: one row per voltage bin (the highest voltage in the first row) and one column per
+        time bin, normalized to the largest counter.
+
+        Args:
+            scale (str): (OPTIONAL) 'LINEAR' or 'LOG' (log(1 + hits), which makes rare events visible).
+
+        Returns:
+            numpy.array: The intensities between 0 and 1 (float32, shape (256, time_bins)).
+        """
+        if scale not in ('LINEAR', 'LOG'):
+            raise ValueError("The scale must be 'LINEAR' or 'LOG'.")
+        with self._lock:
+            if self._histogram is None:
+                return np.zeros((256, 0), dtype=np.float32)
+            image = self._histogram.T[::-1].astype(np.float32)
+        if scale == 'LOG':
+            np.log1p(image, out=image)
+        maximum = image.max()
+        if maximum > 0:
+            image /= maximum
+        return image
+
+    def time_axis(self):
+        """
+        Get the time of the first sample of each time bin.
+
+        Returns:
+            numpy.array: The times in seconds (empty if no record has been added yet).
+        """
+        with self._lock:
+            if self._key is None:
+                return np.empty(0)
+            time_bins, length, (first_time, last_time), _ = self._key
+        # sample i is counted in time bin i * time_bins // length
+        first_samples = -(-np.arange(time_bins) * length // time_bins)
+        return first_time + first_samples * ((last_time - first_time) / max(length - 1, 1))
+
+    def voltage_axis(self):
+        """
+        Get the voltage of each row of the image.
+
+        Returns:
+            numpy.array: The voltages in descending order (empty if no record has been added yet).
+        """
+        with self._lock:
+            if self._key is None:
+                return np.empty(0)
+            _, _, _, (scale_factor, offset) = self._key
+        return (np.arange(255, -1, -1) - 128 - offset) * scale_factor
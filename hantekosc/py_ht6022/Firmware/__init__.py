@@ -1,48 +1,215 @@
 __author__ = 'Robert Cope'
 
 from collections import namedtuple
+import hashlib
 import os
-import array
+import struct
+import threading
 
 # Firmwares to bootstrap the Hantek 6022BE Device are located in this module.
 # Format: (Data Len, Value, Data) (Index is always 0x00).
 FirmwareControlPacket = namedtuple('FirmwareControlPacket', ['size', 'value', 'data'])
 
+# The address of the CPUCS register of the FX2, used to hold (1) and start (0) the 8051
+CPUCS_ADDRESS = 0xe600
+# The largest amount of data written with a single control transfer (limited by libusb and the OS)
+MAX_CONTROL_PACKET_SIZE = 4096
 
-def fx2_ihex_to_control_packets(firmware_location):
+
+def decode_ihex(text):
+    """
+    Decode the data records of an Intel-hex file. All lines are converted from hex at once and the checksums are
+    verified with numpy, so no Python code runs per byte.
+    :param text: The content of the hex file.
+    :return: A list of (address, data) tuples of the data records before the end of file record.
+    """
+    # only needed when a hex file is actually parsed (the parsed firmware is usually cached)
+    import numpy as np
+    lines = [line for line in (line.strip() for line in text.splitlines()) if line]
+    if not all(line.startswith(':') for line in lines):
+        raise ValueError('Invalid Intel-hex file, each record has to start with ":"!')
+    if not lines:
+        return []
+    record = bytes.fromhex(''.join(line[1:] for line in lines))
+    record_sizes = np.array([(len(line) - 1) // 2 for line in lines], dtype=np.intp)
+    starts = np.cumsum(record_sizes) - record_sizes
+    raw = np.frombuffer(record, dtype=np.uint8)
+    if np.any(record_sizes < 5) or np.any(raw[starts].astype(np.intp) + 5 != record_sizes):
+        raise ValueError('Invalid Intel-hex file, the length of a record does not match its content!')
+    record_types = raw[starts + 3]
+    end_records = np.flatnonzero(record_types == 0x01)
+    count = end_records[0] if len(end_records) else len(lines)
+    # the sum of all bytes of a record including the checksum is 0
+    checksums = np.add.reduceat(raw, starts, dtype=np.uint32)[:count + 1] & 0xFF
+    if np.any(checksums):
+        raise ValueError('Invalid checksum in line {} of the Intel-hex file!'.format(np.flatnonzero(checksums)[0] + 1))
+    unknown = np.flatnonzero(record_types[:count] != 0x00)
+    if len(unknown):
+        raise ValueError('Unknown record type 0x{:02x} encountered!'.format(record_types[unknown[0]]))
+    addresses = (raw[starts + 1].astype(np.intp) << 8) | raw[starts + 2]
+    return [(address, record[start + 4:start + size - 1])
+            for address, start, size in zip(addresses[:count].tolist(), starts[:count].tolist(),
+                                            record_sizes[:count].tolist())]
+
+
+def encode_ihex(data, address=0, record_len=16):
+    """
+    Encode data as an Intel-hex file. The records are assembled as one array, so no Python code runs per byte.
+    :param data: The bytes to encode.
+    :param address: (OPTIONAL) The address of the first byte. Default: 0
+    :param record_len: (OPTIONAL) The number of data bytes per record (line). Default: 16
+    :return: The content of the hex file, including the end of file record.
+    """
+    import numpy as np
+    if not 0 < record_len < 256:
+        raise ValueError('The record length has to be between 1 and 255 bytes!')
+    if address < 0 or address + len(data) > 0x10000:
+        raise ValueError('Only 16 bit addresses are supported!')
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    lines = []
+    full_records = len(data) // record_len
+    for count, length, first in ((full_records, record_len, 0), (1, len(data) % record_len, full_records * record_len)):
+        if not count or not length:
+            continue
+        records = np.empty((count, length + 5), dtype=np.uint8)
+        addresses = address + first + np.arange(count) * length
+        records[:, 0] = length
+        records[:, 1] = addresses >> 8
+        records[:, 2] = addresses & 0xFF
+        records[:, 3] = 0x00
+        records[:, 4:-1] = data[first:first + count * length].reshape(count, length)
+        records[:, -1] = -np.sum(records[:, :-1], axis=1, dtype=np.uint32) & 0xFF
+        # one line per row: ":" + hex digits + newline
+        hex_digits = np.frombuffer(records.tobytes().hex().encode('ascii'), dtype=np.uint8).reshape(count, -1)
+        characters = np.empty((count, hex_digits.shape[1] + 2), dtype=np.uint8)
+        characters[:, 0] = ord(':')
+        characters[:, 1:-1] = hex_digits
+        characters[:, -1] = ord('\n')
+        lines.append(characters.tobytes().decode('ascii'))
+    # Add stop record at the end.
+    lines.append(':00000001ff')
+    return ''.join(lines)
+
+
+def fx2_ihex_to_control_packets(firmware_location, coalesce=True):
+    """
+    Convert an Intel-hex firmware file into the control packets that load it into the RAM of the FX2.
+    :param firmware_location: The path of the hex file.
+    :param coalesce: (OPTIONAL) Merge records of contiguous addresses into packets of up to MAX_CONTROL_PACKET_SIZE
+                     bytes, so the firmware is uploaded with fewer control transfers. Default: True
+    :return: A list of FirmwareControlPacket.
+    """
     packets = list()
     # disable 8051
-    packets.append(FirmwareControlPacket(1, 0xe600, b'\x01'))
+    packets.append(FirmwareControlPacket(1, CPUCS_ADDRESS, b'\x01'))
     with open(firmware_location, 'r') as f:
-        for line in f.readlines():
-            line = line.strip()
-            assert line.startswith(":")
-            record_len = int(line[1:3], 16)
-            addr = int(line[3:7], 16)
-            record_type = int(line[7:9], 16)
-            raw_data = line[9:-2]
-            record_data = [int(raw_data[i:i+2], 16) for i in range(0, len(raw_data), 2)]
-            file_checksum = int(line[-2:], 16)
-            assert record_len == len(record_data)
-            if record_type == 0x00:
-                checksum = (sum(record_data) + record_len + (addr % 256) + (addr >> 8)) % 256
-                assert not ((checksum + file_checksum) % 256) & 0xFF
-                packets.append(FirmwareControlPacket(record_len, addr, array.array('B', record_data).tobytes()))
-            elif record_type == 0x01:
-                assert file_checksum == 0xFF
-                break
-            else:
-                raise ValueError('Unknown record type 0x{:2x} encountered!'.format(record_type))
+        for addr, record_data in decode_ihex(f.read()):
+            packets.append(FirmwareControlPacket(len(record_data), addr, record_data))
     # enable 8051
-    packets.append(FirmwareControlPacket(1, 0xe600, b'\x00'))
+    packets.append(FirmwareControlPacket(1, CPUCS_ADDRESS, b'\x00'))
+    if coalesce:
+        packets = coalesce_control_packets(packets)
+    return packets
+
+
+def coalesce_control_packets(packets, max_size=MAX_CONTROL_PACKET_SIZE):
+    """
+    Merge control packets writing to contiguous addresses into packets of up to max_size bytes. The packets writing
+    the CPUCS register are never merged.
+    :param packets: A list of FirmwareControlPacket.
+    :param max_size: (OPTIONAL) The maximum size of a merged packet.
+    :return: A list of FirmwareControlPacket.
+    """
+    coalesced = list()
+    address = None
+    data = bytearray()
+
+    def flush():
+        if data:
+            coalesced.append(FirmwareControlPacket(len(data), address, bytes(data)))
+
+    for packet in packets:
+        if (packet.value == CPUCS_ADDRESS or address is None or packet.value != address + len(data)
+                or len(data) + packet.size > max_size):
+            flush()
+            data = bytearray()
+            address = packet.value
+            if packet.value == CPUCS_ADDRESS:
+                coalesced.append(packet)
+                address = None
+                continue
+        data += packet.data
+    flush()
+    return coalesced
+
+
+# The control packets of a firmware are cached in a binary file, so the hex file only needs to be parsed once.
+# The cache file is keyed by the hash of the hex file and silently ignored if it cannot be read or written.
+CACHE_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                               'hantekosc', 'firmware')
+_PACKET_HEADER = struct.Struct('<HH')
+
+
+def load_control_packets(firmware_location, use_cache=True):
+    """
+    Get the control packets of a firmware file, from the cache if possible.
+    :param firmware_location: The path of the Intel-hex file.
+    :param use_cache: (OPTIONAL) Read and write the cache of parsed firmware. Default: True
+    :return: A list of (coalesced) FirmwareControlPacket.
+    """
+    if not use_cache:
+        return fx2_ihex_to_control_packets(firmware_location)
+    with open(firmware_location, 'rb') as f:
+        file_hash = hashlib.sha1(f.read()).hexdigest()
+    cache_location = os.path.join(CACHE_DIRECTORY, file_hash + '.bin')
+    try:
+        with open(cache_location, 'rb') as f:
+            cached = f.read()
+        packets = list()
+        position = 0
+        while position < len(cached):
+            size, value = _PACKET_HEADER.unpack_from(cached, position)
+            position += _PACKET_HEADER.size
+            packets.append(FirmwareControlPacket(size, value, cached[position:position + size]))
+            position += size
+        return packets
+    except (OSError, struct.error):
+        pass
+
+    packets = fx2_ihex_to_control_packets(firmware_location)
+    try:
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        # write to a temporary file first, so other processes never read an incomplete file
+        temporary_location = '{}.{}.tmp'.format(cache_location, os.getpid())
+        with open(temporary_location, 'wb') as f:
+            for packet in packets:
+                f.write(_PACKET_HEADER.pack(packet.size, packet.value))
+                f.write(packet.data)
+        os.replace(temporary_location, cache_location)
+    except OSError:
+        pass
     return packets
 
+
 base_path = os.path.dirname(os.path.realpath(__file__))
-stock_firmware = fx2_ihex_to_control_packets(os.path.join(base_path, 'stock', 'stock_fw.ihex'))
-mod_firmware_01 = fx2_ihex_to_control_packets(os.path.join(base_path, 'modded', 'mod_fw_01.ihex'))
-mod_firmware_iso = fx2_ihex_to_control_packets(os.path.join(base_path, 'modded', 'mod_fw_iso.ihex'))
-dso6021_firmware = fx2_ihex_to_control_packets(os.path.join(base_path, 'DSO6021', 'dso6021-firmware.hex'))
-dso6022be_firmware = fx2_ihex_to_control_packets(os.path.join(base_path, 'DSO6022BE', 'dso6022be-firmware.hex'))
-dso6022bl_firmware = fx2_ihex_to_control_packets(os.path.join(base_path, 'DSO6022BL', 'dso6022bl-firmware.hex'))
-dds120_firmware = fx2_ihex_to_control_packets(os.path.join(base_path, 'DDS120', 'dds120-firmware.hex'))
-firmware = default_firmware = dso6022be_firmware
+# The firmwares are only loaded when they are used for the first time (e.g. "Firmware.dso6022be_firmware")
+FIRMWARE_FILES = {
+    'stock_firmware': os.path.join(base_path, 'stock', 'stock_fw.ihex'),
+    'mod_firmware_01': os.path.join(base_path, 'modded', 'mod_fw_01.ihex'),
+    'mod_firmware_iso': os.path.join(base_path, 'modded', 'mod_fw_iso.ihex'),
+    'dso6021_firmware': os.path.join(base_path, 'DSO6021', 'dso6021-firmware.hex'),
+    'dso6022be_firmware': os.path.join(base_path, 'DSO6022BE', 'dso6022be-firmware.hex'),
+    'dso6022bl_firmware': os.path.join(base_path, 'DSO6022BL', 'dso6022bl-firmware.hex'),
+    'dds120_firmware': os.path.join(base_path, 'DDS120', 'dds120-firmware.hex'),
+}
+FIRMWARE_FILES['firmware'] = FIRMWARE_FILES['default_firmware'] = FIRMWARE_FILES['dso6022be_firmware']
+_firmware_lock = threading.Lock()
+
+
+def __getattr__(name):
+    if name not in FIRMWARE_FILES:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    with _firmware_lock:
+        if name not in globals():
+            globals()[name] = load_control_packets(FIRMWARE_FILES[name])
+    return globals()[name]
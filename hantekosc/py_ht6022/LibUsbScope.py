@@ -9,7 +9,9 @@ import libusb1
 import threading
 from struct import pack
 
-from hantekosc.py_ht6022.Firmware import dso6021_firmware,dso6022be_firmware, dso6022bl_firmware, fx2_ihex_to_control_packets
+# the firmwares are loaded on first use (e.g. "Firmware.dso6022be_firmware")
+from hantekosc.py_ht6022 import Firmware
+from hantekosc.py_ht6022.Firmware import fx2_ihex_to_control_packets
 
 class Oscilloscope(object):
     # sync with "__version__" in "setup.py" and "FIRMWARE_VERSION" in "py_ht6022/Firmware/DSO6022BE/descriptor.inc"
@@ -117,10 +119,11 @@ class Oscilloscope(object):
 
 
     # defaults to 6022BE with the possibility to supply a non standard VID/PID combination
-    def __init__(self, VID=NO_FIRMWARE_VENDOR_ID, PID=PRODUCT_ID_BE):
+    # several scopes can share a USB context, so the events of all of them are handled by a single thread
+    def __init__(self, VID=NO_FIRMWARE_VENDOR_ID, PID=PRODUCT_ID_BE, context=None):
         self.device = None
         self.device_handle = None
-        self.context = usb1.USBContext()
+        self.context = context if context is not None else usb1.USBContext()
         self.is_device_firmware_present = False
         self.supports_single_channel = False
         self.is_iso = False
@@ -135,81 +138,113 @@ class Oscilloscope(object):
         self.offset2 = { 1:0, 2:0, 5:0, 10:0 }
         self.gain1 = { 1:1.01, 2:1.01, 5:0.99, 10:1.0 }
         self.gain2 = { 1:1.01, 2:1.01, 5:0.99, 10:1.0 }
+        # transfers and shutdown event of the asynchronous reading (see read_async)
+        self._transfers = []
+        self._shutdown_event = None
+        self._packets = 0
+        self._user_data = ()
 
 
-    def setup(self):
+    def setup(self, serial_number=None, port=None):
         """
         Attempt to find a suitable scope to run.
+        :param serial_number: (OPTIONAL) Only use the device with this serial number. Only devices with the custom
+                              firmware loaded report a serial number. Default: use the first suitable device.
+        :param port: (OPTIONAL) Only use the device connected to this port, given as (bus number, port numbers) like
+                     returned by get_port. Default: use the first suitable device.
         :return: True if a {6022BE, 6022BL, 6021} (or user defined) scope was found, False otherwise.
         """
+        devices = self.context.getDeviceList(skip_on_error=True, skip_on_access_error=True)
+        for vendor_id, product_id in self._device_ids():
+            for device in devices:
+                if device.getVendorID() != vendor_id or device.getProductID() != product_id:
+                    continue
+                if port is not None and self._get_port(device) != port:
+                    continue
+                if serial_number is not None and (vendor_id != self.FIRMWARE_PRESENT_VENDOR_ID
+                                                  or self._get_serial_number(device) != serial_number):
+                    continue
+                self.device = device
+                # a user defined device that doesn't match {6021,6022BE,6022BL} gets the firmware uploaded
+                self.supports_single_channel = \
+                self.is_device_firmware_present = (
+                      vendor_id == self.FIRMWARE_PRESENT_VENDOR_ID
+                  and product_id in (self.PRODUCT_ID_BE, self.PRODUCT_ID_BL, self.PRODUCT_ID_21)
+                  and device.getbcdDevice() == self.FIRMWARE_VERSION
+                ) # latest custom FW loaded
+                return True
+        return False
+
+
+    def _device_ids(self):
+        """
+        The vendor and product ids of the supported devices in the order in which they are looked for.
+        """
+        device_ids = []
         # look for a user defined device that doesn't match {6021,6022BE,6022BL}
-        # ToDo: can't create a device list if always the first matching device is used
-        # ToDo: rather initialize self.VID to None?
         if ( ( self.VID != self.NO_FIRMWARE_VENDOR_ID and self.VID != self.FIRMWARE_PRESENT_VENDOR_ID )
         or ( self.PID != self.PRODUCT_ID_21
          and self.PID != self.PRODUCT_ID_BE
          and self.PID != self.PRODUCT_ID_BL ) ):
-            self.device = (
-                self.context.getByVendorIDAndProductID(
-                    self.VID, self.PID, skip_on_error=True, skip_on_access_error=True
-                )
-            )
-            if self.device:
-                self.is_device_firmware_present = False
-                return True
+            device_ids.append((self.VID, self.PID))
+        # 1st look for 6022BE, if not found look for 6022BL and then for 6021
+        for product_id in (self.PRODUCT_ID_BE, self.PRODUCT_ID_BL, self.PRODUCT_ID_21):
+            device_ids.append((self.FIRMWARE_PRESENT_VENDOR_ID, product_id))
+            device_ids.append((self.NO_FIRMWARE_VENDOR_ID, product_id))
+        return device_ids
+
+
+    def list_device_ports(self, firmware_present=None):
+        """
+        List the ports of all connected scopes without opening them.
+        :param firmware_present: (OPTIONAL) Only list devices with (True) or without (False) the custom firmware loaded.
+                                 Default: list all devices.
+        :return: A list of (bus number, port numbers) tuples that can be passed to setup.
+        """
+        ports = []
+        device_ids = set(self._device_ids())
+        for device in self.context.getDeviceList(skip_on_error=True, skip_on_access_error=True):
+            if (device.getVendorID(), device.getProductID()) not in device_ids:
+                continue
+            if (firmware_present is not None
+                    and (device.getVendorID() == self.FIRMWARE_PRESENT_VENDOR_ID) != firmware_present):
+                continue
+            ports.append(self._get_port(device))
+        return ports
+
+
+    def register_hotplug_callback(self, callback):
+        """
+        Call a function whenever a scope is connected or disconnected. The function is called while the USB events are
+        handled (see poll), so it must not call any libusb function itself.
+        :param callback: A function with two arguments: True if the device arrived (False if it left) and its port
+                         as (bus number, port numbers).
+        :return: True if successful, False if hotplug events are not supported on this platform.
+        """
+        if not usb1.hasCapability(usb1.CAP_HAS_HOTPLUG):
+            return False
+        device_ids = set(self._device_ids())
+        def hotplug_callback(context, device, event):
+            if (device.getVendorID(), device.getProductID()) in device_ids:
+                callback(event == usb1.HOTPLUG_EVENT_DEVICE_ARRIVED, self._get_port(device))
+            # keep the callback registered
+            return False
+        self.context.hotplugRegisterCallback(hotplug_callback, flags=usb1.HOTPLUG_NO_FLAGS)
+        return True
 
-        # 1st look for 6022BE
-        self.device = (
-            self.context.getByVendorIDAndProductID(
-                self.FIRMWARE_PRESENT_VENDOR_ID, self.PRODUCT_ID_BE, skip_on_error=True, skip_on_access_error=True
-            )
-         or self.context.getByVendorIDAndProductID(
-                self.NO_FIRMWARE_VENDOR_ID, self.PRODUCT_ID_BE, skip_on_error=True, skip_on_access_error=True
-            )
-        )
-        if self.device:
-            self.supports_single_channel = \
-            self.is_device_firmware_present = (
-                  self.device.getVendorID() == self.FIRMWARE_PRESENT_VENDOR_ID
-              and self.device.getbcdDevice() == self.FIRMWARE_VERSION
-            ) # latest custom FW loaded
-            return True
 
-        # if not found look for 6022BL
-        self.device = (
-            self.context.getByVendorIDAndProductID(
-                self.FIRMWARE_PRESENT_VENDOR_ID, self.PRODUCT_ID_BL, skip_on_error=True, skip_on_access_error=True
-            )
-         or self.context.getByVendorIDAndProductID(
-                self.NO_FIRMWARE_VENDOR_ID, self.PRODUCT_ID_BL, skip_on_error=True, skip_on_access_error=True
-            )
-        )
-        if self.device:
-            self.supports_single_channel = \
-            self.is_device_firmware_present = (
-                  self.device.getVendorID() == self.FIRMWARE_PRESENT_VENDOR_ID
-              and self.device.getbcdDevice() == self.FIRMWARE_VERSION
-            ) # latest custom FW loaded
-            return True
+    @staticmethod
+    def _get_port(device):
+        return device.getBusNumber(), tuple(device.getPortNumberList())
 
-        # if not found look for 6021
-        self.device = (
-            self.context.getByVendorIDAndProductID(
-                self.FIRMWARE_PRESENT_VENDOR_ID, self.PRODUCT_ID_21, skip_on_error=True, skip_on_access_error=True
-            )
-         or self.context.getByVendorIDAndProductID(
-                self.NO_FIRMWARE_VENDOR_ID, self.PRODUCT_ID_21, skip_on_error=True, skip_on_access_error=True
-            )
-        )
-        if self.device:
-            self.supports_single_channel = \
-            self.is_device_firmware_present = (
-                  self.device.getVendorID() == self.FIRMWARE_PRESENT_VENDOR_ID
-              and self.device.getbcdDevice() == self.FIRMWARE_VERSION
-            ) # latest custom FW loaded
-            return True
 
-        return False
+    @staticmethod
+    def _get_serial_number(device):
+        try:
+            return device.getSerialNumber()
+        except usb1.USBError:
+            # the device is not accessible (e.g. missing permissions)
+            return None
 
 
     def open_handle(self):
@@ -243,6 +278,7 @@ class Oscilloscope(object):
         """
         if not self.device_handle:
             return True
+        self.release_async()
         try:
             if release_interface:
                 self.device_handle.releaseInterface(0)
@@ -272,6 +308,15 @@ class Oscilloscope(object):
         return self.device.getProduct()
 
 
+    def get_port( self ):
+        """
+        Returns the port the device is connected to as (bus number, port numbers)
+        """
+        if not self.device:
+            return None
+        return self._get_port(self.device)
+
+
     def get_serial_number_string( self ):
         """
         Returns the 6 byte serial number as 12 char string
@@ -285,8 +330,22 @@ class Oscilloscope(object):
         self.close_handle()
 
 
-    def poll(self):
-        self.context.handleEvents()
+    def poll(self, timeout=None):
+        """
+        Handle pending USB events (the callbacks of read_async are called from here).
+        :param timeout: (OPTIONAL) The maximum time in seconds to wait for an event. Default: libusb's default timeout.
+        """
+        if timeout is None:
+            self.context.handleEvents()
+        else:
+            self.context.handleEventsTimeout(tv=timeout)
+
+
+    def interrupt_poll(self):
+        """
+        Make a poll that is currently waiting for events in another thread return immediately.
+        """
+        self.context.interruptEventHandler()
 
 
     def flash_firmware(self, firmware=None, supports_single_channel=True, timeout=60):
@@ -304,23 +363,39 @@ class Oscilloscope(object):
             assert self.open_handle()
         if not firmware: # called without an explicit firmware parameter
             if self.device.getProductID() == self.PRODUCT_ID_BE:
-                firmware = dso6022be_firmware
+                firmware = Firmware.dso6022be_firmware
             elif self.device.getProductID() == self.PRODUCT_ID_BL:
-                firmware = dso6022bl_firmware
+                firmware = Firmware.dso6022bl_firmware
             elif self.device.getProductID() == self.PRODUCT_ID_21:
-                firmware = dso6021_firmware
+                firmware = Firmware.dso6021_firmware
             else:
                 return False
+        # After firmware is written, scope will typically show up again as a different device at the same port (other
+        # scopes may be connected). If possible, the re-enumeration is detected by a hotplug event instead of polling.
+        port = self.get_port()
+        arrived = threading.Event()
+        hotplug_handle = None
+        if usb1.hasCapability(usb1.CAP_HAS_HOTPLUG):
+            def hotplug_callback(context, device, event):
+                if event == usb1.HOTPLUG_EVENT_DEVICE_ARRIVED and self._get_port(device) == port:
+                    arrived.set()
+                return False
+            hotplug_handle = self.context.hotplugRegisterCallback(hotplug_callback, flags=usb1.HOTPLUG_NO_FLAGS)
         for packet in firmware:
             bytes_written = self.device_handle.controlWrite(0x40, self.RW_FIRMWARE_REQUEST,
                                                             packet.value, self.RW_FIRMWARE_INDEX,
                                                             packet.data, timeout=timeout)
             assert bytes_written == packet.size
-        # After firmware is written, scope will typically show up again as a different device, so scan again
         self.close_handle(release_interface=False)
-        time.sleep(.5)
-        while not self.setup():
-            time.sleep(0.1)
+        if hotplug_handle is not None:
+            deadline = time.monotonic() + timeout
+            while not arrived.is_set() and time.monotonic() < deadline:
+                self.context.handleEventsTimeout(tv=0.05)
+            self.context.hotplugDeregisterCallback(hotplug_handle)
+        else:
+            time.sleep(.5)
+        while not self.setup(port=port):
+            time.sleep(0.01 if hotplug_handle is not None else 0.1)
         self.supports_single_channel = supports_single_channel
         self.open_handle()
         return self.is_device_firmware_present
@@ -337,13 +412,16 @@ class Oscilloscope(object):
         return self.flash_firmware(firmware=fx2_ihex_to_control_packets(hex_file), timeout=timeout)
 
 
-    def read_firmware(self, address=0, length=8192, to_ihex=True, chunk_len=16, timeout=60):
+    def read_firmware(self, address=0, length=8192, to_ihex=True, chunk_len=Firmware.MAX_CONTROL_PACKET_SIZE,
+                      timeout=60, record_len=16):
         """
         Read the entire device RAM, and return a raw string.
         :param to_ihex: (OPTIONAL) Convert the firmware into the Intel hex format after reading. Otherwise, return
-                        the firmware is a raw byte string. Default: True
-        :param chunk_len: (OPTIONAL) The length of RAM chunks to pull from the device at a time. Default: 16 bytes.
+                        the firmware as bytes. Default: True
+        :param chunk_len: (OPTIONAL) The length of RAM chunks to pull from the device at a time.
+                          Default: The largest control transfer (4096 bytes).
         :param timeout: (OPTIONAL) A timeout for each packet transfer on the firmware upload. Default: 60 seconds.
+        :param record_len: (OPTIONAL) The number of bytes per line of the Intel hex output. Default: 16 bytes.
         :return: The raw device firmware, if successful.
                  May assert or raise various libusb errors if something went wrong.
         """
@@ -351,40 +429,39 @@ class Oscilloscope(object):
             assert self.open_handle()
 
         bytes_written = self.device_handle.controlWrite(0x40, self.RW_FIRMWARE_REQUEST,
-                                                        0xe600, self.RW_FIRMWARE_INDEX,
+                                                        Firmware.CPUCS_ADDRESS, self.RW_FIRMWARE_INDEX,
                                                         b'\x01', timeout=timeout)
         assert bytes_written == 1
-        firmware_chunk_list = []
-        # TODO: Fix this for when 8192 isn't divisible by chunk_len
-        for packet in range(0, length//chunk_len):
-            chunk = self.device_handle.controlRead(0x40, self.RW_FIRMWARE_REQUEST,
-                                                   address + packet * chunk_len, self.RW_FIRMWARE_INDEX,
-                                                   chunk_len, timeout=timeout)
-            firmware_chunk_list.append(chunk)
-            assert len(chunk) == chunk_len
+        firmware = self._control_read(self.RW_FIRMWARE_REQUEST, address, self.RW_FIRMWARE_INDEX, length,
+                                      chunk_len, timeout)
         bytes_written = self.device_handle.controlWrite(0x40, self.RW_FIRMWARE_REQUEST,
-                                                        0xe600, self.RW_FIRMWARE_INDEX,
+                                                        Firmware.CPUCS_ADDRESS, self.RW_FIRMWARE_INDEX,
                                                         b'\x00', timeout=timeout)
         assert bytes_written == 1
         if not to_ihex:
-            return ''.join(firmware_chunk_list)
-
-        lines = []
-        for i, chunk in enumerate(firmware_chunk_list):
-            addr = address + i*chunk_len
-            iterable_chunk = array.array('B', chunk)
-            hex_data = "".join(["{:02x}".format(b) for b in iterable_chunk])
-            total_sum = (sum(iterable_chunk) + chunk_len + (addr % 256) + (addr >> 8)) % 256
-            checksum = (((0xFF ^ total_sum) & 0xFF) + 0x01) % 256
-            line = ":{nbytes:02x}{addr:04x}{itype:02x}{hex_data}{checksum:02x}".format(nbytes=chunk_len,
-                                                                                        addr=addr,
-                                                                                        itype=0x00,
-                                                                                        hex_data=hex_data,
-                                                                                        checksum=checksum)
-            lines.append(line)
-        # Add stop record at the end.
-        lines.append(":00000001ff")
-        return "\n".join(lines)
+            return firmware
+        return Firmware.encode_ihex(firmware, address, record_len)
+
+
+    def _control_read(self, request, address, index, length, chunk_len, timeout):
+        """
+        Read a block of memory with as few control transfers as possible.
+        :param request: The vendor request reading the memory.
+        :param address: The start address.
+        :param index: The index of the request.
+        :param length: The number of bytes to read.
+        :param chunk_len: The maximum number of bytes read by one control transfer.
+        :param timeout: A timeout for each transfer.
+        :return: The data as bytes.
+        """
+        chunk_len = min(chunk_len, Firmware.MAX_CONTROL_PACKET_SIZE)
+        data = bytearray()
+        for chunk_address in range(address, address + length, chunk_len):
+            chunk_size = min(chunk_len, address + length - chunk_address)
+            chunk = self.device_handle.controlRead(0x40, request, chunk_address, index, chunk_size, timeout=timeout)
+            assert len(chunk) == chunk_size
+            data += chunk
+        return bytes(data)
 
 
     def get_calibration_values(self, size=32, timeout=0):
@@ -479,9 +556,8 @@ class Oscilloscope(object):
         """
         if not self.device_handle:
             assert self.open_handle()
-        data = self.device_handle.controlRead(0x40, self.RW_EEPROM_REQUEST, offset,
-                                              self.RW_EEPROM_INDEX, length, timeout=timeout)
-        return data
+        return self._control_read(self.RW_EEPROM_REQUEST, offset, self.RW_EEPROM_INDEX, length,
+                                  Firmware.MAX_CONTROL_PACKET_SIZE, timeout)
 
 
     def write_eeprom(self, offset, data, timeout=0):
@@ -494,9 +570,11 @@ class Oscilloscope(object):
         """
         if not self.device_handle:
             assert self.open_handle()
-        data_len = self.device_handle.controlWrite(0x40, self.RW_EEPROM_REQUEST, offset,
-                                                   self.RW_EEPROM_INDEX, data, timeout=timeout)
-        assert data_len == len(data)
+        for position in range(0, len(data), Firmware.MAX_CONTROL_PACKET_SIZE):
+            chunk = data[position:position + Firmware.MAX_CONTROL_PACKET_SIZE]
+            data_len = self.device_handle.controlWrite(0x40, self.RW_EEPROM_REQUEST, offset + position,
+                                                       self.RW_EEPROM_INDEX, chunk, timeout=timeout)
+            assert data_len == len(chunk)
         return True
 
 
@@ -623,7 +701,7 @@ class Oscilloscope(object):
         return True
 
 
-    def read_async_iso(self, callback, packets, outstanding_transfers, raw):
+    def read_async_iso(self, callback, packets, outstanding_transfers, raw, tag=None):
         """
         Internal function to read from isochronous channel.  External
         users should call read_async.
@@ -633,38 +711,53 @@ class Oscilloscope(object):
         shutdown_is_set = shutdown_event.is_set
         if self.num_channels == 1 and raw:
             def transfer_callback(iso_transfer):
+                if iso_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 for (status, data) in iso_transfer.iterISO():
-                    callback(data, '')
+                    callback(data, '', *iso_transfer.getUserData())
                 if not shutdown_is_set():
                     iso_transfer.submit()
         elif self.num_channels == 1 and not raw:
             def transfer_callback(iso_transfer):
+                if iso_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 for (status, data) in iso_transfer.iterISO():
-                    callback(array_builder('B', data), [])
+                    callback(array_builder('B', data), [], *iso_transfer.getUserData())
                 if not shutdown_is_set():
                     iso_transfer.submit()
         elif self.num_channels == 2 and raw:
             def transfer_callback(iso_transfer):
+                if iso_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 for (status, data) in iso_transfer.iterISO():
-                    callback(data[::2], data[1::2])
+                    callback(data[::2], data[1::2], *iso_transfer.getUserData())
                 if not shutdown_is_set():
                     iso_transfer.submit()
         elif self.num_channels == 2 and not raw:
             def transfer_callback(iso_transfer):
+                if iso_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 for (status, data) in iso_transfer.iterISO():
-                    callback(array_builder('B', data[::2]), array_builder('B', data[1::2]))
+                    callback(array_builder('B', data[::2]), array_builder('B', data[1::2]),
+                             *iso_transfer.getUserData())
                 if not shutdown_is_set():
                     iso_transfer.submit()
         else:
             assert False
+        self._shutdown_event = shutdown_event
+        self._packets = packets
+        self._user_data = () if tag is None else (tag,)
+        self._transfers = []
         for _ in range(outstanding_transfers):
             transfer = self.device_handle.getTransfer(iso_packets=packets)
-            transfer.setIsochronous(0x82, (packets*self.packetsize), callback=transfer_callback)
+            transfer.setIsochronous(0x82, (packets*self.packetsize), callback=transfer_callback,
+                                    user_data=self._user_data)
             transfer.submit()
+            self._transfers.append(transfer)
         return shutdown_event
 
 
-    def read_async_bulk(self, callback, packets, outstanding_transfers, raw):
+    def read_async_bulk(self, callback, packets, outstanding_transfers, raw, tag=None):
         """
         Internal function to read from bulk channel.  External
         users should call read_async.
@@ -674,38 +767,52 @@ class Oscilloscope(object):
         shutdown_is_set = shutdown_event.is_set
         if self.num_channels == 1 and raw:
             def transfer_callback(bulk_transfer):
+                if bulk_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 data = bulk_transfer.getBuffer()[0:bulk_transfer.getActualLength()]
-                callback(data, '')
+                callback(data, '', *bulk_transfer.getUserData())
                 if not shutdown_is_set():
                     bulk_transfer.submit()
         elif self.num_channels == 1 and not raw:
             def transfer_callback(bulk_transfer):
+                if bulk_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 data = bulk_transfer.getBuffer()[0:bulk_transfer.getActualLength()]
-                callback(array_builder('B', data), [])
+                callback(array_builder('B', data), [], *bulk_transfer.getUserData())
                 if not shutdown_is_set():
                     bulk_transfer.submit()
         elif self.num_channels == 2 and raw:
             def transfer_callback(bulk_transfer):
+                if bulk_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 data = bulk_transfer.getBuffer()[0:bulk_transfer.getActualLength()]
-                callback(data[::2], data[1::2])
+                callback(data[::2], data[1::2], *bulk_transfer.getUserData())
                 if not shutdown_is_set():
                     bulk_transfer.submit()
         elif self.num_channels == 2 and not raw:
             def transfer_callback(bulk_transfer):
+                if bulk_transfer.getStatus() in (usb1.TRANSFER_CANCELLED, usb1.TRANSFER_NO_DEVICE):
+                    return
                 data = bulk_transfer.getBuffer()[0:bulk_transfer.getActualLength()]
-                callback(array_builder('B', data[::2]), array_builder('B', data[1::2]))
+                callback(array_builder('B', data[::2]), array_builder('B', data[1::2]),
+                         *bulk_transfer.getUserData())
                 if not shutdown_is_set():
                     bulk_transfer.submit()
         else:
             assert False
+        self._shutdown_event = shutdown_event
+        self._packets = packets
+        self._user_data = () if tag is None else (tag,)
+        self._transfers = []
         for _ in range(outstanding_transfers):
             transfer = self.device_handle.getTransfer(iso_packets=packets)
-            transfer.setBulk(0x86, (packets*self.packetsize), callback=transfer_callback)
+            transfer.setBulk(0x86, (packets*self.packetsize), callback=transfer_callback, user_data=self._user_data)
             transfer.submit()
+            self._transfers.append(transfer)
         return shutdown_event
 
 
-    def read_async(self, callback, data_size, outstanding_transfers=3, raw=False):
+    def read_async(self, callback, data_size, outstanding_transfers=3, raw=False, tag=None):
         """
         Read both channel's ADC data from the device asynchronously. No trigger support, you need to do this in software.
         The function returns immediately but the data is then sent asynchronously to the callback function whenever it
@@ -716,15 +823,100 @@ class Oscilloscope(object):
         :param int outstanding_transfers: (OPTIONAL) The number of transfers sent to the kernel at the same time to
                 improve gapless sampling.  The higher, the more likely it works, but the more resources it will take.
         :param raw: (OPTIONAL) Whether the samples should be returned as raw string (8-bit data) or as an array of bytes.
+        :param tag: (OPTIONAL) A value stored on each transfer when it is submitted and passed to the callback as third
+                    argument, so the data of transfers submitted before a settings change can be recognized (see
+                    resubmit_async). Default: the callback is called with two arguments.
         :return: Returns a shutdown event handle if successful (and then calls the callback asynchronously).
                  Call set() on the returned event to stop sampling.
         """
         # data_size to packets
         packets = (data_size + self.packetsize-1)//self.packetsize
         if self.is_iso:
-            return self.read_async_iso(callback, packets, outstanding_transfers, raw)
+            return self.read_async_iso(callback, packets, outstanding_transfers, raw, tag)
         else:
-            return self.read_async_bulk(callback, packets, outstanding_transfers, raw)
+            return self.read_async_bulk(callback, packets, outstanding_transfers, raw, tag)
+
+
+    def cancel_async(self, timeout=1):
+        """
+        Stop the asynchronous reading started with read_async. All outstanding transfers are cancelled and the
+        function returns as soon as libusb has given all of them back, so the callback is not called anymore
+        afterwards. The transfers are kept and can be submitted again with resubmit_async.
+        :param timeout: (OPTIONAL) The maximum time in seconds to wait for the transfers. Default: 1 second.
+        :return: True if all transfers have been given back, False if the timeout expired.
+        """
+        if self._shutdown_event is None:
+            return True
+        self._shutdown_event.set()
+        deadline = time.monotonic() + timeout
+        while True:
+            submitted_transfers = [transfer for transfer in self._transfers if transfer.isSubmitted()]
+            if not submitted_transfers:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            for transfer in submitted_transfers:
+                try:
+                    transfer.cancel()
+                except (usb1.USBErrorNotFound, usb1.USBErrorNoDevice):
+                    # already completed or cancelled, the callback just has not been called yet
+                    pass
+            # the events may also be handled by another thread, so only wait for a short time
+            self.context.handleEventsTimeout(tv=min(remaining, 0.01))
+
+
+    def resubmit_async(self, data_size=None, tag=None):
+        """
+        Restart the asynchronous reading after cancel_async. The transfers and the callback of read_async are reused.
+        :param data_size: (OPTIONAL) A new block size (see read_async). Default: keep the current block size.
+        :param tag: (OPTIONAL) A new tag stored on the resubmitted transfers (see read_async). Transfers that could
+                    not be cancelled keep their old tag. Default: keep the tag.
+        :return: The shutdown event handle of read_async.
+        """
+        if self._shutdown_event is None:
+            raise RuntimeError('read_async has not been called')
+        packets = self._packets
+        if data_size is not None:
+            packets = (data_size + self.packetsize-1)//self.packetsize
+        if packets != self._packets:
+            for index, transfer in enumerate(self._transfers):
+                if transfer.isSubmitted():
+                    # cancel_async timed out, the transfer is still in use
+                    continue
+                callback = transfer.getCallback()
+                if self.is_iso:
+                    # the number of iso packets of a transfer is fixed, so the transfer must be replaced
+                    transfer.close()
+                    transfer = self.device_handle.getTransfer(iso_packets=packets)
+                    transfer.setIsochronous(0x82, (packets*self.packetsize), callback=callback,
+                                            user_data=self._user_data)
+                    self._transfers[index] = transfer
+                else:
+                    transfer.setBulk(0x86, (packets*self.packetsize), callback=callback, user_data=self._user_data)
+            self._packets = packets
+        if tag is not None:
+            self._user_data = (tag,)
+        self._shutdown_event.clear()
+        for transfer in self._transfers:
+            if not transfer.isSubmitted():
+                transfer.setUserData(self._user_data)
+                transfer.submit()
+        return self._shutdown_event
+
+
+    def release_async(self):
+        """
+        Cancel the asynchronous reading and free its transfers. read_async must be called to read again.
+        :return: True if all transfers have been freed, False if some of them could not be cancelled.
+        """
+        if not self.cancel_async():
+            return False
+        for transfer in self._transfers:
+            transfer.close()
+        self._transfers = []
+        self._shutdown_event = None
+        return True
 
 
     def scale_read_data( self, read_data, voltage_range=1, channel=1, probe=1, offset=0 ):
@@ -0,0 +1,186 @@
+import numpy as np
+
+
+class WaveformPyramid:
+    """
+    Min/max/mean levels of a record (a mip-map of the waveform), so envelopes of any width and any section of the record
+    can be produced without scanning all samples of the record again.
+
+    Level 0 is the published data of the record. Each further level holds the minimum, the maximum and the mean ADC
+    count of blocks of "factor" entries of the level below, down to a length of "min_length" entries. The levels are
+    built incrementally while the record is assembled ("update"), and completed when it is published ("finish").
+    A query is answered from the coarsest level that still has at least four entries per output point, so the peaks
+    are never lost and are placed with an error of at most a quarter point.
+
+    Attributes:
+        factor (int): The number of entries of a level combined into one entry of the next level (2 to 16).
+        record_length (int): The number of samples of each channel.
+        levels (list): The minima, maxima and means of each level as tuple of arrays (one row per channel). The arrays
+            of level 0 are the data of the record (available once it is finished), the other levels hold ADC counts.
+    """
+    def __init__(self, record_length, number_of_channels=2, factor=4, min_length=256, c_code=None):
+        """
+        Class constructor. The levels are allocated, but empty.
+
+        Args:
+            record_length (int): The number of samples of each channel.
+            number_of_channels (int): (OPTIONAL) The number of channels.
+            factor (int): (OPTIONAL) The number of entries of a level combined into one entry of the next level.
+            min_length (int): (OPTIONAL) The minimum number of entries of a level.
+            c_code (C_Code): (OPTIONAL) Used to run the kernels in C. Default: use NumPy.
+        """
+        if not 2 <= factor <= 16:
+            raise ValueError('The factor between two levels must be between 2 and 16.')
+        self.factor = factor
+        self.record_length = record_length
+        self.levels = [(None, None, None)]
+        self._c_code = c_code if c_code is not None and c_code.c_code_loaded else None
+        length = record_length
+        while length // factor >= min_length:
+            length = -(-length // factor)
+            self.levels.append((np.empty((number_of_channels, length), dtype=np.uint8),
+                                np.empty((number_of_channels, length), dtype=np.uint8),
+                                np.empty((number_of_channels, length), dtype=np.float32)))
+        # the number of complete entries of each level
+        self._complete = [0] * len(self.levels)
+
+    @classmethod
+    def from_record(cls, data, adc_counts=None, c_code=None, factor=4, min_length=256):
+        """
+        Build the pyramid of a complete record at once.
+
+        Args:
+            data (numpy.array): The published data of the record (one row per channel).
+            adc_counts (numpy.array): (OPTIONAL) The ADC counts of the record. Default: only level 0 is available.
+            c_code (C_Code): (OPTIONAL) Used to run the kernels in C.
+            factor (int): (OPTIONAL) The number of entries of a level combined into one entry of the next level.
+            min_length (int): (OPTIONAL) The minimum number of entries of a level.
+
+        Returns:
+            WaveformPyramid: The pyramid.
+        """
+        if adc_counts is None:
+            # no level above the record data
+            min_length = data.shape[1] + 1
+        pyramid = cls(data.shape[1], data.shape[0], factor, min_length, c_code)
+        pyramid.finish(data, adc_counts)
+        return pyramid
+
+    def update(self, adc_counts, length):
+        """
+        Add the samples of the record assembled so far to the levels. Only entries that are complete are calculated,
+        so each sample is processed once.
+
+        Args:
+            adc_counts (numpy.array): The buffer the record is assembled in (one row per channel).
+            length (int): The number of samples of the buffer that are filled.
+        """
+        self._complete[0] = length
+        self._build(adc_counts, 1024)
+
+    def _build(self, adc_counts, min_entries):
+        """
+        Calculate the complete entries of all levels. The levels above level 1 are only calculated once at least
+        min_entries entries can be added, so the upper levels are not updated for each block.
+        """
+        for level in range(1, len(self.levels)):
+            first = self._complete[level]
+            last = self._complete[level - 1] // self.factor
+            if last <= first or (level > 1 and last - first < min_entries):
+                continue
+            if level == 1:
+                minima = maxima = adc_counts
+                means = None
+            else:
+                minima, maxima, means = self.levels[level - 1]
+            start, stop = first * self.factor, last * self.factor
+            out_minima, out_maxima, out_means = self.levels[level]
+            self._reduce_level(minima[:, start:stop], maxima[:, start:stop],
+                               None if means is None else means[:, start:stop], out_minima[:, first:last],
+                               out_maxima[:, first:last], out_means[:, first:last])
+            self._complete[level] = last
+
+    def finish(self, data, adc_counts=None):
+        """
+        Complete the levels when the record is published: the last entries that cover fewer samples than the other
+        entries are calculated and the record data is used as level 0.
+
+        Args:
+            data (numpy.array): The published data of the record (one row per channel).
+            adc_counts (numpy.array): (OPTIONAL) The ADC counts of the record. Needed if there are levels above level 0.
+        """
+        # a read-only view, so the published data cannot be changed through the pyramid
+        data = data.view()
+        data.flags.writeable = False
+        self.levels[0] = (data, data, data)
+        self._complete[0] = self.record_length
+        self._build(adc_counts, 1)
+        for level in range(1, len(self.levels)):
+            minima, maxima, means = self.levels[level]
+            if self._complete[level] < minima.shape[1]:
+                # the samples of the last entry
+                tail = adc_counts[:, (minima.shape[1] - 1) * self.factor ** level:]
+                minima[:, -1] = tail.min(axis=1)
+                maxima[:, -1] = tail.max(axis=1)
+                means[:, -1] = tail.mean(axis=1)
+                self._complete[level] = minima.shape[1]
+
+    def _reduce_level(self, minima, maxima, means, out_minima, out_maxima, out_means):
+        """
+        Calculate entries of a level from blocks of "factor" entries of the level below (one row per channel, means is
+        None for raw data).
+        """
+        if self._c_code is not None:
+            self._c_code.reduce_level(minima, maxima, means, self.factor, out_minima, out_maxima, out_means)
+            return
+        shape = (len(out_minima), out_minima.shape[1], self.factor)
+        out_minima[:] = minima.reshape(shape).min(axis=2)
+        out_maxima[:] = maxima.reshape(shape).max(axis=2)
+        out_means[:] = (minima if means is None else means).reshape(shape).mean(axis=2)
+
+    def _minmax(self, minima, maxima, n_bins, out_min=None, out_max=None):
+        """
+        Get the minimum and the maximum of n_bins bins of (nearly) equal size.
+        """
+        if self._c_code is not None:
+            return self._c_code.minmax_decimate(minima, maxima, n_bins, out_min, out_max)
+        starts = np.arange(n_bins) * len(minima) // n_bins
+        return (np.minimum.reduceat(minima, starts, out=out_min), np.maximum.reduceat(maxima, starts, out=out_max))
+
+    def query(self, channel, start, stop, n_points):
+        """
+        Get a section of a channel reduced to n_points bins of (nearly) equal size: the minimum, the maximum and the
+        mean of each bin. The time needed is proportional to n_points, not to the length of the section.
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            start (int): The index of the first sample of the section.
+            stop (int): The index behind the last sample of the section.
+            n_points (int): The number of bins. It is limited to the number of samples of the section.
+
+        Returns:
+            tuple: The minima, the maxima, the means (numpy.array) and the level they were taken from (ADC counts if it
+                is not 0).
+        """
+        length = stop - start
+        if length < 1:
+            raise ValueError('The section does not contain any samples.')
+        n_points = min(n_points, length)
+        level = 0
+        while level + 1 < len(self.levels) and length // self.factor ** (level + 1) >= 4 * n_points:
+            level += 1
+        block_size = self.factor ** level
+        first = start // block_size
+        last = -(-stop // block_size)
+        minima, maxima, means = (array[channel, first:last] for array in self.levels[level])
+        n_points = min(n_points, last - first)
+        minima, maxima = self._minmax(minima, maxima, n_points)
+        starts = np.arange(n_points) * (last - first) // n_points
+        # the entries of a level cover the same number of samples, except the last entry of the record
+        weights = np.diff(np.append(starts, last - first)).astype(np.float64)
+        sums = np.add.reduceat(means, starts, dtype=np.float64)
+        if last * block_size > self.record_length:
+            missing = last * block_size - self.record_length
+            sums[-1] -= means[-1] * missing / block_size
+            weights[-1] -= missing / block_size
+        return minima, maxima, sums / weights, level
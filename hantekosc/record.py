@@ -0,0 +1,373 @@
+import threading
+import weakref
+from collections import deque
+
+import numpy as np
+
+from hantekosc.measurements import measure
+from hantekosc.pyramid import WaveformPyramid
+
+
+class Record:
+    """
+    An immutable snapshot of a record of all channels.
+
+    The arrays of a record are read-only views into the buffers of the oscilloscope. They are never overwritten while
+    a record (or any view of its arrays) is still referenced, so they can be used without copying them.
+
+    Attributes:
+        record_id (int): The number of the record. It is increased by one for each published record.
+        timing_data (numpy.array): The time of each sample in seconds.
+        data (numpy.array): The measurement data of each channel (one row per channel). Voltages, or ADC counts if the
+            data type is 'uint8'.
+        data_type (str): The data type of the measurement data ('float32', 'float64' or 'uint8').
+        scale_factors (tuple): The scale factor of each channel used to convert ADC counts into volts.
+        offsets (tuple): The offset of each channel used to convert ADC counts into volts.
+        sample_rate (float): The sample rate in Hz.
+        pyramid (WaveformPyramid): The min/max levels of the record used for peak detection (None if they have not
+            been built).
+        measurements (list): The measurements of each channel (see "measure"), None for channels not measured yet.
+        math_data (dict): The voltages of each math channel by its name (see "hantekosc.math_channel.MathChannel").
+    """
+    def __init__(self, record_id, timing_data, data, data_type, scale_factors, offsets, sample_rate, pyramid=None,
+                 measurements=None, math_data=None):
+        """
+        Class constructor.
+
+        Args:
+            record_id (int): The number of the record.
+            timing_data (numpy.array): The time of each sample in seconds.
+            data (numpy.array): The measurement data of each channel.
+            data_type (str): The data type of the measurement data.
+            scale_factors (tuple): The scale factor of each channel.
+            offsets (tuple): The offset of each channel.
+            sample_rate (float): The sample rate in Hz.
+            pyramid (WaveformPyramid): (OPTIONAL) The min/max levels of the record.
+            measurements (list): (OPTIONAL) The measurements of each channel calculated when the record was published.
+            math_data (dict): (OPTIONAL) The voltages of each math channel by its name.
+        """
+        self.record_id = record_id
+        self.timing_data = self._read_only(timing_data)
+        self.data = self._read_only(data)
+        self.data_type = data_type
+        self.scale_factors = tuple(scale_factors)
+        self.offsets = tuple(offsets)
+        self.sample_rate = sample_rate
+        self.pyramid = pyramid
+        self.measurements = list(measurements) if measurements is not None else [None] * len(self.data)
+        self.math_data = {name: self._read_only(array) for name, array in (math_data or {}).items()}
+
+    @staticmethod
+    def _read_only(array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def record_length(self):
+        """
+        Get the number of samples of each channel.
+
+        Returns:
+            int: The record length.
+        """
+        return len(self.timing_data)
+
+    def voltage_data(self, channel, dtype=np.float32):
+        """
+        Get the voltages of a channel. Only in the 'uint8' data mode the ADC counts are converted (into a new array of
+        the given data type), otherwise the read-only view is returned.
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            dtype: (OPTIONAL) The data type used for the conversion of ADC counts.
+
+        Returns:
+            numpy.array: The voltage data.
+        """
+        if self.data_type != 'uint8':
+            return self.data[channel]
+        voltage_data = np.subtract(self.data[channel], 128 + self.offsets[channel], dtype=dtype)
+        voltage_data *= self.scale_factors[channel]
+        return voltage_data
+
+    def measure(self, channel):
+        """
+        Get the standard measurements of a channel (see "hantekosc.measurements.MEASUREMENTS"). They are calculated
+        when the record is published if the measurements of the channel are enabled, otherwise on the first call.
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+
+        Returns:
+            dict: The value of each measurement in volts, seconds or percent (NaN if it is not defined).
+        """
+        if self.measurements[channel] is None:
+            self.measurements[channel] = measure(self.adc_counts(channel), self.sample_rate,
+                                                 self.scale_factors[channel], self.offsets[channel])
+        return self.measurements[channel]
+
+    def adc_counts(self, channel):
+        """
+        Get the ADC counts of a channel. Only in the 'uint8' data mode they are returned directly, the voltages of the
+        other data modes are converted back into the ADC counts they were calculated from (rounded in the averaging
+        acquisition modes).
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+
+        Returns:
+            numpy.array: The ADC counts (uint8).
+        """
+        if self.data_type == 'uint8':
+            return self.data[channel]
+        adc_counts = np.rint(self.data[channel] / self.scale_factors[channel] + 128 + self.offsets[channel])
+        return np.clip(adc_counts, 0, 255).astype(np.uint8)
+
+    def envelope(self, channel, n_points, start=0, stop=None):
+        """
+        Get the envelope of a channel for a display n_points wide: the minimum and the maximum of n_points bins of
+        (nearly) equal size (peak detection). It is calculated from the min/max levels of the record, so it only takes
+        time proportional to n_points.
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            n_points (int): The number of bins. It is limited to the number of samples.
+            start (int): (OPTIONAL) The index of the first sample.
+            stop (int): (OPTIONAL) The index behind the last sample. Default: the record length.
+
+        Returns:
+            tuple: The time of the first sample of each bin, the minima and the maxima (in the unit of "data").
+        """
+        return self._reduce(channel, start, self.record_length if stop is None else stop, n_points)[:3]
+
+    def view(self, channel, t_start=None, t_end=None, n_points=2000):
+        """
+        Get a time window of a channel reduced to n_points bins: the minimum, the maximum and the mean of each bin.
+        The result is calculated from the level of the min/max/mean pyramid that fits the zoom, so it only takes time
+        proportional to n_points (not to the length of the window).
+
+        Args:
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            t_start (float): (OPTIONAL) The start of the window in seconds. Default: the start of the record.
+            t_end (float): (OPTIONAL) The end of the window in seconds. Default: the end of the record.
+            n_points (int): (OPTIONAL) The number of bins. It is limited to the number of samples in the window.
+
+        Returns:
+            tuple: The time of the first sample of each bin, the minima, the maxima and the means (in the unit of
+                "data", the means of ADC counts are floats).
+        """
+        first_time = float(self.timing_data[0]) if self.record_length else 0.0
+        start = 0 if t_start is None else int(np.ceil(round((t_start - first_time) * self.sample_rate, 6)))
+        stop = self.record_length if t_end is None else \
+            int(np.floor(round((t_end - first_time) * self.sample_rate, 6))) + 1
+        start = min(max(start, 0), self.record_length)
+        stop = min(max(stop, start), self.record_length)
+        if stop <= start:
+            raise ValueError('The time window does not contain any samples.')
+        return self._reduce(channel, start, stop, n_points)
+
+    def _reduce(self, channel, start, stop, n_points):
+        if self.pyramid is None:
+            self.pyramid = WaveformPyramid.from_record(self.data, self.data if self.data_type == 'uint8' else None)
+        minima, maxima, means, level = self.pyramid.query(channel, start, stop, n_points)
+        if self.data_type != 'uint8':
+            if level > 0:
+                # the levels above the record data hold ADC counts
+                minima = self._counts_to_volts(minima, channel)
+                maxima = self._counts_to_volts(maxima, channel)
+                means = self._counts_to_volts(means, channel)
+                if self.scale_factors[channel] < 0:
+                    # the largest ADC count is the lowest voltage
+                    minima, maxima = maxima, minima
+            else:
+                means = means.astype(self.data.dtype)
+        starts = start + np.arange(len(minima)) * (stop - start) // len(minima)
+        return self.timing_data[starts], minima, maxima, means
+
+    def _counts_to_volts(self, adc_counts, channel):
+        voltage_data = np.subtract(adc_counts, 128 + self.offsets[channel], dtype=self.data.dtype)
+        voltage_data *= self.scale_factors[channel]
+        return voltage_data
+
+    def copy(self):
+        """
+        Get a copy of the record with writable arrays.
+
+        Returns:
+            Record: The copy.
+        """
+        record = Record(self.record_id, self.timing_data, self.data, self.data_type, self.scale_factors, self.offsets,
+                        self.sample_rate, self.pyramid, self.measurements)
+        record.timing_data = np.array(self.timing_data, copy=True)
+        record.data = np.array(self.data, copy=True)
+        record.math_data = {name: np.array(array, copy=True) for name, array in self.math_data.items()}
+        return record
+
+
+class _Lease:
+    """
+    The owner of the memory of a buffer handed out by a BufferPool. The arrays of a lease (and all views of them) keep
+    the lease alive, so the buffer is given back to the pool when the last of them is deleted.
+    """
+    def __init__(self, buffer):
+        self.__array_interface__ = buffer.__array_interface__
+        self._buffer = buffer
+
+
+class BufferPool:
+    """
+    A pool of reusable arrays (e.g. a triple buffer for the published records).
+
+    Each buffer is leased: "acquire" returns an array whose memory is owned by a lease object instead of the buffer,
+    so the lease stays alive as long as the array, any record or any view of it is alive. A finalizer gives the buffer
+    back to the pool when the lease is deleted. If all buffers are leased, a new buffer is allocated, so published
+    data is never overwritten.
+
+    Attributes:
+        number_of_buffers (int): The number of buffers kept in the pool.
+    """
+    def __init__(self, number_of_buffers=3):
+        """
+        Class constructor.
+
+        Args:
+            number_of_buffers (int): The number of buffers kept in the pool.
+        """
+        self.number_of_buffers = number_of_buffers
+        # the buffers as [array, leased] entries (the finalizers of the leases reset the flag of their entry)
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    def _release(self, entry):
+        with self._lock:
+            entry[1] = False
+
+    def _lease(self, entry):
+        entry[1] = True
+        lease = _Lease(entry[0])
+        weakref.finalize(lease, self._release, entry)
+        return np.asarray(lease)
+
+    def acquire(self, shape, dtype):
+        """
+        Get a buffer that is not used anywhere else.
+
+        Args:
+            shape (tuple): The shape of the buffer.
+            dtype: The data type of the buffer.
+
+        Returns:
+            numpy.array: The buffer. Its content is undefined.
+        """
+        dtype = np.dtype(dtype)
+        shape = tuple(shape)
+        with self._lock:
+            for index, entry in enumerate(self._buffers):
+                if not entry[1] and entry[0].shape == shape and entry[0].dtype == dtype:
+                    # move the buffer to the end, so the buffers are used in turn
+                    self._buffers.append(self._buffers.pop(index))
+                    return self._lease(entry)
+
+            if len(self._buffers) >= self.number_of_buffers:
+                # drop the oldest buffer that does not fit or is still leased (it lives on as long as it is referenced)
+                unusable = [index for index, (buffer, leased) in enumerate(self._buffers)
+                            if leased or buffer.shape != shape or buffer.dtype != dtype]
+                del self._buffers[unusable[0] if unusable else 0]
+            entry = [np.empty(shape, dtype=dtype), False]
+            self._buffers.append(entry)
+            return self._lease(entry)
+
+
+class RecordStream:
+    """
+    An iterator yielding each record published by an oscilloscope exactly once (or each update of the roll display,
+    see "Oscilloscope.roll_updates"). It can be used with "for" as well as with "async for".
+
+    The records are buffered in a bounded queue. If the consumer is too slow and the queue is full, the oldest record
+    is dropped. The iteration ends when the measurement is stopped and all buffered records have been consumed. A
+    stream created before the measurement is started waits for its first record.
+
+    Attributes:
+        osc: The oscilloscope the records are received from.
+        dropped_records (int): The number of records dropped because the queue was full.
+        timeout (float): The maximum time in seconds to wait for a record (None: wait until the measurement stops).
+    """
+    def __init__(self, osc, maxsize=16, timeout=None, roll_updates=False):
+        """
+        Class constructor.
+
+        Args:
+            osc: The oscilloscope the records are received from.
+            maxsize (int): The maximum number of buffered records.
+            timeout (float): The maximum time in seconds to wait for a record.
+            roll_updates (bool): (OPTIONAL) Receive the updates of the roll display instead of records.
+        """
+        self.osc = osc
+        self.timeout = timeout
+        self._roll_updates = roll_updates
+        self.dropped_records = 0
+        self._records = deque(maxlen=maxsize)
+        self._closed = False
+        # the stream ends with the next stop of the measurement
+        self._stop_count = osc.stop_count
+
+    def put(self, record):
+        """
+        Add a published record to the queue. Must be called with the record condition of the oscilloscope held.
+
+        Args:
+            record (Record): The published record.
+        """
+        if len(self._records) == self._records.maxlen:
+            self.dropped_records += 1
+        self._records.append(record)
+
+    def close(self):
+        """
+        Stop receiving records.
+        """
+        self._closed = True
+        self.osc.unsubscribe(self)
+
+    @property
+    def _stopped(self):
+        return self.osc.stop_count != self._stop_count
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        condition = self.osc.record_condition
+        with condition:
+            if not condition.wait_for(lambda: self._records or self._closed or self._stopped, self.timeout) \
+                    or not self._records:
+                self.close()
+                raise StopIteration
+            return self._records.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        import asyncio
+        while True:
+            with self.osc.record_condition:
+                if self._records:
+                    return self._records.popleft()
+                if self._closed or self._stopped:
+                    self.close()
+                    raise StopAsyncIteration
+                # registered while the lock is held, so a stop right after the check resolves it
+                future = self.osc._add_waiter(self._roll_updates)
+            try:
+                await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self.close()
+                raise StopAsyncIteration
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+
+
+class RollUpdate:
+    """
+    The samples added to the roll display by one data block (see the 'ROLL' trigger mode of the oscilloscope).
+
+    Only the new samples are published, so the work per update is proportional to the block size and not to the
+    record length. A display appends them at "start_index" (modulo its width) to show a continuously scrolling
+    strip chart.
+
+    Attributes:
+        update_id (int): The number of the update. It is increased by one for each update.
+        start_index (int): The index of the first new sample, counted from the start of the measurement.
+        data (numpy.array): The new samples of each channel (one row per channel, read-only). Voltages, or ADC counts
+            if the data type is 'uint8'.
+        data_type (str): The data type of the measurement data ('float32', 'float64' or 'uint8').
+        scale_factors (tuple): The scale factor of each channel used to convert ADC counts into volts.
+        offsets (tuple): The offset of each channel used to convert ADC counts into volts.
+        sample_rate (float): The sample rate in Hz.
+    """
+    def __init__(self, update_id, start_index, data, data_type, scale_factors, offsets, sample_rate):
+        """
+        Class constructor.
+
+        Args:
+            update_id (int): The number of the update.
+            start_index (int): The index of the first new sample.
+            data (numpy.array): The new samples of each channel.
+            data_type (str): The data type of the measurement data.
+            scale_factors (tuple): The scale factor of each channel.
+            offsets (tuple): The offset of each channel.
+            sample_rate (float): The sample rate in Hz.
+        """
+        self.update_id = update_id
+        self.start_index = start_index
+        self.data = data.view()
+        self.data.flags.writeable = False
+        self.data_type = data_type
+        self.scale_factors = tuple(scale_factors)
+        self.offsets = tuple(offsets)
+        self.sample_rate = sample_rate
+
+    @property
+    def number_of_samples(self):
+        """
+        Get the number of new samples of each channel.
+
+        Returns:
+            int: The number of samples.
+        """
+        return self.data.shape[1]
+
+    @property
+    def timing_data(self):
+        """
+        Get the time of each new sample relative to the start of the measurement.
+
+        Returns:
+            numpy.array: The times in seconds.
+        """
+        return (self.start_index + np.arange(self.number_of_samples)) / self.sample_rate
+
+
+class RollBuffer:
+    """
+    A circular buffer holding the last "length" ADC counts of each channel for the roll display. Appending a block
+    only copies the block, the oldest samples are overwritten.
+
+    Attributes:
+        length (int): The number of samples kept of each channel.
+        total_samples (int): The number of samples appended since the buffer was created.
+    """
+    def __init__(self, length, number_of_channels=2):
+        """
+        Class constructor.
+
+        Args:
+            length (int): The number of samples kept of each channel.
+            number_of_channels (int): (OPTIONAL) The number of channels.
+        """
+        self.length = length
+        self.total_samples = 0
+        self._buffer = np.full((number_of_channels, length), 128, dtype=np.uint8)
+        self._lock = threading.Lock()
+
+    def append(self, block):
+        """
+        Append a data block.
+
+        Args:
+            block (tuple): The ADC counts of the block for each channel.
+        """
+        block_length = len(block[0])
+        # only the newest samples fit into the buffer
+        skipped = max(0, block_length - self.length)
+        with self._lock:
+            position = (self.total_samples + skipped) % self.length
+            first_part = min(block_length - skipped, self.length - position)
+            for i, data in enumerate(block):
+                self._buffer[i, position:position + first_part] = data[skipped:skipped + first_part]
+                self._buffer[i, :block_length - skipped - first_part] = data[skipped + first_part:]
+            self.total_samples += block_length
+
+    def snapshot(self):
+        """
+        Get the samples of the buffer in chronological order (e.g. to redraw the whole display).
+
+        Returns:
+            tuple: The index of the first sample (counted from the start of the measurement) and a copy of the ADC
+                counts (one row per channel, at most "length" samples).
+        """
+        with self._lock:
+            if self.total_samples <= self.length:
+                return 0, self._buffer[:, :self.total_samples].copy()
+            position = self.total_samples % self.length
+            return self.total_samples - self.length, np.roll(self._buffer, -position, axis=1)
@@ -0,0 +1,193 @@
+import threading
+import time
+
+import usb1
+
+from hantekosc.oscilloscope import Oscilloscope
+
+
+class ScopeGroup:
+    """
+    Manage several oscilloscopes that measure at the same time.
+
+    All devices share a single USB context whose events are handled by one thread. Each device keeps its own processing
+    thread, and the C code releases the GIL, so the data of the devices is processed on several cores in parallel.
+    The threads and transfers of all devices are prepared before the capture is started on the devices directly one
+    after another, so the time offset between the devices is kept to a minimum.
+
+    Example:
+
+        group = ScopeGroup(['0123456789AB', '0123456789AC'])
+        group.start()
+        for records in group.records(timeout=5):
+            ...
+        group.stop()
+
+    Attributes:
+        context (usb1.USBContext): The USB context shared by all devices (None for simulated devices).
+        serial_numbers (list): The serial numbers of the devices.
+        oscilloscopes (list): The oscilloscopes of the group in the order of their serial numbers.
+        running (bool): Indicates whether the group is currently running.
+        start_times (list): The time (time.perf_counter) at which the capture was started on each device.
+        stop_time (float): The time (time.perf_counter) at which the group was stopped (None while running).
+    """
+    def __init__(self, serial_numbers, data_type='float32', scopes=None):
+        """
+        Class constructor. Open the connection to all devices.
+
+        Args:
+            serial_numbers (list): The serial numbers of the devices.
+            data_type (str): The data type of the published measurement data ('float32', 'float64' or 'uint8').
+            scopes (list): (OPTIONAL) The device object of the Hantek6022API to use for each serial number, e.g.
+                simulated devices (see hantekosc.simulation.SimulatedScope). Default: USB devices.
+        """
+        self.serial_numbers = list(serial_numbers)
+        if scopes is not None and len(scopes) != len(self.serial_numbers):
+            raise ValueError('A device object is needed for each serial number.')
+        # simulated devices do not use libusb
+        self.context = usb1.USBContext() if scopes is None else None
+        self.oscilloscopes = []
+        self.running = False
+        self.start_times = []
+        self.stop_time = None
+        self._start_record_ids = []
+        self._event_thread = None
+        try:
+            for i, serial_number in enumerate(self.serial_numbers):
+                osc = Oscilloscope(serial_number, data_type, context=self.context,
+                                   scope=None if scopes is None else scopes[i])
+                # the events of all devices are handled by the thread of the group
+                osc.handle_usb_events = False
+                self.oscilloscopes.append(osc)
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self.oscilloscopes)
+
+    def __getitem__(self, index):
+        return self.oscilloscopes[index]
+
+    def start(self):
+        """
+        Start the measurement on all devices.
+        """
+        for osc in self.oscilloscopes:
+            osc._arm()
+        self.running = True
+        self._event_thread = threading.Thread(target=self._handle_usb_events)
+        self._event_thread.start()
+
+        self._start_record_ids = [osc.latest_record_id for osc in self.oscilloscopes]
+        self.start_times = []
+        self.stop_time = None
+        for osc in self.oscilloscopes:
+            osc.scope.start_capture()
+            self.start_times.append(time.perf_counter())
+
+    def stop(self, timeout=1):
+        """
+        Stop the measurement on all devices.
+
+        Args:
+            timeout (float): (OPTIONAL) The maximum time in seconds to wait for the transfers and for each thread.
+
+        Returns:
+            float: The time in seconds it took to stop all devices.
+        """
+        start_time = time.perf_counter()
+        for osc in self.oscilloscopes:
+            if osc.running:
+                osc.stop(timeout)
+        self.running = False
+        self.stop_time = time.perf_counter()
+        if self._event_thread is not None:
+            if self.context is not None:
+                self.context.interruptEventHandler()
+            self._event_thread.join(timeout)
+            self._event_thread = None
+        return time.perf_counter() - start_time
+
+    def close(self):
+        """
+        Stop the measurement and close the connection to all devices.
+        """
+        if self.running:
+            self.stop()
+        for osc in self.oscilloscopes:
+            osc.scope.close_handle()
+
+    def _handle_usb_events(self):
+        """
+        Handle the USB events of all devices in a separate thread as long as the group is running.
+        """
+        while self.running:
+            if self.context is not None:
+                self.context.handleEventsTimeout(tv=0.1)
+                continue
+            # the simulated devices deliver their data when they are polled
+            for osc in self.oscilloscopes:
+                osc.scope.poll(timeout=0.1 / len(self.oscilloscopes))
+
+    @property
+    def start_skew(self):
+        """
+        Get the time between starting the capture on the first and on the last device.
+
+        Returns:
+            float: The time offset in seconds.
+        """
+        if not self.start_times:
+            return 0.0
+        return max(self.start_times) - min(self.start_times)
+
+    def records(self, timeout=None):
+        """
+        Get an iterator yielding a tuple with a new record of each device:
+
+            for records in group.records():
+                ...
+
+        The n-th tuple contains the next record of each device after the records of the previous tuple. If a device
+        publishes records faster than the others, only its latest record is used. The iteration ends when the group is
+        stopped or a device does not publish a record within the timeout.
+
+        Args:
+            timeout (float): (OPTIONAL) The maximum time to wait for the record of a device in seconds.
+                Default: wait forever.
+
+        Returns:
+            generator: The iterator.
+        """
+        record_ids = [osc.latest_record_id for osc in self.oscilloscopes]
+        while self.running:
+            records = []
+            for osc, record_id in zip(self.oscilloscopes, record_ids):
+                record = osc.wait_for_record(record_id, timeout)
+                if record is None:
+                    return
+                records.append(record)
+            record_ids = [record.record_id for record in records]
+            yield tuple(records)
+
+    def statistics(self):
+        """
+        Get the throughput of each device since the measurement was started.
+
+        Returns:
+            list(dict): A list containing a dict containing 'Serial Number', 'Records', 'Records per Second',
+                'Processed Samples' and 'Samples per Second' (per channel) for each device.
+        """
+        statistics = []
+        end_time = self.stop_time if self.stop_time is not None else time.perf_counter()
+        for serial_number, osc, start_time, start_record_id in zip(self.serial_numbers, self.oscilloscopes,
+                                                                   self.start_times, self._start_record_ids):
+            duration = max(end_time - start_time, 1e-9)
+            number_of_records = osc.latest_record_id - start_record_id
+            statistics.append({'Serial Number': serial_number,
+                               'Records': number_of_records,
+                               'Records per Second': number_of_records / duration,
+                               'Processed Samples': osc.processed_samples,
+                               'Samples per Second': osc.processed_samples / duration})
+        return statistics
@@ -0,0 +1,340 @@
+import threading
+import time
+
+import numpy as np
+import usb1
+
+from hantekosc.py_ht6022 import Firmware, LibUsbScope
+
+
+class SimulatedScope(LibUsbScope.Oscilloscope):
+    """
+    A simulated Hantek 6022BE with the interface of the Hantek6022API, to use an oscilloscope without hardware:
+
+        osc = Oscilloscope(scope=SimulatedScope())
+
+    The ADC counts of both channels are calculated from input signals using the voltage range of each channel. The
+    device has an EEPROM, a calibration output, and it can be disconnected and reconnected (e.g. to test the recovery
+    of a running measurement). The data is delivered in the thread calling "poll", either paced in real time or as fast
+    as possible.
+
+    Attributes:
+        signals (list): The input signal of each channel, functions returning the voltages for an array of times in
+            seconds.
+        calibration_signal_connected (list): Whether the input of each channel is connected to the calibration output
+            (a square wave between 0 V and 2 V) instead of its signal.
+        adc_gains (list): The actual gain error of the ADC of each channel per voltage range index.
+        adc_offsets (list): The actual offset of the ADC of each channel per voltage range index (in ADC counts).
+        noise (float): The standard deviation of the noise added to the ADC counts.
+        realtime (bool): Deliver the data at the rate it would be sampled. Otherwise, as fast as possible.
+        serial_number (str): The serial number reported once the firmware is loaded.
+        connected (bool): Whether the device is connected.
+        eeprom (bytearray): The content of the EEPROM.
+        calibration_frequency (float): The frequency of the calibration output in Hz.
+        ram (bytearray): The RAM of the 8051 the firmware is uploaded to.
+        control_transfer_time (float): The time in seconds a control transfer takes (e.g. to upload the firmware).
+        enumeration_time (float): The time in seconds it takes the device to re-enumerate after the firmware upload.
+    """
+    def __init__(self, serial_number='000000000001', port=(1, (1,)), realtime=True, noise=0.5):
+        """
+        Class constructor.
+
+        Args:
+            serial_number (str): (OPTIONAL) The serial number of the device.
+            port (tuple): (OPTIONAL) The port the device is connected to as (bus number, port numbers).
+            realtime (bool): (OPTIONAL) Deliver the data at the rate it would be sampled.
+            noise (float): (OPTIONAL) The standard deviation of the noise in ADC counts.
+        """
+        # no USB context is needed, so the constructor of the base class is not called
+        self.device = None
+        self.device_handle = None
+        self.context = None
+        self.is_device_firmware_present = False
+        self.supports_single_channel = False
+        self.is_iso = False
+        self.packetsize = 512
+        self.num_channels = 2
+        self.ac_dc_status = 0x11
+        self.VID = self.NO_FIRMWARE_VENDOR_ID
+        self.PID = self.PRODUCT_ID_BE
+        self.calibration = None
+        self.calibration_ext = None
+        self.offset1 = { 1:0, 2:0, 5:0, 10:0 }
+        self.offset2 = { 1:0, 2:0, 5:0, 10:0 }
+        self.gain1 = { 1:1.01, 2:1.01, 5:0.99, 10:1.0 }
+        self.gain2 = { 1:1.01, 2:1.01, 5:0.99, 10:1.0 }
+        self._transfers = []
+        self._shutdown_event = None
+        self._packets = 0
+        self._user_data = ()
+
+        self.signals = [lambda t: np.sin(2 * np.pi * 1e3 * t), lambda t: 0.5 * np.sign(np.sin(2 * np.pi * 1e3 * t))]
+        self.calibration_signal_connected = [False, False]
+        self.adc_gains = [{1: 1.0, 2: 1.0, 5: 1.0, 10: 1.0}, {1: 1.0, 2: 1.0, 5: 1.0, 10: 1.0}]
+        self.adc_offsets = [{1: 0.0, 2: 0.0, 5: 0.0, 10: 0.0}, {1: 0.0, 2: 0.0, 5: 0.0, 10: 0.0}]
+        self.noise = noise
+        self.realtime = realtime
+        self.serial_number = serial_number
+        self.port = port
+        self.connected = True
+        self.eeprom = bytearray(b'\xff' * 256)
+        self.calibration_frequency = 1000
+        self.ram = bytearray(0x10000)
+        # a control transfer takes at least a few (micro)frames of the bus
+        self.control_transfer_time = 250e-6
+        self.enumeration_time = 0.05
+        self.voltage_range_indices = [1, 1]
+        self.sample_rate = 20e3
+        self.capturing = False
+        self._callback = None
+        self._raw = False
+        self._block_length = 0
+        self._sample_index = 0
+        self._next_block_time = 0
+        self._hotplug_callbacks = []
+        self._random = np.random.default_rng()
+        self._lock = threading.Lock()
+
+    def _check_device(self):
+        """
+        Raise the error libusb raises when a disconnected device is accessed.
+        """
+        if not self.connected or not self.device_handle:
+            raise usb1.USBErrorNoDevice
+
+    def setup(self, serial_number=None, port=None):
+        if not self.connected:
+            return False
+        if port is not None and port != self.port:
+            return False
+        if serial_number is not None and (not self.is_device_firmware_present or serial_number != self.serial_number):
+            return False
+        self.device = self
+        self.supports_single_channel = self.is_device_firmware_present
+        return True
+
+    def list_device_ports(self, firmware_present=None):
+        if not self.connected or (firmware_present is not None and firmware_present != self.is_device_firmware_present):
+            return []
+        return [self.port]
+
+    def open_handle(self):
+        if self.device_handle:
+            return True
+        if not self.device and not self.setup():
+            return False
+        if not self.connected:
+            return False
+        self.device_handle = True
+        return True
+
+    def close_handle(self, release_interface=True):
+        self.release_async()
+        self.device_handle = None
+        return True
+
+    def get_fw_version(self):
+        return self.FIRMWARE_VERSION if self.is_device_firmware_present else 0
+
+    def get_product_string(self):
+        return 'Simulated DSO-6022BE'
+
+    def get_port(self):
+        return self.port
+
+    def get_serial_number_string(self):
+        return self.serial_number if self.is_device_firmware_present else None
+
+    def poll(self, timeout=None):
+        """
+        Deliver the next data block to the callback of read_async (if the capture is running).
+        """
+        with self._lock:
+            active = (self.connected and self.capturing and self._shutdown_event is not None
+                      and not self._shutdown_event.is_set())
+            if active:
+                # like the tag of a transfer, the tag is bound to the block when it is captured
+                block = self._next_block()
+                user_data = self._user_data
+        if not active:
+            time.sleep(0.01 if timeout is None else min(timeout, 0.01))
+            return
+        if self.realtime:
+            delay = self._next_block_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if self._raw:
+            self._callback(block[0].tobytes(), block[1].tobytes(), *user_data)
+        else:
+            self._callback(block[0], block[1], *user_data)
+
+    def _next_block(self):
+        """
+        Calculate the ADC counts of the next block.
+        """
+        sample_rate = self.sample_rate
+        times = (self._sample_index + np.arange(self._block_length)) / sample_rate
+        if self._sample_index == 0:
+            self._next_block_time = time.perf_counter()
+        self._sample_index += self._block_length
+        self._next_block_time += self._block_length / sample_rate
+        block = []
+        for channel in range(2):
+            if self.calibration_signal_connected[channel]:
+                voltages = 2.0 * (np.floor(2 * self.calibration_frequency * times) % 2 == 0)
+            else:
+                voltages = np.broadcast_to(self.signals[channel](times), times.shape)
+            index = self.voltage_range_indices[channel]
+            # inverse of the conversion (adc_count - 128 - offset) * 5.12 * gain / (index << 7)
+            adc_counts = voltages * (index << 7) / 5.12 * self.adc_gains[channel][index] + 128 \
+                + self.adc_offsets[channel][index]
+            if self.noise:
+                adc_counts += self._random.normal(0, self.noise, len(times))
+            block.append(np.clip(np.round(adc_counts), 0, 255).astype(np.uint8))
+        return block
+
+    def interrupt_poll(self):
+        pass
+
+    def flash_firmware(self, firmware=None, supports_single_channel=True, timeout=60):
+        self._check_device()
+        if not firmware:
+            firmware = Firmware.dso6022be_firmware
+        # each packet is written with a control transfer
+        for packet in firmware:
+            if packet.value != Firmware.CPUCS_ADDRESS:
+                self.ram[packet.value:packet.value + packet.size] = packet.data
+            time.sleep(self.control_transfer_time)
+        # the device re-enumerates with the new firmware
+        time.sleep(self.enumeration_time)
+        self.is_device_firmware_present = True
+        self.supports_single_channel = supports_single_channel
+        return True
+
+    def read_firmware(self, address=0, length=8192, to_ihex=True, chunk_len=Firmware.MAX_CONTROL_PACKET_SIZE,
+                      timeout=60, record_len=16):
+        self._check_device()
+        chunk_len = min(chunk_len, Firmware.MAX_CONTROL_PACKET_SIZE)
+        # the 8051 is held and started again with two writes, the RAM is read with one control transfer per chunk
+        time.sleep(self.control_transfer_time * (2 + -(-length // chunk_len)))
+        firmware = bytes(self.ram[address:address + length])
+        if not to_ihex:
+            return firmware
+        return Firmware.encode_ihex(firmware, address, record_len)
+
+    def read_eeprom(self, offset, length, timeout=0):
+        self._check_device()
+        return bytes(self.eeprom[offset:offset + length])
+
+    def write_eeprom(self, offset, data, timeout=0):
+        self._check_device()
+        self.eeprom[offset:offset + len(data)] = bytes(data)
+        return True
+
+    def start_capture(self, timeout=0):
+        self._check_device()
+        self.capturing = True
+        return True
+
+    def stop_capture(self, timeout=0):
+        self._check_device()
+        self.capturing = False
+        return True
+
+    def read_async(self, callback, data_size, outstanding_transfers=3, raw=False, tag=None):
+        self._check_device()
+        self._callback = callback
+        self._raw = raw
+        self._user_data = () if tag is None else (tag,)
+        self._block_length = data_size // self.num_channels
+        self._shutdown_event = threading.Event()
+        return self._shutdown_event
+
+    def cancel_async(self, timeout=1):
+        if self._shutdown_event is not None:
+            # wait until a block being delivered has been generated
+            with self._lock:
+                self._shutdown_event.set()
+        return True
+
+    def resubmit_async(self, data_size=None, tag=None):
+        self._check_device()
+        if self._shutdown_event is None:
+            raise RuntimeError('read_async has not been called')
+        with self._lock:
+            if data_size is not None:
+                self._block_length = data_size // self.num_channels
+            if tag is not None:
+                self._user_data = (tag,)
+            self._shutdown_event.clear()
+        return self._shutdown_event
+
+    def release_async(self):
+        self.cancel_async()
+        self._shutdown_event = None
+        return True
+
+    def register_hotplug_callback(self, callback):
+        self._hotplug_callbacks.append(callback)
+        return True
+
+    def set_sample_rate(self, rate_index, timeout=0):
+        self._check_device()
+        self.sample_rate = self.SAMPLE_RATES.get(rate_index, ('', 20e3))[1]
+        return True
+
+    def set_num_channels(self, nchannels, timeout=0):
+        if not self.supports_single_channel:
+            return False
+        self._check_device()
+        self.num_channels = nchannels
+        return True
+
+    def set_ch1_voltage_range(self, range_index, timeout=0):
+        self._check_device()
+        self.voltage_range_indices[0] = range_index
+        return True
+
+    def set_ch2_voltage_range(self, range_index, timeout=0):
+        self._check_device()
+        self.voltage_range_indices[1] = range_index
+        return True
+
+    def set_calibration_frequency(self, cal_freq, timeout=0):
+        if cal_freq < 32 or cal_freq > 100000:
+            return False
+        self._check_device()
+        self.calibration_frequency = cal_freq
+        return True
+
+    def set_ch1_ch2_ac_dc(self, ac_dc, timeout=0):
+        self._check_device()
+        self.ac_dc_status = ac_dc
+        return True
+
+    def disconnect(self):
+        """
+        Simulate unplugging the device. The firmware and the settings are lost, as they are only stored in the RAM of
+        the device.
+        """
+        with self._lock:
+            self.connected = False
+            self.capturing = False
+            self.is_device_firmware_present = False
+            self.ram = bytearray(0x10000)
+            self.supports_single_channel = False
+            self.num_channels = 2
+            self.voltage_range_indices = [1, 1]
+            self.sample_rate = 20e3
+        for callback in self._hotplug_callbacks:
+            callback(False, self.port)
+
+    def connect(self):
+        """
+        Simulate plugging the device in again.
+        """
+        with self._lock:
+            self.connected = True
+            self._sample_index = 0
+        for callback in self._hotplug_callbacks:
+            callback(True, self.port)
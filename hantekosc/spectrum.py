@@ -0,0 +1,208 @@
+import functools
+import threading
+
+import numpy as np
+
+
+# Coefficients of the cosine sum windows: w[n] = sum_k (-1)^k * a_k * cos(2 * pi * k * n / N)
+_WINDOW_COEFFICIENTS = {
+    'RECTANGULAR': (1.0,),
+    'HANN': (0.5, 0.5),
+    'FLATTOP': (0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368),
+    'BLACKMAN_HARRIS': (0.35875, 0.48829, 0.14128, 0.01168),
+}
+WINDOWS = tuple(_WINDOW_COEFFICIENTS)
+AVERAGING_MODES = ('NONE', 'LINEAR', 'EXPONENTIAL', 'PEAK_HOLD')
+
+
+@functools.lru_cache(maxsize=16)
+def window_function(window, length):
+    """
+    Get a window function scaled for amplitude spectra: the amplitude of a sine wave in the center of a bin is the
+    value of its bin. The windows are periodic (DFT-even) and cached, so they are only calculated once per length.
+
+    Args:
+        window (str): The window ('RECTANGULAR', 'HANN', 'FLATTOP' or 'BLACKMAN_HARRIS').
+        length (int): The number of samples.
+
+    Returns:
+        numpy.array: The read-only window (float32).
+    """
+    if window not in _WINDOW_COEFFICIENTS:
+        raise ValueError(f'Unknown window {window!r}, available windows: {WINDOWS}')
+    phase = 2 * np.pi * np.arange(length) / length
+    values = np.zeros(length)
+    for k, coefficient in enumerate(_WINDOW_COEFFICIENTS[window]):
+        values += (-1) ** k * coefficient * np.cos(k * phase)
+    # the one-sided spectrum holds half the amplitude of each sine in each of the positive and negative frequencies
+    values *= 2 / values.sum()
+    values = values.astype(np.float32)
+    values.flags.writeable = False
+    return values
+
+
+@functools.lru_cache(maxsize=16)
+def frequency_axis(length, sample_rate):
+    """
+    Get the frequency of each bin of the spectrum of a record (cached per record length and sample rate).
+
+    Args:
+        length (int): The number of samples of the record.
+        sample_rate (float): The sample rate in Hz.
+
+    Returns:
+        numpy.array: The read-only frequencies in Hz.
+    """
+    frequencies = np.fft.rfftfreq(length, 1 / sample_rate)
+    frequencies.flags.writeable = False
+    return frequencies
+
+
+class SpectrumAnalyzer:
+    """
+    Calculates the amplitude spectrum of a channel for each record and averages it over records.
+
+    The spectra are calculated with real FFTs of the windowed float32 voltages. The averaging is done on the power,
+    so the noise floor is not lowered by averaging (unlike averaging the waveforms): 'LINEAR' averages the last
+    "number_of_averages" records with equal weight (then it starts again), 'EXPONENTIAL' weights each new record by
+    1 / number_of_averages, 'PEAK_HOLD' keeps the maximum of each bin. The average is restarted when the record length,
+    the sample rate or the window changes.
+
+    If "use_worker" is set, the spectra are calculated in a separate thread, so the processing of the measurement data
+    is not stalled. A record is skipped if the spectrum of the previous record has not been calculated yet.
+
+    Attributes:
+        window (str): The window function (see "WINDOWS").
+        averaging (str): The averaging mode (see "AVERAGING_MODES").
+        number_of_averages (int): The number of records averaged.
+        use_worker (bool): Calculate the spectra in a worker thread.
+        dropped_records (int): The number of records skipped because the worker was busy.
+    """
+    def __init__(self, window='HANN', averaging='NONE', number_of_averages=8, use_worker=True):
+        """
+        Class constructor.
+
+        Args:
+            window (str): (OPTIONAL) The window function.
+            averaging (str): (OPTIONAL) The averaging mode.
+            number_of_averages (int): (OPTIONAL) The number of records averaged.
+            use_worker (bool): (OPTIONAL) Calculate the spectra in a worker thread.
+        """
+        if window not in WINDOWS:
+            raise ValueError(f'Unknown window {window!r}, available windows: {WINDOWS}')
+        if averaging not in AVERAGING_MODES:
+            raise ValueError(f'Unknown averaging mode {averaging!r}, available modes: {AVERAGING_MODES}')
+        if number_of_averages < 1:
+            raise ValueError('At least one record has to be averaged.')
+        self.window = window
+        self.averaging = averaging
+        self.number_of_averages = number_of_averages
+        self.use_worker = use_worker
+        self.dropped_records = 0
+        self._lock = threading.Lock()
+        # the averaged power of each bin, the number of records it contains and the parameters it was calculated with
+        self._power = None
+        self._count = 0
+        self._key = None
+        self._record_id = 0
+        self._pending = False
+        self._buffer = None
+
+    def submit(self, record, channel, executor=None):
+        """
+        Add the spectrum of a record. Called by the oscilloscope for each published record.
+
+        Args:
+            record (Record): The record.
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+            executor (concurrent.futures.Executor): (OPTIONAL) The executor used if "use_worker" is set.
+        """
+        if not self.use_worker or executor is None:
+            self.add(record, channel)
+            return
+        with self._lock:
+            if self._pending:
+                self.dropped_records += 1
+                return
+            self._pending = True
+        executor.submit(self._add_pending, record, channel)
+
+    def _add_pending(self, record, channel):
+        try:
+            self.add(record, channel)
+        finally:
+            with self._lock:
+                self._pending = False
+
+    def add(self, record, channel):
+        """
+        Calculate the spectrum of a record and add it to the average.
+
+        Args:
+            record (Record): The record.
+            channel (int): The channel number. 0 = CH1, 1 = CH2.
+        """
+        length = record.record_length
+        window = window_function(self.window, length)
+        key = (length, record.sample_rate, self.window)
+        if self._buffer is None or len(self._buffer) != length:
+            self._buffer = np.empty(length, dtype=np.float32)
+        np.multiply(record.voltage_data(channel), window, out=self._buffer, dtype=np.float32)
+        spectrum = np.fft.rfft(self._buffer)
+        power = np.square(spectrum.real, dtype=np.float32)
+        power += np.square(spectrum.imag, dtype=np.float32)
+        # DC and Nyquist frequency are not split into a positive and a negative frequency
+        power[0] *= 0.25
+        if length % 2 == 0:
+            power[-1] *= 0.25
+
+        with self._lock:
+            if key != self._key or self._power is None or self.averaging == 'NONE' \
+                    or (self.averaging == 'LINEAR' and self._count >= self.number_of_averages):
+                self._power = power
+                self._count = 1
+                self._key = key
+            elif self.averaging == 'LINEAR':
+                self._count += 1
+                self._power += (power - self._power) / self._count
+            elif self.averaging == 'EXPONENTIAL':
+                self._count += 1
+                # start with a linear average, so the first records are not weighted too little
+                self._power += (power - self._power) / min(self._count, self.number_of_averages)
+            else:
+                self._count += 1
+                np.maximum(self._power, power, out=self._power)
+            self._record_id = record.record_id
+
+    def reset(self):
+        """
+        Restart the averaging.
+        """
+        with self._lock:
+            self._power = None
+            self._count = 0
+
+    def result(self, scale='LINEAR'):
+        """
+        Get the averaged spectrum.
+
+        Args:
+            scale (str): (OPTIONAL) 'LINEAR' for amplitudes in volts (peak), 'DB' for dBV (relative to 1 V RMS).
+
+        Returns:
+            tuple: The id of the last record added, the frequencies in Hz, the amplitudes and the number of records
+                averaged. The arrays are empty if no record has been added yet.
+        """
+        with self._lock:
+            if self._power is None:
+                return 0, np.empty(0), np.empty(0, dtype=np.float32), 0
+            length, sample_rate, _ = self._key
+            amplitudes = np.sqrt(self._power)
+            record_id, count = self._record_id, self._count
+        if scale == 'DB':
+            # peak amplitude -> RMS value in dBV (-inf for empty bins)
+            with np.errstate(divide='ignore'):
+                amplitudes = 20 * np.log10(amplitudes / np.sqrt(2, dtype=np.float32))
+        elif scale != 'LINEAR':
+            raise ValueError("The scale must be 'LINEAR' or 'DB'.")
+        return record_id, frequency_axis(length, sample_rate), amplitudes, count
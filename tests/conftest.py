@@ -0,0 +1,23 @@
+import pytest
+
+from hantekosc import calibration
+from hantekosc.py_ht6022 import Firmware
+
+
+@pytest.fixture(autouse=True)
+def calibration_cache(tmp_path, monkeypatch):
+    """
+    Keep the calibration values cached on disk and in the process out of the tests.
+    """
+    monkeypatch.setattr(calibration, 'CACHE_DIRECTORY', str(tmp_path / 'calibration'))
+    monkeypatch.setattr(calibration, '_calibrations', {})
+    return calibration.CACHE_DIRECTORY
+
+
+@pytest.fixture(autouse=True)
+def firmware_cache(tmp_path, monkeypatch):
+    """
+    Keep the firmware packets cached on disk out of the tests.
+    """
+    monkeypatch.setattr(Firmware, 'CACHE_DIRECTORY', str(tmp_path / 'firmware'))
+    return Firmware.CACHE_DIRECTORY
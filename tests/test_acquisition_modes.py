@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+RECORD_LENGTH = 4000
+SIGNALS = {
+    'constant': lambda t: np.full_like(t, 0.3),
+    'sine': lambda t: 0.8 * np.sin(2 * np.pi * 1.7e3 * t),
+}
+
+
+@pytest.fixture(params=[True, False], ids=['c', 'numpy'])
+def osc(request):
+    osc = Oscilloscope(scope=SimulatedScope(realtime=False, noise=0))
+    osc.c_code.c_code_loaded = osc.c_code.c_code_loaded and request.param
+    if request.param and not osc.c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    osc.trigger_mode = 'NONE'
+    osc.data_type = 'float64'
+    osc.record_length = RECORD_LENGTH
+    osc.channels[0].voltage_range = 1
+    osc.channels[1].voltage_range = 5
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def capture(osc, signal, number_of_records):
+    """
+    Feed records of ADC counts of the simulated device (one block per record) into the oscilloscope and collect the
+    published records.
+    """
+    scope = osc.scope
+    scope.signals = [signal, signal]
+    scope._block_length = RECORD_LENGTH * osc._oversampling
+    osc._reset_record()
+    adc_counts, records = [], []
+    for _ in range(number_of_records):
+        block = scope._next_block()
+        osc._process_block(*block)
+        adc_counts.append(np.array(block))
+        records.append(osc.latest_record)
+    assert len({record.record_id for record in records}) == number_of_records
+    return np.array(adc_counts), records
+
+
+def to_voltage(adc_counts, record):
+    scale_factors = np.array(record.scale_factors)[:, np.newaxis]
+    offsets = np.array(record.offsets)[:, np.newaxis]
+    return (adc_counts - 128 - offsets) * scale_factors
+
+
+@pytest.mark.parametrize('signal', SIGNALS)
+@pytest.mark.parametrize('sample_rate, oversampling', [(1_000_000, 16), (8_000_000, 2), (200_000, 60)])
+def test_hires(osc, signal, sample_rate, oversampling):
+    osc.acquisition_mode = 'HIRES'
+    osc.sample_rate = sample_rate
+    assert osc._oversampling == oversampling
+    assert osc.scope.sample_rate == sample_rate * oversampling <= osc.MAX_HIRES_SAMPLE_RATE
+    adc_counts, records = capture(osc, SIGNALS[signal], 2)
+    for counts, record in zip(adc_counts, records):
+        means = counts.reshape(2, RECORD_LENGTH, oversampling).mean(axis=2)
+        np.testing.assert_allclose(record.data, to_voltage(means, record), rtol=1e-12, atol=1e-12)
+        assert record.sample_rate == sample_rate
+
+
+@pytest.mark.parametrize('signal', SIGNALS)
+def test_average(osc, signal):
+    osc.acquisition_mode = 'AVERAGE'
+    osc.number_of_averages = 4
+    osc.sample_rate = 16_000_000
+    adc_counts, records = capture(osc, SIGNALS[signal], 10)
+    for i, record in enumerate(records):
+        mean = adc_counts[max(0, i - 3):i + 1].mean(axis=0)
+        np.testing.assert_allclose(record.data, to_voltage(mean, record), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('signal', SIGNALS)
+def test_exponential_average(osc, signal):
+    osc.acquisition_mode = 'EXPONENTIAL_AVERAGE'
+    osc.number_of_averages = 4
+    osc.sample_rate = 16_000_000
+    adc_counts, records = capture(osc, SIGNALS[signal], 10)
+    accumulator = adc_counts[0].astype(np.float64)
+    for i, (counts, record) in enumerate(zip(adc_counts, records)):
+        # the first records are averaged with equal weights, then each new record has the weight 1/N
+        accumulator += (counts - accumulator) / min(i + 1, 4)
+        # the accumulator is float32
+        np.testing.assert_allclose(record.data, to_voltage(accumulator, record), atol=1e-5)
+
+
+def test_constant_input_is_exact(osc):
+    volts = {}
+    for mode in osc.acquisition_modes_available:
+        osc.acquisition_mode = mode
+        osc.sample_rate = 1_000_000
+        _, records = capture(osc, SIGNALS['constant'], 5)
+        volts[mode] = records[-1].data
+    for mode, data in volts.items():
+        np.testing.assert_allclose(data, volts['NORMAL'], atol=1e-5, err_msg=mode)
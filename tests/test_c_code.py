@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+
+LENGTH = 1001
+SCALE_FACTOR = 0.0395
+OFFSET = 1.25
+
+
+@pytest.fixture(scope='module')
+def c_code():
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    return c_code
+
+
+@pytest.fixture(scope='module')
+def adc_counts():
+    return np.random.default_rng(0).integers(0, 256, (2, 3 * LENGTH), dtype=np.uint8)
+
+
+def reference(adc_counts, scale_factor=SCALE_FACTOR, offset=OFFSET, dtype=np.float64):
+    return ((np.asarray(adc_counts, dtype=np.float64) - 128 - offset) * scale_factor).astype(dtype)
+
+
+def views(adc_counts):
+    """
+    Get contiguous, strided and reversed views of the ADC counts of one channel.
+    """
+    return {'contiguous': adc_counts[:LENGTH], 'strided': adc_counts[::3], 'reversed': adc_counts[::-3],
+            'column': np.ascontiguousarray(adc_counts[:2 * LENGTH].reshape(LENGTH, 2))[:, 1]}
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('view', ['contiguous', 'strided', 'reversed', 'column'])
+def test_convert_to_voltage(c_code, adc_counts, dtype, view):
+    counts = views(adc_counts[0])[view]
+    expected = reference(counts, dtype=dtype)
+    tolerance = {'rtol': 1e-6} if dtype == np.float32 else {'rtol': 1e-12}
+    np.testing.assert_allclose(c_code.convert_to_voltage(counts, SCALE_FACTOR, OFFSET, dtype=dtype), expected,
+                               **tolerance)
+    # in place into a strided row of a larger buffer, the other elements are untouched
+    buffer = np.full((2, 2 * LENGTH), -1, dtype=dtype)
+    out = buffer[1, ::2]
+    assert c_code.convert_to_voltage(counts, SCALE_FACTOR, OFFSET, out=out) is out
+    np.testing.assert_allclose(out, expected, **tolerance)
+    assert np.all(buffer[0] == -1) and np.all(buffer[1, 1::2] == -1)
+
+
+def test_convert_to_voltage_input_types(c_code):
+    counts = [0, 1, 127, 128, 255]
+    for data in (counts, bytes(counts), bytearray(counts), np.array(counts, dtype=np.int64),
+                 np.array(counts, dtype=np.uint16)):
+        np.testing.assert_allclose(c_code.convert_to_voltage(data, SCALE_FACTOR, OFFSET), reference(counts))
+    assert len(c_code.convert_to_voltage([], SCALE_FACTOR, OFFSET)) == 0
+    # float counts are not truncated silently
+    with pytest.raises(TypeError):
+        c_code.convert_to_voltage(np.array([1.7, 2.2]), SCALE_FACTOR, OFFSET)
+    with pytest.raises(TypeError):
+        c_code.convert_to_voltage([1.0, 2.0], SCALE_FACTOR, OFFSET)
+    with pytest.raises(ValueError):
+        c_code.convert_to_voltage([-1, 256], SCALE_FACTOR, OFFSET)
+    with pytest.raises(ValueError):
+        c_code.convert_to_voltage(np.zeros(10, dtype=np.uint8), SCALE_FACTOR, OFFSET, out=np.empty(9))
+    with pytest.raises(TypeError):
+        c_code.convert_to_voltage(np.zeros(10, dtype=np.uint8), SCALE_FACTOR, OFFSET, out=np.empty(10, dtype=int))
+    read_only = np.empty(10)
+    read_only.flags.writeable = False
+    with pytest.raises(ValueError):
+        c_code.convert_to_voltage(np.zeros(10, dtype=np.uint8), SCALE_FACTOR, OFFSET, out=read_only)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('view', ['contiguous', 'strided', 'reversed', 'column'])
+def test_convert_channels_to_voltage(c_code, adc_counts, dtype, view):
+    ch1 = views(adc_counts[0])[view]
+    ch2 = views(adc_counts[1])[view]
+    scale_factors = (SCALE_FACTOR, -0.02)
+    offsets = (OFFSET, -3.5)
+    out = np.empty((2, LENGTH), dtype=dtype)
+    assert c_code.convert_channels_to_voltage(ch1, ch2, out, scale_factors, offsets) is out
+    tolerance = {'rtol': 1e-6} if dtype == np.float32 else {'rtol': 1e-12}
+    np.testing.assert_allclose(out[0], reference(ch1, scale_factors[0], offsets[0]), **tolerance)
+    np.testing.assert_allclose(out[1], reference(ch2, scale_factors[1], offsets[1]), **tolerance)
+    # two separate output arrays
+    outs = [np.empty(LENGTH, dtype=dtype), np.empty(LENGTH, dtype=dtype)]
+    c_code.convert_channels_to_voltage(ch1, ch2, outs, scale_factors, offsets)
+    np.testing.assert_array_equal(np.array(outs), out)
+
+
+def test_convert_channels_to_voltage_errors(c_code):
+    counts = np.zeros(10, dtype=np.uint8)
+    with pytest.raises(ValueError):
+        c_code.convert_channels_to_voltage(counts, counts[:9], np.empty((2, 10)), (1, 1), (0, 0))
+    with pytest.raises(ValueError):
+        c_code.convert_channels_to_voltage(counts, counts, np.empty((2, 9)), (1, 1), (0, 0))
+    with pytest.raises(ValueError):
+        c_code.convert_channels_to_voltage(counts, counts, np.empty((2, 20))[:, ::2], (1, 1), (0, 0))
+    with pytest.raises(TypeError):
+        c_code.convert_channels_to_voltage(counts.astype(float), counts, np.empty((2, 10)), (1, 1), (0, 0))
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.float32, np.float64])
+@pytest.mark.parametrize('trigger_kind', ['RISING', 'FALLING'])
+def test_find_trigger_position(c_code, dtype, trigger_kind):
+    signal = 128 + 100 * np.sin(2 * np.pi * np.arange(3 * LENGTH) / 400 + 1)
+    data = np.rint(signal).astype(dtype)
+    threshold = 150
+    for view in (data, data[::3], data[5:]):
+        if trigger_kind == 'RISING':
+            crossings = np.flatnonzero((view[:-1] < threshold) & (view[1:] >= threshold))
+        else:
+            crossings = np.flatnonzero((view[:-1] > threshold) & (view[1:] <= threshold))
+        assert c_code.find_trigger_position(view, threshold, trigger_kind) == crossings[0] + 1
+    assert c_code.find_trigger_position(np.full(100, 128, dtype=dtype), threshold, trigger_kind) == -1
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_fill_timing_data(c_code, dtype):
+    buffer = np.zeros(2 * LENGTH, dtype=dtype)
+    out = c_code.fill_timing_data(buffer[::2], 1e6, -100)
+    np.testing.assert_allclose(out, (np.arange(LENGTH) - 100) / 1e6, rtol=1e-6, atol=1e-12)
+    assert np.all(buffer[1::2] == 0)
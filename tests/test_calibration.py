@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from hantekosc.calibration import Calibration
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+# the gain and offset errors of the simulated ADC per voltage range index
+ADC_GAINS = [{1: 1.02, 2: 0.97, 5: 1.01, 10: 0.99}, {1: 0.98, 2: 1.03, 5: 0.99, 10: 1.01}]
+ADC_OFFSETS = [{1: 2.0, 2: -1.5, 5: 3.0, 10: -4.0}, {1: -3.0, 2: 1.0, 5: -2.5, 10: 4.5}]
+
+
+@pytest.fixture
+def osc():
+    scope = SimulatedScope(realtime=False)
+    scope.adc_gains = ADC_GAINS
+    scope.adc_offsets = ADC_OFFSETS
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = 100e3
+    osc.record_length = 1000
+    osc.trigger_mode = 'NONE'
+    osc.data_type = 'float64'
+    osc.channels[0].voltage_range = 5
+    osc.channels[1].voltage_range = 2.5
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def settings(osc):
+    return (osc.sample_rate, osc.record_length, osc.trigger_mode, osc.data_type, osc.acquisition_mode,
+            [channel.voltage_range for channel in osc.channels], list(osc.scope.voltage_range_indices),
+            osc.scope.sample_rate)
+
+
+def ground(scope):
+    scope.signals = [lambda t: np.zeros_like(t), lambda t: np.zeros_like(t)]
+
+
+def test_calibrate_offsets_and_gains(osc):
+    scope = osc.scope
+    before = settings(osc)
+    default_gains = osc.calibration.gains.copy()
+    expected_offsets = np.array([[offsets[index] for index in Calibration.VOLTAGE_INDICES] for offsets in ADC_OFFSETS])
+    expected_gains = np.array([[1 / gains[index] for index in Calibration.VOLTAGE_INDICES] for gains in ADC_GAINS])
+
+    ground(scope)
+    calibration = osc.calibrate('GROUND', number_of_samples=50000, write_eeprom=False)
+    np.testing.assert_allclose(calibration.offsets, expected_offsets, atol=0.05)
+    np.testing.assert_array_equal(calibration.gains, default_gains)
+    assert osc.calibration is calibration
+    assert settings(osc) == before
+
+    scope.calibration_signal_connected = [True, True]
+    calibration = osc.calibrate('CALIBRATION_OUTPUT', number_of_samples=50000, write_eeprom=False)
+    np.testing.assert_array_equal(calibration.offsets, osc.calibration.offsets)
+    # the square wave (0 V to 2 V) is only within the ranges +/- 5 V and +/- 2.5 V, the other gains are kept
+    np.testing.assert_allclose(calibration.gains[:, :2], expected_gains[:, :2], rtol=2e-3)
+    np.testing.assert_array_equal(calibration.gains[:, 2:], default_gains[:, 2:])
+    assert settings(osc) == before
+
+    # the calibrated conversion reproduces the input voltages (in ranges whose gains were calibrated)
+    scope.calibration_signal_connected = [False, False]
+    scope.signals = [lambda t: np.full_like(t, 0.75), lambda t: np.full_like(t, -1.5)]
+    osc.start()
+    osc.wait_for_record(timeout=5)
+    record = osc.wait_for_record(timeout=5)
+    osc.stop()
+    np.testing.assert_allclose(record.data.mean(axis=1), [0.75, -1.5], atol=0.005)
+
+
+def test_calibrate_writes_eeprom(osc):
+    ground(osc.scope)
+    calibration = osc.calibrate('GROUND', number_of_samples=20000)
+    read = Calibration.read(osc.scope, calibration.serial_number)
+    np.testing.assert_array_equal(read.offsets, calibration.offsets)
+    np.testing.assert_array_equal(read.gains, calibration.gains)
+    assert osc.load_calibration(use_cache=False).offsets.tolist() == calibration.offsets.tolist()
+
+
+def test_calibrate_clipped_signal(osc):
+    calibration = osc.calibration
+    # 1 V is outside the range +/- 0.5 V
+    osc.channels[0].voltage_range = 1
+    before = settings(osc)
+    osc.scope.signals = [lambda t: np.full_like(t, 1.0), lambda t: np.zeros_like(t)]
+    with pytest.raises(RuntimeError, match='clipped'):
+        osc.calibrate('GROUND', number_of_samples=20000, write_eeprom=False)
+    assert osc.calibration is calibration
+    assert not osc.running
+    assert settings(osc) == before
+
+
+def test_calibrate_without_calibration_signal(osc):
+    before = settings(osc)
+    ground(osc.scope)
+    with pytest.raises(RuntimeError, match='No calibration signal'):
+        osc.calibrate('CALIBRATION_OUTPUT', number_of_samples=20000, write_eeprom=False)
+    assert settings(osc) == before
+
+
+def test_calibrate_rejects_running_measurement(osc):
+    with pytest.raises(ValueError):
+        osc.calibrate('SINE')
+    osc.start()
+    with pytest.raises(RuntimeError):
+        osc.calibrate()
@@ -0,0 +1,155 @@
+import threading
+
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.pyramid import WaveformPyramid
+from hantekosc.record import Record
+from hantekosc.simulation import SimulatedScope
+
+
+@pytest.fixture
+def osc():
+    osc = Oscilloscope(scope=SimulatedScope(realtime=False))
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def test_data_mutex_is_deprecated(osc):
+    channel = osc.channels[0]
+    with pytest.deprecated_call():
+        mutex = channel.data_mutex
+    assert isinstance(mutex, type(threading.Lock()))
+    with pytest.deprecated_call():
+        assert channel.data_mutex is mutex
+    # existing code locking the data keeps working
+    with mutex:
+        data = channel.measured_data
+    assert data.shape[0] == 2
+
+
+SAMPLE_RATE = 1_000_000
+RECORD_LENGTH = 100_003
+SPIKE_INDICES = np.array([0, 17, 4_096, 33_333, 50_001, 77_777, RECORD_LENGTH - 1])
+
+
+def spike_record(data_type='uint8', scale_factor=0.04, offset=1.0):
+    """
+    Get a record of noise around the middle of the ADC range with single-sample spikes, upwards on CH1 and downwards
+    on CH2. The pyramid is built as the oscilloscope builds it when the record is published.
+    """
+    adc_counts = np.random.default_rng(0).integers(120, 137, (2, RECORD_LENGTH), dtype=np.uint8)
+    adc_counts[0, SPIKE_INDICES] = 250
+    adc_counts[1, SPIKE_INDICES] = 5
+    if data_type == 'uint8':
+        data = adc_counts
+    else:
+        # converted like the oscilloscope converts the published data
+        data = np.subtract(adc_counts, 128 + offset, dtype=data_type)
+        data *= scale_factor
+    pyramid = WaveformPyramid.from_record(data, adc_counts)
+    return Record(1, np.arange(RECORD_LENGTH) / SAMPLE_RATE, data, data_type, (scale_factor,) * 2, (offset,) * 2,
+                  SAMPLE_RATE, pyramid)
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32', 'float64'])
+@pytest.mark.parametrize('scale_factor', [0.04, -0.04])
+@pytest.mark.parametrize('n_points', [1, 7, 100, 2000, 30_000])
+def test_peak_detect_does_not_lose_peaks(osc, data_type, scale_factor, n_points):
+    record = spike_record(data_type, scale_factor)
+    osc.latest_record = record
+    for channel in osc.channels:
+        data = record.data[channel.ch_number]
+        record_id, times, minima, maxima = channel.peak_detect(n_points)
+        assert record_id == 1
+        assert len(times) == len(minima) == len(maxima) == n_points
+        assert np.all(minima <= maxima)
+        assert minima.min() == data.min() and maxima.max() == data.max()
+        spike = data[SPIKE_INDICES[0]]
+        # each spike is found in the bin that covers it, or the next one (a quarter of a bin early at most)
+        bins = (spike == (maxima if spike == data.max() else minima)).nonzero()[0]
+        expected = np.searchsorted(times, SPIKE_INDICES / SAMPLE_RATE, side='right') - 1
+        assert np.all(np.isin(expected, np.concatenate((bins, bins - 1))))
+        assert len(bins) == len(np.unique(expected))
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32'])
+def test_peak_detect_of_a_section(osc, data_type):
+    osc.latest_record = record = spike_record(data_type)
+    _, times, minima, maxima = osc.channels[0].peak_detect(100, 33_000, 34_000)
+    assert times[0] == record.timing_data[33_000]
+    assert maxima.max() == record.data[0, 33_333]
+    assert times[np.argmax(maxima)] == record.timing_data[33_330]
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float64'])
+def test_more_points_than_samples(osc, data_type):
+    osc.latest_record = record = spike_record(data_type)
+    # each bin is a single sample, so the section is returned as it is
+    _, times, minima, maxima = osc.channels[1].peak_detect(10_000, 4_000, 4_150)
+    np.testing.assert_array_equal(times, record.timing_data[4_000:4_150])
+    np.testing.assert_array_equal(minima, record.data[1, 4_000:4_150])
+    np.testing.assert_array_equal(maxima, record.data[1, 4_000:4_150])
+    _, times, minima, maxima, means = osc.channels[1].view(4e-3, 4.149e-3, 10_000)
+    np.testing.assert_array_equal(times, record.timing_data[4_000:4_150])
+    np.testing.assert_array_equal(means, record.data[1, 4_000:4_150])
+
+
+def test_view_matches_the_data(osc):
+    osc.latest_record = record = spike_record('float64')
+    _, times, minima, maxima, means = osc.channels[0].view(10e-3, 60e-3, 50)
+    data = record.data[0, 10_000:60_001]
+    assert times[0] == 10e-3 and len(times) == 50
+    assert minima.min() == data.min() and maxima.max() == data.max()
+    assert abs(np.mean(means) - data.mean()) < 1e-3
+    with pytest.raises(ValueError):
+        osc.channels[0].view(1.0, 2.0)
+
+
+def test_peak_detect_without_record(osc):
+    record_id, times, minima, maxima = osc.channels[0].peak_detect()
+    assert record_id == 0 and len(times) == len(minima) == len(maxima) == 0
+
+
+def test_peak_detect_of_published_records(osc):
+    scope = osc.scope
+    period = 9_973
+    # a one-sample pulse every period samples
+    scope.signals = [lambda t: np.where(np.rint(t * SAMPLE_RATE) % period == 0, 4.0, 0.0), lambda t: 0.0 * t]
+    scope.noise = 0
+    osc.sample_rate = SAMPLE_RATE
+    osc.record_length = RECORD_LENGTH
+    osc.trigger_mode = 'NONE'
+    osc.start()
+    try:
+        record = osc.wait_for_record(timeout=10)
+    finally:
+        osc.stop()
+    assert record is not None and record.pyramid is not None and len(record.pyramid.levels) > 2
+    data = record.data[0]
+    pulses = (data == data.max()).nonzero()[0]
+    assert len(pulses) >= RECORD_LENGTH // period
+    _, times, _, maxima = osc.channels[0].peak_detect(500)
+    assert np.count_nonzero(maxima == data.max()) == len(pulses)
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.float32, np.float64])
+@pytest.mark.parametrize('n_bins', [1, 3, 999, 1000, 4096])
+@pytest.mark.parametrize('step', [1, 3])
+def test_minmax_decimate_c_matches_numpy(dtype, n_bins, step):
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    rng = np.random.default_rng(n_bins)
+    data = rng.integers(0, 256, 3 * 4096 + 1).astype(dtype)[::step]
+    if dtype != np.uint8:
+        data[::2] += rng.random(len(data[::2]))
+    pyramid = WaveformPyramid(len(data))
+    expected = pyramid._minmax(data, data, n_bins)
+    result = c_code.minmax_decimate(data, data, n_bins)
+    for array, expected_array in zip(result, expected):
+        assert array.dtype == dtype
+        np.testing.assert_array_equal(array, expected_array)
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from hantekosc.calibration import Calibration
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+RECORD_LENGTH = 5000
+SAMPLE_RATE = 1_000_000
+# gain corrections and offsets that differ for each channel and voltage range
+GAINS = [[1.03, 0.98, 1.01, 0.99], [0.97, 1.02, 1.0, 1.04]]
+OFFSETS = [[2.5, -1.0, 0.5, 3.0], [-1.5, 1.25, -2.0, 0.75]]
+
+
+@pytest.fixture(params=[True, False], ids=['c', 'numpy'])
+def osc(request):
+    scope = SimulatedScope(realtime=False, noise=0)
+    scope.signals = [lambda t: 0.8 * np.sin(2 * np.pi * 2e3 * t), lambda t: 2.0 * np.cos(2 * np.pi * 3e3 * t)]
+    osc = Oscilloscope(scope=scope)
+    osc.c_code.c_code_loaded = osc.c_code.c_code_loaded and request.param
+    if request.param and not osc.c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    osc.calibration = Calibration(GAINS, OFFSETS)
+    osc.sample_rate = SAMPLE_RATE
+    osc.record_length = RECORD_LENGTH
+    osc.trigger_mode = 'NONE'
+    osc.channels[0].voltage_range = 1
+    osc.channels[1].voltage_range = 5
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def capture(osc):
+    """
+    Feed one record of the simulated device into the oscilloscope and get the record and its ADC counts.
+    """
+    osc.scope._block_length = RECORD_LENGTH
+    block = osc.scope._next_block()
+    osc._process_block(*block)
+    assert osc.latest_record_id == 1
+    return osc.latest_record, np.array(block)
+
+
+def conversion_values(osc):
+    scale_factors, offsets = zip(*(osc.calibration.conversion_values(i, osc.channels[i].voltage_index)
+                                   for i in range(2)))
+    return scale_factors, offsets
+
+
+def converted(adc_counts, scale_factor, offset, dtype):
+    voltages = np.subtract(adc_counts, 128 + offset, dtype=dtype)
+    voltages *= scale_factor
+    return voltages
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32', 'float64'])
+def test_record_data_type(osc, data_type):
+    osc.data_type = data_type
+    record, adc_counts = capture(osc)
+    assert record.data_type == data_type and record.data.dtype == np.dtype(data_type)
+    assert record.data.shape == (2, RECORD_LENGTH) and not record.data.flags.writeable
+    assert record.timing_data.dtype == (np.float64 if data_type == 'float64' else np.float32)
+    np.testing.assert_allclose(record.timing_data, np.arange(RECORD_LENGTH) / SAMPLE_RATE, rtol=1e-6)
+    # the conversion values of the calibration and the selected voltage ranges are published with the record
+    assert (record.scale_factors, record.offsets) == conversion_values(osc)
+    assert record.offsets == (OFFSETS[0][2], OFFSETS[1][0])
+    if data_type == 'uint8':
+        np.testing.assert_array_equal(record.data, adc_counts)
+    else:
+        for i in range(2):
+            expected = converted(adc_counts[i], record.scale_factors[i], record.offsets[i], data_type)
+            np.testing.assert_allclose(record.data[i], expected, rtol=1e-6 if data_type == 'float32' else 1e-12,
+                                       atol=1e-6 if data_type == 'float32' else 1e-12)
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32', 'float64'])
+def test_adc_counts_and_voltages(osc, data_type):
+    osc.data_type = data_type
+    record, adc_counts = capture(osc)
+    for i in range(2):
+        # the voltages are converted back into the ADC counts they were calculated from
+        adc_data = record.adc_counts(i)
+        assert adc_data.dtype == np.uint8
+        np.testing.assert_array_equal(adc_data, adc_counts[i])
+        voltages = record.voltage_data(i)
+        assert voltages.dtype == (np.float32 if data_type == 'uint8' else np.dtype(data_type))
+        np.testing.assert_allclose(voltages, converted(adc_counts[i], record.scale_factors[i], record.offsets[i],
+                                                       np.float32), rtol=1e-6, atol=1e-6)
+        measured_data = osc.channels[i].measured_data
+        assert measured_data.dtype == voltages.dtype
+        np.testing.assert_array_equal(measured_data[1], voltages)
+    assert record.voltage_data(1, dtype=np.float64).dtype == (np.float64 if data_type == 'uint8' else data_type)
+
+
+def test_adc_data(osc):
+    osc.data_type = 'uint8'
+    record, adc_counts = capture(osc)
+    timing_data, adc_data, scale_factor, offset = osc.channels[1].adc_data
+    assert timing_data is not None and not adc_data.flags.writeable
+    np.testing.assert_array_equal(adc_data, adc_counts[1])
+    assert (scale_factor, offset) == (record.scale_factors[1], record.offsets[1])
+
+
+@pytest.mark.parametrize('data_type', ['float32', 'float64'])
+def test_adc_data_needs_the_uint8_data_type(osc, data_type):
+    osc.data_type = data_type
+    capture(osc)
+    with pytest.raises(RuntimeError):
+        osc.channels[0].adc_data
+
+
+def test_unsupported_data_type(osc):
+    with pytest.raises(ValueError):
+        osc.data_type = 'int16'
+    assert osc.data_type == 'float32'
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32', 'float64'])
+def test_voltage_range_changes_the_conversion_values(osc, data_type):
+    osc.data_type = data_type
+    first, _ = capture(osc)
+    osc.channels[0].voltage_range = 5
+    osc.scope._block_length = RECORD_LENGTH
+    block = osc.scope._next_block()
+    osc._process_block(*block)
+    record = osc.latest_record
+    assert record.record_id == 2 and record.data.dtype == np.dtype(data_type)
+    assert (record.scale_factors, record.offsets) == conversion_values(osc)
+    assert record.offsets == (OFFSETS[0][0], first.offsets[1]) and record.scale_factors[1] == first.scale_factors[1]
+    # the first record keeps the values it was published with
+    assert first.offsets[0] == OFFSETS[0][2]
+    assert first.scale_factors[0] == pytest.approx(record.scale_factors[0] / 5 * GAINS[0][2] / GAINS[0][0])
@@ -0,0 +1,163 @@
+import pytest
+import usb1
+
+from hantekosc import devices
+from hantekosc.py_ht6022 import LibUsbScope
+
+Scope = LibUsbScope.Oscilloscope
+
+
+class SimulatedUSBDevice:
+    """
+    The descriptors of a Hantek 6022BE as libusb reports them. The device can neither be opened nor written to, so the
+    enumeration cannot claim it or upload firmware.
+    """
+    def __init__(self, port, address, serial_number, firmware_present=False):
+        self.port = port
+        self.address = address
+        self.serial_number = serial_number
+        self.firmware_present = firmware_present
+        self.serial_number_reads = 0
+
+    def getVendorID(self):
+        return Scope.FIRMWARE_PRESENT_VENDOR_ID if self.firmware_present else Scope.NO_FIRMWARE_VENDOR_ID
+
+    def getProductID(self):
+        return Scope.PRODUCT_ID_BE
+
+    def getbcdDevice(self):
+        return Scope.FIRMWARE_VERSION if self.firmware_present else 0
+
+    def getSerialNumber(self):
+        self.serial_number_reads += 1
+        return self.serial_number
+
+    def getBusNumber(self):
+        return self.port[0]
+
+    def getPortNumberList(self):
+        return list(self.port[1])
+
+    def getDeviceAddress(self):
+        return self.address
+
+
+class SimulatedUSBContext:
+    """
+    A USB context listing simulated devices. Hotplug events are queued and delivered by "handleEventsTimeout".
+    """
+    def __init__(self, usb_devices):
+        self.devices = list(usb_devices)
+        self.device_list_calls = 0
+        self._callbacks = []
+        self._events = []
+
+    def getDeviceList(self, skip_on_error=False, skip_on_access_error=False):
+        self.device_list_calls += 1
+        return list(self.devices)
+
+    def hotplugRegisterCallback(self, callback, flags=0):
+        self._callbacks.append(callback)
+
+    def handleEventsTimeout(self, tv=0):
+        events, self._events = self._events, []
+        for device, event in events:
+            for callback in self._callbacks:
+                callback(self, device, event)
+
+    def unplug(self, device):
+        self.devices.remove(device)
+        self._events.append((device, usb1.HOTPLUG_EVENT_DEVICE_LEFT))
+
+    def plug(self, device):
+        self.devices.append(device)
+        self._events.append((device, usb1.HOTPLUG_EVENT_DEVICE_ARRIVED))
+
+
+@pytest.fixture
+def context(monkeypatch):
+    usb_devices = [SimulatedUSBDevice((1, (1,)), 5, 'SN0001', firmware_present=True),
+                   SimulatedUSBDevice((1, (2,)), 6, 'SN0002', firmware_present=False),
+                   SimulatedUSBDevice((2, (1, 3)), 7, 'SN0003', firmware_present=True)]
+    context = SimulatedUSBContext(usb_devices)
+    context.hotplugRegisterCallback(devices._hotplug_callback)
+    monkeypatch.setattr(devices, '_context', context)
+    monkeypatch.setattr(devices, '_device_cache', {})
+    return context
+
+
+def reads(context):
+    return [device.serial_number_reads for device in context.devices]
+
+
+def test_listing_reads_descriptors_only(context):
+    device_list = devices.list_connected_hantek_devices()
+    assert device_list == [
+        {'Manufacturer': 'Hantek', 'Model': '6022BE', 'Serial Number': 'SN0001', 'Firmware Present': True, 'Bus': 1,
+         'Port': (1,)},
+        {'Manufacturer': 'Hantek', 'Model': '6022BE', 'Serial Number': None, 'Firmware Present': False, 'Bus': 1,
+         'Port': (2,)},
+        {'Manufacturer': 'Hantek', 'Model': '6022BE', 'Serial Number': 'SN0003', 'Firmware Present': True, 'Bus': 2,
+         'Port': (1, 3)}]
+    # the device without firmware is not opened to read the serial number, and no firmware is uploaded
+    assert reads(context) == [1, 0, 1]
+    assert not context.devices[1].firmware_present
+
+
+def test_other_devices_are_ignored(context):
+    other = SimulatedUSBDevice((1, (4,)), 9, 'OTHER', firmware_present=True)
+    other.getVendorID = lambda: 0x1234
+    context.devices.append(other)
+    assert len(devices.list_connected_hantek_devices()) == 3 and other.serial_number_reads == 0
+
+
+def test_cached_listing(context):
+    first = devices.list_connected_hantek_devices()
+    second = devices.list_connected_hantek_devices()
+    assert second == first and reads(context) == [1, 0, 1]
+    # the cached entries are copies
+    second[0]['Serial Number'] = 'changed'
+    assert devices.list_connected_hantek_devices() == first
+    devices.list_connected_hantek_devices(use_cache=False)
+    assert reads(context) == [2, 0, 2]
+
+
+def test_hotplug_invalidates_the_cache(context):
+    devices.list_connected_hantek_devices()
+    device = context.devices[0]
+    context.unplug(device)
+    assert [info['Serial Number'] for info in devices.list_connected_hantek_devices()] == [None, 'SN0003']
+    # another device is plugged into the same port (with the same address, so only the hotplug event tells)
+    replacement = SimulatedUSBDevice(device.port, device.address, 'SN0004', firmware_present=True)
+    context.plug(replacement)
+    device_list = devices.list_connected_hantek_devices()
+    assert device_list[-1]['Serial Number'] == 'SN0004' and device_list[-1]['Port'] == device.port[1]
+    assert replacement.serial_number_reads == 1 and context.devices[1].serial_number_reads == 1
+
+
+def test_address_change_invalidates_the_cache(context):
+    devices.list_connected_hantek_devices()
+    # the firmware is uploaded by another program: the device re-enumerates with a new address (no hotplug support)
+    device = context.devices[1]
+    device.firmware_present = True
+    device.address = 10
+    device_list = devices.list_connected_hantek_devices()
+    assert device_list[1]['Serial Number'] == 'SN0002' and device_list[1]['Firmware Present']
+    assert reads(context) == [1, 1, 1]
+
+
+def test_parallel_reads(context):
+    context.devices = [SimulatedUSBDevice((1, (i + 1,)), i + 1, f'SN{i:04d}', firmware_present=True)
+                       for i in range(20)]
+    device_list = devices.list_connected_hantek_devices(max_workers=4)
+    assert [info['Serial Number'] for info in device_list] == [f'SN{i:04d}' for i in range(20)]
+    assert devices.list_connected_hantek_devices(max_workers=4) == device_list
+    assert reads(context) == [1] * 20
+
+
+def test_inaccessible_device(context):
+    def denied():
+        raise usb1.USBErrorAccess
+    context.devices[0].getSerialNumber = denied
+    device_list = devices.list_connected_hantek_devices()
+    assert device_list[0]['Serial Number'] is None and device_list[0]['Firmware Present']
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+from hantekosc.filters import (BiquadFilter, CICDecimator, DCBlocker, FilterChain, FIRFilter, butterworth_sections,
+                               lowpass_taps)
+
+SAMPLE_RATE = 24e6
+LENGTH = 5000
+
+
+@pytest.fixture(scope='module')
+def c_code():
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    return c_code
+
+
+@pytest.fixture(scope='module')
+def no_c_code():
+    # the filters run in NumPy if the C code is not loaded
+    c_code = C_Code()
+    c_code.c_code_loaded = False
+    return c_code
+
+
+@pytest.fixture(scope='module')
+def adc_counts():
+    rng = np.random.default_rng(1)
+    times = np.arange(LENGTH) / SAMPLE_RATE
+    signal = 128 + 60 * np.sin(2 * np.pi * 1e6 * times) + 20 + rng.normal(0, 8, LENGTH)
+    return np.clip(np.rint(signal), 0, 255).astype(np.uint8)
+
+
+def blocks(data, seed=2):
+    """
+    Split the data into blocks of random lengths, including empty blocks and blocks of a single sample.
+    """
+    rng = np.random.default_rng(seed)
+    edges = np.sort(np.concatenate(([0, 0, 1, 1, len(data)], rng.integers(0, len(data), 20))))
+    return [data[start:stop] for start, stop in zip(edges[:-1], edges[1:])]
+
+
+def process_blockwise(filter_, data):
+    filter_.reset()
+    return np.concatenate([filter_.process(block) for block in blocks(data)])
+
+
+def process_at_once(filter_, data):
+    filter_.reset()
+    return filter_.process(data)
+
+
+def biquad_reference(sections, data):
+    # transposed direct form II in double precision
+    values = np.asarray(data, dtype=np.float64)
+    for b0, b1, b2, a1, a2 in sections:
+        out = np.empty_like(values)
+        s1 = s2 = 0.0
+        for n, x in enumerate(values):
+            y = b0 * x + s1
+            s1 = b1 * x - a1 * y + s2
+            s2 = b2 * x - a2 * y
+            out[n] = y
+        values = out
+    return values
+
+
+FILTERS = {
+    'fir': lambda c_code: FIRFilter(lowpass_taps(31, 2e6, SAMPLE_RATE), c_code=c_code),
+    'fir_decimating': lambda c_code: FIRFilter(lowpass_taps(63, 1e6, SAMPLE_RATE), decimation=8, c_code=c_code),
+    'biquad': lambda c_code: BiquadFilter(butterworth_sections(4, 2e6, SAMPLE_RATE), c_code=c_code),
+    'dc_blocker': lambda c_code: DCBlocker(10e3, SAMPLE_RATE, c_code=c_code),
+    'cic': lambda c_code: CICDecimator(8, order=3, c_code=c_code),
+    'cic_odd_ratio': lambda c_code: CICDecimator(5, order=4, c_code=c_code),
+}
+# the filters that have a NumPy implementation (the IIR filters need the C code)
+NUMPY_FILTERS = ['fir', 'fir_decimating', 'cic', 'cic_odd_ratio']
+
+
+def filter_input(name, adc_counts):
+    # the CIC decimator works on ADC counts, the other filters on the counts relative to 128
+    return adc_counts if name.startswith('cic') else adc_counts.astype(np.float32) - 128
+
+
+@pytest.mark.parametrize('name', FILTERS)
+def test_blockwise_equals_at_once_c(c_code, adc_counts, name):
+    filter_ = FILTERS[name](c_code)
+    data = filter_input(name, adc_counts)
+    np.testing.assert_allclose(process_blockwise(filter_, data), process_at_once(filter_, data), rtol=1e-6,
+                               atol=1e-4)
+
+
+@pytest.mark.parametrize('name', NUMPY_FILTERS)
+def test_blockwise_equals_at_once_numpy(no_c_code, adc_counts, name):
+    filter_ = FILTERS[name](no_c_code)
+    data = filter_input(name, adc_counts)
+    np.testing.assert_allclose(process_blockwise(filter_, data), process_at_once(filter_, data), rtol=1e-6,
+                               atol=1e-4)
+
+
+@pytest.mark.parametrize('name', NUMPY_FILTERS)
+def test_c_equals_numpy(c_code, no_c_code, adc_counts, name):
+    data = filter_input(name, adc_counts)
+    np.testing.assert_allclose(process_blockwise(FILTERS[name](c_code), data),
+                               process_blockwise(FILTERS[name](no_c_code), data), rtol=1e-5, atol=1e-3)
+
+
+def test_fir_reference(c_code, adc_counts):
+    taps = lowpass_taps(63, 1e6, SAMPLE_RATE)
+    data = filter_input('fir', adc_counts)
+    # the input before the first block is zero
+    reference = np.convolve(data.astype(np.float64), taps.astype(np.float64))[:LENGTH]
+    np.testing.assert_allclose(process_blockwise(FIRFilter(taps, c_code=c_code), data), reference, atol=1e-3)
+    np.testing.assert_allclose(process_blockwise(FIRFilter(taps, decimation=8, c_code=c_code), data),
+                               reference[::8], atol=1e-3)
+
+
+@pytest.mark.parametrize('name', ['biquad', 'dc_blocker'])
+def test_iir_reference(c_code, adc_counts, name):
+    filter_ = FILTERS[name](c_code)
+    data = filter_input(name, adc_counts)
+    np.testing.assert_allclose(process_blockwise(filter_, data), biquad_reference(filter_.sections, data), rtol=1e-5,
+                               atol=1e-3)
+
+
+@pytest.mark.parametrize('ratio, order', [(8, 3), (5, 4), (1, 2)])
+def test_cic_reference(c_code, adc_counts, ratio, order):
+    # "order" moving averages over "ratio" samples, the last output of each group of "ratio" inputs is kept
+    reference = adc_counts.astype(np.float64) - 128
+    for _ in range(order):
+        reference = np.convolve(reference, np.ones(ratio) / ratio)[:LENGTH]
+    reference = reference[ratio - 1::ratio] + 128
+    np.testing.assert_allclose(process_blockwise(CICDecimator(ratio, order, c_code=c_code), adc_counts), reference,
+                               atol=1e-3)
+
+
+def test_filter_chain(c_code, adc_counts):
+    chain = FilterChain(CICDecimator(4, c_code=c_code), FIRFilter(lowpass_taps(15, 1e6, SAMPLE_RATE / 4),
+                                                                   c_code=c_code))
+    assert chain.decimation == 4
+    np.testing.assert_allclose(process_blockwise(chain, adc_counts), process_at_once(chain, adc_counts), atol=1e-4)
+    with pytest.raises(ValueError):
+        FilterChain(FIRFilter([1.0]), CICDecimator(4))
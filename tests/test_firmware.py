@@ -0,0 +1,112 @@
+import os
+import time
+
+import pytest
+
+from hantekosc.py_ht6022 import Firmware
+from hantekosc.simulation import SimulatedScope
+
+
+@pytest.fixture
+def scope():
+    scope = SimulatedScope()
+    scope.setup()
+    scope.open_handle()
+    return scope
+
+
+def flash(scope, firmware):
+    start = time.perf_counter()
+    scope.flash_firmware(firmware)
+    return time.perf_counter() - start
+
+
+@pytest.mark.parametrize('name', ['dso6022be_firmware', 'dso6022bl_firmware', 'stock_firmware'])
+def test_coalesced_packets_write_the_same_image(scope, name):
+    location = Firmware.FIRMWARE_FILES[name]
+    records = Firmware.fx2_ihex_to_control_packets(location, coalesce=False)
+    packets = Firmware.fx2_ihex_to_control_packets(location)
+    assert len(packets) < len(records)
+    assert all(packet.size == len(packet.data) <= Firmware.MAX_CONTROL_PACKET_SIZE for packet in packets)
+    # the writes to the CPUCS register (holding and starting the 8051) are kept in order
+    assert packets[0] == records[0] and packets[-1] == records[-1]
+    assert ([packet for packet in packets if packet.value == Firmware.CPUCS_ADDRESS] ==
+            [packet for packet in records if packet.value == Firmware.CPUCS_ADDRESS])
+
+    scope.flash_firmware(records)
+    image = bytes(scope.ram)
+    scope.ram = bytearray(len(scope.ram))
+    scope.flash_firmware(packets)
+    assert scope.ram == image
+
+
+def test_cached_packets_equal_parsed_packets(firmware_cache):
+    location = Firmware.FIRMWARE_FILES['dso6022be_firmware']
+    packets = Firmware.load_control_packets(location)
+    assert len(os.listdir(firmware_cache)) == 1
+    assert Firmware.load_control_packets(location) == packets
+    assert Firmware.load_control_packets(location, use_cache=False) == packets
+
+
+@pytest.mark.slow
+def test_coalesced_flash_is_faster(scope):
+    location = Firmware.FIRMWARE_FILES['dso6022be_firmware']
+    scope.enumeration_time = 0
+    records = Firmware.fx2_ihex_to_control_packets(location, coalesce=False)
+    packets = Firmware.fx2_ihex_to_control_packets(location)
+    per_record = min(flash(scope, records) for _ in range(3))
+    coalesced = min(flash(scope, packets) for _ in range(3))
+    assert coalesced < per_record / 4
+
+
+@pytest.mark.parametrize('address, length, record_len', [(0, 8192, 16), (0x100, 1000, 16), (3, 1, 32),
+                                                         (0, 4096, 255), (0xffff - 99, 100, 7)])
+def test_ihex_round_trip(address, length, record_len):
+    data = bytes(range(256)) * (length // 256) + bytes(range(length % 256))
+    text = Firmware.encode_ihex(data, address, record_len)
+    lines = text.splitlines()
+    assert lines[-1] == ':00000001ff' and len(lines) == -(-length // record_len) + 1
+    records = Firmware.decode_ihex(text)
+    assert all(len(record) <= record_len for _, record in records)
+    assert [record_address for record_address, _ in records] == list(range(address, address + length, record_len))
+    assert b''.join(record for _, record in records) == data
+
+
+def test_ihex_of_the_firmware_files():
+    with open(Firmware.FIRMWARE_FILES['dso6022be_firmware']) as f:
+        records = Firmware.decode_ihex(f.read())
+    for address, data in records:
+        assert Firmware.decode_ihex(Firmware.encode_ihex(data, address)) == [
+            (address + offset, data[offset:offset + 16]) for offset in range(0, len(data), 16)]
+
+
+def test_invalid_ihex():
+    text = Firmware.encode_ihex(b'\x01\x02\x03\x04')
+    record, end_record = text.splitlines()
+    with pytest.raises(ValueError):
+        # wrong checksum
+        Firmware.decode_ihex(f'{record[:-2]}{(int(record[-2:], 16) + 1) % 256:02x}\n{end_record}')
+    with pytest.raises(ValueError):
+        Firmware.decode_ihex('00' + text)
+    with pytest.raises(ValueError):
+        Firmware.encode_ihex(b'\x00' * 10, 0xfffa)
+    with pytest.raises(ValueError):
+        Firmware.encode_ihex(b'\x00', record_len=0)
+
+
+@pytest.mark.parametrize('to_ihex', [True, False])
+def test_read_firmware(scope, to_ihex):
+    location = Firmware.FIRMWARE_FILES['dso6022be_firmware']
+    scope.flash_firmware(Firmware.fx2_ihex_to_control_packets(location))
+    with open(location) as f:
+        records = Firmware.decode_ihex(f.read())
+    end = max(address + len(data) for address, data in records)
+    firmware = scope.read_firmware(0, end, to_ihex=to_ihex, chunk_len=1000)
+    if to_ihex:
+        assert isinstance(firmware, str)
+        firmware = b''.join(data for _, data in Firmware.decode_ihex(firmware))
+    assert isinstance(firmware, bytes) and len(firmware) == end
+    for address, data in records:
+        assert firmware[address:address + len(data)] == data
+    # a section of the RAM
+    assert scope.read_firmware(0x10, 0x20, to_ihex=False) == bytes(scope.ram[0x10:0x30])
@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+# the maximum time in seconds for the recovery and for the first record afterwards
+TIMEOUT = 5
+
+
+def wait_until(condition, timeout=TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def osc():
+    osc = Oscilloscope(scope=SimulatedScope(noise=0))
+    yield osc
+    # never leave threads behind, even if the test failed (the recovery thread is a daemon)
+    if osc.running:
+        osc.stop()
+    if osc._recovery_thread is not None:
+        osc._recovery_thread.join(TIMEOUT)
+
+
+def test_unplug_and_replug_restores_the_session(osc):
+    scope = osc.scope
+    osc.sample_rate = 1e6
+    osc.channels[0].voltage_range = 1
+    osc.channels[1].voltage_range = 2.5
+    osc.channels[0].trigger_level = 0.0
+    osc.trigger_mode = 'REPEAT'
+    scope.set_ch1_ch2_ac_dc(0x10)
+    device_settings = (scope.sample_rate, list(scope.voltage_range_indices), scope.ac_dc_status)
+    gains = osc.calibration.gains.copy()
+    offsets = osc.calibration.offsets.copy()
+    conversion = [osc._get_conversion_values(channel) for channel in range(2)]
+    connection_events = []
+    osc.connection_callback = connection_events.append
+
+    osc.start()
+    record = osc.wait_for_record(timeout=TIMEOUT)
+    assert record is not None
+
+    scope.disconnect()
+    assert osc.connected is False
+    # the settings are lost together with the firmware (the coupling is remembered by the host as "ac_dc_status")
+    assert not scope.is_device_firmware_present
+    assert (scope.sample_rate, list(scope.voltage_range_indices)) != device_settings[:2]
+
+    scope.connect()
+    assert wait_until(lambda: osc.connected)
+    osc._recovery_thread.join(TIMEOUT)
+    assert not osc._recovery_thread.is_alive()
+    assert connection_events == [False, True]
+    assert osc.last_recovery_time is not None and osc.last_recovery_time < TIMEOUT
+
+    assert scope.is_device_firmware_present
+    assert (scope.sample_rate, list(scope.voltage_range_indices), scope.ac_dc_status) == device_settings
+    np.testing.assert_array_equal(osc.calibration.gains, gains)
+    np.testing.assert_array_equal(osc.calibration.offsets, offsets)
+    assert [osc._get_conversion_values(channel) for channel in range(2)] == conversion
+    assert osc.channels[0].trigger_level == 0.0
+
+    # the measurement resumes with the restored settings
+    new_record = osc.wait_for_record(after_id=record.record_id, timeout=TIMEOUT)
+    assert new_record is not None
+    assert new_record.sample_rate == record.sample_rate
+    np.testing.assert_array_equal(new_record.scale_factors, record.scale_factors)
+    assert osc.stop() < TIMEOUT
+
+
+def test_no_recovery_without_auto_reconnect(osc):
+    osc.auto_reconnect = False
+    osc.scope.disconnect()
+    osc.scope.connect()
+    assert osc.connected is False
+    assert osc._recovery_thread is None
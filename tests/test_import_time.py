@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+import pytest
+
+# The budgets of the cumulative import time in milliseconds. They are generous, so that slow machines pass, but they
+# fail if a module imports its heavy dependencies eagerly again ("hantekosc" took ~100 ms before).
+BUDGETS = {
+    'hantekosc': 25,
+    'hantekosc.devices': 250,
+    'hantekosc.oscilloscope': 600,
+}
+
+
+def cumulative_import_times(statement):
+    """
+    Get the cumulative import time in milliseconds of each module imported by a statement in a new interpreter.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True,
+                            check=True, timeout=60)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative) / 1000
+    return times
+
+
+@pytest.mark.parametrize('module', list(BUDGETS))
+def test_import_time(module):
+    # the fastest of a few imports, as the first one might have to read the files from disk
+    import_time = min(cumulative_import_times(f'import {module}')[module] for _ in range(3))
+    assert import_time < BUDGETS[module], f'importing {module} took {import_time:.1f} ms'
+
+
+def test_package_import_is_lazy():
+    statement = 'import sys, hantekosc; print(" ".join(sorted(sys.modules)))'
+    result = subprocess.run([sys.executable, '-c', statement], capture_output=True, text=True, check=True,
+                            timeout=60)
+    modules = set(result.stdout.split())
+    assert not modules & {'numpy', 'usb1', 'cffi', 'asyncio', 'hantekosc.oscilloscope'}
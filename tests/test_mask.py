@@ -0,0 +1,180 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+from hantekosc.calibration import voltage_to_adc
+from hantekosc.mask import MaskTest
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.record import Record
+from hantekosc.simulation import SimulatedScope
+
+LENGTH = 1000
+SAMPLE_RATE = 1e6
+# +/- 5 V in 256 ADC counts
+CONVERSION = (0.04, 2.0)
+
+
+@pytest.fixture(scope='module')
+def c_code():
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    return c_code
+
+
+@pytest.fixture
+def timing_data():
+    return np.arange(LENGTH) / SAMPLE_RATE
+
+
+def record(adc_counts, record_id=1, conversion=CONVERSION):
+    adc_counts = np.asarray(adc_counts, dtype=np.uint8)
+    return Record(record_id, np.arange(adc_counts.shape[1]) / SAMPLE_RATE, adc_counts, 'uint8',
+                  (conversion[0],) * 2, (conversion[1],) * 2, SAMPLE_RATE)
+
+
+def counts(volts, conversion=CONVERSION):
+    return np.clip(np.rint(voltage_to_adc(volts, *conversion)), 0, 255).astype(np.uint8)
+
+
+def test_limits_in_adc_counts(timing_data):
+    lower, upper = MaskTest(-1.0, 1.0).adc_limits(timing_data, CONVERSION)
+    assert np.all(lower == np.ceil(voltage_to_adc(-1.0, *CONVERSION)))
+    assert np.all(upper == np.floor(voltage_to_adc(1.0, *CONVERSION)))
+    # a limit on a level of the ADC is not lost by rounding errors
+    assert voltage_to_adc(-1.0, *CONVERSION) == lower[0] and voltage_to_adc(1.0, *CONVERSION) == upper[0]
+
+
+def test_limits_with_negative_scale_factor(timing_data):
+    conversion = (-0.04, -2.0)
+    mask = MaskTest(-1.0, 0.5)
+    lower, upper = mask.adc_limits(timing_data, conversion)
+    # the lower voltage limit is the upper limit in ADC counts
+    assert np.all(lower == np.ceil(voltage_to_adc(0.5, *conversion)))
+    assert np.all(upper == np.floor(voltage_to_adc(-1.0, *conversion)))
+    assert mask.test(counts(np.full(LENGTH, 0.0), conversion), timing_data, conversion) == (0, -1)
+    assert mask.test(counts(np.full(LENGTH, 0.8), conversion), timing_data, conversion) == (LENGTH, 0)
+
+
+def test_limits_outside_the_adc_range(timing_data):
+    # no limits
+    lower, upper = MaskTest().adc_limits(timing_data, CONVERSION)
+    assert np.all(lower == 0) and np.all(upper == 255)
+    lower, upper = MaskTest(-100.0, 100.0).adc_limits(timing_data, CONVERSION)
+    assert np.all(lower == 0) and np.all(upper == 255)
+    # limits no sample can pass
+    for lower_limit, upper_limit in ((-100.0, -50.0), (50.0, 100.0), (1.0, -1.0), (np.nan, 1.0)):
+        lower, upper = MaskTest(lower_limit, upper_limit).adc_limits(timing_data, CONVERSION)
+        assert np.all(lower == 255) and np.all(upper == 0)
+        mask = MaskTest(lower_limit, upper_limit)
+        assert mask.test(np.full(LENGTH, 128, dtype=np.uint8), timing_data, CONVERSION) == (LENGTH, 0)
+
+
+def test_interpolated_and_callable_limits(timing_data):
+    # a limit with fewer points is stretched over the record
+    lower, upper = MaskTest([-1.0, -2.0, -1.0], [1.0, 3.0, 1.0]).adc_limits(timing_data, CONVERSION)
+    positions = np.linspace(0, 2, LENGTH)
+    expected_lower = np.ceil(voltage_to_adc(np.interp(positions, [0, 1, 2], [-1.0, -2.0, -1.0]), *CONVERSION) - 1e-6)
+    expected_upper = np.floor(voltage_to_adc(np.interp(positions, [0, 1, 2], [1.0, 3.0, 1.0]), *CONVERSION) + 1e-6)
+    np.testing.assert_array_equal(lower, expected_lower)
+    np.testing.assert_array_equal(upper, expected_upper)
+
+    mask = MaskTest(lambda t: np.sin(2 * np.pi * 1e3 * t) - 0.5, lambda t: np.sin(2 * np.pi * 1e3 * t) + 0.5)
+    lower, upper = mask.adc_limits(timing_data, CONVERSION)
+    sine = np.sin(2 * np.pi * 1e3 * timing_data)
+    np.testing.assert_array_equal(lower, np.ceil(voltage_to_adc(sine - 0.5, *CONVERSION) - 1e-6))
+    np.testing.assert_array_equal(upper, np.floor(voltage_to_adc(sine + 0.5, *CONVERSION) + 1e-6))
+    assert mask.test(counts(sine), timing_data, CONVERSION) == (0, -1)
+    assert mask.test(counts(-sine), timing_data, CONVERSION)[0] > 0
+
+
+def test_limits_are_cached(timing_data):
+    mask = MaskTest(-1.0, 1.0)
+    limits = mask.adc_limits(timing_data, CONVERSION)
+    assert not limits.flags.writeable
+    assert mask.adc_limits(timing_data, CONVERSION) is limits
+    assert mask.adc_limits(timing_data, (0.02, 2.0)) is not limits
+    mask.upper = 2.0
+    mask.reset()
+    assert mask.adc_limits(timing_data, CONVERSION)[1][0] == np.floor(voltage_to_adc(2.0, *CONVERSION))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_c_equals_numpy(c_code, timing_data, seed):
+    rng = np.random.default_rng(seed)
+    adc_counts = rng.integers(0, 256, LENGTH, dtype=np.uint8)
+    lower = rng.uniform(-6, 0, 7)
+    upper = rng.uniform(0, 6, 7)
+    c_mask = MaskTest(lower, upper, c_code=c_code)
+    numpy_mask = MaskTest(lower, upper)
+    # contiguous and strided counts
+    for data in (adc_counts, np.repeat(adc_counts, 2)[::2]):
+        result = c_mask.test(data, timing_data, CONVERSION)
+        assert result == numpy_mask.test(data, timing_data, CONVERSION)
+        lower_limits, upper_limits = numpy_mask.adc_limits(timing_data, CONVERSION)
+        outside = np.flatnonzero((data < lower_limits) | (data > upper_limits))
+        assert result == (len(outside), int(outside[0]) if len(outside) else -1)
+
+
+def test_counters_failures_and_saving(tmp_path):
+    mask = MaskTest(-1.0, 1.0, keep_failures=2, save_directory=str(tmp_path))
+    good = record([counts(np.full(LENGTH, 0.5))] * 2)
+    bad = np.array([counts(np.full(LENGTH, 0.5))] * 2)
+    bad[1, 100:110] = counts(1.5)
+    assert mask.add_record(good, 0)
+    assert mask.add_record(record(bad, 2), 0)
+    with ThreadPoolExecutor(1) as executor:
+        assert not mask.add_record(record(bad, 3), 1, executor=executor)
+        assert not mask.add_record(record(bad, 4), 1, executor=executor)
+        assert not mask.add_record(record(bad, 5), 1, executor=executor)
+    assert (mask.tested, mask.passed, mask.failed) == (5, 2, 3)
+    # only the last failures are kept
+    assert [(failure.record_id, n, first) for failure, n, first in mask.failures] == [(4, 10, 100e-6), (5, 10, 100e-6)]
+    assert sorted(os.listdir(tmp_path)) == [f'mask_failure_{record_id:08d}.npz' for record_id in (3, 4, 5)]
+    with np.load(tmp_path / 'mask_failure_00000003.npz') as saved:
+        np.testing.assert_array_equal(saved['data'], bad)
+        assert (saved['channel'], saved['number_of_violations'], saved['first_violation']) == (1, 10, 100)
+        assert saved['sample_rate'] == SAMPLE_RATE
+
+    statistics = mask.statistics()
+    assert statistics['tested'] == 5 and statistics['failure_rate'] == 3 / 5
+    elapsed = mask._last_test_time - mask._first_test_time
+    assert statistics['records_per_second'] == pytest.approx(4 / elapsed)
+    assert statistics['test_time'] > 0
+    mask.reset()
+    assert mask.statistics() == {'tested': 0, 'passed': 0, 'failed': 0, 'failure_rate': 0.0,
+                                 'records_per_second': 0.0, 'test_time': 0.0}
+    assert not mask.failures
+
+
+@pytest.mark.parametrize('data_type', ['float32', 'uint8'])
+def test_mask_on_the_simulator(tmp_path, data_type):
+    scope = SimulatedScope(realtime=False, noise=0)
+    scope.signals = [lambda t: np.sin(2 * np.pi * 1e3 * t), lambda t: 1.5 * np.sin(2 * np.pi * 1e3 * t)]
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = 1_000_000
+    osc.record_length = 5000
+    osc.trigger_mode = 'NONE'
+    osc.data_type = data_type
+    for channel in osc.channels:
+        channel.voltage_range = 2.5
+        channel.mask_test = MaskTest(-1.2, 1.2, save_directory=str(tmp_path / f'ch{channel.ch_number + 1}'),
+                                     c_code=osc.c_code)
+    osc.start()
+    try:
+        for _ in range(3):
+            assert osc.wait_for_record(timeout=5) is not None
+    finally:
+        osc.stop()
+    passing, failing = (channel.mask_test for channel in osc.channels)
+    assert passing.tested >= 3 and passing.failed == 0
+    assert failing.tested >= 3 and failing.passed == 0
+    # without a trigger the records start at any phase, a sine with 1.5 V amplitude exceeds the limits in each half
+    # period (500 us)
+    assert all(0 <= first < 500e-6 for _, _, first in failing.failures)
+    # the failing records have been saved when the measurement is stopped
+    assert len(os.listdir(tmp_path / 'ch2')) == failing.failed
+    assert not os.path.exists(tmp_path / 'ch1')
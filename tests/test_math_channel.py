@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from hantekosc.math_channel import CHUNK_SIZE, MathChannel
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+# the expressions and their direct calculation with NumPy
+EXPRESSIONS = {
+    'CH1 - CH2': lambda ch1, ch2: ch1 - ch2,
+    'CH1 * CH2': lambda ch1, ch2: ch1 * ch2,
+    '-CH1': lambda ch1, ch2: -ch1,
+    '+CH2 / 2': lambda ch1, ch2: ch2 / 2,
+    'CH1 ** 2 + CH2 ** 2': lambda ch1, ch2: ch1 ** 2 + ch2 ** 2,
+    'sqrt(CH1**2 + CH2**2)': lambda ch1, ch2: np.sqrt(ch1 ** 2 + ch2 ** 2),
+    '((CH1 + CH2) * (CH1 - CH2)) / (CH1 * CH1 + 1)': lambda ch1, ch2: ((ch1 + ch2) * (ch1 - ch2)) / (ch1 * ch1 + 1),
+    '-(CH1 - -CH2) * -2': lambda ch1, ch2: -(ch1 - -ch2) * -2,
+    'abs(sin(CH1) - cos(CH2)) ** 3': lambda ch1, ch2: np.abs(np.sin(ch1) - np.cos(ch2)) ** 3,
+    'exp(-abs(CH1)) * log10(abs(CH2) + 1) + log(2)': lambda ch1, ch2: np.exp(-np.abs(ch1)) * np.log10(np.abs(ch2) + 1)
+    + np.log(2),
+    '1 / CH2': lambda ch1, ch2: 1 / ch2,
+    '2 * 3 - CH1 / (4 ** 0.5)': lambda ch1, ch2: 6 - ch1 / 2,
+    'CH2': lambda ch1, ch2: ch2,
+    '2 ** 3 - 1': lambda ch1, ch2: np.full_like(ch1, 7),
+}
+
+
+@pytest.fixture(params=[1000, CHUNK_SIZE, 2 * CHUNK_SIZE + 123], ids=['short', 'one_chunk', 'chunks'])
+def channel_data(request):
+    rng = np.random.default_rng(request.param)
+    channel_data = rng.uniform(-5, 5, (2, request.param))
+    # a zero in the last chunk, for the division by zero
+    channel_data[1, -1] = 0
+    return channel_data
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_evaluate_equals_numpy(channel_data, expression, dtype):
+    channel_data = channel_data.astype(dtype)
+    math_channel = MathChannel(None, 'MATH1', expression)
+    out = np.empty(channel_data.shape[1], dtype=dtype)
+    math_channel.evaluate(channel_data, out)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = EXPRESSIONS[expression](*channel_data)
+    np.testing.assert_allclose(out, expected, rtol=1e-5 if dtype == np.float32 else 1e-12)
+    # the buffers are reused for the next record
+    out2 = np.empty_like(out)
+    math_channel.evaluate(channel_data[:, ::-1].copy(), out2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = EXPRESSIONS[expression](*channel_data[:, ::-1])
+    np.testing.assert_allclose(out2, expected, rtol=1e-5 if dtype == np.float32 else 1e-12)
+
+
+def test_registers_are_reused():
+    # one register per nesting level of the right operands, the output buffer is register 0
+    assert MathChannel(None, 'M', 'CH1 + CH2 + CH1 + CH2')._number_of_registers == 1
+    assert MathChannel(None, 'M', '(CH1 + CH2) * (CH1 - CH2)')._number_of_registers == 2
+    assert MathChannel(None, 'M', '(CH1 + CH2) * ((CH1 - CH2) / (CH1 * CH2))')._number_of_registers == 3
+    assert MathChannel(None, 'M', 'CH1 ** 2')._operations[0][0] is np.square
+
+
+def test_constants_are_folded():
+    math_channel = MathChannel(None, 'M', 'CH1 * (2 ** 3 - sqrt(4)) + -(1 / 4)')
+    assert [(operation[0], operation[2]) for operation in math_channel._operations] == \
+        [(np.multiply, ('constant', 6.0)), (np.add, ('constant', -0.25))]
+
+
+@pytest.mark.parametrize('expression', ['CH1 + 1/0', 'CH1 * 10.0**400', 'CH1 * sqrt(-1)', 'CH1 * log(0)',
+                                        'CH1 * (-8) ** 0.5', 'CH3', 'CH1 +', 'CH1 % 2', 'max(CH1)', 'CH1 + True',
+                                        'CH1 + "1"', 'sin(CH1, CH2)', 'CH1.real'])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        MathChannel(None, 'M', expression)
+
+
+@pytest.mark.parametrize('data_type', ['float32', 'float64', 'uint8'])
+def test_math_channel_on_the_simulator(data_type):
+    osc = Oscilloscope(scope=SimulatedScope(realtime=False))
+    osc.sample_rate = 1_000_000
+    osc.record_length = 3 * CHUNK_SIZE // 2
+    osc.trigger_mode = 'NONE'
+    osc.data_type = data_type
+    difference = osc.add_math_channel('CH1 - CH2')
+    power = osc.add_math_channel('(CH1 * CH2) ** 2', name='POWER')
+    assert difference.id == 'MATH1'
+    with pytest.raises(ValueError):
+        osc.add_math_channel('CH1', name='CH2')
+    osc.start()
+    try:
+        record = osc.wait_for_record(timeout=5)
+    finally:
+        osc.stop()
+    ch1, ch2 = (record.voltage_data(i, np.float32).astype(np.float64) for i in range(2))
+    assert record.math_data['MATH1'].dtype == (np.float64 if data_type == 'float64' else np.float32)
+    np.testing.assert_allclose(record.math_data['MATH1'], ch1 - ch2, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(record.math_data['POWER'], (ch1 * ch2) ** 2, rtol=1e-5, atol=1e-6)
+    assert difference.snapshot()[2] is not None and power.snapshot()[0] == record.record_id
+    osc.remove_math_channel(power)
+    assert osc.math_channels == [difference]
@@ -0,0 +1,151 @@
+import math
+
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+from hantekosc.measurements import MEASUREMENTS, RunningStatistics, _crossings, measure
+
+SAMPLE_RATE = 1e6
+SCALE_FACTOR = 0.04
+OFFSET = 2.0
+# the square wave: 100 samples per period, 30 samples high (at the 50 % level), 10 samples per edge
+PERIOD = 100
+HIGH = 30
+EDGE = 10
+BASE, TOP, PEAK = 60, 200, 220
+
+
+@pytest.fixture(scope='module')
+def c_code():
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    return c_code
+
+
+def square_wave(n_periods=20):
+    """
+    Get a square wave with linear edges and a single sample of overshoot after each rising edge.
+    """
+    period = np.full(PERIOD, BASE, dtype=np.float64)
+    # the 50 % level is crossed in the middle of each edge
+    period[:EDGE] = np.linspace(BASE, TOP, EDGE + 1)[1:]
+    period[EDGE:HIGH] = TOP
+    period[EDGE] = PEAK
+    period[HIGH:HIGH + EDGE] = np.linspace(TOP, BASE, EDGE + 1)[1:]
+    # start on the base level, so the first edge is complete
+    return np.concatenate((np.full(50, BASE), np.tile(period, n_periods))).round().astype(np.uint8)
+
+
+def sine_wave(frequency=12_345.0, amplitude=100, length=100_000):
+    t = np.arange(length) / SAMPLE_RATE
+    return np.rint(128 + OFFSET + amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.uint8)
+
+
+def test_square_wave():
+    results = measure(square_wave(), SAMPLE_RATE, SCALE_FACTOR, OFFSET)
+    assert set(results) == set(MEASUREMENTS)
+    assert results['frequency'] == pytest.approx(SAMPLE_RATE / PERIOD)
+    assert results['period'] == pytest.approx(PERIOD / SAMPLE_RATE)
+    assert results['duty_cycle'] == pytest.approx(100 * HIGH / PERIOD, abs=0.5)
+    # 10 % to 90 % of a linear edge
+    assert results['rise_time'] == pytest.approx(0.8 * EDGE / SAMPLE_RATE, rel=0.05)
+    assert results['fall_time'] == pytest.approx(0.8 * EDGE / SAMPLE_RATE, rel=0.05)
+    assert results['overshoot'] == pytest.approx(100 * (PEAK - TOP) / (TOP - BASE))
+    assert results['top'] == pytest.approx((TOP - 128 - OFFSET) * SCALE_FACTOR)
+    assert results['base'] == pytest.approx((BASE - 128 - OFFSET) * SCALE_FACTOR)
+    assert results['amplitude'] == pytest.approx((TOP - BASE) * SCALE_FACTOR)
+    assert results['vpp'] == pytest.approx((PEAK - BASE) * SCALE_FACTOR)
+
+
+def test_sine_wave():
+    frequency, amplitude = 12_345.0, 100
+    results = measure(sine_wave(frequency, amplitude), SAMPLE_RATE, SCALE_FACTOR, OFFSET)
+    assert results['frequency'] == pytest.approx(frequency, rel=1e-4)
+    assert results['duty_cycle'] == pytest.approx(50, abs=0.5)
+    # not a whole number of periods
+    assert results['mean'] == pytest.approx(0, abs=0.05 * SCALE_FACTOR)
+    assert results['rms'] == pytest.approx(amplitude / math.sqrt(2) * SCALE_FACTOR, rel=1e-3)
+    assert results['vpp'] == pytest.approx(2 * amplitude * SCALE_FACTOR)
+    assert results['min'] == pytest.approx(-amplitude * SCALE_FACTOR)
+    assert results['max'] == pytest.approx(amplitude * SCALE_FACTOR)
+    # 10 % to 90 % of the peak-to-peak amplitude of a sine: (arcsin(0.8) / pi) of half a period
+    rise_time = math.asin(0.8) / math.pi / frequency
+    assert results['rise_time'] == pytest.approx(rise_time, rel=0.02)
+    assert results['fall_time'] == pytest.approx(rise_time, rel=0.02)
+
+
+def test_negative_scale_factor():
+    results = measure(sine_wave(), SAMPLE_RATE, -SCALE_FACTOR, OFFSET)
+    expected = measure(sine_wave(), SAMPLE_RATE, SCALE_FACTOR, OFFSET)
+    for name in ('rms', 'vpp', 'amplitude', 'frequency', 'rise_time', 'fall_time'):
+        assert results[name] == pytest.approx(expected[name])
+    assert results['vpp'] > 0 and results['amplitude'] > 0
+    assert results['min'] == pytest.approx(-expected['max']) and results['max'] == pytest.approx(-expected['min'])
+    assert results['min'] < results['max']
+
+
+@pytest.mark.parametrize('use_c', [False, True])
+def test_constant_signal(use_c):
+    c_code = C_Code() if use_c else None
+    if use_c and not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    results = measure(np.full(10_000, 150, dtype=np.uint8), SAMPLE_RATE, SCALE_FACTOR, OFFSET, c_code)
+    assert results['mean'] == pytest.approx((150 - 128 - OFFSET) * SCALE_FACTOR)
+    assert results['rms'] == pytest.approx(abs(results['mean']))
+    assert results['vpp'] == 0 and results['amplitude'] == 0
+    for name in ('frequency', 'period', 'duty_cycle', 'rise_time', 'fall_time', 'overshoot'):
+        assert math.isnan(results[name])
+
+
+def test_empty_record():
+    results = measure(np.empty(0, dtype=np.uint8), SAMPLE_RATE, SCALE_FACTOR, OFFSET)
+    assert all(math.isnan(value) for value in results.values())
+
+
+def test_measure_with_c_code(c_code):
+    for adc_counts in (square_wave(), sine_wave()):
+        expected = measure(adc_counts, SAMPLE_RATE, SCALE_FACTOR, OFFSET)
+        results = measure(adc_counts, SAMPLE_RATE, SCALE_FACTOR, OFFSET, c_code)
+        for name in MEASUREMENTS:
+            assert results[name] == pytest.approx(expected[name], nan_ok=True)
+
+
+@pytest.mark.parametrize('signal', ['square', 'sine', 'noise', 'noisy square'])
+@pytest.mark.parametrize('level, hysteresis', [(130, 0), (130.5, 14), (100, 40), (250, 4)])
+def test_find_crossings_c_matches_numpy(c_code, signal, level, hysteresis):
+    rng = np.random.default_rng(0)
+    if signal == 'square':
+        adc_counts = square_wave()
+    elif signal == 'sine':
+        adc_counts = sine_wave()
+    elif signal == 'noise':
+        adc_counts = rng.integers(0, 256, 20_000, dtype=np.uint8)
+    else:
+        noise = rng.integers(-20, 21, len(square_wave()))
+        adc_counts = np.clip(square_wave().astype(int) + noise, 0, 255).astype(np.uint8)
+    expected = _crossings(adc_counts, level, hysteresis)
+    result = _crossings(adc_counts, level, hysteresis, c_code)
+    for positions, expected_positions in zip(result, expected):
+        np.testing.assert_allclose(positions, expected_positions)
+
+
+def test_running_statistics():
+    values = np.random.default_rng(0).normal(3.0, 0.5, 1000)
+    statistics = RunningStatistics()
+    assert math.isnan(statistics.mean) and math.isnan(statistics.stddev)
+    for value in values:
+        statistics.update(float(value))
+        # NaN values are not counted
+        statistics.update(math.nan)
+    assert statistics.count == len(values)
+    assert statistics.mean == pytest.approx(np.mean(values))
+    assert statistics.stddev == pytest.approx(np.std(values, ddof=1))
+    assert statistics.min == values.min() and statistics.max == values.max()
+    assert statistics.as_dict() == {'count': len(values), 'mean': statistics.mean, 'min': statistics.min,
+                                    'max': statistics.max, 'stddev': statistics.stddev}
+    statistics.reset()
+    assert statistics.count == 0 and math.isnan(statistics.mean)
+    statistics.update(1.0)
+    assert statistics.mean == 1.0 and math.isnan(statistics.stddev)
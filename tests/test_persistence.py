@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.persistence import PersistenceHistogram
+from hantekosc.simulation import SimulatedScope
+
+
+@pytest.fixture(scope='module')
+def c_code():
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    return c_code
+
+
+def expected_counts(records, time_bins):
+    """
+    Count each sample of the records in the time bin i * time_bins // length and the column of its ADC count.
+    """
+    histogram = np.zeros((time_bins, 256), dtype=np.int64)
+    for adc_counts in records:
+        bins = np.arange(len(adc_counts)) * time_bins // len(adc_counts)
+        np.add.at(histogram, (bins, adc_counts), 1)
+    return histogram
+
+
+@pytest.mark.parametrize('length, time_bins', [(1000, 1000), (1000, 7), (10_007, 1000), (5000, 333), (50, 1000)])
+def test_c_matches_bincount(c_code, length, time_bins):
+    rng = np.random.default_rng(length)
+    records = [rng.integers(0, 256, length, dtype=np.uint8) for _ in range(5)]
+    histograms = [PersistenceHistogram(time_bins), PersistenceHistogram(time_bins, c_code=c_code)]
+    for adc_counts in records:
+        for histogram in histograms:
+            histogram.add(adc_counts)
+    expected = expected_counts(records, min(time_bins, length))
+    for histogram in histograms:
+        counts = histogram.counts()
+        assert counts.dtype == np.uint32
+        np.testing.assert_array_equal(counts, expected)
+        assert histogram.number_of_records == len(records)
+
+
+def test_strided_records(c_code):
+    adc_counts = np.random.default_rng(0).integers(0, 256, 6000, dtype=np.uint8)[::3]
+    histograms = [PersistenceHistogram(100), PersistenceHistogram(100, c_code=c_code)]
+    for histogram in histograms:
+        histogram.add(adc_counts)
+        np.testing.assert_array_equal(histogram.counts(), expected_counts([adc_counts], 100))
+
+
+@pytest.mark.parametrize('use_c', [False, True])
+def test_decay_modes(use_c):
+    c_code = C_Code() if use_c else None
+    if use_c and not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    adc_counts = np.full(100, 42, dtype=np.uint8)
+    histograms = {decay: PersistenceHistogram(10, decay, decay_records=3, c_code=c_code)
+                  for decay in ('INFINITE', 'EXPONENTIAL', 'RESET')}
+    for _ in range(3):
+        for histogram in histograms.values():
+            histogram.add(adc_counts)
+    # 10 samples per time bin and record
+    for histogram in histograms.values():
+        assert np.all(histogram.counts()[:, 42] == 30)
+    for histogram in histograms.values():
+        histogram.add(adc_counts)
+    assert np.all(histograms['INFINITE'].counts()[:, 42] == 40)
+    # halved before the fourth record is added
+    assert np.all(histograms['EXPONENTIAL'].counts()[:, 42] == 15 + 10)
+    assert histograms['EXPONENTIAL'].number_of_records == 4
+    # cleared before the fourth record is added
+    assert np.all(histograms['RESET'].counts()[:, 42] == 10)
+    assert histograms['RESET'].number_of_records == 1
+    for histogram in histograms.values():
+        assert histogram.counts().sum() == histogram.counts()[:, 42].sum()
+
+
+@pytest.mark.parametrize('change', ['time_range', 'conversion', 'length'])
+def test_reset_on_key_change(change):
+    histogram = PersistenceHistogram(100)
+    adc_counts = np.full(1000, 100, dtype=np.uint8)
+    for _ in range(3):
+        histogram.add(adc_counts, (0.0, 1e-3), (0.04, 0.0))
+    assert histogram.number_of_records == 3
+    if change == 'time_range':
+        histogram.add(adc_counts, (-0.5e-3, 0.5e-3), (0.04, 0.0))
+    elif change == 'conversion':
+        histogram.add(adc_counts, (0.0, 1e-3), (0.08, 0.0))
+    else:
+        histogram.add(adc_counts[:500], (0.0, 1e-3), (0.04, 0.0))
+    assert histogram.number_of_records == 1
+    assert histogram.counts().sum() == (1000 if change != 'length' else 500)
+
+
+def test_reset_and_axes():
+    histogram = PersistenceHistogram(4)
+    assert histogram.counts().shape == (0, 256)
+    assert histogram.image().shape == (256, 0)
+    assert len(histogram.time_axis()) == len(histogram.voltage_axis()) == 0
+    histogram.add(np.array([0, 255, 255, 128, 128, 128, 7, 8], dtype=np.uint8), (1.0, 1.7), (0.5, 1.0))
+    np.testing.assert_allclose(histogram.time_axis(), [1.0, 1.2, 1.4, 1.6])
+    voltages = histogram.voltage_axis()
+    assert voltages[0] == (255 - 129) * 0.5 and voltages[-1] == -129 * 0.5
+    image = histogram.image()
+    assert image.shape == (256, 4) and image.max() == 1
+    # the highest voltage in the first row
+    assert image[0, 0] == 0.5 and image[255, 0] == 0.5 and image[127, 1] == 0.5
+    log_image = histogram.image('LOG')
+    assert log_image.max() == 1 and log_image[0, 0] == pytest.approx(np.log(2) / np.log(3))
+    histogram.reset()
+    assert histogram.number_of_records == 0 and histogram.counts().shape == (0, 256)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        PersistenceHistogram(decay='LINEAR')
+    with pytest.raises(ValueError):
+        PersistenceHistogram(time_bins=0)
+    with pytest.raises(ValueError):
+        PersistenceHistogram(decay_records=0)
+    with pytest.raises(ValueError):
+        PersistenceHistogram().image('SQRT')
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32'])
+def test_published_records(data_type):
+    osc = Oscilloscope(scope=SimulatedScope(realtime=False, noise=0))
+    osc.sample_rate = 1_000_000
+    osc.record_length = 5000
+    osc.trigger_mode = 'NONE'
+    osc.data_type = data_type
+    osc.channels[0].persistence = PersistenceHistogram(500, c_code=osc.c_code)
+    reference = PersistenceHistogram(500)
+    osc.start()
+    try:
+        records = [osc.wait_for_record(timeout=5) for _ in range(3)]
+    finally:
+        osc.stop()
+    assert all(record is not None for record in records)
+    persistence = osc.channels[0].persistence
+    assert persistence.number_of_records >= 3
+    assert persistence.counts().sum() == persistence.number_of_records * 5000
+    # a record added again counts the same ADC counts as when it was published
+    reference.add_record(records[-1], 0)
+    np.testing.assert_array_equal(reference.counts().sum(axis=0), np.bincount(records[-1].adc_counts(0),
+                                                                              minlength=256))
+    times, voltages, image = osc.channels[0].persistence_image()
+    assert len(times) == 500 and len(voltages) == 256 and image.shape == (256, 500)
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from hantekosc.c_code import C_Code
+from hantekosc.pyramid import WaveformPyramid
+
+# not a multiple of any power of the factors, so the last entry of each level covers fewer samples
+RECORD_LENGTH = 100_003
+
+
+@pytest.fixture(scope='module')
+def c_code():
+    c_code = C_Code()
+    if not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    return c_code
+
+
+@pytest.fixture(scope='module')
+def adc_counts():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (2, RECORD_LENGTH), dtype=np.uint8)
+
+
+def brute_force(pyramid, adc_counts, channel, start, stop, n_points, level):
+    """
+    Get the minimum, the maximum and the mean of the samples of each bin of a query. The bins cover whole entries of
+    the level, so the section is extended to the entries that contain its first and its last sample.
+    """
+    block_size = pyramid.factor ** level
+    first, last = start // block_size, -(-stop // block_size)
+    n_points = min(n_points, last - first)
+    starts = np.arange(n_points) * (last - first) // n_points
+    edges = np.minimum((first + np.append(starts, last - first)) * block_size, pyramid.record_length)
+    samples = [adc_counts[channel, begin:end] for begin, end in zip(edges[:-1], edges[1:])]
+    return (np.array([s.min() for s in samples]), np.array([s.max() for s in samples]),
+            np.array([s.mean() for s in samples]))
+
+
+@pytest.mark.parametrize('factor', [2, 4, 7])
+@pytest.mark.parametrize('start, stop, n_points', [(0, RECORD_LENGTH, 100), (0, RECORD_LENGTH, 1000),
+                                                   (12_345, RECORD_LENGTH, 333), (1, 99_999, 250),
+                                                   (50_000, 50_100, 1000), (777, 888, 20)])
+def test_query_matches_brute_force(adc_counts, factor, start, stop, n_points):
+    pyramid = WaveformPyramid.from_record(adc_counts, adc_counts, factor=factor)
+    for channel in range(2):
+        minima, maxima, means, level = pyramid.query(channel, start, stop, n_points)
+        expected = brute_force(pyramid, adc_counts, channel, start, stop, n_points, level)
+        np.testing.assert_array_equal(minima, expected[0])
+        np.testing.assert_array_equal(maxima, expected[1])
+        np.testing.assert_allclose(means, expected[2], rtol=1e-5)
+
+
+def test_query_uses_upper_levels_and_the_tail(adc_counts):
+    pyramid = WaveformPyramid.from_record(adc_counts, adc_counts, factor=4)
+    # the record length is not a multiple of the block size of the level that is queried
+    _, _, means, level = pyramid.query(0, 0, RECORD_LENGTH, 100)
+    assert level > 0
+    assert RECORD_LENGTH % pyramid.factor ** level
+    expected = brute_force(pyramid, adc_counts, 0, 0, RECORD_LENGTH, 100, level)[2]
+    np.testing.assert_allclose(means, expected, rtol=1e-5)
+
+
+def test_query_of_an_empty_section(adc_counts):
+    pyramid = WaveformPyramid.from_record(adc_counts, adc_counts)
+    with pytest.raises(ValueError):
+        pyramid.query(0, 10, 10, 100)
+
+
+def test_level_0_is_read_only(adc_counts):
+    data = adc_counts.copy()
+    pyramid = WaveformPyramid.from_record(data, data)
+    with pytest.raises(ValueError):
+        pyramid.levels[0][0][0, 0] = 0
+    # the record data itself is not changed
+    assert data.flags.writeable
+
+
+@pytest.mark.parametrize('use_c', [False, True])
+@pytest.mark.parametrize('block_length', [1000, 4096, 33_333])
+def test_incremental_update_matches_from_record(adc_counts, use_c, block_length):
+    c_code = C_Code() if use_c else None
+    if use_c and not c_code.c_code_loaded:
+        pytest.skip('The C code is not available.')
+    expected = WaveformPyramid.from_record(adc_counts, adc_counts, c_code)
+    pyramid = WaveformPyramid(RECORD_LENGTH, c_code=c_code)
+    buffer = np.zeros_like(adc_counts)
+    for start in range(0, RECORD_LENGTH, block_length):
+        stop = min(start + block_length, RECORD_LENGTH)
+        buffer[:, start:stop] = adc_counts[:, start:stop]
+        pyramid.update(buffer, stop)
+    pyramid.finish(buffer, buffer)
+    assert len(pyramid.levels) == len(expected.levels) > 2
+    for level, expected_level in zip(pyramid.levels[1:], expected.levels[1:]):
+        for array, expected_array in zip(level, expected_level):
+            np.testing.assert_array_equal(array, expected_array)
+
+
+@pytest.mark.parametrize('factor', [2, 3, 4, 8, 16])
+@pytest.mark.parametrize('raw', [True, False])
+def test_reduce_level_c_matches_numpy(c_code, factor, raw):
+    rng = np.random.default_rng(factor)
+    length = 1000 * factor
+    minima = rng.integers(0, 200, (2, length), dtype=np.uint8)
+    maxima = minima if raw else minima + rng.integers(0, 56, (2, length), dtype=np.uint8)
+    means = None if raw else rng.uniform(0, 255, (2, length)).astype(np.float32)
+    results = []
+    for pyramid_c_code in (None, c_code):
+        pyramid = WaveformPyramid(length, factor=factor, c_code=pyramid_c_code)
+        outputs = (np.empty((2, 1000), dtype=np.uint8), np.empty((2, 1000), dtype=np.uint8),
+                   np.empty((2, 1000), dtype=np.float32))
+        pyramid._reduce_level(minima, maxima, means, *outputs)
+        results.append(outputs)
+    np.testing.assert_array_equal(results[1][0], results[0][0])
+    np.testing.assert_array_equal(results[1][1], results[0][1])
+    np.testing.assert_allclose(results[1][2], results[0][2], rtol=1e-6)
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+TIMEOUT = 5
+LEVEL = 0.8
+FREQUENCY = 5e3
+
+
+@pytest.fixture
+def osc():
+    scope = SimulatedScope(realtime=False, noise=0)
+    # a constant on CH1, a sine on CH2
+    scope.signals = [lambda t: np.full_like(t, LEVEL), lambda t: 0.5 * np.sin(2 * np.pi * FREQUENCY * t)]
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = 1_000_000
+    osc.record_length = 10_000
+    osc.trigger_mode = 'NONE'
+    osc.channels[0].voltage_range = 5
+    osc.channels[1].measurements_enabled = True
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def wait_until(condition, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_blocks_of_older_generations_are_dropped(osc):
+    # the threads and the transfers are prepared, but the device does not deliver data
+    osc._arm()
+    try:
+        block = bytes([150]) * osc._blocksize
+        generation = osc._capture_generation
+        osc.retrieve_callback(block, block, generation - 1)
+        assert osc._raw_data.qsize() == 0
+        # a stale block that is already queued is discarded by the processing thread
+        osc._raw_data.put((generation - 1, block, block))
+        osc._raw_data.put((generation, block, block))
+        wait_until(lambda: osc._raw_data.qsize() == 0 and osc.processed_samples)
+        time.sleep(0.05)
+        assert osc.processed_samples == osc._blocksize
+    finally:
+        osc.stop()
+
+
+def test_voltage_range_change_drops_stale_blocks(osc):
+    records = osc.records(maxsize=1000, timeout=TIMEOUT)
+    osc.start()
+    try:
+        assert osc.wait_for_record(timeout=TIMEOUT) is not None
+        process_thread = osc._process_data_thread
+        generation = osc._capture_generation
+        osc.channels[0].voltage_range = 1
+        changed_id = osc.latest_record_id
+        assert osc._capture_generation == generation + 1
+        assert osc.wait_for_record(changed_id + 3, timeout=TIMEOUT) is not None
+        # the capture is resumed without restarting the threads
+        assert osc._process_data_thread is process_thread and process_thread.is_alive()
+    finally:
+        osc.stop()
+    assert osc.scope.voltage_range_indices[0] == 5
+    new_records = [record for record in records if record.record_id > changed_id]
+    assert len(new_records) >= 3
+    for record in new_records:
+        # ADC counts of the 5 V range converted with the values of the 1 V range would read a fifth of the level
+        np.testing.assert_allclose(record.data[0], LEVEL, atol=0.02)
+        assert record.scale_factors[0] == osc._get_conversion_values(0)[0]
+
+
+def test_sample_rate_change_drops_stale_blocks(osc):
+    records = osc.records(maxsize=1000, timeout=TIMEOUT)
+    osc.start()
+    try:
+        assert osc.wait_for_record(timeout=TIMEOUT) is not None
+        osc.sample_rate = 4_000_000
+        changed_id = osc.latest_record_id
+        assert osc.wait_for_record(changed_id + 3, timeout=TIMEOUT) is not None
+    finally:
+        osc.stop()
+    new_records = [record for record in records if record.record_id > changed_id]
+    assert len(new_records) >= 3
+    for record in new_records:
+        assert record.sample_rate == 4_000_000
+        # blocks captured at the old sample rate would change the measured frequency
+        assert record.measure(1)['frequency'] == pytest.approx(FREQUENCY, rel=1e-3)
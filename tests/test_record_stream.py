@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def osc():
+    scope = SimulatedScope(noise=0)
+    # the trigger level is never reached, so no record is published
+    scope.signals = [lambda t: np.zeros_like(t), lambda t: np.zeros_like(t)]
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = 1_000_000
+    osc.trigger_mode = 'REPEAT'
+    osc.channels[0].trigger_level = 1.0
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+async def consume(stream):
+    return [record async for record in stream]
+
+
+@pytest.mark.parametrize('stream_timeout', [None, 60], ids=['no_timeout', 'timeout'])
+@pytest.mark.parametrize('roll_updates', [False, True], ids=['records', 'roll_updates'])
+@pytest.mark.parametrize('steps', range(6))
+def test_stop_ends_pending_async_iteration(osc, roll_updates, steps, stream_timeout):
+    if roll_updates:
+        osc.trigger_mode = 'ROLL'
+        osc.sample_rate = 20_000
+        osc.scope.realtime = False
+
+    async def main():
+        osc.start()
+        if roll_updates:
+            stream = osc.roll_updates(timeout=stream_timeout)
+        else:
+            stream = osc.records(timeout=stream_timeout)
+        consumer = asyncio.ensure_future(consume(stream))
+        # stop after a varying number of steps of the event loop, so the stop hits every point of "__anext__"
+        for _ in range(steps):
+            await asyncio.sleep(0)
+        osc.stop()
+        # a missed stop would hang until the timeout of the stream (forever without one)
+        await asyncio.wait_for(consumer, TIMEOUT)
+        return stream
+
+    stream = asyncio.run(main())
+    assert not osc.running
+    assert stream._closed
+
+
+def test_stop_from_another_thread_ends_async_iteration(osc):
+    async def main():
+        osc.start()
+        stream = osc.records()
+        stopper = threading.Timer(0.2, osc.stop)
+        stopper.start()
+        try:
+            return await asyncio.wait_for(consume(stream), TIMEOUT)
+        finally:
+            stopper.join()
+
+    assert asyncio.run(main()) == []
+
+
+def test_records_are_delivered_before_the_end(osc):
+    osc.channels[0].trigger_level = 0.0
+    osc.scope.signals[0] = lambda t: np.sin(2 * np.pi * 1e3 * t)
+
+    async def main():
+        osc.start()
+        records = []
+        async for record in osc.records():
+            records.append(record)
+            if len(records) == 3:
+                osc.stop()
+        return records
+
+    records = asyncio.run(asyncio.wait_for(main(), TIMEOUT))
+    assert len(records) >= 3
+    assert [record.record_id for record in records] == sorted({record.record_id for record in records})
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.roll import RollBuffer, RollUpdate
+from hantekosc.simulation import SimulatedScope
+
+RECORD_LENGTH = 1000
+SAMPLE_RATE = 100_000
+
+
+def stream(length):
+    """
+    Get a deterministic stream of ADC counts of two channels (CH2 is CH1 reversed).
+    """
+    counts = (np.arange(length) * 7 % 251).astype(np.uint8)
+    return np.stack((counts, 255 - counts))
+
+
+def append_blocks(buffer, data, block_lengths):
+    position = 0
+    for block_length in block_lengths:
+        buffer.append(tuple(data[:, position:position + block_length]))
+        position += block_length
+    return position
+
+
+@pytest.mark.parametrize('block_lengths', [[100] * 25, [333] * 9, [1] * 1500, [999, 2, 999, 5], [1000] * 3,
+                                           [7, 993, 1, 1000, 456]])
+def test_append_and_snapshot(block_lengths):
+    data = stream(sum(block_lengths))
+    buffer = RollBuffer(RECORD_LENGTH)
+    total = 0
+    for block_length in block_lengths:
+        total = append_blocks(buffer, data[:, total:], [block_length]) + total
+        first_index, snapshot = buffer.snapshot()
+        assert buffer.total_samples == total
+        assert first_index == max(0, total - RECORD_LENGTH)
+        np.testing.assert_array_equal(snapshot, data[:, first_index:total])
+
+
+@pytest.mark.parametrize('block_length', [RECORD_LENGTH + 1, 2 * RECORD_LENGTH + 37, 10 * RECORD_LENGTH])
+def test_blocks_longer_than_the_buffer(block_length):
+    data = stream(3 * block_length + 250)
+    buffer = RollBuffer(RECORD_LENGTH)
+    # start in the middle of the buffer, so the skipped samples move the write position
+    total = append_blocks(buffer, data, [250] + [block_length] * 3)
+    first_index, snapshot = buffer.snapshot()
+    assert buffer.total_samples == total
+    assert first_index == total - RECORD_LENGTH
+    np.testing.assert_array_equal(snapshot, data[:, -RECORD_LENGTH:])
+
+
+def test_snapshot_is_a_copy():
+    buffer = RollBuffer(10, number_of_channels=1)
+    assert buffer.snapshot()[1].shape == (1, 0)
+    buffer.append((np.arange(15, dtype=np.uint8),))
+    first_index, snapshot = buffer.snapshot()
+    assert first_index == 5
+    np.testing.assert_array_equal(snapshot[0], np.arange(5, 15))
+    snapshot[:] = 0
+    assert buffer.snapshot()[1][0, 0] == 5
+
+
+def test_roll_update():
+    data = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    update = RollUpdate(3, 200, data, 'float64', (0.04, 0.04), (0.0, 0.0), 1000.0)
+    assert update.number_of_samples == 3
+    np.testing.assert_allclose(update.timing_data, [0.2, 0.201, 0.202])
+    with pytest.raises(ValueError):
+        update.data[0, 0] = 0.0
+
+
+@pytest.fixture
+def osc():
+    scope = SimulatedScope(realtime=False, noise=0)
+    scope.signals = [lambda t: 0.8 * np.sin(2 * np.pi * 1e3 * t), lambda t: 0.5 * np.cos(2 * np.pi * 3e3 * t)]
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = SAMPLE_RATE
+    osc.record_length = RECORD_LENGTH
+    osc.trigger_mode = 'ROLL'
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def feed(osc, block_length, number_of_blocks):
+    """
+    Feed blocks of the simulated device into the oscilloscope and collect the roll updates.
+    """
+    osc.scope._block_length = block_length
+    adc_counts, updates = [], []
+    for _ in range(number_of_blocks):
+        block = osc.scope._next_block()
+        osc._process_block(*block)
+        adc_counts.append(np.array(block))
+        updates.append(osc.latest_roll_update)
+    return np.concatenate(adc_counts, axis=1), updates
+
+
+def test_roll_buffer_allocation(osc):
+    # one row per channel, record_length samples
+    assert osc._roll_buffer._buffer.shape == (osc.number_of_channels, RECORD_LENGTH)
+    osc.record_length = 2 * RECORD_LENGTH
+    assert osc._roll_buffer.length == 2 * RECORD_LENGTH and osc._roll_buffer.total_samples == 0
+    osc.trigger_mode = 'NONE'
+    assert osc._roll_buffer is None
+    assert osc.roll_data()[1].shape == (0,)
+
+
+@pytest.mark.parametrize('data_type', ['uint8', 'float32', 'float64'])
+@pytest.mark.parametrize('block_length', [300, RECORD_LENGTH, 2500])
+def test_roll_mode(osc, data_type, block_length):
+    osc.data_type = data_type
+    adc_counts, updates = feed(osc, block_length, 5)
+    # no records are published in the 'ROLL' mode
+    assert osc.latest_record is None
+    assert [update.update_id for update in updates] == [1, 2, 3, 4, 5]
+    # the updates follow each other without gaps
+    assert [update.start_index for update in updates] == [i * block_length for i in range(5)]
+    for update in updates:
+        assert update.data_type == data_type and update.data.dtype == np.dtype(data_type)
+        assert update.number_of_samples == block_length
+        new_counts = adc_counts[:, update.start_index:update.start_index + block_length]
+        if data_type == 'uint8':
+            np.testing.assert_array_equal(update.data, new_counts)
+        else:
+            expected = [(new_counts[i] - 128.0 - update.offsets[i]) * update.scale_factors[i] for i in range(2)]
+            np.testing.assert_allclose(update.data, expected, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(update.timing_data, (update.start_index + np.arange(block_length)) / SAMPLE_RATE)
+    update_id, timing_data, data = osc.roll_data()
+    assert update_id == 5
+    total = 5 * block_length
+    np.testing.assert_allclose(timing_data, np.arange(total - RECORD_LENGTH, total) / SAMPLE_RATE)
+    expected_counts = adc_counts[:, -RECORD_LENGTH:]
+    if data_type == 'uint8':
+        np.testing.assert_array_equal(data, expected_counts)
+    else:
+        assert data.dtype == np.dtype(data_type)
+        expected = [(expected_counts[i] - 128.0 - updates[-1].offsets[i]) * updates[-1].scale_factors[i]
+                    for i in range(2)]
+        np.testing.assert_allclose(data, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_roll_updates_of_the_running_device(osc):
+    osc.start()
+    updates = osc.roll_updates(timeout=5)
+    try:
+        received = [next(updates) for _ in range(5)]
+    finally:
+        updates.close()
+        osc.stop()
+    ids = [update.update_id for update in received]
+    assert ids == list(range(ids[0], ids[0] + 5))
+    for previous, update in zip(received, received[1:]):
+        assert update.start_index == previous.start_index + previous.number_of_samples
+    assert osc.latest_record is None
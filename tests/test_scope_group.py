@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.scope_group import ScopeGroup
+from hantekosc.simulation import SimulatedScope
+
+TIMEOUT = 5
+SERIAL_NUMBERS = ['0123456789AA', '0123456789AB', '0123456789AC']
+
+
+class SimulatedBus(SimulatedScope):
+    """
+    Several simulated devices on one bus, of which one is opened at a time. They only differ in their serial number,
+    their port and whether their firmware is loaded.
+    """
+    def __init__(self, serial_numbers, firmware_present=(), **kwargs):
+        super().__init__(**kwargs)
+        self.enumeration_time = 0
+        self.devices = {(1, (i + 1,)): {'serial_number': serial_number, 'firmware': serial_number in firmware_present}
+                        for i, serial_number in enumerate(serial_numbers)}
+        self.flashed_ports = []
+        self.port = None
+        self._select(next(iter(self.devices)))
+
+    def _select(self, port):
+        if self.port is not None:
+            self.devices[self.port]['firmware'] = self.is_device_firmware_present
+        self.port = port
+        self.serial_number = self.devices[port]['serial_number']
+        self.is_device_firmware_present = self.devices[port]['firmware']
+
+    def setup(self, serial_number=None, port=None):
+        for device_port, device in self.devices.items():
+            if port is not None and port != device_port:
+                continue
+            if serial_number is not None and (not device['firmware'] or device['serial_number'] != serial_number):
+                continue
+            self._select(device_port)
+            return super().setup(serial_number, port)
+        return False
+
+    def list_device_ports(self, firmware_present=None):
+        return [port for port, device in self.devices.items()
+                if firmware_present is None or device['firmware'] == firmware_present]
+
+    def flash_firmware(self, firmware=None, supports_single_channel=True, timeout=60):
+        self.flashed_ports.append(self.port)
+        result = super().flash_firmware(firmware, supports_single_channel, timeout)
+        self.devices[self.port]['firmware'] = True
+        return result
+
+
+def port(index):
+    return 1, (index + 1,)
+
+
+@pytest.mark.parametrize('index', range(3))
+def test_serial_number_selects_the_device(index):
+    bus = SimulatedBus(SERIAL_NUMBERS, realtime=False)
+    osc = Oscilloscope(SERIAL_NUMBERS[index], scope=bus)
+    assert bus.get_serial_number_string() == SERIAL_NUMBERS[index]
+    assert osc._port == port(index)
+    # the devices without firmware are flashed one after another until the device is found
+    assert bus.flashed_ports == [port(i) for i in range(index + 1)]
+
+
+def test_device_with_firmware_is_not_flashed():
+    bus = SimulatedBus(SERIAL_NUMBERS, firmware_present=SERIAL_NUMBERS, realtime=False)
+    osc = Oscilloscope(SERIAL_NUMBERS[2], scope=bus)
+    assert osc._port == port(2) and bus.flashed_ports == []
+
+
+def test_only_devices_without_firmware_are_flashed():
+    bus = SimulatedBus(SERIAL_NUMBERS, firmware_present=SERIAL_NUMBERS[:1], realtime=False)
+    osc = Oscilloscope(SERIAL_NUMBERS[2], scope=bus)
+    assert osc._port == port(2) and bus.flashed_ports == [port(1), port(2)]
+
+
+def test_first_device_without_serial_number():
+    bus = SimulatedBus(SERIAL_NUMBERS, realtime=False)
+    osc = Oscilloscope(scope=bus)
+    assert osc._port == port(0) and bus.get_serial_number_string() == SERIAL_NUMBERS[0]
+
+
+def test_unknown_serial_number():
+    bus = SimulatedBus(SERIAL_NUMBERS, realtime=False)
+    with pytest.raises(RuntimeError, match='0123456789FF'):
+        Oscilloscope('0123456789FF', scope=bus)
+    assert bus.flashed_ports == [port(i) for i in range(3)]
+
+
+@pytest.fixture
+def group():
+    scopes = [SimulatedScope(serial_number, port(i), realtime=True, noise=0)
+              for i, serial_number in enumerate(SERIAL_NUMBERS[:2])]
+    scopes[1].signals = [lambda t: np.full_like(t, 0.5), lambda t: np.zeros_like(t)]
+    group = ScopeGroup(SERIAL_NUMBERS[:2], scopes=scopes)
+    for osc in group:
+        osc.sample_rate = 1_000_000
+        osc.record_length = 10_000
+        osc.trigger_mode = 'NONE'
+    yield group
+    group.close()
+
+
+def test_group_records(group):
+    assert len(group) == 2 and group.context is None
+    assert [osc.scope.get_serial_number_string() for osc in group] == SERIAL_NUMBERS[:2]
+    assert not any(osc.handle_usb_events for osc in group)
+    group.start()
+    try:
+        received = []
+        for records in group.records(timeout=TIMEOUT):
+            received.append(records)
+            if len(received) == 3:
+                break
+    finally:
+        duration = group.stop()
+    assert duration < 1 and not group.running and group._event_thread is None
+    assert group.start_skew < 0.05
+    for previous, records in zip(received, received[1:]):
+        assert all(record.record_id > previous_record.record_id for record, previous_record in zip(records, previous))
+    # each record belongs to its device
+    np.testing.assert_allclose(received[-1][1].data[0], 0.5, atol=0.02)
+    assert np.abs(received[-1][0].data[0]).max() == pytest.approx(1.0, abs=0.05)
+    statistics = group.statistics()
+    assert [entry['Serial Number'] for entry in statistics] == SERIAL_NUMBERS[:2]
+    assert all(entry['Records'] >= 3 and entry['Processed Samples'] >= 30_000 for entry in statistics)
+
+
+def test_group_needs_a_device_per_serial_number():
+    with pytest.raises(ValueError):
+        ScopeGroup(SERIAL_NUMBERS, scopes=[SimulatedScope(SERIAL_NUMBERS[0])])
+
+
+def test_group_with_wrong_device():
+    scopes = [SimulatedScope(SERIAL_NUMBERS[0], port(0)), SimulatedScope(SERIAL_NUMBERS[2], port(1))]
+    with pytest.raises(RuntimeError, match=SERIAL_NUMBERS[1]):
+        ScopeGroup(SERIAL_NUMBERS[:2], scopes=scopes)
@@ -0,0 +1,176 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.record import Record
+from hantekosc.simulation import SimulatedScope
+from hantekosc.spectrum import WINDOWS, SpectrumAnalyzer, frequency_axis, window_function
+
+LENGTH = 4096
+SAMPLE_RATE = 1_024_000.0
+# the frequency of bin 100
+FREQUENCY = 100 * SAMPLE_RATE / LENGTH
+
+
+def sine_record(amplitude=1.5, dc=0.3, record_id=1, length=LENGTH, sample_rate=SAMPLE_RATE, frequency=FREQUENCY):
+    t = np.arange(length) / sample_rate
+    data = np.stack((dc + amplitude * np.sin(2 * np.pi * frequency * t), np.zeros(length)))
+    return Record(record_id, t, data, 'float64', (0.04, 0.04), (0.0, 0.0), sample_rate)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_amplitude_of_a_bin_centred_sine(window):
+    analyzer = SpectrumAnalyzer(window, use_worker=False)
+    analyzer.add(sine_record(), 0)
+    record_id, frequencies, amplitudes, count = analyzer.result()
+    assert record_id == 1 and count == 1
+    assert len(frequencies) == len(amplitudes) == LENGTH // 2 + 1
+    assert frequencies[100] == FREQUENCY
+    assert amplitudes[100] == pytest.approx(1.5, rel=1e-4)
+    assert amplitudes[0] == pytest.approx(0.3, rel=1e-4)
+    # far away from the sine, only leakage is left
+    assert amplitudes[400:].max() < 1e-3
+    _, _, levels, _ = analyzer.result('DB')
+    assert levels[100] == pytest.approx(20 * math.log10(1.5 / math.sqrt(2)), abs=1e-3)
+
+
+def test_windows():
+    for window in WINDOWS:
+        values = window_function(window, 1000)
+        assert values.dtype == np.float32 and not values.flags.writeable
+        assert values.sum() == pytest.approx(2)
+        assert window_function(window, 1000) is values
+    with pytest.raises(ValueError):
+        window_function('HAMMING', 1000)
+    np.testing.assert_array_equal(frequency_axis(LENGTH, SAMPLE_RATE), np.fft.rfftfreq(LENGTH, 1 / SAMPLE_RATE))
+
+
+def amplitudes(analyzer):
+    _, _, amplitudes, count = analyzer.result()
+    return float(amplitudes[100]), count
+
+
+def test_linear_averaging():
+    analyzer = SpectrumAnalyzer(averaging='LINEAR', number_of_averages=3, use_worker=False)
+    for record_id, amplitude in enumerate((1.0, 2.0, 3.0), 1):
+        analyzer.add(sine_record(amplitude, record_id=record_id), 0)
+    # the power is averaged
+    assert amplitudes(analyzer) == pytest.approx((math.sqrt(14 / 3), 3), rel=1e-4)
+    # the average starts again after number_of_averages records
+    analyzer.add(sine_record(4.0, record_id=4), 0)
+    assert amplitudes(analyzer) == pytest.approx((4.0, 1), rel=1e-4)
+
+
+def test_exponential_averaging():
+    analyzer = SpectrumAnalyzer(averaging='EXPONENTIAL', number_of_averages=2, use_worker=False)
+    expected = None
+    for count, amplitude in enumerate((1.0, 3.0, 2.0, 5.0), 1):
+        analyzer.add(sine_record(amplitude, record_id=count), 0)
+        power = amplitude ** 2
+        expected = power if expected is None else expected + (power - expected) / min(count, 2)
+        assert amplitudes(analyzer) == pytest.approx((math.sqrt(expected), count), rel=1e-4)
+
+
+def test_peak_hold():
+    analyzer = SpectrumAnalyzer(averaging='PEAK_HOLD', use_worker=False)
+    for record_id, amplitude in enumerate((1.0, 3.0, 2.0), 1):
+        analyzer.add(sine_record(amplitude, record_id=record_id), 0)
+    assert amplitudes(analyzer) == pytest.approx((3.0, 3), rel=1e-4)
+    analyzer.reset()
+    assert analyzer.result()[3] == 0
+    analyzer.add(sine_record(2.0), 0)
+    assert amplitudes(analyzer) == pytest.approx((2.0, 1), rel=1e-4)
+
+
+@pytest.mark.parametrize('averaging', ['LINEAR', 'EXPONENTIAL', 'PEAK_HOLD'])
+@pytest.mark.parametrize('change', ['length', 'sample_rate', 'window'])
+def test_averaging_restarts_on_key_change(averaging, change):
+    analyzer = SpectrumAnalyzer(averaging=averaging, number_of_averages=8, use_worker=False)
+    for record_id in range(1, 4):
+        analyzer.add(sine_record(3.0, record_id=record_id), 0)
+    assert analyzer.result()[3] == 3
+    if change == 'length':
+        record = sine_record(1.0, record_id=4, length=2 * LENGTH)
+    elif change == 'sample_rate':
+        record = sine_record(1.0, record_id=4, sample_rate=2 * SAMPLE_RATE, frequency=2 * FREQUENCY)
+    else:
+        analyzer.window = 'FLATTOP'
+        record = sine_record(1.0, record_id=4)
+    analyzer.add(record, 0)
+    record_id, frequencies, spectrum, count = analyzer.result()
+    assert record_id == 4 and count == 1
+    assert len(frequencies) == record.record_length // 2 + 1
+    # the spectrum only contains the new record
+    assert spectrum.max() == pytest.approx(1.0, rel=1e-4)
+
+
+def test_worker_drops_records_while_busy():
+    analyzer = SpectrumAnalyzer(use_worker=True)
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # the worker is blocked, so the first spectrum is pending
+        executor.submit(release.wait)
+        analyzer.submit(sine_record(1.0, record_id=1), 0, executor)
+        analyzer.submit(sine_record(2.0, record_id=2), 0, executor)
+        analyzer.submit(sine_record(3.0, record_id=3), 0, executor)
+        assert analyzer.dropped_records == 2
+        release.set()
+    assert analyzer.result()[0] == 1
+    assert amplitudes(analyzer) == pytest.approx((1.0, 1), rel=1e-4)
+    # the worker is free again
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        analyzer.submit(sine_record(4.0, record_id=4), 0, executor)
+    assert analyzer.result()[0] == 4 and analyzer.dropped_records == 2
+
+
+def test_without_worker():
+    analyzer = SpectrumAnalyzer(use_worker=False)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        analyzer.submit(sine_record(record_id=7), 0, executor)
+        # calculated in the calling thread
+        assert analyzer.result()[0] == 7
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        SpectrumAnalyzer('HAMMING')
+    with pytest.raises(ValueError):
+        SpectrumAnalyzer(averaging='MEDIAN')
+    with pytest.raises(ValueError):
+        SpectrumAnalyzer(number_of_averages=0)
+    analyzer = SpectrumAnalyzer(use_worker=False)
+    assert len(analyzer.result()[1]) == 0
+    analyzer.add(sine_record(), 0)
+    with pytest.raises(ValueError):
+        analyzer.result('LOG')
+
+
+def test_spectrum_of_published_records():
+    scope = SimulatedScope(realtime=False, noise=0)
+    frequency = 10_000.0
+    scope.signals = [lambda t: np.sin(2 * np.pi * frequency * t), lambda t: 0.0 * t]
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = 1_000_000
+    osc.record_length = 10_000
+    osc.trigger_mode = 'NONE'
+    osc.data_type = 'float32'
+    osc.channels[0].spectrum_analyzer = SpectrumAnalyzer('FLATTOP', 'LINEAR')
+    osc.start()
+    try:
+        assert osc.wait_for_record(timeout=5) is not None
+        assert osc.wait_for_record(timeout=5) is not None
+    finally:
+        osc.stop()
+    record_id, frequencies, spectrum = osc.channels[0].spectrum()
+    assert record_id > 0
+    assert frequencies[np.argmax(spectrum[1:]) + 1] == pytest.approx(frequency)
+    assert spectrum.max() == pytest.approx(1.0, rel=0.05)
+    # without a spectrum analyzer, the spectrum of the latest record is calculated
+    osc.channels[0].spectrum_analyzer = None
+    record_id, frequencies, spectrum = osc.channels[0].spectrum(window='RECTANGULAR')
+    assert record_id == osc.latest_record.record_id
+    assert frequencies[np.argmax(spectrum[1:]) + 1] == pytest.approx(frequency)
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from hantekosc.oscilloscope import Oscilloscope
+from hantekosc.simulation import SimulatedScope
+
+TIMEOUT = 5
+# stop() cancels the transfers and joins the threads, it does not wait for any timeout to expire
+MAX_STOP_TIME = 0.5
+
+
+@pytest.fixture(params=[True, False], ids=['realtime', 'fast'])
+def osc(request):
+    scope = SimulatedScope(realtime=request.param, noise=0)
+    scope.signals = [lambda t: np.sin(2 * np.pi * 1e3 * t), lambda t: np.zeros_like(t)]
+    osc = Oscilloscope(scope=scope)
+    osc.sample_rate = 1_000_000
+    osc.record_length = 5000
+    osc.trigger_mode = 'NONE'
+    yield osc
+    if osc.running:
+        osc.stop()
+
+
+def threads(osc):
+    return [thread for thread in (osc._process_data_thread, osc._retriever_thread) if thread is not None]
+
+
+def test_stop_is_fast_and_final(osc):
+    stop_calls = []
+    osc.stop_callback = lambda: stop_calls.append(threading.current_thread())
+    osc.start()
+    assert osc.wait_for_record(timeout=TIMEOUT) is not None
+    running_threads = threads(osc)
+    assert len(running_threads) == 2
+    start = time.perf_counter()
+    duration = osc.stop()
+    assert time.perf_counter() - start < MAX_STOP_TIME and duration < MAX_STOP_TIME
+    assert not any(thread.is_alive() for thread in running_threads)
+    assert stop_calls == [threading.current_thread()] and osc.stop_count == 1
+    # no record is published and no block is processed after stop() returned
+    record_id, processed_samples = osc.latest_record_id, osc.processed_samples
+    time.sleep(0.1)
+    assert osc.latest_record_id == record_id and osc.processed_samples == processed_samples
+    assert osc._raw_data.qsize() == 0
+    assert not osc.scope.capturing
+
+
+def test_restart(osc):
+    record_ids = []
+    for _ in range(5):
+        osc.start()
+        record = osc.wait_for_record(timeout=TIMEOUT)
+        assert record is not None
+        record_ids.append(record.record_id)
+        assert osc.stop() < MAX_STOP_TIME
+    # the record ids keep increasing and each measurement starts with a fresh record
+    assert record_ids == sorted(set(record_ids))
+    assert osc.stop_count == 5
+    osc.start()
+    try:
+        records = osc.records(timeout=TIMEOUT)
+        record = next(records)
+        # the restarted measurement delivers the input signal
+        assert record.record_id > record_ids[-1]
+        assert np.abs(record.data[0]).max() == pytest.approx(1.0, abs=0.05)
+    finally:
+        osc.stop()
+
+
+def test_stop_in_single_mode(osc):
+    stopped = threading.Event()
+    osc.stop_callback = stopped.set
+    osc.trigger_mode = 'SINGLE'
+    osc.channels[0].trigger_level = 0.5
+    osc.start()
+    assert stopped.wait(TIMEOUT)
+    # the processing thread stopped the measurement itself after the first record
+    assert not osc.running and osc.latest_record_id == 1
+    osc._process_data_thread.join(TIMEOUT)
+    assert not osc._process_data_thread.is_alive()
+    osc.start()
+    try:
+        assert osc.wait_for_record(1, timeout=TIMEOUT) is not None
+    finally:
+        osc.stop()
+
+
+def test_stop_ends_waiting_consumers(osc):
+    osc.channels[0].trigger_level = 5.0
+    osc.trigger_mode = 'REPEAT'
+    osc.start()
+    records = osc.records(timeout=60)
+    received = []
+    consumer = threading.Thread(target=lambda: received.extend(records))
+    consumer.start()
+    time.sleep(0.05)
+    assert osc.stop() < MAX_STOP_TIME
+    consumer.join(TIMEOUT)
+    assert not consumer.is_alive() and received == []
+
+
+def test_full_queue_does_not_block_the_callback(osc):
+    osc._arm()
+    try:
+        # the processing thread cannot take blocks while the settings are locked
+        with osc.settings_mutex:
+            block = bytes(osc._blocksize)
+            start = time.perf_counter()
+            for _ in range(osc._raw_data.maxsize + 10):
+                osc.retrieve_callback(block, block, osc._capture_generation)
+            assert time.perf_counter() - start < MAX_STOP_TIME
+            assert osc.dropped_blocks >= 9
+    finally:
+        assert osc.stop() < MAX_STOP_TIME